@@ -35,13 +35,9 @@ def require_admin(authorization: Optional[str] = Header(None)) -> None:
     if authorization.split(" ", 1)[1] != token:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-DEFAULT_VIEWS: List[str] = [
-    "lane_matchup_stats",
-    "ctx_lane_vs_enemyjg",
-    "ctx_bot_2v2",
-    "ctx_lane_vs_enemyjg_builds",
-    "ctx_bot_2v2_builds",
-]
+# No sql/*.sql file creates a materialized view, so by default the endpoint refreshes whatever
+# pg_matviews lists (possibly nothing) and then bumps lol.data_versions.
+DEFAULT_VIEWS: List[str] = []
 
 class RefreshBody(BaseModel):
     views: Optional[List[str]] = None
@@ -49,8 +45,6 @@ class RefreshBody(BaseModel):
 
 @router.post("/refresh")
 def refresh_materialized_views(body: RefreshBody, _=Depends(require_admin)):
-    views = body.views or DEFAULT_VIEWS
-
     def ident(s: str) -> str:
         return "".join(c for c in s if c.isalnum() or c == "_")
 
@@ -59,21 +53,35 @@ def refresh_materialized_views(body: RefreshBody, _=Depends(require_admin)):
 
     dsn = _get_dsn()
     with psycopg.connect(dsn) as con:
+        # autocommit: each statement is its own transaction, so one failed refresh
+        # doesn't abort the others or the data_versions bump
+        con.autocommit = True
         with con.cursor() as cur:
-            for v in views:
-                name = ident(v)
+            cur.execute("select matviewname from pg_matviews where schemaname = any(current_schemas(false))")
+            existing = {r[0] for r in cur.fetchall()}
+            views = [ident(v) for v in (body.views or DEFAULT_VIEWS or sorted(existing))]
+            for name in views:
+                if name not in existing:
+                    errors.append(f"{name}: no such materialized view")
+                    continue
                 try:
                     cur.execute(f"refresh materialized view {name};")
                     refreshed.append(name)
                 except Exception as e:
                     errors.append(f"{name}: {e}")
             if body.analyze_after:
-                for v in views:
-                    name = ident(v)
+                for name in refreshed:
                     try:
                         cur.execute(f"analyze {name};")
                     except Exception:
                         pass
-        con.commit()
+            # invalidate cached /stats/flexible answers everywhere (sql/data_versions.sql)
+            try:
+                cur.execute("""
+                  insert into lol.data_versions(patch) values('*')
+                  on conflict (patch) do update set version = lol.data_versions.version + 1, updated_at = now()
+                """)
+            except Exception as e:
+                errors.append(f"data_versions: {e}")
 
     return {"refreshed": refreshed, "errors": errors}
@@ -0,0 +1,67 @@
+# api/admission.py
+from __future__ import annotations
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional
+
+class Overloaded(Exception):
+    """A request waited longer than its budget for an execution slot or a connection."""
+    def __init__(self, request_class: str, waited_s: float, reason: str):
+        super().__init__(f"{request_class} request turned away after {waited_s * 1000:.0f}ms ({reason})")
+        self.request_class = request_class
+        self.waited_s = waited_s
+        self.reason = reason
+
+class Admission:
+    """
+    Concurrency caps per request class, each with a wait budget. A request that can't get a slot
+    within the budget raises Overloaded (the route answers 503 + Retry-After) instead of queueing
+    behind slower ones. Capping the slow class below the pool size keeps connections free for the
+    fast one. Classes missing from `limits` are not capped. slot() is for sync routes, aslot() for
+    async ones. Both yield the budget left for the connection wait that follows.
+    """
+    def __init__(self, limits: Dict[str, int], metrics=None):
+        self.limits = dict(limits)
+        self.metrics = metrics
+        self._sync = {c: threading.BoundedSemaphore(n) for c, n in self.limits.items()}
+        self._async: Dict[str, asyncio.Semaphore] = {}  # made on first use, on the serving loop
+
+    def reject(self, request_class: str, waited_s: float, reason: str) -> Overloaded:
+        if self.metrics is not None:
+            self.metrics.inc("api_rejected_total", request_class=request_class, reason=reason)
+        return Overloaded(request_class, waited_s, reason)
+
+    @contextmanager
+    def slot(self, request_class: str, budget_s: float):
+        sem = self._sync.get(request_class)
+        if sem is None:
+            yield budget_s
+            return
+        t0 = time.perf_counter()
+        if not sem.acquire(timeout=budget_s):
+            raise self.reject(request_class, time.perf_counter() - t0, "slot")
+        try:
+            yield max(budget_s - (time.perf_counter() - t0), 0.0)
+        finally:
+            sem.release()
+
+    @asynccontextmanager
+    async def aslot(self, request_class: str, budget_s: float):
+        limit: Optional[int] = self.limits.get(request_class)
+        if limit is None:
+            yield budget_s
+            return
+        sem = self._async.get(request_class)
+        if sem is None:
+            sem = self._async[request_class] = asyncio.Semaphore(limit)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(sem.acquire(), budget_s)
+        except asyncio.TimeoutError:
+            raise self.reject(request_class, time.perf_counter() - t0, "slot") from None
+        try:
+            yield max(budget_s - (time.perf_counter() - t0), 0.0)
+        finally:
+            sem.release()
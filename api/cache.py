@@ -0,0 +1,183 @@
+# api/cache.py
+from __future__ import annotations
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Callable, Any
+
+# ----------------------------
+# Shared (cross-process) backends
+# ----------------------------
+class LocalBackend:
+    """
+    In-process stand-in for a shared cache (same get/set contract as RedisBackend).
+    Useful in dev and single-process deployments, or to exercise the shared path without Redis.
+    """
+    def __init__(self):
+        self._data: Dict[str, tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            expires, value = hit
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl_s: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl_s, value)
+
+class RedisBackend:
+    def __init__(self, url: str, prefix: str = "flex:"):
+        try:
+            import redis  # optional dependency
+        except ImportError as e:
+            raise RuntimeError("FLEX_CACHE_BACKEND=redis://... needs the 'redis' package") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception:
+            return None  # a sick shared cache degrades to local-only, never fails the request
+
+    def set(self, key: str, value: bytes, ttl_s: float):
+        try:
+            self.client.set(self.prefix + key, value, ex=max(1, int(ttl_s)))
+        except Exception:
+            pass
+
+def build_backend(spec: str):
+    """'' -> none, 'local' -> LocalBackend, 'redis://...' -> RedisBackend."""
+    if not spec:
+        return None
+    if spec == "local":
+        return LocalBackend()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    raise RuntimeError(f"Unknown FLEX_CACHE_BACKEND {spec!r}")
+
+# ----------------------------
+# Data-version stamps
+# ----------------------------
+class DataVersions:
+    """
+    Snapshot of lol.data_versions (patch -> version), re-read at most every `poll_s`.
+    Ingest bumps a patch's row when it commits matches for it; /admin/refresh bumps '*'.
+    """
+    GLOBAL = "*"
+
+    def __init__(self, fetch: Callable[[], Dict[str, int]], poll_s: float = 2.0):
+        self.fetch = fetch
+        self.poll_s = poll_s
+        self._versions: Dict[str, int] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _snapshot(self) -> Dict[str, int]:
+        now = time.monotonic()
+        if now - self._loaded_at >= self.poll_s:
+            with self._lock:
+                if now - self._loaded_at >= self.poll_s:
+                    try:
+                        self._versions = self.fetch()
+                    except Exception:
+                        pass  # keep the last snapshot; TTL still bounds staleness
+                    self._loaded_at = now
+        return self._versions
+
+    def due(self) -> bool:
+        """True when the next stamp() re-reads lol.data_versions (a blocking query)."""
+        return time.monotonic() - self._loaded_at >= self.poll_s
+
+    def stamp(self, patch: Optional[str]) -> str:
+        v = self._snapshot()
+        g = v.get(self.GLOBAL, 0)
+        if patch is None:
+            # all-patch answers change whenever any patch does
+            return f"{g}.{sum(n for p, n in v.items() if p != self.GLOBAL)}"
+        return f"{g}.{v.get(patch, 0)}"
+
+# ----------------------------
+# Response cache
+# ----------------------------
+def canonical_key(payload: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class ResponseCache:
+    """
+    LRU of JSON-encoded responses bounded by total bytes, with a per-entry TTL.
+    Sits in front of an optional shared backend: local miss -> shared -> compute.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_s: float = 300.0, shared=None):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.shared = shared
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "too_large": 0}
+
+    def _drop(self, key: str):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return json.loads(hit[1])
+                self._drop(key)
+                self.stats["expired"] += 1
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._put_local(key, value)
+                with self._lock:
+                    self.stats["shared_hits"] += 1
+                return json.loads(value)
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _put_local(self, key: str, value: bytes):
+        with self._lock:
+            if len(value) > self.max_bytes:
+                self.stats["too_large"] += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def set(self, key: str, response: dict):
+        value = json.dumps(response, separators=(",", ":")).encode()
+        self._put_local(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.ttl_s)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "ttl_s": self.ttl_s,
+                    "shared": type(self.shared).__name__ if self.shared is not None else None}
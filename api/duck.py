@@ -0,0 +1,98 @@
+# api/duck.py
+"""
+Embedded DuckDB engine for /stats/flexible (FLEX_ENGINE=duckdb). Runs agg_summary / top_items of
+sql/flexible_duckdb.sql over the Parquet files export_parquet.py writes, reading only the requested
+patch's files. Answers are as of the last export; the manifest's versions stamp the response cache.
+"""
+from __future__ import annotations
+import os
+import re
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+MANIFEST = "manifest.json"
+_TABLE_REF = re.compile(r"\blol\.(\w+)\b")
+
+class Manifest:
+    """export_parquet.py's manifest.json, re-read when the file changes."""
+    def __init__(self, root: str):
+        self.path = os.path.join(root, MANIFEST)
+        self._mtime = None
+        self._data: Dict = {"patches": {}}
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            raise RuntimeError(f"no Parquet export at {os.path.dirname(self.path)!r}; run export_parquet.py first")
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, encoding="utf-8") as f:
+                        self._data = json.load(f)
+                    self._mtime = mtime
+        return self._data
+
+class DuckEngine:
+    def __init__(self, root: str, sql_parts: Dict[str, str], threads: Optional[int] = None):
+        self.root = root
+        self.manifest = Manifest(root)
+        self.agg_summary = sql_parts["agg_summary"]
+        self.top_items = sql_parts["top_items"]
+        self._db = duckdb.connect(config={"threads": threads} if threads else {})
+        self._db.execute(sql_parts["setup"])
+        self._local = threading.local()
+
+    def _con(self) -> duckdb.DuckDBPyConnection:
+        # one cursor (its own connection to the shared database) per worker thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._db.cursor()
+        return con
+
+    def versions(self) -> Dict[str, int]:
+        """patch -> exported data version, plus '*', in the shape of lol.data_versions."""
+        m = self.manifest.get()
+        out = {patch: int(e["version"]) for patch, e in m["patches"].items()}
+        out["*"] = int(m.get("global", 0))
+        return out
+
+    def _files(self, patch: Optional[str]) -> Optional[List[str]]:
+        patches = self.manifest.get()["patches"]
+        if patch is not None:
+            patches = {patch: patches[patch]} if patch in patches else {}
+        return [e["dir"] for e in patches.values()] or None
+
+    def _bind(self, query: str, dirs: List[str]) -> str:
+        def source(m: re.Match) -> str:
+            table = m.group(1)
+            if table == "items":
+                paths = [os.path.join(self.root, "items.parquet")]
+            else:
+                paths = [os.path.join(self.root, table, d, "data.parquet") for d in dirs]
+            return "read_parquet([" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "])"
+        return _TABLE_REF.sub(source, query)
+
+    def run(self, params: Dict) -> Tuple[Optional[Tuple], List[Tuple]]:
+        """
+        (n_games, winrate, gold_at_min, xp_at_min) or None below min_n / without data, and the
+        top items as (item_id, item_name, picks) rows; the same values the Postgres path returns.
+        """
+        dirs = self._files(params["patch"])
+        if dirs is None:
+            return None, []
+        con = self._con()
+        row = con.execute(self._bind(self.agg_summary, dirs), _used(self.agg_summary, params)).fetchone()
+        if row is None:
+            return None, []
+        n_games, winrate_m, gold_c, xp_c = row
+        items = con.execute(self._bind(self.top_items, dirs), _used(self.top_items, params)).fetchall()
+        return (n_games, winrate_m / 1000, gold_c / 100, xp_c / 100), items
+
+def _used(query: str, params: Dict) -> Dict:
+    # DuckDB rejects named parameters the statement doesn't reference
+    return {k: v for k, v in params.items() if f"${k}" in query}
@@ -1,6 +1,10 @@
 # api/main.py
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from api.routes import flexible
+from api import admin_refresh
+from api.metrics import METRICS
+from api import timing
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(
@@ -18,10 +22,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request phase timings: Server-Timing header, phase histograms, slow-request log
+if timing.ENABLED:
+    app.add_middleware(timing.TimingMiddleware, metrics=METRICS)
+
 # Health Check
 @app.get("/")
 def root():
     return {"status": "ok", "service": "League Stats API"}
 
+# Prometheus scrape target
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # New normalized, single flexible endpoint
 app.include_router(flexible.router)
+
+# POST /admin/refresh (Bearer ADMIN_TOKEN): refresh materialized views, drop cached answers
+app.include_router(admin_refresh.router)
@@ -0,0 +1,5 @@
+# api/metrics.py
+from riot.metrics import Metrics
+
+# one registry per API process, scraped at GET /metrics
+METRICS = Metrics()
@@ -2,15 +2,23 @@
 from __future__ import annotations
 import os
 import json
+import time
+import asyncio
 from dataclasses import dataclass
 from typing import Optional, List, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import psycopg
 from psycopg import sql
-from psycopg_pool import ConnectionPool
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout, TooManyRequests
+
+from api.cache import ResponseCache, DataVersions, build_backend, canonical_key
+from api.metrics import METRICS
+from api.admission import Admission, Overloaded
+from api import timing
 
 load_dotenv()
 
@@ -35,18 +43,125 @@ SQL_PATH = os.getenv(
     "FLEX_SQL_PATH",
     os.path.join(os.path.dirname(__file__), "..", "..", "sql", "flexible_filters.sql")
 )
+CUBE_SQL_PATH = os.getenv(
+    "FLEX_CUBE_SQL_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "sql", "flexible_cube.sql")
+)
+DUCK_SQL_PATH = os.getenv(
+    "FLEX_DUCK_SQL_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "sql", "flexible_duckdb.sql")
+)
+# answer matching filter shapes from lol.cube_* (sql/flex_cube.sql must be applied and maintained)
+USE_CUBE = os.getenv("FLEX_CUBE", "0") == "1"
+# "split" = agg_summary then top_items, "combined" = one statement that selects matches once
+EXEC_MODE = os.getenv("FLEX_EXEC_MODE", "split").lower()
+# "rows" = lol.participant_frames, "arrays" = lol.participant_frame_arrays (sql/frame_arrays.sql);
+# unset follows the store ingest writes (FRAME_STORE=rows|arrays|both, where both reads rows)
+FRAME_STORE = os.getenv("FLEX_FRAME_STORE", "arrays" if os.getenv("FRAME_STORE", "").lower() == "arrays" else "rows").lower()
+if FRAME_STORE == "arrays" and EXEC_MODE == "combined":
+    raise RuntimeError("FLEX_EXEC_MODE=combined reads lol.participant_frames; use FLEX_EXEC_MODE=split with FLEX_FRAME_STORE=arrays")
+# raw path engine: "postgres", or "duckdb" = api/duck.py over export_parquet.py's files in FLEX_PARQUET_DIR
+ENGINE = os.getenv("FLEX_ENGINE", "postgres").lower()
+PARQUET_DIR = os.getenv("FLEX_PARQUET_DIR", "parquet")
+DUCK_THREADS = int(os.getenv("FLEX_DUCKDB_THREADS", "0")) or None
+# response cache: FLEX_CACHE_MB=0 turns it off; FLEX_CACHE_BACKEND='' | local | redis://...
+CACHE_MB = float(os.getenv("FLEX_CACHE_MB", "64"))
+CACHE_TTL_S = float(os.getenv("FLEX_CACHE_TTL", "300"))
+CACHE_BACKEND = os.getenv("FLEX_CACHE_BACKEND", "")
+VERSION_POLL_S = float(os.getenv("FLEX_VERSION_POLL", "2"))
+# explain=true runs EXPLAIN (ANALYZE, BUFFERS), i.e. the full query, past the cache; off unless FLEX_EXPLAIN=1
+EXPLAIN_ALLOWED = os.getenv("FLEX_EXPLAIN", "0") == "1"
+# "sync" = def route on FastAPI's threadpool + ConnectionPool, "async" = async def route + AsyncConnectionPool
+DB_MODE = os.getenv("FLEX_DB_MODE", "sync").lower()
+POOL_MIN = int(os.getenv("FLEX_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("FLEX_POOL_MAX", "10"))
+POOL_MAX_WAITING = int(os.getenv("FLEX_POOL_MAX_WAITING", "0"))  # 0 = no cap on the pool's own queue
+# request classes: "cube" = answered from lol.cube_* only, "raw" = raw join narrowed by a champ_id
+# filter, "wide" = raw join with role-only filters, which reads a large share of the patch.
+# statement_timeout per class; a cancelled statement answers 504
+STATEMENT_TIMEOUT_MS = {
+    "cube": int(os.getenv("FLEX_TIMEOUT_CUBE_MS", "2000")),
+    "raw": int(os.getenv("FLEX_TIMEOUT_RAW_MS", "10000")),
+    "wide": int(os.getenv("FLEX_TIMEOUT_WIDE_MS", "30000")),
+}
+# admission: a request may wait this long for a slot + a connection, then it gets 503 + Retry-After
+QUEUE_BUDGET_S = float(os.getenv("FLEX_QUEUE_BUDGET_MS", "1000")) / 1000
+RETRY_AFTER_S = int(os.getenv("FLEX_RETRY_AFTER", "1"))
+# Server-side prepared statements (FLEX_PREPARE=1): each pooled connection parses the bundle's
+# statements once, on first use, and then executes them by name. Off by default: planning is a few
+# percent of a request and bench/flex_prepare_bench.py measured prepared custom plans slower.
+# FLEX_PLAN_CACHE_MODE is plan_cache_mode on the pool's connections. force_custom_plan (default)
+# still plans each call with the actual patch / skill_tier, which keeps partition pruning and
+# row estimates. force_generic_plan reuses one plan and skips planning. auto lets Postgres choose
+# after 5 calls.
+PREPARE = os.getenv("FLEX_PREPARE", "0") == "1"
+PLAN_CACHE_MODE = os.getenv("FLEX_PLAN_CACHE_MODE", "force_custom_plan").lower()
+if PLAN_CACHE_MODE not in ("auto", "force_custom_plan", "force_generic_plan"):
+    raise RuntimeError(f"FLEX_PLAN_CACHE_MODE must be auto, force_custom_plan or force_generic_plan, not {PLAN_CACHE_MODE!r}")
+# wide requests holding connections at once; below POOL_MAX so they can't starve the narrow ones
+WIDE_CONCURRENCY = int(os.getenv("FLEX_WIDE_CONCURRENCY", "0")) or max(1, POOL_MAX // 2)
+
+def _configure(conn: psycopg.Connection):
+    conn.execute(sql.SQL("SET plan_cache_mode = {}").format(sql.Literal(PLAN_CACHE_MODE)))
+    conn.commit()  # the pool wants connections back idle
+
+async def _configure_async(conn: psycopg.AsyncConnection):
+    await conn.execute(sql.SQL("SET plan_cache_mode = {}").format(sql.Literal(PLAN_CACHE_MODE)))
+    await conn.commit()
 
 _pool: ConnectionPool | None = None
 def get_pool() -> ConnectionPool:
     global _pool
     if _pool is None:
         _pool = ConnectionPool(
-            PG_DSN, min_size=1, max_size=10,
-            timeout=10,  # wait up to 10s for a conn
-            kwargs={"connect_timeout": 5}
+            PG_DSN, min_size=POOL_MIN, max_size=POOL_MAX,
+            timeout=10,  # wait up to 10s for a conn (the request path passes its own budget)
+            max_waiting=POOL_MAX_WAITING,
+            kwargs={"connect_timeout": 5},
+            configure=_configure,
         )
     return _pool
 
+_apool: AsyncConnectionPool | None = None
+_apool_lock = asyncio.Lock()
+async def get_async_pool() -> AsyncConnectionPool:
+    global _apool
+    if _apool is None:
+        async with _apool_lock:
+            if _apool is None:
+                pool = AsyncConnectionPool(
+                    PG_DSN, min_size=POOL_MIN, max_size=POOL_MAX, timeout=10,
+                    max_waiting=POOL_MAX_WAITING, kwargs={"connect_timeout": 5}, configure=_configure_async,
+                    open=False,
+                )
+                await pool.open()
+                _apool = pool
+    return _apool
+
+def _pool_gauges(metrics):
+    for name, pool in (("sync", _pool), ("async", _apool)):
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+        metrics.set_gauge("api_pool_connections", available, pool=name, state="idle")
+        metrics.set_gauge("api_pool_connections", size - available, pool=name, state="busy")
+        metrics.set_gauge("api_pool_connections", stats.get("requests_waiting", 0), pool=name, state="waiting")
+
+METRICS.add_collector(_pool_gauges)
+ADMISSION = Admission({"wide": WIDE_CONCURRENCY}, METRICS)
+
+_duck = None
+def get_duck():
+    global _duck
+    if _duck is None:
+        try:
+            from api.duck import DuckEngine  # optional dependency
+        except ImportError as e:
+            raise RuntimeError("FLEX_ENGINE=duckdb needs the 'duckdb' package") from e
+        _duck = DuckEngine(PARQUET_DIR, split_named_sql(DUCK_SQL_PATH), DUCK_THREADS)
+    return _duck
+
 # ----------------------------
 # Load & split SQL file
 # ----------------------------
@@ -54,8 +169,16 @@ def get_pool() -> ConnectionPool:
 class SqlBundle:
     agg_summary: str
     top_items: str
+    combined: Optional[str] = None  # summary + items in one statement (FLEX_EXEC_MODE=combined)
+    agg_summary_arrays: Optional[str] = None  # summary over participant_frame_arrays (FLEX_FRAME_STORE=arrays)
 
-def load_sql_bundle(path: str) -> SqlBundle:
+@dataclass
+class CubeSqlBundle:
+    subject_summary: str
+    pair_summary: str
+    subject_items: str
+
+def split_named_sql(path: str) -> Dict[str, str]:
     with open(path, "r", encoding="utf-8") as f:
         text = f.read()
 
@@ -72,13 +195,27 @@ def load_sql_bundle(path: str) -> SqlBundle:
             buf.append(line)
     if current_name and buf:
         parts[current_name] = "\n".join(buf).strip()
+    return parts
 
+def load_sql_bundle(path: str) -> SqlBundle:
+    parts = split_named_sql(path)
     if "agg_summary" not in parts or "top_items" not in parts:
         raise RuntimeError("flexible_filters.sql must contain queries named 'agg_summary' and 'top_items'")
 
-    return SqlBundle(agg_summary=parts["agg_summary"], top_items=parts["top_items"])
+    return SqlBundle(agg_summary=parts["agg_summary"], top_items=parts["top_items"], combined=parts.get("combined"),
+                     agg_summary_arrays=parts.get("agg_summary_arrays"))
+
+def load_cube_bundle(path: str) -> CubeSqlBundle:
+    parts = split_named_sql(path)
+    missing = [n for n in ("subject_summary", "pair_summary", "subject_items") if n not in parts]
+    if missing:
+        raise RuntimeError(f"flexible_cube.sql is missing queries: {', '.join(missing)}")
+    return CubeSqlBundle(parts["subject_summary"], parts["pair_summary"], parts["subject_items"])
 
 SQL = load_sql_bundle(SQL_PATH)
+if FRAME_STORE == "arrays" and not SQL.agg_summary_arrays:
+    raise RuntimeError("FLEX_FRAME_STORE=arrays needs a query named 'agg_summary_arrays' in flexible_filters.sql")
+CUBE_SQL = load_cube_bundle(CUBE_SQL_PATH)
 
 # ----------------------------
 # Models
@@ -97,13 +234,99 @@ class FlexibleBody(BaseModel):
     ally_filters: List[RoleFilter] = []
     enemy_filters: List[RoleFilter] = []
 
+# ----------------------------
+# Cube shape matching
+# ----------------------------
+def _norm_role(role: Optional[str]) -> Optional[str]:
+    # same normalisation as the SQL: NULLIF(UPPER(TRIM(role)), '')
+    if role is None or role.strip() == "":
+        return None
+    return role.strip().upper()
+
+def cube_params(subject: RoleFilter, allies: List[RoleFilter], enemies: List[RoleFilter],
+                body: FlexibleBody) -> Optional[Dict]:
+    """
+    Parameters for the cube queries, or None when the filter shape isn't covered.
+    Covered: subject alone, or subject + exactly one ally or one enemy, with every
+    filter naming a champ_id (a champ appears once per game, so cube counts equal game counts).
+    """
+    if subject.champ_id is None or len(allies) + len(enemies) > 1:
+        return None
+    if body.skill_tier == "":
+        return None  # the cube files untiered games under '', where the raw query matches none
+    params = {
+        "patch": body.patch,
+        "skill_tier": body.skill_tier,
+        "minute": body.minute,
+        "min_n": body.min_n,
+        "champ_id": subject.champ_id,
+        "role": _norm_role(subject.role),
+    }
+    other = allies[0] if allies else enemies[0] if enemies else None
+    if other is not None:
+        if other.champ_id is None:
+            return None
+        params.update(relation="ALLY" if allies else "ENEMY",
+                      other_champ_id=other.champ_id, other_role=_norm_role(other.role))
+    return params
+
+# ----------------------------
+# Response cache
+# ----------------------------
+def _fetch_versions() -> Dict[str, int]:
+    with get_pool().connection() as conn:
+        rows = conn.execute("SELECT patch, version FROM lol.data_versions").fetchall()
+    return {patch: int(version) for patch, version in rows}
+
+CACHE = ResponseCache(int(CACHE_MB * 1024 * 1024), CACHE_TTL_S, build_backend(CACHE_BACKEND)) if CACHE_MB > 0 else None
+# one stamp per engine: DuckDB answers follow the Parquet export, cube and raw Postgres ones the live tables
+VERSIONS = {"postgres": DataVersions(_fetch_versions, VERSION_POLL_S)}
+if ENGINE == "duckdb":
+    VERSIONS["duckdb"] = DataVersions(lambda: get_duck().versions(), VERSION_POLL_S)
+
+def serving_engine(subject: RoleFilter, extra_allies: List[RoleFilter], body: FlexibleBody) -> str:
+    """The engine plan_flexible will send this request to: the cube lives in Postgres whatever FLEX_ENGINE says."""
+    if ENGINE == "duckdb" and (not USE_CUBE or cube_params(subject, extra_allies, body.enemy_filters, body) is None):
+        return "duckdb"
+    return "postgres"
+
+def _canon_filter(f: RoleFilter) -> Dict:
+    return {"role": _norm_role(f.role), "champ_id": f.champ_id}
+
+def _filter_order(f: Dict):
+    return (f["role"] or "", -1 if f["champ_id"] is None else f["champ_id"])
+
+def canonical_body(subject: RoleFilter, allies: List[RoleFilter], enemies: List[RoleFilter], body: FlexibleBody) -> Dict:
+    """
+    The request as a FlexibleBody that asks the same question: roles upper-cased like the SQL
+    does, ally/enemy filters sorted (they're matched as sets). POSTing it back replays the request.
+    """
+    return {
+        "subject": _canon_filter(subject),
+        "ally_filters": sorted(map(_canon_filter, allies), key=_filter_order),
+        "enemy_filters": sorted(map(_canon_filter, enemies), key=_filter_order),
+        "patch": body.patch,
+        "skill_tier": body.skill_tier,
+        "minute": body.minute,
+        "min_n": body.min_n,
+    }
+
+def cache_key(canon: Dict, patch: Optional[str], engine: str = "postgres") -> str:
+    """Same answer -> same key: the canonical body plus the serving engine's data-version stamp of the requested patch."""
+    return canonical_key({**canon, "engine": engine, "version": VERSIONS[engine].stamp(patch)})
+
 # ----------------------------
 # Router
 # ----------------------------
 router = APIRouter(prefix="/stats", tags=["stats"])
 
-@router.post("/flexible")
-def flexible(body: FlexibleBody):
+@router.get("/flexible/cache")
+def flexible_cache_stats():
+    if CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **CACHE.snapshot()}
+
+def _subject(body: FlexibleBody) -> tuple[RoleFilter, List[RoleFilter]]:
     # Back-compat & validation:
     # If subject is missing, use the first ally filter as subject (if any).
     subject = body.subject
@@ -118,43 +341,262 @@ def flexible(body: FlexibleBody):
     # Ensure subject has at least role or champ_id populated
     if (subject.role is None or subject.role.strip() == "") and subject.champ_id is None:
         raise HTTPException(status_code=400, detail="Subject must include role and/or champ_id.")
+    return subject, extra_allies
 
-    params = {
+def _observe(t0: float, source: str):
+    METRICS.observe("api_request_duration_seconds", time.perf_counter() - t0, route="/stats/flexible", source=source)
+
+def flexible(body: FlexibleBody, explain: bool = Query(False, description="EXPLAIN (ANALYZE, BUFFERS) both statements")):
+    subject, extra_allies = _subject(body)
+    if explain and not EXPLAIN_ALLOWED:
+        raise HTTPException(status_code=403, detail="explain=true is disabled (FLEX_EXPLAIN=1 enables it).")
+
+    t0 = time.perf_counter()
+    canon = canonical_body(subject, extra_allies, body.enemy_filters, body)
+    timing.set_body(canon)
+    try:
+        if explain:
+            return run_flexible(subject, extra_allies, body, explain=True)
+        if CACHE is None:
+            result = run_flexible(subject, extra_allies, body)
+        else:
+            key = cache_key(canon, body.patch, serving_engine(subject, extra_allies, body))
+            cached = CACHE.get(key)
+            timing.record("cache", time.perf_counter() - t0)
+            METRICS.inc("api_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                _observe(t0, "cache")
+                return cached
+            result = run_flexible(subject, extra_allies, body)
+            CACHE.set(key, result)
+        _observe(t0, result.get("source", "raw"))
+        return result
+    finally:
+        timing.record("handler", time.perf_counter() - t0)
+
+async def flexible_async(body: FlexibleBody, explain: bool = Query(False, description="EXPLAIN (ANALYZE, BUFFERS) both statements")):
+    subject, extra_allies = _subject(body)
+    if explain and not EXPLAIN_ALLOWED:
+        raise HTTPException(status_code=403, detail="explain=true is disabled (FLEX_EXPLAIN=1 enables it).")
+
+    t0 = time.perf_counter()
+    canon = canonical_body(subject, extra_allies, body.enemy_filters, body)
+    timing.set_body(canon)
+    try:
+        if explain:
+            return await run_flexible_async(subject, extra_allies, body, explain=True)
+        if CACHE is None:
+            result = await run_flexible_async(subject, extra_allies, body)
+        else:
+            # the in-process LRU is answered on the loop; a due version poll or a shared backend
+            # does blocking I/O, so that lookup goes to the threadpool
+            engine = serving_engine(subject, extra_allies, body)
+            if VERSIONS[engine].due():
+                key = await run_in_threadpool(cache_key, canon, body.patch, engine)
+            else:
+                key = cache_key(canon, body.patch, engine)
+            cached = CACHE.get(key) if CACHE.shared is None else await run_in_threadpool(CACHE.get, key)
+            timing.record("cache", time.perf_counter() - t0)
+            METRICS.inc("api_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                _observe(t0, "cache")
+                return cached
+            result = await run_flexible_async(subject, extra_allies, body)
+            if CACHE.shared is None:
+                CACHE.set(key, result)
+            else:
+                await run_in_threadpool(CACHE.set, key, result)
+        _observe(t0, result.get("source", "raw"))
+        return result
+    finally:
+        timing.record("handler", time.perf_counter() - t0)
+
+router.add_api_route("/flexible", flexible_async if DB_MODE == "async" else flexible, methods=["POST"])
+
+def raw_params(subject: RoleFilter, extra_allies: List[RoleFilter], body: FlexibleBody) -> Dict:
+    """Parameters of the named queries in flexible_filters.sql; roles go in normalised like the cube's."""
+    return {
         "patch": body.patch,
         "skill_tier": body.skill_tier,
         "minute": body.minute,
         "min_n": body.min_n,
-        "subject": json.dumps(subject.dict()),
-        "ally_filters": json.dumps([f.dict() for f in extra_allies]),
-        "enemy_filters": json.dumps([f.dict() for f in body.enemy_filters]),
+        "subject": json.dumps(_canon_filter(subject)),
+        "ally_filters": json.dumps([_canon_filter(f) for f in extra_allies]),
+        "enemy_filters": json.dumps([_canon_filter(f) for f in body.enemy_filters]),
+    }
+
+@dataclass
+class Plan:
+    """The statements answering one request; names (as in the .sql files) label timings and explain output."""
+    source: str
+    summary_name: str
+    summary_sql: str
+    summary_params: Dict
+    items_name: Optional[str] = None
+    items_sql: Optional[str] = None  # None: the summary statement returns the items too (combined)
+    items_params: Optional[Dict] = None
+    request_class: str = "raw"  # key of STATEMENT_TIMEOUT_MS / ADMISSION limits
+
+def plan_flexible(subject: RoleFilter, extra_allies: List[RoleFilter], body: FlexibleBody, params: Dict) -> Optional[Plan]:
+    """None: the request goes to the DuckDB engine."""
+    cube = cube_params(subject, extra_allies, body.enemy_filters, body) if USE_CUBE else None
+    if cube is None and ENGINE == "duckdb":
+        return None
+    if cube is None:
+        narrow = any(f.champ_id is not None for f in [subject, *extra_allies, *body.enemy_filters])
+        plan = Plan("raw", "agg_summary", SQL.agg_summary, params, "top_items", SQL.top_items, params,
+                    request_class="raw" if narrow else "wide")
+        if FRAME_STORE == "arrays":
+            plan.summary_name, plan.summary_sql = "agg_summary_arrays", SQL.agg_summary_arrays
+        elif EXEC_MODE == "combined" and SQL.combined:
+            plan.summary_name, plan.summary_sql, plan.items_sql = "combined", SQL.combined, None
+        return plan
+    if "relation" in cube:
+        # subject + one ally/enemy: summary from the pair cube, items still need the raw join
+        return Plan("cube+raw", "pair_summary", CUBE_SQL.pair_summary, cube, "top_items", SQL.top_items, params)
+    return Plan("cube", "subject_summary", CUBE_SQL.subject_summary, cube, "subject_items", CUBE_SQL.subject_items, cube,
+                request_class="cube")
+
+def shape_result(source: str, row, item_rows) -> Dict:
+    if not row:
+        return {
+            "summary": {"n_games": 0, "winrate": 0.0, "gold_at_min": 0.0, "xp_at_min": 0.0},
+            "top_items": [],
+            "source": source,
+        }
+    n_games, winrate, gold_at_min, xp_at_min = row[:4]
+    items = [
+        {"item_id": item_id, "item_name": item_name, "picks": int(picks)}
+        for item_id, item_name, picks in item_rows
+    ]
+    return {
+        "summary": {
+            "n_games": int(n_games),
+            "winrate": float(winrate),
+            "gold_at_min": float(gold_at_min),
+            "xp_at_min": float(xp_at_min),
+        },
+        "top_items": items,
+        "source": source,
     }
 
-    pool = get_pool()
-    with pool.connection() as conn:
-        with conn.cursor() as cur:
-            # summary
-            cur.execute(sql.SQL(SQL.agg_summary), params)  # type: ignore[arg-type]
-            row = cur.fetchone()
-            if not row:
-                return {
-                    "summary": {"n_games": 0, "winrate": 0.0, "gold_at_min": 0.0, "xp_at_min": 0.0},
-                    "top_items": []
-                }
-            n_games, winrate, gold_at_min, xp_at_min = row
-
-            # top items
-            cur.execute(sql.SQL(SQL.top_items), params)  # type: ignore[arg-type]
-            items = [
-                {"item_id": item_id, "item_name": item_name, "picks": int(picks)}
-                for item_id, item_name, picks in cur.fetchall()
-            ]
-
-            return {
-                "summary": {
-                    "n_games": int(n_games),
-                    "winrate": float(winrate),
-                    "gold_at_min": float(gold_at_min),
-                    "xp_at_min": float(xp_at_min),
-                },
-                "top_items": items,
-            }
+def _overloaded(ex: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(ex), headers={"Retry-After": str(RETRY_AFTER_S)})
+
+def _timed_out(plan: Plan) -> HTTPException:
+    return HTTPException(status_code=504, detail=f"{plan.request_class} query exceeded its "
+                                                 f"{STATEMENT_TIMEOUT_MS[plan.request_class]}ms statement timeout")
+
+# statement_timeout for the request's transaction only (SET LOCAL can't take a bind parameter)
+_SET_TIMEOUT = "SELECT set_config('statement_timeout', %s, true)"
+
+def run_flexible(subject: RoleFilter, extra_allies: List[RoleFilter], body: FlexibleBody, explain: bool = False) -> Dict:
+    params = raw_params(subject, extra_allies, body)
+    plan = plan_flexible(subject, extra_allies, body, params)
+    if plan is None:
+        if explain:
+            raise HTTPException(status_code=400, detail="explain=true needs the postgres engine.")
+        return run_duckdb(params)
+
+    t0 = time.perf_counter()
+    try:
+        with ADMISSION.slot(plan.request_class, QUEUE_BUDGET_S) as left_s:
+            with get_pool().connection(timeout=max(left_s, 0.001)) as conn:
+                timing.record("pool", time.perf_counter() - t0)
+                with conn.cursor() as cur:
+                    cur.execute(_SET_TIMEOUT, (str(STATEMENT_TIMEOUT_MS[plan.request_class]),), prepare=False)
+                    return explain_plan(cur, plan) if explain else execute_plan(cur, plan)
+    except (PoolTimeout, TooManyRequests):  # only raised while waiting for a connection
+        raise _overloaded(ADMISSION.reject(plan.request_class, time.perf_counter() - t0, "pool")) from None
+    except Overloaded as ex:
+        raise _overloaded(ex) from None
+    except psycopg.errors.QueryCanceled:
+        raise _timed_out(plan) from None
+
+def execute_plan(cur, plan: Plan) -> Dict:
+    # prepared (FLEX_PREPARE) by psycopg, per connection, keyed by statement text; whether a call
+    # is planned again is up to plan_cache_mode (see FLEX_PLAN_CACHE_MODE)
+    t0 = time.perf_counter()
+    cur.execute(sql.SQL(plan.summary_sql), plan.summary_params, prepare=PREPARE)  # type: ignore[arg-type]
+    row = cur.fetchone()
+    timing.record(plan.summary_name, time.perf_counter() - t0)
+    if not row:
+        return shape_result(plan.source, None, [])
+    if plan.items_sql is None:
+        return shape_result(plan.source, row, row[4])  # combined: already computed, as [[item_id, item_name, picks], ...]
+    t0 = time.perf_counter()
+    cur.execute(sql.SQL(plan.items_sql), plan.items_params, prepare=PREPARE)  # type: ignore[arg-type]
+    item_rows = cur.fetchall()
+    timing.record(plan.items_name, time.perf_counter() - t0)
+    return shape_result(plan.source, row, item_rows)
+
+def explain_plan(cur, plan: Plan) -> Dict:
+    plans = {plan.summary_name: explain_analyze(cur, plan.summary_sql, plan.summary_params)}
+    if plan.items_sql is not None:
+        plans[plan.items_name] = explain_analyze(cur, plan.items_sql, plan.items_params)
+    return {"source": plan.source, "explain": plans}
+
+async def run_flexible_async(subject: RoleFilter, extra_allies: List[RoleFilter], body: FlexibleBody, explain: bool = False) -> Dict:
+    params = raw_params(subject, extra_allies, body)
+    plan = plan_flexible(subject, extra_allies, body, params)
+    if plan is None:
+        if explain:
+            raise HTTPException(status_code=400, detail="explain=true needs the postgres engine.")
+        return await run_in_threadpool(run_duckdb, params)
+
+    t0 = time.perf_counter()
+    try:
+        async with ADMISSION.aslot(plan.request_class, QUEUE_BUDGET_S) as left_s:
+            pool = await get_async_pool()
+            async with pool.connection(timeout=max(left_s, 0.001)) as conn:
+                timing.record("pool", time.perf_counter() - t0)
+                async with conn.cursor() as cur:
+                    await cur.execute(_SET_TIMEOUT, (str(STATEMENT_TIMEOUT_MS[plan.request_class]),), prepare=False)
+                    return await (explain_plan_async(cur, plan) if explain else execute_plan_async(cur, plan))
+    except (PoolTimeout, TooManyRequests):
+        raise _overloaded(ADMISSION.reject(plan.request_class, time.perf_counter() - t0, "pool")) from None
+    except Overloaded as ex:
+        raise _overloaded(ex) from None
+    except psycopg.errors.QueryCanceled:
+        raise _timed_out(plan) from None
+
+async def execute_plan_async(cur, plan: Plan) -> Dict:
+    t0 = time.perf_counter()
+    await cur.execute(sql.SQL(plan.summary_sql), plan.summary_params, prepare=PREPARE)  # type: ignore[arg-type]
+    row = await cur.fetchone()
+    timing.record(plan.summary_name, time.perf_counter() - t0)
+    if not row:
+        return shape_result(plan.source, None, [])
+    if plan.items_sql is None:
+        return shape_result(plan.source, row, row[4])
+    t0 = time.perf_counter()
+    await cur.execute(sql.SQL(plan.items_sql), plan.items_params, prepare=PREPARE)  # type: ignore[arg-type]
+    item_rows = await cur.fetchall()
+    timing.record(plan.items_name, time.perf_counter() - t0)
+    return shape_result(plan.source, row, item_rows)
+
+async def explain_plan_async(cur, plan: Plan) -> Dict:
+    plans = {}
+    for name, statement, params in ((plan.summary_name, plan.summary_sql, plan.summary_params),
+                                    (plan.items_name, plan.items_sql, plan.items_params)):
+        if statement is None:
+            continue
+        t0 = time.perf_counter()
+        await cur.execute(sql.SQL("EXPLAIN (ANALYZE, BUFFERS) ") + sql.SQL(statement), params, prepare=False)  # type: ignore[arg-type]
+        plans[name] = [r[0] for r in await cur.fetchall()]
+        timing.record("explain", time.perf_counter() - t0)
+    return {"source": plan.source, "explain": plans}
+
+def explain_analyze(cur, statement: str, params: Dict) -> List[str]:
+    """EXPLAIN (ANALYZE, BUFFERS) of one named statement with the request's own parameters, one plan line per item."""
+    t0 = time.perf_counter()
+    cur.execute(sql.SQL("EXPLAIN (ANALYZE, BUFFERS) ") + sql.SQL(statement), params, prepare=False)  # type: ignore[arg-type]
+    lines = [r[0] for r in cur.fetchall()]
+    timing.record("explain", time.perf_counter() - t0)
+    return lines
+
+def run_duckdb(params: Dict) -> Dict:
+    t0 = time.perf_counter()
+    summary, item_rows = get_duck().run(params)
+    timing.record("duckdb", time.perf_counter() - t0)
+    return shape_result("duckdb", summary, item_rows)
@@ -0,0 +1,112 @@
+# api/timing.py
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from contextvars import ContextVar
+from typing import Optional, Dict, Any
+
+from starlette.datastructures import MutableHeaders
+
+# per-request phase timings (pool wait, each statement, ...) -> Server-Timing header + histograms;
+# API_TIMING=0 leaves the middleware out, and record() is then one ContextVar lookup
+ENABLED = os.getenv("API_TIMING", "1") == "1"
+# requests slower than this (ms) are appended to SLOW_LOG with their canonical body; 0 turns it off
+SLOW_MS = float(os.getenv("API_SLOW_MS", "500"))
+SLOW_LOG = os.getenv("API_SLOW_LOG", "slow_requests.ndjson")
+
+class RequestTiming:
+    __slots__ = ("started", "phases", "body")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}  # name -> seconds, in the order they ran
+        self.body: Optional[Dict[str, Any]] = None  # canonical body, set by routes that can be replayed
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self, total_s: float) -> str:
+        parts = [f"{name};dur={s * 1000:.2f}" for name, s in self.phases.items()]
+        parts.append(f"total;dur={total_s * 1000:.2f}")
+        return ", ".join(parts)
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def begin() -> tuple[RequestTiming, Any]:
+    t = RequestTiming()
+    return t, _current.set(t)
+
+def end(token):
+    _current.reset(token)
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+def record(name: str, seconds: float):
+    t = _current.get()
+    if t is not None:
+        t.add(name, seconds)
+
+def set_body(body: Dict[str, Any]):
+    t = _current.get()
+    if t is not None:
+        t.body = body
+
+_slow_lock = threading.Lock()
+
+def log_slow(method: str, path: str, status: int, total_s: float, t: RequestTiming):
+    """One JSON line per slow request; `body` can be POSTed back as-is to replay it."""
+    if not SLOW_MS or total_s * 1000 < SLOW_MS or not SLOW_LOG:
+        return
+    line = json.dumps({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "method": method,
+        "path": path,
+        "status": status,
+        "total_ms": round(total_s * 1000, 2),
+        "phases_ms": {k: round(v * 1000, 2) for k, v in t.phases.items()},
+        "body": t.body,
+    }, separators=(",", ":"))
+    with _slow_lock, open(SLOW_LOG, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+class TimingMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task hop). Routes add phases through record();
+    "serialize" is everything outside the route function up to the response headers: body parsing /
+    validation, threadpool hand-off and response encoding. Histograms and the slow log are written
+    once the response has been sent.
+    """
+    def __init__(self, app, metrics=None):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t, token = begin()
+        status, total = 500, None
+
+        async def send_timed(message):
+            nonlocal status, total
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = time.perf_counter() - t.started
+                handler = t.phases.get("handler")
+                if handler is not None:
+                    t.add("serialize", max(total - handler, 0.0))
+                MutableHeaders(scope=message).append("Server-Timing", t.server_timing(total))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            end(token)
+            route = getattr(scope.get("route"), "path", None)  # None: no route matched (404s)
+            if route is not None and total is not None:
+                if self.metrics is not None:
+                    for name, seconds in t.phases.items():
+                        self.metrics.observe("api_phase_duration_seconds", seconds, route=route, phase=name)
+                log_slow(scope["method"], route, status, total, t)
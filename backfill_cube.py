@@ -0,0 +1,53 @@
+# backfill_cube.py
+"""
+Folds every stored match that isn't in lol.cube_matches yet into the /stats/flexible cube, and the
+frames / item events of matches whose timeline was stored after they were applied.
+Run once after applying sql/flex_cube.sql; afterwards ingest keeps it current (CUBE_MAINTAIN=1).
+
+  python backfill_cube.py --batch 500
+"""
+import os, argparse
+from dotenv import load_dotenv
+import psycopg
+
+from util.logging import setup_logger
+
+load_dotenv()
+log = setup_logger("backfill_cube")
+
+PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
+
+def apply_pending(conn: psycopg.Connection, limit: int) -> int:
+    """Picks up to `limit` matches with something not in the cube yet and folds them in; returns how many were applied."""
+    with conn.cursor() as cur:
+        cur.execute("""
+          SELECT lol.cube_apply(ARRAY(
+            SELECT m.match_id FROM lol.matches m
+            LEFT JOIN lol.cube_matches c ON c.match_id = m.match_id
+            WHERE c.match_id IS NULL
+               OR (NOT c.frames_applied AND EXISTS (SELECT 1 FROM lol.cube_frames(ARRAY[m.match_key])))
+               OR (NOT c.items_applied AND EXISTS (
+                     SELECT 1 FROM lol.item_events ie
+                     WHERE ie.match_key = m.match_key AND ie.patch = m.patch AND ie.event_type = 'PURCHASE'))
+            LIMIT %s
+          ))
+        """, (limit,))
+        return cur.fetchone()[0]
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill lol.cube_* from lol.matches")
+    ap.add_argument("--batch", type=int, default=500, help="matches per transaction")
+    args = ap.parse_args()
+
+    total = 0
+    with psycopg.connect(PG_DSN, autocommit=True) as conn:
+        while True:
+            n = apply_pending(conn, args.batch)  # one transaction per batch (autocommit)
+            if not n:
+                break
+            total += n
+            log.info(f"cube backfill: {total} matches applied")
+    log.info(f"Done; {total} matches folded into the cube")
+
+if __name__ == "__main__":
+    main()
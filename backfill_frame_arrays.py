@@ -0,0 +1,74 @@
+# backfill_frame_arrays.py
+"""
+Converts lol.participant_frames rows into lol.participant_frame_arrays (sql/frame_arrays.sql),
+one batch of matches per transaction. Safe to re-run: converted participants are skipped.
+
+  python backfill_frame_arrays.py --batch 500              # fill arrays, keep the rows
+  python backfill_frame_arrays.py --batch 500 --drop-rows  # and delete converted rows afterwards
+
+Switch ingest to FRAME_STORE=both before backfilling so nothing lands in between, then to
+FRAME_STORE=arrays and FLEX_FRAME_STORE=arrays once the API reads from the new table.
+"""
+import os, argparse
+from dotenv import load_dotenv
+import psycopg
+
+from util.logging import setup_logger
+
+load_dotenv()
+log = setup_logger("backfill_frame_arrays")
+
+PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
+
+def convert_batch(conn: psycopg.Connection, limit: int, drop_rows: bool = False) -> int:
+    """Packs frames of up to `limit` not-yet-converted matches; returns the number of matches handled."""
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute("""
+          SELECT DISTINCT f.match_key FROM lol.participant_frames f
+          WHERE NOT EXISTS (SELECT 1 FROM lol.participant_frame_arrays a
+                            WHERE a.match_key = f.match_key AND a.player_key = f.player_key)
+          LIMIT %s
+        """, (limit,))
+        ids = [r[0] for r in cur.fetchall()]
+        if not ids:
+            return 0
+        # a dense minute grid per participant keeps minute m at index m + 1 even if a frame is missing
+        cur.execute("""
+          WITH grid AS (
+            SELECT match_key, player_key, patch, generate_series(0, max(minute)) AS minute
+            FROM lol.participant_frames
+            WHERE match_key = ANY(%s)
+            GROUP BY match_key, player_key, patch
+          )
+          INSERT INTO lol.participant_frame_arrays (match_key, player_key, patch, gold, xp, cs)
+          SELECT g.match_key, g.player_key, g.patch,
+                 array_agg(f.gold ORDER BY g.minute),
+                 array_agg(f.xp   ORDER BY g.minute),
+                 array_agg(f.cs   ORDER BY g.minute)
+          FROM grid g
+          LEFT JOIN lol.participant_frames f USING (match_key, player_key, patch, minute)
+          GROUP BY g.match_key, g.player_key, g.patch
+          ON CONFLICT (match_key, player_key, patch) DO NOTHING
+        """, (ids,))
+        if drop_rows:
+            cur.execute("DELETE FROM lol.participant_frames WHERE match_key = ANY(%s)", (ids,))
+        return len(ids)
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill lol.participant_frame_arrays from lol.participant_frames")
+    ap.add_argument("--batch", type=int, default=500, help="matches per transaction")
+    ap.add_argument("--drop-rows", action="store_true", help="delete row frames once their arrays are written")
+    args = ap.parse_args()
+
+    total = 0
+    with psycopg.connect(PG_DSN, autocommit=True) as conn:
+        while True:
+            n = convert_batch(conn, args.batch, args.drop_rows)
+            if not n:
+                break
+            total += n
+            log.info(f"frame arrays: {total} matches converted")
+    log.info(f"Done; {total} matches converted")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench/archive_compaction.py
+"""
+Raw archive layouts on the local Storage backend: one object per payload (plain, or compressed
+with object_codec) against compacted NDJSON segments (riot/segments.py) with zstd and gzip frames.
+Payloads start as response bytes. The "decoded" row decodes them and lets write_json re-encode
+them, as the crawler did before it archived raw bytes; every other row passes the bytes through.
+
+  python -m bench.archive_compaction --matches 2000 --dir /tmp/archive_bench
+
+For each layout: objects written, bytes on disk, write time, mean latency of single-match
+get()s (a ranged read for segments) and the time to stream the whole patch back. Every payload
+read back is checked against what was written.
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import statistics
+
+from riot.storage import Storage
+from riot.segments import SegmentReader
+from riot.decoding import loads
+from bench.synthetic import SyntheticMatches
+
+REGION = "americas"
+
+def disk_usage(root: str) -> tuple[int, int]:
+    n = size = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            n += 1
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return n, size
+
+def run_layout(name: str, root: str, payloads: list[tuple[str, dict, dict]], patch: str,
+               codec: str, max_records: int, gets: int, object_codec: str = "", raw: bool = True) -> dict:
+    shutil.rmtree(root, ignore_errors=True)
+    compaction = dict(codec=codec, max_records=max_records) if codec else None
+    st = Storage("local", root, compaction=compaction, object_codec=object_codec)
+    bodies = [(mid, json.dumps(m, separators=(",", ":")).encode(), json.dumps(tl, separators=(",", ":")).encode())
+              for mid, m, tl in payloads]
+    t0 = time.perf_counter()
+    for mid, m, tl in bodies:
+        st.write_json(patch, REGION, mid, "match", m if raw else loads(m))
+        st.write_json(patch, REGION, mid, "timeline", tl if raw else loads(tl))
+        st.flush(force=False)
+    st.flush()
+    write_s = time.perf_counter() - t0
+    n_objects, size = disk_usage(root)
+
+    reader = SegmentReader(Storage("local", root))
+    want = {mid: (m, tl) for mid, m, tl in payloads}
+    sample = random.Random(1).sample(list(want), min(gets, len(want)))
+    reader.get(patch, REGION, "match", sample[0])  # first call lists the folder and loads its indexes
+    lat = []
+    for mid in sample:
+        t = time.perf_counter()
+        got = reader.get(patch, REGION, "timeline", mid)
+        lat.append((time.perf_counter() - t) * 1000)
+        assert json.loads(got) == want[mid][1], f"{name}: timeline {mid} differs"
+
+    t0 = time.perf_counter()
+    seen = 0
+    for kind, pos in (("match", 0), ("timeline", 1)):
+        for _, mid, payload in reader.iter_patch(patch, kind):
+            assert json.loads(payload) == want[mid][pos], f"{name}: {kind} {mid} differs"
+            seen += 1
+    stream_s = time.perf_counter() - t0
+    assert seen == 2 * len(payloads), f"{name}: streamed {seen} payloads, wrote {2 * len(payloads)}"
+    return {"layout": name, "objects": n_objects, "mib": size / 2**20, "write_s": write_s,
+            "get_ms": statistics.mean(lat), "stream_s": stream_s}
+
+def main():
+    ap = argparse.ArgumentParser(description="per-object vs compacted raw archive")
+    ap.add_argument("--dir", default="/tmp/archive_bench")
+    ap.add_argument("--matches", type=int, default=2000)
+    ap.add_argument("--patch", default="25.17")
+    ap.add_argument("--max-records", type=int, default=500, help="payloads per segment")
+    ap.add_argument("--gets", type=int, default=200)
+    args = ap.parse_args()
+
+    gen = SyntheticMatches(seed=3, patch=args.patch)
+    payloads = [(m["metadata"]["matchId"], m, tl) for m, tl in gen.matches(args.matches)]
+    print(f"matches={args.matches} segment size={args.max_records} payloads")
+    print(f"{'layout':<12} {'objects':>8} {'MiB':>8} {'write':>8} {'get':>8} {'stream':>8}")
+    layouts = (("decoded", "", "", False), ("objects", "", "", True), ("objects.zst", "", "zst", True),
+               ("objects.gz", "", "gz", True), ("zst", "zst", "", True), ("gz", "gz", "", True))
+    for name, codec, object_codec, raw in layouts:
+        try:
+            r = run_layout(name, os.path.join(args.dir, name), payloads, args.patch, codec, args.max_records,
+                           args.gets, object_codec, raw)
+        except RuntimeError as e:  # zstandard not installed
+            print(f"{name:<12} skipped: {e}")
+            continue
+        print(f"{r['layout']:<12} {r['objects']:>8} {r['mib']:>8.1f} {r['write_s']:>7.2f}s "
+              f"{r['get_ms']:>6.2f}ms {r['stream_s']:>7.2f}s")
+
+if __name__ == "__main__":
+    main()
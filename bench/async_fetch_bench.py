@@ -0,0 +1,81 @@
+# bench/async_fetch_bench.py
+"""
+Drives AsyncMatchFetcher against bench.stub_riot (started in-process) and compares
+it with the one-at-a-time fetch loop used by the sync worker.
+
+  python -m bench.async_fetch_bench --matches 60 --latency-ms 150 --p429 0.05 --concurrency 8
+
+No database: the consumer just drains the bounded queue, so this isolates fetch throughput.
+"""
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from riot.async_fetch import AsyncMatchFetcher, AsyncMultiLimiter
+from bench.stub_riot import StubRiot
+
+def run_sequential(base_url: str, routing: str, match_ids: list[str]) -> float:
+    t0 = time.perf_counter()
+    with httpx.Client(timeout=15.0) as client:
+        for mid in match_ids:
+            for path in (f"/lol/match/v5/matches/{mid}", f"/lol/match/v5/matches/{mid}/timeline"):
+                while True:
+                    r = client.get(base_url.format(routing=routing) + path)
+                    if r.status_code == 429:
+                        time.sleep(float(r.headers.get("Retry-After", "1")))
+                        continue
+                    r.raise_for_status()
+                    r.json()
+                    break
+    return time.perf_counter() - t0
+
+async def run_async(base_url: str, routing: str, match_ids: list[str], concurrency: int,
+                    queue_max: int, per_sec: int, per_2min: int) -> tuple[float, dict, int]:
+    fetcher = AsyncMatchFetcher("bench", AsyncMultiLimiter(per_sec, per_2min), concurrency=concurrency, base_url=base_url)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+    consumed = 0
+
+    async def drain():
+        nonlocal consumed
+        while (await queue.get()) is not None:
+            consumed += 1
+
+    t0 = time.perf_counter()
+    consumer = asyncio.create_task(drain())
+    await fetcher.run(routing, match_ids, queue)
+    await queue.put(None)
+    await consumer
+    elapsed = time.perf_counter() - t0
+    await fetcher.aclose()
+    return elapsed, dict(fetcher.stats), consumed
+
+def main():
+    ap = argparse.ArgumentParser(description="Async vs sequential match fetch against a stub Riot server")
+    ap.add_argument("--matches", type=int, default=60)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--queue-max", type=int, default=16)
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--p429", type=float, default=0.05)
+    ap.add_argument("--per-sec", type=int, default=20)
+    ap.add_argument("--per-2min", type=int, default=1000, help="raise above 100 so short runs measure concurrency, not the 2-min cap")
+    ap.add_argument("--skip-sequential", action="store_true")
+    args = ap.parse_args()
+
+    stub = StubRiot(port=0, latency_ms=args.latency_ms, p429=args.p429).start()
+    routing = "americas"
+    mids = [f"NA1_{stub.gen.id_base + i}" for i in range(args.matches)]
+    try:
+        if not args.skip_sequential:
+            t_seq = run_sequential(stub.base_url, routing, mids)
+            print(f"sequential: {t_seq:7.2f}s  {args.matches / t_seq:6.2f} matches/s")
+        t_async, stats, consumed = asyncio.run(run_async(
+            stub.base_url, routing, mids, args.concurrency, args.queue_max, args.per_sec, args.per_2min))
+        print(f"async     : {t_async:7.2f}s  {consumed / t_async:6.2f} matches/s  stats={stats}")
+        print(f"stub      : {stub.counts}")
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
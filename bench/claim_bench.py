@@ -0,0 +1,116 @@
+# bench/claim_bench.py
+"""
+Multi-worker contention benchmark for match_queue claiming.
+
+  python -m bench.claim_bench --rows 20000 --workers 1,2,4,8 --batch 50
+
+For each worker count it refills a private copy of match_queue (schema bench_claims,
+selected through search_path so Ledger runs unmodified) and lets N processes drain it with:
+  legacy  - the old single-row UPDATE ... WHERE id = (SELECT ... LIMIT 1), no SKIP LOCKED
+  single  - Ledger.pop_next_match (SKIP LOCKED, one row per claim)
+  batch   - Ledger.pop_next_matches(--batch) + mark_done_many
+Reports claims/sec and how many rows were handed to more than one worker.
+"""
+import os
+import time
+import argparse
+import multiprocessing as mp
+from collections import Counter
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+
+from riot.ledger import Ledger
+
+SCHEMA = "bench_claims"
+
+LEGACY_POP = """
+  update match_queue
+     set picked_at = now(), status='processing'
+   where id = (
+     select id from match_queue
+      where status='queued'
+      order by enqueued_at asc
+      limit 1
+   )
+  returning match_id, region, id
+"""
+
+def setup(dsn: str, rows: int):
+    here = os.path.dirname(__file__)
+    with psycopg.connect(dsn, autocommit=True) as con:
+        con.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        con.execute(f"CREATE SCHEMA {SCHEMA}")
+        con.execute(f"SET search_path = {SCHEMA}")
+        with open(os.path.join(here, "..", "sql", "match_queue.sql"), encoding="utf-8-sig") as f:
+            con.execute(f.read())
+        con.execute("""
+          INSERT INTO match_queue (match_id, region, enqueued_at)
+          SELECT 'NA1_' || g, 'americas', now() + g * interval '1 microsecond'
+          FROM generate_series(1, %s) g
+        """, (rows,))
+
+def worker(mode: str, dsn: str, batch: int, out: mp.Queue):
+    ledger = Ledger(dsn)
+    claimed: list[int] = []
+    if mode == "legacy":
+        with psycopg.connect(dsn, autocommit=True) as con:
+            while True:
+                row = con.execute(LEGACY_POP).fetchone()
+                if not row:
+                    break
+                claimed.append(row[2])
+                con.execute("update match_queue set done_at=now(), status='done' where id=%s", (row[2],))
+    elif mode == "single":
+        while True:
+            item = ledger.pop_next_match()
+            if not item:
+                break
+            claimed.append(item[2])
+            ledger.mark_done(item[2])
+    else:
+        while True:
+            items = ledger.pop_next_matches(batch)
+            if not items:
+                break
+            ids = [qid for _, _, qid in items]
+            claimed.extend(ids)
+            ledger.mark_done_many(ids)
+    out.put(claimed)
+
+def run(mode: str, dsn: str, rows: int, workers: int, batch: int) -> tuple[float, int, int]:
+    setup(dsn, rows)
+    out: mp.Queue = mp.Queue()
+    procs = [mp.Process(target=worker, args=(mode, dsn, batch, out)) for _ in range(workers)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    claimed = Counter()
+    for _ in procs:
+        claimed.update(out.get())
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+    dupes = sum(1 for c in claimed.values() if c > 1)
+    return elapsed, sum(claimed.values()), dupes
+
+def main():
+    ap = argparse.ArgumentParser(description="match_queue claim contention benchmark")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--batch", type=int, default=50)
+    ap.add_argument("--modes", default="legacy,single,batch")
+    args = ap.parse_args()
+
+    dsn = make_conninfo(args.dsn, options=f"-c search_path={SCHEMA}")
+    print(f"{'mode':<7} {'workers':>7} {'claims/s':>10} {'claims':>8} {'dupes':>6}")
+    for mode in args.modes.split(","):
+        for w in (int(x) for x in args.workers.split(",")):
+            elapsed, n, dupes = run(mode, dsn, args.rows, w, args.batch)
+            print(f"{mode:<7} {w:>7} {n / elapsed:>10.0f} {n:>8} {dupes:>6}")
+    with psycopg.connect(args.dsn, autocommit=True) as con:
+        con.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench/duck_bench.py
+"""
+/stats/flexible on Postgres against the DuckDB engine (api/duck.py over export_parquet.py's files),
+side by side on synthetic matches loaded under their own patch.
+
+  python -m bench.duck_bench --matches 3000 --reps 20 --dir /tmp/flex_parquet
+  python -m bench.duck_bench --all-patches   # also every body with patch unset
+
+Loads the fixture like bench.flex_exec_bench, exports the changed patches, runs each body through
+run_flexible with FLEX_ENGINE=postgres and =duckdb, checks the answers are identical and prints
+mean / p50 latency per engine.
+"""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+import export_parquet
+from bench.synthetic import SyntheticMatches
+from bench.flex_exec_bench import load, bodies
+from api.routes import flexible as F
+
+def time_engine(engine: str, body: F.FlexibleBody, reps: int) -> tuple[list[float], dict]:
+    F.ENGINE = engine
+    out = F.run_flexible(body.subject, body.ally_filters, body)  # warm-up (pool, file metadata)
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        F.run_flexible(body.subject, body.ally_filters, body)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples, out
+
+def main():
+    ap = argparse.ArgumentParser(description="Postgres vs DuckDB engine for /stats/flexible")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--dir", default=os.getenv("FLEX_PARQUET_DIR", "parquet"))
+    ap.add_argument("--matches", type=int, default=3000)
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--champs", type=int, default=40, help="fewer champs = more games per filter")
+    ap.add_argument("--reps", type=int, default=20)
+    ap.add_argument("--all-patches", action="store_true", help="also run every body with patch unset")
+    args = ap.parse_args()
+
+    gen = SyntheticMatches(seed=10, champs=args.champs, patch=args.patch, id_base=8_100_000_000)
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        loaded = load(conn, gen, args.matches, args.patch)
+    with psycopg.connect(args.dsn) as conn:
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        t0 = time.perf_counter()
+        exported = export_parquet.run_once(conn, args.dir)
+        export_s = time.perf_counter() - t0
+    print(f"patch={args.patch} matches={args.matches} (loaded {loaded}) reps={args.reps} "
+          f"exported {exported} patches in {export_s:.1f}s")
+
+    F.PG_DSN = args.dsn
+    F.PARQUET_DIR = args.dir
+    F.USE_CUBE = False
+    runs = list(bodies(args.patch).items())
+    if args.all_patches:
+        runs += [(f"{name} (all)", body) for name, body in bodies(None).items()]
+    print(f"{'body':<24} {'postgres mean':>14} {'p50':>8} {'duckdb mean':>12} {'p50':>8} {'speedup':>8}  same")
+    for name, body in runs:
+        pg, a = time_engine("postgres", body, args.reps)
+        dk, b = time_engine("duckdb", body, args.reps)
+        same = a["summary"] == b["summary"] and \
+            sorted((i["item_id"], i["picks"]) for i in a["top_items"]) == sorted((i["item_id"], i["picks"]) for i in b["top_items"])
+        print(f"{name:<24} {statistics.mean(pg):12.1f}ms {statistics.median(pg):6.1f}ms "
+              f"{statistics.mean(dk):10.1f}ms {statistics.median(dk):6.1f}ms "
+              f"{statistics.mean(pg) / statistics.mean(dk):7.2f}x  {same}")
+
+if __name__ == "__main__":
+    main()
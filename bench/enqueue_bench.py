@@ -0,0 +1,101 @@
+# bench/enqueue_bench.py
+"""
+Microbenchmark: enqueueing 10k ids one INSERT at a time vs one INSERT ... SELECT FROM unnest.
+
+  python -m bench.enqueue_bench --ids 10000 --dup-rate 0.3
+
+Covers match_queue (Ledger.enqueue_matches) and lol.seed_queue (run_worker.enqueue_new_puuids,
+bootstrap_players.enqueue_puuids). match_queue runs in a scratch schema; seed_queue runs inside
+a transaction that is rolled back, so workers never see the benchmark rows.
+"""
+import os
+import time
+import random
+import argparse
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client / bootstrap_players read it at import time
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+
+from riot.ledger import Ledger
+from run_worker import enqueue_new_puuids
+from bootstrap_players import enqueue_puuids
+
+SCHEMA = "bench_enqueue"
+
+def make_ids(n: int, dup_rate: float, prefix: str) -> list[str]:
+    rng = random.Random(11)
+    base = [f"{prefix}{i:012d}" for i in range(int(n * (1 - dup_rate)))]
+    return base + [rng.choice(base) for _ in range(n - len(base))]
+
+def bench_match_queue(dsn: str, ids: list[str]) -> tuple[float, int, float, int]:
+    here = os.path.dirname(__file__)
+    with psycopg.connect(dsn, autocommit=True) as con:
+        con.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        con.execute(f"CREATE SCHEMA {SCHEMA}")
+        with open(os.path.join(here, "..", "sql", "match_queue.sql"), encoding="utf-8-sig") as f:
+            con.execute(f.read())
+
+        t0 = time.perf_counter()
+        looped = 0
+        with con.transaction(), con.cursor() as cur:
+            for mid in ids:
+                cur.execute("insert into match_queue(match_id, region) values(%s,%s) on conflict do nothing", (mid, "americas"))
+                looped += cur.rowcount
+        t_loop = time.perf_counter() - t0
+        con.execute("TRUNCATE match_queue")
+
+    ledger = Ledger(dsn)
+    t0 = time.perf_counter()
+    bulk = ledger.enqueue_matches("americas", ids)
+    t_bulk = time.perf_counter() - t0
+    ledger.close()
+    return t_loop, looped, t_bulk, bulk
+
+def bench_seed_queue(dsn: str, ids: list[str]) -> list[tuple[str, float, int]]:
+    out = []
+    with psycopg.connect(dsn, autocommit=True) as con:
+        with con.transaction(force_rollback=True), con.cursor() as cur:
+            t0 = time.perf_counter()
+            n = 0
+            for pu in ids:
+                cur.execute("""
+                  INSERT INTO lol.seed_queue(puuid, region_routing, status)
+                  VALUES (%s,%s,'PENDING')
+                  ON CONFLICT (puuid) DO NOTHING
+                """, (pu, "AMERICAS"))
+                n += cur.rowcount
+            out.append(("seed_queue loop", time.perf_counter() - t0, n))
+        with con.transaction(force_rollback=True):
+            t0 = time.perf_counter()
+            n = enqueue_new_puuids(con, "AMERICAS", ids)
+            out.append(("enqueue_new_puuids", time.perf_counter() - t0, n))
+        with con.transaction(force_rollback=True):
+            t0 = time.perf_counter()
+            inserted, _ = enqueue_puuids(con, ids, "na1")
+            out.append(("bootstrap enqueue_puuids", time.perf_counter() - t0, inserted))
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-row vs unnest enqueue microbenchmark")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--ids", type=int, default=10_000)
+    ap.add_argument("--dup-rate", type=float, default=0.3, help="fraction of ids repeated within the batch")
+    args = ap.parse_args()
+
+    match_ids = make_ids(args.ids, args.dup_rate, "NA1_")
+    puuids = make_ids(args.ids, args.dup_rate, "bench-puuid-")
+
+    t_loop, n_loop, t_bulk, n_bulk = bench_match_queue(make_conninfo(args.dsn, options=f"-c search_path={SCHEMA}"), match_ids)
+    rows = [("match_queue loop", t_loop, n_loop), ("Ledger.enqueue_matches", t_bulk, n_bulk)]
+    rows += bench_seed_queue(args.dsn, puuids)
+    with psycopg.connect(args.dsn, autocommit=True) as con:
+        con.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    print(f"ids={args.ids} dup_rate={args.dup_rate}")
+    for name, t, n in rows:
+        print(f"{name:<26} {t * 1000:9.1f} ms  inserted={n}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# bench/flex_concurrency_bench.py
+"""
+/stats/flexible under concurrent load with a mix of slow and fast bodies, sync route vs async route
+(FLEX_DB_MODE=sync|async).
+
+  python -m bench.flex_concurrency_bench --concurrency 32 --requests 600 --slow-share 0.2
+
+Uses bench.flex_load's synthetic dataset (it is loaded if missing). Fast bodies carry a champ_id
+filter ("raw" class); slow ones have role-only filters and read a large share of the patch ("wide"
+class). Each mode runs in its own process with the response cache off. The requests go through
+the whole ASGI app over httpx's ASGI transport: the sync route runs on FastAPI's threadpool with
+the sync pool, the async one on the event loop with AsyncConnectionPool and admission control.
+It reports, per class, p50/p95/p99 of the answered requests, and the count of 503s (turned away
+by admission) and 504s (statement timeout).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+from bench import flex_load
+
+FAST = ({"role": "TOP", "champ_id": 2}, {"role": "MID", "champ_id": 1}, {"champ_id": 4}, {"role": "JUNGLE", "champ_id": 3})
+SLOW = ({"role": "MID"}, {"role": "BOT_CARRY"}, {"role": "TOP"}, {"role": "JUNGLE"})
+
+def bodies(args) -> list[tuple[str, dict]]:
+    rng = random.Random(args.seed)
+    out = []
+    for _ in range(args.requests):
+        slow = rng.random() < args.slow_share
+        out.append(("slow" if slow else "fast", {
+            "subject": rng.choice(SLOW if slow else FAST),
+            "patch": rng.choice(args.patches), "minute": rng.choice((5, 10, 15)), "min_n": 1,
+        }))
+    return out
+
+async def child_run(args) -> dict:
+    import httpx
+    from api.main import app
+
+    seq = bodies(args)
+    lat: dict[str, list[float]] = defaultdict(list)
+    status: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    nxt = iter(seq)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        for kind, body in seq[:args.warmup]:
+            await client.post("/stats/flexible", json=body)
+
+        async def worker():
+            for kind, body in nxt:
+                t0 = time.perf_counter()
+                r = await client.post("/stats/flexible", json=body)
+                ms = (time.perf_counter() - t0) * 1000
+                status[kind][r.status_code] += 1
+                if r.status_code == 200:
+                    lat[kind].append(ms)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    def pct(ms):
+        if len(ms) < 2:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        q = statistics.quantiles(ms, n=100, method="inclusive")
+        return {"p50": q[49], "p95": q[94], "p99": q[98]}
+    return {"elapsed_s": elapsed, "ok_per_s": sum(len(v) for v in lat.values()) / elapsed,
+            "classes": {k: {"ok": len(lat[k]), **{str(c): n for c, n in status[k].items()}, **pct(lat[k])}
+                        for k in ("fast", "slow")}}
+
+def main():
+    ap = argparse.ArgumentParser(description="sync vs async /stats/flexible under mixed slow / fast load")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=20000)
+    ap.add_argument("--patches", type=lambda s: s.split(","), default=["98.1", "98.2"])
+    ap.add_argument("--tiers", type=lambda s: s.split(","), default=["GOLD", "PLATINUM", "EMERALD"])
+    ap.add_argument("--champs", type=int, default=60)
+    ap.add_argument("--skew", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=23)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=600)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--slow-share", type=float, default=0.2)
+    ap.add_argument("--pool-max", type=int, default=10)
+    ap.add_argument("--budget-ms", type=float, default=1000, help="FLEX_QUEUE_BUDGET_MS")
+    ap.add_argument("--modes", default="sync,async")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(child_run(args))))
+        return
+
+    flex_load.load(args.dsn, args)
+    print(f"concurrency={args.concurrency} requests={args.requests} slow share={args.slow_share:.0%} "
+          f"pool max={args.pool_max} queue budget={args.budget_ms:.0f}ms")
+    print(f"{'mode':<6} {'class':<5} {'ok':>5} {'503':>5} {'504':>5} {'p50':>9} {'p95':>9} {'p99':>9}  ok/s")
+    for mode in args.modes.split(","):
+        env = dict(os.environ, PG_DSN=args.dsn, FLEX_DB_MODE=mode, FLEX_CACHE_MB="0", API_TIMING="0",
+                   FLEX_POOL_MAX=str(args.pool_max), FLEX_QUEUE_BUDGET_MS=str(args.budget_ms))
+        p = subprocess.run([sys.executable, "-m", "bench.flex_concurrency_bench", "--child", mode,
+                            *sys.argv[1:]], capture_output=True, text=True, env=env)
+        if p.returncode != 0:
+            print(f"{mode:<6} failed: {p.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        for cls, s in r["classes"].items():
+            print(f"{mode:<6} {cls:<5} {s['ok']:>5} {s.get('503', 0):>5} {s.get('504', 0):>5} "
+                  f"{s['p50']:>7.1f}ms {s['p95']:>7.1f}ms {s['p99']:>7.1f}ms  {r['ok_per_s']:.1f}")
+
+if __name__ == "__main__":
+    main()
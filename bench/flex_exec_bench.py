@@ -0,0 +1,94 @@
+# bench/flex_exec_bench.py
+"""
+Latency of /stats/flexible's two-statement path (agg_summary, then top_items) against the
+single-pass "combined" statement, on synthetic matches loaded under their own patch.
+
+  python -m bench.flex_exec_bench --matches 3000 --reps 20
+
+Loads --matches synthetic games (patch --patch) with BulkIngest if they aren't there yet,
+runs a fixed set of bodies through api.routes.flexible.run_flexible in both modes, checks
+the answers are identical and prints per-body mean / p50 latency. --cleanup removes the patch.
+"""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from run_seed import BulkIngest
+from bench.synthetic import SyntheticMatches
+from bench.ingest_bench import prepare
+from api.routes import flexible as F
+
+def load(conn: psycopg.Connection, gen: SyntheticMatches, n: int, patch: str) -> int:
+    have = conn.execute("SELECT count(*) FROM lol.matches WHERE patch = %s", (patch,)).fetchone()[0]
+    if have >= n:
+        return 0
+    prepare(conn, gen)
+    bulk = BulkIngest(conn, max_matches=200)
+    for m, tl in gen.matches(n - have, start=have):
+        bulk.add_match(m, tl)
+    bulk.flush()
+    conn.execute("ANALYZE lol.matches; ANALYZE lol.participants; ANALYZE lol.participant_frames; ANALYZE lol.item_events")
+    return n - have
+
+def bodies(patch: str) -> dict[str, F.FlexibleBody]:
+    R = F.RoleFilter
+    return {
+        "champ":            F.FlexibleBody(patch=patch, subject=R(champ_id=1), min_n=1),
+        "role":             F.FlexibleBody(patch=patch, subject=R(role="MID"), min_n=1),
+        "champ+role":       F.FlexibleBody(patch=patch, subject=R(role="TOP", champ_id=2), min_n=1),
+        "champ+ally":       F.FlexibleBody(patch=patch, subject=R(champ_id=3), ally_filters=[R(champ_id=4)], min_n=1),
+        "champ+enemy":      F.FlexibleBody(patch=patch, subject=R(champ_id=5), enemy_filters=[R(role="JUNGLE")], min_n=1),
+        "role+2ally+enemy": F.FlexibleBody(patch=patch, subject=R(role="BOT_CARRY"),
+                                           ally_filters=[R(role="UNKNOWN"), R(role="JUNGLE")],
+                                           enemy_filters=[R(role="BOT_CARRY")], min_n=1),
+    }
+
+def time_mode(mode: str, body: F.FlexibleBody, reps: int) -> tuple[list[float], dict]:
+    F.EXEC_MODE = mode
+    subject = body.subject
+    out = F.run_flexible(subject, body.ally_filters, body)  # warm-up (pool, caches)
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        F.run_flexible(subject, body.ally_filters, body)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples, out
+
+def main():
+    ap = argparse.ArgumentParser(description="split vs combined /stats/flexible execution")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=3000)
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--champs", type=int, default=40, help="fewer champs = more games per filter")
+    ap.add_argument("--reps", type=int, default=20)
+    ap.add_argument("--cleanup", action="store_true")
+    args = ap.parse_args()
+
+    gen = SyntheticMatches(seed=10, champs=args.champs, patch=args.patch, id_base=8_100_000_000)
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        loaded = load(conn, gen, args.matches, args.patch)
+    print(f"patch={args.patch} matches={args.matches} (loaded {loaded}) reps={args.reps}")
+
+    F.PG_DSN = args.dsn
+    F.USE_CUBE = False
+    print(f"{'body':<18} {'split mean':>11} {'p50':>8} {'combined mean':>14} {'p50':>8} {'speedup':>8}  same")
+    for name, body in bodies(args.patch).items():
+        split, a = time_mode("split", body, args.reps)
+        comb, b = time_mode("combined", body, args.reps)
+        same = a["summary"] == b["summary"] and \
+            sorted((i["item_id"], i["picks"]) for i in a["top_items"]) == sorted((i["item_id"], i["picks"]) for i in b["top_items"])
+        print(f"{name:<18} {statistics.mean(split):9.1f}ms {statistics.median(split):6.1f}ms "
+              f"{statistics.mean(comb):12.1f}ms {statistics.median(comb):6.1f}ms "
+              f"{statistics.mean(split) / statistics.mean(comb):7.2f}x  {same}")
+
+    if args.cleanup:
+        with psycopg.connect(args.dsn, autocommit=True) as conn:
+            conn.execute("DELETE FROM lol.matches WHERE patch = %s", (args.patch,))
+
+if __name__ == "__main__":
+    main()
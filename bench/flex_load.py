@@ -0,0 +1,289 @@
+# bench/flex_load.py
+"""
+Load test for /stats/flexible on a reproducible synthetic dataset.
+
+  python -m bench.flex_load --matches 20000 --patches 98.1,98.2 --tiers GOLD,PLATINUM,EMERALD \\
+      --concurrency 8 --requests 2000 --save bench/baselines/flex.json
+  python -m bench.flex_load --url http://127.0.0.1:8000 --concurrency 32 --compare bench/baselines/flex.json
+
+Dataset: --matches games split over --patches, each game tagged with one of --tiers. It is made by
+bench.synthetic.SyntheticMatches with skewed champion picks, so a popular champ filter matches
+many games and a tail champ a few. Rows go in through BulkIngest (COPY + set-based merge). A run
+only loads what is missing from each patch's id range, and the same arguments always produce the same rows.
+
+Load: a fixed, seeded set of --bodies request bodies across these kinds:
+  champ, role, champ+role            subject only
+  2-ally-roles, 2-ally-champs        subject + two ally filters, by role or by champ
+  2-enemy-roles, 2-enemy-champs      subject + two enemy filters, by role or by champ
+--concurrency closed-loop workers send them in a seeded order. Without --url the route function
+runs in-process (api.routes.flexible.flexible, this process's FLEX_* settings, --no-cache to turn
+the response cache off). With --url the bodies are POSTed to a running API.
+
+Output: throughput and p50/p95/p99 overall and per kind. --save writes them, with the dataset and
+run parameters, as a JSON baseline. --compare reads a baseline and marks (and exits 1 on) any p95 /
+p99 that is more than --tolerance slower, or throughput that is more than --tolerance lower.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from run_seed import BulkIngest, bump_data_versions
+from bench.synthetic import SyntheticMatches
+from bench.ingest_bench import prepare
+
+ROLES = ("TOP", "JUNGLE", "MID", "BOT_CARRY")
+KINDS = {  # kind -> share of the body mix
+    "champ": 0.20, "role": 0.10, "champ+role": 0.20,
+    "2-ally-roles": 0.125, "2-ally-champs": 0.125,
+    "2-enemy-roles": 0.125, "2-enemy-champs": 0.125,
+}
+ID_BASE = 7_300_000_000
+
+# ----------------------------
+# Dataset
+# ----------------------------
+def generators(args) -> list[SyntheticMatches]:
+    # one generator (seed, id range) per patch, so adding a patch doesn't change the others
+    return [SyntheticMatches(seed=args.seed * 100 + i, champs=args.champs, patch=patch,
+                             id_base=ID_BASE + i * 100_000_000, skew=args.skew)
+            for i, patch in enumerate(args.patches)]
+
+def load(dsn: str, args) -> int:
+    per_patch = args.matches // len(args.patches)
+    loaded = 0
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        for gen in generators(args):
+            have = conn.execute("SELECT count(*) FROM lol.matches WHERE patch = %s AND match_id LIKE %s",
+                                (gen.patch, f"{gen.region}_{gen.id_base // 100_000_000}%")).fetchone()[0]
+            if have >= per_patch:
+                continue
+            prepare(conn, gen)
+            t0 = time.perf_counter()
+            bulk = BulkIngest(conn, max_matches=args.batch)
+            for idx, (m, tl) in enumerate(gen.matches(per_patch - have, start=have), start=have):
+                bulk.add_match(m, tl, skill_tier=args.tiers[idx % len(args.tiers)])
+            bulk.flush()
+            n = per_patch - have
+            print(f"[load] patch {gen.patch}: {n} matches in {time.perf_counter() - t0:.1f}s "
+                  f"({n / (time.perf_counter() - t0):.0f}/s)", flush=True)
+            loaded += n
+        if loaded:
+            conn.execute("ANALYZE lol.matches; ANALYZE lol.participants; ANALYZE lol.participant_frames; "
+                         "ANALYZE lol.item_events")
+            bump_data_versions(conn, args.patches)  # cached answers for these patches are stale now
+    return loaded
+
+# ----------------------------
+# Request mix
+# ----------------------------
+def make_bodies(args) -> list[tuple[str, dict]]:
+    rng = random.Random(args.seed)
+    champs = list(range(1, args.champs + 1))
+    weights = [1 / k ** args.skew for k in champs] if args.skew > 0 else None
+    champ = lambda: rng.choices(champs, weights)[0]
+    kinds, shares = zip(*KINDS.items())
+    out = []
+    for _ in range(args.bodies):
+        kind = rng.choices(kinds, shares)[0]
+        subject = {"champ_id": champ()} if kind == "champ" else \
+                  {"role": rng.choice(ROLES)} if kind == "role" else \
+                  {"role": rng.choice(ROLES), "champ_id": champ()}
+        others = []
+        if kind.startswith("2-"):
+            by_role = kind.endswith("roles")
+            others = [{"role": r} for r in rng.sample(ROLES, 2)] if by_role else [{"champ_id": champ()}, {"champ_id": champ()}]
+        body = {
+            "subject": subject,
+            "ally_filters": others if kind.startswith("2-ally") else [],
+            "enemy_filters": others if kind.startswith("2-enemy") else [],
+            "patch": rng.choice(args.patches),
+            "skill_tier": rng.choice(args.tiers) if rng.random() < 0.5 else None,
+            "minute": rng.choice((5, 10, 15, 20)),
+            "min_n": args.min_n,
+        }
+        out.append((kind, body))
+    return out
+
+# ----------------------------
+# Drivers
+# ----------------------------
+def in_process_sender(args):
+    from api.routes import flexible as F
+    F.PG_DSN = args.dsn
+    if args.no_cache:
+        F.CACHE = None
+
+    def send(body: dict) -> bool:
+        F.flexible(F.FlexibleBody(**body), explain=False)
+        return True
+    return send
+
+def http_sender(args):
+    import httpx
+    local = threading.local()
+
+    def send(body: dict) -> bool:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=args.url, timeout=args.timeout)
+        r = client.post("/stats/flexible", json=body)
+        return r.status_code == 200
+    return send
+
+def drive(send, bodies: list[tuple[str, dict]], args) -> tuple[dict, float]:
+    order = random.Random(args.seed + 1)
+    seq = [bodies[order.randrange(len(bodies))] for _ in range(args.warmup + args.requests)]
+    samples: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    cursor = iter(range(args.warmup, len(seq)))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            kind, body = seq[i]
+            t0 = time.perf_counter()
+            try:
+                ok = send(body)
+            except Exception as ex:
+                ok = False
+                if errors[kind] == 0:
+                    print(f"[load] {kind}: {ex!r}", file=sys.stderr, flush=True)
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                if ok:
+                    samples[kind].append(ms)
+                else:
+                    errors[kind] += 1
+
+    # warm-up runs first, on its own, so the timed part starts with warm pools and caches
+    for _, body in seq[:args.warmup]:
+        try:
+            send(body)
+        except Exception:
+            pass
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for f in [pool.submit(worker) for _ in range(args.concurrency)]:
+            f.result()
+    elapsed = time.perf_counter() - t0
+    return {"samples": samples, "errors": errors}, elapsed
+
+# ----------------------------
+# Report / baseline
+# ----------------------------
+def summarize(ms: list[float], errors: int, elapsed: float) -> dict:
+    if len(ms) < 2:
+        return {"n": len(ms), "errors": errors, "rps": len(ms) / elapsed, "p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    q = statistics.quantiles(ms, n=100, method="inclusive")
+    return {"n": len(ms), "errors": errors, "rps": len(ms) / elapsed, "mean": statistics.mean(ms),
+            "p50": q[49], "p95": q[94], "p99": q[98]}
+
+def report(result: dict, elapsed: float) -> dict:
+    samples, errors = result["samples"], result["errors"]
+    every = [x for v in samples.values() for x in v]
+    out = {"overall": summarize(every, sum(errors.values()), elapsed), "kinds": {}}
+    for kind in KINDS:
+        if kind in samples or kind in errors:
+            out["kinds"][kind] = summarize(samples.get(kind, []), errors.get(kind, 0), elapsed)
+    return out
+
+def print_table(stats: dict, baseline: dict | None, tol: float) -> bool:
+    regressed = False
+    print(f"{'kind':<16} {'n':>6} {'err':>4} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [("overall", stats["overall"])] + list(stats["kinds"].items())
+    for name, s in rows:
+        line = f"{name:<16} {s['n']:>6} {s['errors']:>4} {s['rps']:>8.1f} {s['p50']:>7.1f}ms {s['p95']:>7.1f}ms {s['p99']:>7.1f}ms"
+        b = (baseline or {}).get("overall") if name == "overall" else (baseline or {}).get("kinds", {}).get(name)
+        if b:
+            flags = []
+            for k in ("p95", "p99"):
+                if b[k] and s[k] > b[k] * (1 + tol):
+                    flags.append(f"{k} +{(s[k] / b[k] - 1):.0%}")
+            if b["rps"] and s["rps"] < b["rps"] * (1 - tol):
+                flags.append(f"req/s {(s['rps'] / b['rps'] - 1):.0%}")
+            line += f"   vs p95 {b['p95']:.1f}ms" + (f"   REGRESSED: {', '.join(flags)}" if flags else "")
+            regressed |= bool(flags)
+        print(line)
+    return regressed
+
+def git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="/stats/flexible load test on a synthetic dataset")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=20000, help="total games, split evenly over --patches")
+    ap.add_argument("--patches", type=lambda s: s.split(","), default=["98.1", "98.2"],
+                    help="patches to spread the games over; best kept to patches no real data uses")
+    ap.add_argument("--tiers", type=lambda s: s.split(","), default=["GOLD", "PLATINUM", "EMERALD"])
+    ap.add_argument("--champs", type=int, default=60)
+    ap.add_argument("--skew", type=float, default=1.0, help="champion popularity skew (0 = uniform)")
+    ap.add_argument("--seed", type=int, default=23)
+    ap.add_argument("--batch", type=int, default=500, help="BulkIngest matches per flush")
+    ap.add_argument("--skip-load", action="store_true")
+    ap.add_argument("--url", help="POST to a running API instead of calling the route in-process")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--no-cache", action="store_true", help="in-process: turn the response cache off")
+    ap.add_argument("--bodies", type=int, default=200, help="distinct request bodies in the mix")
+    ap.add_argument("--min-n", type=int, default=5)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--warmup", type=int, default=50)
+    ap.add_argument("--save", help="write the results as a JSON baseline")
+    ap.add_argument("--compare", help="baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--cleanup", action="store_true", help="delete the synthetic patches afterwards")
+    args = ap.parse_args()
+
+    if not args.skip_load:
+        load(args.dsn, args)
+    bodies = make_bodies(args)
+    send = http_sender(args) if args.url else in_process_sender(args)
+    target = args.url or f"in-process (cache {'off' if args.no_cache else 'on'})"
+    print(f"target={target} matches={args.matches} patches={','.join(args.patches)} tiers={','.join(args.tiers)} "
+          f"bodies={len(bodies)} concurrency={args.concurrency} requests={args.requests}")
+
+    result, elapsed = drive(send, bodies, args)
+    stats = report(result, elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"baseline: {args.compare} ({baseline.get('meta', {}).get('git') or 'unknown rev'})")
+    regressed = print_table(stats, baseline, args.tolerance)
+
+    if args.save:
+        meta = {k: v for k, v in vars(args).items() if k not in ("dsn", "save", "compare")}
+        meta.update(git=git_rev(), when=time.strftime("%Y-%m-%dT%H:%M:%S%z"), elapsed_s=elapsed)
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, **stats}, f, indent=2)
+        print(f"saved baseline to {args.save}")
+
+    if args.cleanup:
+        with psycopg.connect(args.dsn, autocommit=True) as conn:
+            conn.execute("DELETE FROM lol.matches WHERE patch = ANY(%s)", (args.patches,))
+    if regressed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
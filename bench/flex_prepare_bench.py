@@ -0,0 +1,132 @@
+# bench/flex_prepare_bench.py
+"""
+Planning cost of /stats/flexible's statements: full text on every call against server-side
+prepared statements under each plan_cache_mode.
+
+  python -m bench.flex_prepare_bench --patch 98.1 --reps 20
+
+Uses bench.flex_load's synthetic dataset (it is loaded if missing). For each mode it runs a
+fixed set of bodies through api.routes.flexible.execute_plan on one connection, as a pooled
+connection would, and checks the answers against the text mode. Per mode it reports:
+- the mean client latency per request (summary + items statement)
+- Postgres' own planning / execution split, read from EXPLAIN (ANALYZE, SUMMARY) of the same
+  statements: the plain text for "text", EXECUTE of a PREPAREd copy for the others, after six
+  warm-up calls so auto has made its custom / generic choice
+- the planning share of the request
+"""
+import os
+import re
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+from psycopg import sql
+
+from bench import flex_load
+from api.routes import flexible as F
+
+MODES = (  # name, prepare, plan_cache_mode
+    ("text", False, "force_custom_plan"),
+    ("prepared custom", True, "force_custom_plan"),
+    ("prepared auto", True, "auto"),
+    ("prepared generic", True, "force_generic_plan"),
+)
+_PARAM = re.compile(r"%\((\w+)\)s")
+
+def bodies(patch: str) -> dict[str, F.FlexibleBody]:
+    R = F.RoleFilter
+    return {
+        "champ":          F.FlexibleBody(patch=patch, subject=R(champ_id=1), min_n=1),
+        "role":           F.FlexibleBody(patch=patch, subject=R(role="MID"), min_n=1),
+        "champ+role":     F.FlexibleBody(patch=patch, subject=R(role="TOP", champ_id=2), min_n=1),
+        "2-ally-champs":  F.FlexibleBody(patch=patch, subject=R(champ_id=3), ally_filters=[R(champ_id=1), R(champ_id=4)], min_n=1),
+        "2-enemy-roles":  F.FlexibleBody(patch=patch, subject=R(role="MID", champ_id=5),
+                                         enemy_filters=[R(role="MID"), R(role="JUNGLE")], min_n=1),
+        "tier":           F.FlexibleBody(patch=patch, skill_tier="GOLD", subject=R(champ_id=2), min_n=1),
+    }
+
+def plans(patch: str) -> dict[str, F.Plan]:
+    out = {}
+    for name, body in bodies(patch).items():
+        params = F.raw_params(body.subject, body.ally_filters, body)
+        out[name] = F.plan_flexible(body.subject, body.ally_filters, body, params)
+    return out
+
+def positional(statement: str) -> tuple[str, list[str]]:
+    """%(name)s placeholders -> $1..$n in order of first use (what PREPARE needs), plus that order."""
+    names: list[str] = []
+    def repl(m):
+        if m.group(1) not in names:
+            names.append(m.group(1))
+        return f"${names.index(m.group(1)) + 1}"
+    return _PARAM.sub(repl, statement), names
+
+def plan_split(conn: psycopg.Connection, label: str, statement: str, params: dict, prepared: bool) -> tuple[float, float]:
+    """(planning ms, execution ms) from EXPLAIN (ANALYZE, SUMMARY) of one call."""
+    if prepared:
+        text, names = positional(statement)
+        conn.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(label)) + sql.SQL(text))
+        call = sql.SQL("EXECUTE {}({})").format(sql.Identifier(label), sql.SQL(", ").join(sql.Literal(params[n]) for n in names))
+        for _ in range(6):
+            conn.execute(call).fetchall()
+        q, args = sql.SQL("EXPLAIN (ANALYZE, SUMMARY, TIMING OFF) ") + call, None
+    else:
+        q, args = sql.SQL("EXPLAIN (ANALYZE, SUMMARY, TIMING OFF) ") + sql.SQL(statement), params
+    lines = [r[0] for r in conn.execute(q, args, prepare=False).fetchall()]
+    get = lambda key: next(float(l.split(":")[1].split()[0]) for l in lines if l.startswith(key))
+    return get("Planning Time"), get("Execution Time")
+
+def run_mode(dsn: str, plan_by_body: dict[str, F.Plan], prepare: bool, mode: str, reps: int):
+    F.PREPARE = prepare
+    lat, answers = [], {}
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(sql.SQL("SET plan_cache_mode = {}").format(sql.Literal(mode)))
+        with conn.cursor() as cur:
+            for name, plan in plan_by_body.items():
+                answers[name] = F.execute_plan(cur, plan)  # first call prepares
+                for _ in range(reps):
+                    t0 = time.perf_counter()
+                    F.execute_plan(cur, plan)
+                    lat.append((time.perf_counter() - t0) * 1000)
+        plan_ms = exec_ms = 0.0
+        for name, plan in plan_by_body.items():
+            for stmt_name, statement, params in ((plan.summary_name, plan.summary_sql, plan.summary_params),
+                                                 (plan.items_name, plan.items_sql, plan.items_params)):
+                if statement is None:
+                    continue
+                p, e = plan_split(conn, f"bench:{name}:{stmt_name}", statement, params, prepare)
+                plan_ms, exec_ms = plan_ms + p, exec_ms + e
+    n = len(plan_by_body)
+    return statistics.mean(lat), plan_ms / n, exec_ms / n, answers
+
+def main():
+    ap = argparse.ArgumentParser(description="text vs prepared flexible statements, by plan_cache_mode")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=20000)
+    ap.add_argument("--patches", type=lambda s: s.split(","), default=["98.1", "98.2"])
+    ap.add_argument("--tiers", type=lambda s: s.split(","), default=["GOLD", "PLATINUM", "EMERALD"])
+    ap.add_argument("--champs", type=int, default=60)
+    ap.add_argument("--skew", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=23)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--patch", default="98.1", help="patch the bodies ask for")
+    ap.add_argument("--reps", type=int, default=20)
+    args = ap.parse_args()
+
+    flex_load.load(args.dsn, args)
+    F.USE_CUBE = False
+    plan_by_body = plans(args.patch)
+    print(f"patch={args.patch} bodies={len(plan_by_body)} reps={args.reps} exec_mode={F.EXEC_MODE}")
+    print(f"{'mode':<18} {'latency':>9} {'planning':>10} {'execution':>10} {'plan share':>11}  same")
+    want = None
+    for name, prepare, mode in MODES:
+        mean_ms, plan_ms, exec_ms, answers = run_mode(args.dsn, plan_by_body, prepare, mode, args.reps)
+        want = answers if want is None else want
+        print(f"{name:<18} {mean_ms:7.2f}ms {plan_ms:8.2f}ms {exec_ms:8.2f}ms {plan_ms / (plan_ms + exec_ms):10.1%}  "
+              f"{answers == want}")
+
+if __name__ == "__main__":
+    main()
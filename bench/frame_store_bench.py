@@ -0,0 +1,81 @@
+# bench/frame_store_bench.py
+"""
+On-disk size and agg_summary latency of lol.participant_frames (one row per minute) against
+lol.participant_frame_arrays (one row per participant with packed INT[]s).
+
+  python -m bench.frame_store_bench --matches 3000 --reps 10
+
+Loads synthetic matches like bench.flex_exec_bench, applies sql/frame_arrays.sql, converts the
+row frames with backfill_frame_arrays.convert_batch, then times both layouts through
+api.routes.flexible.run_flexible (split mode) and checks the answers agree.
+"""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from backfill_frame_arrays import convert_batch
+from bench.synthetic import SyntheticMatches
+from bench.flex_exec_bench import load, bodies
+from api.routes import flexible as F
+
+SIZE_SQL = """
+SELECT pg_table_size(%(t)s::regclass), pg_indexes_size(%(t)s::regclass),
+       (SELECT reltuples::BIGINT FROM pg_class WHERE oid = %(t)s::regclass)
+"""
+
+def mib(n: int) -> str:
+    return f"{n / 1024 / 1024:8.1f} MiB"
+
+def time_store(store: str, body: F.FlexibleBody, reps: int) -> tuple[list[float], dict]:
+    F.FRAME_STORE = store
+    out = F.run_flexible(body.subject, body.ally_filters, body)  # warm-up
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        F.run_flexible(body.subject, body.ally_filters, body)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples, out
+
+def main():
+    ap = argparse.ArgumentParser(description="participant_frames rows vs arrays")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=3000)
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--champs", type=int, default=40)
+    ap.add_argument("--reps", type=int, default=10)
+    args = ap.parse_args()
+
+    here = os.path.dirname(__file__)
+    gen = SyntheticMatches(seed=10, champs=args.champs, patch=args.patch, id_base=8_100_000_000)
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        with open(os.path.join(here, "..", "sql", "frame_arrays.sql"), encoding="utf-8") as f:
+            conn.execute(f.read())
+        load(conn, gen, args.matches, args.patch)
+        converted = 0
+        while n := convert_batch(conn, 500):
+            converted += n
+        conn.execute("VACUUM ANALYZE lol.participant_frames")
+        conn.execute("VACUUM ANALYZE lol.participant_frame_arrays")
+        print(f"patch={args.patch} matches={args.matches} converted={converted}")
+        for t in ("lol.participant_frames", "lol.participant_frame_arrays"):
+            heap, idx, rows = conn.execute(SIZE_SQL, {"t": t}).fetchone()
+            print(f"{t:<32} rows={rows:>10,} heap={mib(heap)} indexes={mib(idx)} total={mib(heap + idx)}")
+
+    F.PG_DSN = args.dsn
+    F.USE_CUBE = False
+    F.EXEC_MODE = "split"
+    print(f"{'body':<18} {'rows mean':>10} {'p50':>8} {'arrays mean':>12} {'p50':>8} {'speedup':>8}  same")
+    for name, body in bodies(args.patch).items():
+        rows, a = time_store("rows", body, args.reps)
+        arrays, b = time_store("arrays", body, args.reps)
+        print(f"{name:<18} {statistics.mean(rows):8.1f}ms {statistics.median(rows):6.1f}ms "
+              f"{statistics.mean(arrays):10.1f}ms {statistics.median(arrays):6.1f}ms "
+              f"{statistics.mean(rows) / statistics.mean(arrays):7.2f}x  {a['summary'] == b['summary']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# bench/index_advisor.py
+"""
+Index advisor for the /stats/flexible raw path. Captures EXPLAIN (ANALYZE) plans of agg_summary and
+top_items for the bench.flex_exec_bench bodies, proposes the covering / partial indexes in CANDIDATES
+whose access path the plans actually use without them, and with --apply creates them, re-captures the
+plans and reports scan types (index-only or not, heap fetches), shared buffers touched and latency
+before / after.
+
+  python -m bench.index_advisor --patch 99.1                        # report + proposals only
+  python -m bench.index_advisor --patch 99.1 --apply --out idx.json # apply, then before/after report
+
+--apply runs the same statements as sql/flex_indexes.sql (restructure.sql has them for new databases).
+CREATE INDEX on a partitioned table can't be CONCURRENTLY, so on a live database apply that file in
+a quiet window instead.
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+from dataclasses import dataclass
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from bench.flex_exec_bench import bodies
+from api.routes import flexible as F
+
+FACT_TABLES = ("matches", "participants", "participant_frames", "item_events")
+
+@dataclass(frozen=True)
+class IndexCandidate:
+    table: str
+    name: str
+    probe: str                    # column the queries look rows up by; the plan must probe on it
+    ddl: tuple[str, ...]
+    replaces: tuple[str, ...] = ()
+    where: str = ""               # partial index predicate, as it shows up in plan conditions
+    applied_when: str = ""        # substring of the index definition once the candidate is in place
+    why: str = ""
+
+CANDIDATES = (
+    IndexCandidate(
+        table="participants", name="participants_match_team_cover", probe="match_key",
+        ddl=("CREATE INDEX IF NOT EXISTS participants_match_team_cover ON lol.participants "
+             "(match_key, team_id) INCLUDE (player_key, role_derived, champ_id, win, patch)",),
+        replaces=("participants_team_id_match_key_idx",),
+        why="ally/enemy side and subject_rows read one match (and team) at a time and only need "
+            "player_key / role / champ / win",
+    ),
+    IndexCandidate(
+        table="participant_frames", name="participant_frames_pkey", probe="player_key",
+        # the primary key already leads with match_key, player_key, minute; carrying gold / xp
+        # makes it covering without a second index over the biggest table
+        ddl=("ALTER TABLE lol.participant_frames DROP CONSTRAINT participant_frames_pkey",
+             "ALTER TABLE lol.participant_frames ADD PRIMARY KEY (match_key, player_key, minute, patch) INCLUDE (gold, xp)"),
+        replaces=("participant_frames_minute_idx", "participant_frames_match_key_player_key_idx"),
+        applied_when="INCLUDE (gold, xp)",
+        why="subject_stats probes match_key + player_key + minute and reads gold / xp",
+    ),
+    IndexCandidate(
+        table="item_events", name="item_events_purchase_cover", probe="match_key",
+        ddl=("CREATE INDEX IF NOT EXISTS item_events_purchase_cover ON lol.item_events "
+             "(match_key, player_key) INCLUDE (item_id, patch) WHERE event_type = 'PURCHASE'",),
+        replaces=("item_events_player_key_match_key_idx",),
+        where="event_type = 'PURCHASE'",
+        why="top_items only counts PURCHASE rows of one participant and reads item_id",
+    ),
+)
+
+def partition_parents(conn: psycopg.Connection) -> dict[str, str]:
+    """relation name -> parent fact table (partitions map to their parent, the parents to themselves)."""
+    out = {t: t for t in FACT_TABLES}
+    for rel, parent in conn.execute("""
+      SELECT c.relname, p.relname FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+      WHERE p.relnamespace = 'lol'::regnamespace
+    """).fetchall():
+        out[rel] = parent
+    return out
+
+def scans(plan: dict, parents: dict[str, str]) -> list[dict]:
+    """Scan nodes on the fact tables that ran, with their lookup conditions and heap fetches."""
+    out = []
+    if plan.get("Relation Name") in parents and plan.get("Actual Loops", 0) > 0:
+        out.append({
+            "table": parents[plan["Relation Name"]],
+            "node": plan["Node Type"],
+            "index": plan.get("Index Name"),
+            "cond": " ".join(filter(None, (plan.get("Index Cond"), plan.get("Recheck Cond"), plan.get("Filter")))),
+            "rows": plan.get("Actual Rows", 0) * plan.get("Actual Loops", 1),
+            "heap_fetches": plan.get("Heap Fetches", 0),
+        })
+    for child in plan.get("Plans", []):
+        out += scans(child, parents)
+    return out
+
+def capture(conn: psycopg.Connection, patch: str, skip: set[str], reps: int) -> dict:
+    parents = partition_parents(conn)
+    out = {}
+    for name, body in bodies(patch).items():
+        if name in skip:
+            continue
+        params = F.raw_params(body.subject, body.ally_filters, body)
+        found, buffers = [], 0
+        for q in (F.SQL.agg_summary, F.SQL.top_items):
+            tree = conn.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + q, params, prepare=False).fetchone()[0][0]
+            found += scans(tree["Plan"], parents)
+            buffers += tree["Plan"].get("Shared Hit Blocks", 0) + tree["Plan"].get("Shared Read Blocks", 0)
+        F.run_flexible(body.subject, body.ally_filters, body)  # warm-up
+        samples = []
+        for _ in range(reps):
+            t0 = time.perf_counter()
+            F.run_flexible(body.subject, body.ally_filters, body)
+            samples.append((time.perf_counter() - t0) * 1000)
+        out[name] = {"scans": found, "buffers": buffers, "mean_ms": statistics.mean(samples)}
+    return out
+
+def existing_indexes(conn: psycopg.Connection) -> dict[str, str]:
+    return dict(conn.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = 'lol' AND tablename = ANY(%s)",
+                             (list(FACT_TABLES),)).fetchall())
+
+def propose(conn: psycopg.Connection, snap: dict) -> list[IndexCandidate]:
+    """
+    Candidates whose table is probed on `probe` by something other than an index-only scan, and
+    partial candidates whose predicate the plans apply while scanning a full index.
+    """
+    have = existing_indexes(conn)
+    out = []
+    for c in CANDIDATES:
+        if c.name in have and c.applied_when in have[c.name]:
+            continue
+        for s in (s for b in snap.values() for s in b["scans"] if s["table"] == c.table and c.probe in s["cond"]):
+            if s["node"] != "Index Only Scan" or (c.where and c.where in s["cond"]):
+                out.append(c)
+                break
+    return out
+
+def apply(conn: psycopg.Connection, candidates: list[IndexCandidate], drop_replaced: bool):
+    with conn.transaction():
+        for c in candidates:
+            for stmt in c.ddl:
+                conn.execute(stmt)
+            if drop_replaced:
+                for old in c.replaces:
+                    conn.execute(f"DROP INDEX IF EXISTS lol.{old}")
+    # index-only scans need an up-to-date visibility map
+    for t in FACT_TABLES:
+        conn.execute(f"VACUUM ANALYZE lol.{t}")
+
+def scan_summary(scan_list: list[dict]) -> str:
+    by_node: dict[str, int] = {}
+    for s in scan_list:
+        by_node[s["node"]] = by_node.get(s["node"], 0) + 1
+    fetches = sum(s["heap_fetches"] for s in scan_list)
+    return ", ".join(f"{k} x{v}" for k, v in sorted(by_node.items())) + f"; heap fetches {fetches}"
+
+def index_sizes(conn: psycopg.Connection) -> dict[str, int]:
+    return dict(conn.execute("""
+      SELECT c.relname, (SELECT sum(pg_relation_size(relid))::BIGINT FROM pg_partition_tree(c.oid::regclass))
+      FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid
+      WHERE t.relnamespace = 'lol'::regnamespace AND t.relname = ANY(%s)
+    """, (list(FACT_TABLES),)).fetchall())
+
+def main():
+    ap = argparse.ArgumentParser(description="covering / partial index advisor for /stats/flexible")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--skip", default="role+2ally+enemy", help="comma-separated body names to leave out")
+    ap.add_argument("--apply", action="store_true", help="create the proposed indexes and report before / after")
+    ap.add_argument("--keep-replaced", action="store_true", help="don't drop the indexes a proposal makes redundant")
+    ap.add_argument("--out", help="write the report as JSON")
+    args = ap.parse_args()
+
+    F.PG_DSN = args.dsn
+    F.USE_CUBE = False
+    F.EXEC_MODE = "split"
+    F.FRAME_STORE = "rows"
+    skip = set(filter(None, args.skip.split(",")))
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        for t in FACT_TABLES:
+            conn.execute(f"VACUUM ANALYZE lol.{t}")
+        sizes_before = index_sizes(conn)
+        before = capture(conn, args.patch, skip, args.reps)
+        proposals = propose(conn, before)
+        for c in proposals:
+            print(f"-- {c.table}: {c.why}")
+            for stmt in c.ddl:
+                print(stmt + ";")
+            for old in c.replaces:
+                print(f"DROP INDEX IF EXISTS lol.{old};")
+        if not proposals:
+            print("-- nothing to propose")
+        report = {"before": before, "proposals": [c.name for c in proposals], "index_sizes_before": sizes_before}
+        if args.apply and proposals:
+            apply(conn, proposals, drop_replaced=not args.keep_replaced)
+            report["after"] = after = capture(conn, args.patch, skip, args.reps)
+            report["index_sizes_after"] = sizes_after = index_sizes(conn)
+            print()
+            print(f"{'body':<14} {'before':>9} {'after':>9} {'buffers':>17}  scans before -> after")
+            for name, b in before.items():
+                a = after[name]
+                print(f"{name:<14} {b['mean_ms']:7.1f}ms {a['mean_ms']:7.1f}ms {b['buffers']:>8}->{a['buffers']:<8}  "
+                      f"{scan_summary(b['scans'])} -> {scan_summary(a['scans'])}")
+            print(f"fact indexes: {sum(sizes_before.values()) / 2**20:.1f} MiB -> {sum(sizes_after.values()) / 2**20:.1f} MiB")
+        else:
+            for name, b in before.items():
+                print(f"{name:<14} {b['mean_ms']:7.1f}ms {b['buffers']:>8} buffers  {scan_summary(b['scans'])}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench/ingest_bench.py
+"""
+Compares matches/sec of the row-at-a-time ingest path (insert_match_from_payload /
+insert_participants_from_payload / insert_timeline) against BulkIngest on a local Postgres.
+
+  python -m bench.ingest_bench --matches 200 --batch 25
+
+Expects restructure.sql to be applied. Each mode writes its own match id range, so
+re-running is safe; pass --cleanup to delete the benchmark rows afterwards.
+"""
+import os
+import time
+import argparse
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+import run_seed
+from run_seed import insert_match_from_payload, insert_participants_from_payload, insert_timeline, BulkIngest
+from bench.synthetic import SyntheticMatches, ITEM_POOL
+
+def prepare(conn: psycopg.Connection, gen: SyntheticMatches):
+    # no network in benchmarks: item names come from the stub cache
+    run_seed.ITEM_NAME_CACHE = {i: f"Item {i}" for i in ITEM_POOL}
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO lol.champions (champ_id, champ_name) SELECT c, 'Champ ' || c FROM unnest(%s::int[]) c ON CONFLICT DO NOTHING",
+            (gen.champs,),
+        )
+
+def run_rows(conn: psycopg.Connection, payloads) -> float:
+    t0 = time.perf_counter()
+    for m, tl in payloads:
+        insert_match_from_payload(conn, m)
+        insert_participants_from_payload(conn, m)
+        insert_timeline(conn, tl)
+    return time.perf_counter() - t0
+
+def run_bulk(conn: psycopg.Connection, payloads, batch: int) -> float:
+    t0 = time.perf_counter()
+    bulk = BulkIngest(conn, max_matches=batch)
+    for m, tl in payloads:
+        bulk.add_match(m, tl)
+    bulk.flush()
+    return time.perf_counter() - t0
+
+def cleanup(conn: psycopg.Connection, match_ids: list[str]):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM lol.matches WHERE match_id = ANY(%s)", (match_ids,))
+
+def main():
+    ap = argparse.ArgumentParser(description="Row-at-a-time vs COPY bulk ingest")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--matches", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=25, help="BulkIngest max_matches per flush")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--cleanup", action="store_true")
+    args = ap.parse_args()
+
+    gen = SyntheticMatches(seed=args.seed, id_base=9_000_000_000 + int(time.time()) % 1_000_000 * 1000)
+    rows_payloads = list(gen.matches(args.matches))
+    bulk_payloads = list(gen.matches(args.matches, start=args.matches))
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        prepare(conn, gen)
+        t_rows = run_rows(conn, rows_payloads)
+        t_bulk = run_bulk(conn, bulk_payloads, args.batch)
+        if args.cleanup:
+            cleanup(conn, [m["metadata"]["matchId"] for m, _ in rows_payloads + bulk_payloads])
+
+    print(f"matches={args.matches} batch={args.batch}")
+    print(f"rows : {t_rows:8.2f}s  {args.matches / t_rows:8.1f} matches/s")
+    print(f"bulk : {t_bulk:8.2f}s  {args.matches / t_bulk:8.1f} matches/s  ({t_rows / t_bulk:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# bench/metrics_overhead.py
+"""
+Cost of riot.metrics.Metrics on the hot path, against the deque-based version it replaced
+(loaded from git, `--baseline-rev`).
+
+  python -m bench.metrics_overhead --rate 10000 --threads 8
+
+Each event is what one Riot call records: record_request, plus its latency histogram where the
+implementation has one. It reports the per-event cost single-threaded and with --threads
+recording at once, the CPU share that cost takes at --rate events/s, and the time one summary /
+scrape takes once the 120s window is full.
+"""
+import sys
+import time
+import types
+import random
+import argparse
+import subprocess
+import threading
+
+from riot.metrics import Metrics
+
+KEYS = [("routing", "americas", "match"), ("routing", "americas", "timeline"), ("routing", "europe", "match"),
+        ("routing", "europe", "timeline"), ("platform", "na1", "league"), ("platform", "euw1", "league")]
+
+def load_baseline(rev: str):
+    src = subprocess.run(["git", "show", f"{rev}:riot/metrics.py"], capture_output=True, text=True, check=True).stdout
+    mod = types.ModuleType("metrics_baseline")
+    exec(compile(src, "metrics_baseline.py", "exec"), mod.__dict__)
+    return mod.Metrics
+
+def record_fn(m):
+    if hasattr(m, "record_request_latency"):
+        def rec(scope, key, ep, s):
+            m.record_request(scope, key, ep)
+            m.record_request_latency(scope, key, ep, s, 200)
+    else:
+        def rec(scope, key, ep, s):
+            m.record_request(scope, key, ep)
+    return rec
+
+def per_event_us(m, n: int, threads: int) -> float:
+    rec = record_fn(m)
+    lat = [random.Random(i).lognormvariate(-2.5, 0.8) for i in range(1024)]
+
+    def run(count):
+        for i in range(count):
+            scope, key, ep = KEYS[i % len(KEYS)]
+            rec(scope, key, ep, lat[i & 1023])
+
+    ts = [threading.Thread(target=run, args=(n // threads,)) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return (time.perf_counter() - t0) / n * 1e6
+
+def fill_window(m, rate: int):
+    """Records 120s worth of events at `rate`/s, backdated so all of them are in the window."""
+    rec = record_fn(m)
+    if hasattr(m, "_events"):  # baseline: one deque entry per event
+        now = time.monotonic()
+        with m._lock:
+            for j, k in enumerate(KEYS):
+                dq = m._events[k]
+                dq.extend(now - 120 + i / rate for i in range(j, rate * 120, len(KEYS)))
+        return
+    now = time.time()
+    for k in KEYS:
+        rec(*k, 0.05)
+        for sec in range(120):
+            m._rings[k].add(now - 120 + sec, rate // len(KEYS))
+
+def timed_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def quiet(fn):
+    def run():
+        out, sys.stdout = sys.stdout, open("/dev/null", "w")
+        try:
+            fn()
+        finally:
+            sys.stdout.close()
+            sys.stdout = out
+    return run
+
+def main():
+    ap = argparse.ArgumentParser(description="riot.metrics hot-path and scrape cost")
+    ap.add_argument("--rate", type=int, default=10_000, help="events per second to size the CPU share for")
+    ap.add_argument("--events", type=int, default=300_000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--baseline-rev", default="HEAD~1")
+    args = ap.parse_args()
+
+    impls = [("current", Metrics)]
+    try:
+        impls.insert(0, (f"baseline ({args.baseline_rev})", load_baseline(args.baseline_rev)))
+    except (subprocess.CalledProcessError, OSError) as ex:
+        print(f"baseline skipped: {ex}")
+
+    print(f"events={args.events} rate={args.rate}/s threads={args.threads}")
+    print(f"{'impl':<20} {'1 thread':>10} {f'{args.threads} threads':>11} {'CPU @rate':>10} {'summary':>10} {'scrape':>10}")
+    for name, cls in impls:
+        one = per_event_us(cls(), args.events, 1)
+        many = per_event_us(cls(), args.events, args.threads)
+        m = cls()
+        fill_window(m, args.rate)
+        summary = timed_ms(quiet(m.print_summary))
+        scrape = f"{timed_ms(m.render_prometheus):8.2f}ms" if hasattr(m, "render_prometheus") else f"{'-':>10}"
+        print(f"{name:<20} {one:8.2f}us {many:9.2f}us {one * args.rate / 1e4:9.2f}% {summary:8.2f}ms {scrape}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench/partition_explain.py
+"""
+Shows partition pruning in agg_summary: runs EXPLAIN (ANALYZE) for a body with its patch set
+and with patch=None, and lists which lol.* partitions each plan actually touches.
+
+  python -m bench.partition_explain --patch 99.1 --champ 1
+  python -m bench.partition_explain --patch 99.1 --champ 1 --plan   # also print the plan text
+
+Needs the partitioned schema (restructure.sql / sql/partition_by_patch.sql) and at least two
+patches loaded (bench.flex_exec_bench loads one under its own patch).
+"""
+import os
+import argparse
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from api.routes import flexible as F
+
+def scanned(plan: dict) -> set[str]:
+    """Relations of the scan nodes that actually ran (pruned subplans don't appear, never-executed ones have loops=0)."""
+    out = set()
+    if "Relation Name" in plan and plan.get("Actual Loops", 1) > 0:
+        out.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        out |= scanned(child)
+    return out
+
+def explain(conn: psycopg.Connection, body: F.FlexibleBody) -> tuple[dict, str]:
+    params = F.raw_params(body.subject, body.ally_filters, body)
+    tree = conn.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + F.SQL.agg_summary, params).fetchone()[0][0]
+    text = "\n".join(r[0] for r in conn.execute("EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) " + F.SQL.agg_summary, params))
+    return tree, text
+
+def main():
+    ap = argparse.ArgumentParser(description="agg_summary partition pruning")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--champ", type=int, default=1)
+    ap.add_argument("--plan", action="store_true", help="print the text plan of the patch-filtered run")
+    args = ap.parse_args()
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        parts = conn.execute("SELECT parent::text, partition FROM lol.patch_partitions ORDER BY 1, 2").fetchall()
+        total: dict[str, int] = {}
+        for parent, _ in parts:
+            total[parent] = total.get(parent, 0) + 1
+        for patch in (args.patch, None):
+            body = F.FlexibleBody(patch=patch, subject=F.RoleFilter(champ_id=args.champ), min_n=1)
+            tree, text = explain(conn, body)
+            hit = scanned(tree["Plan"])
+            print(f"patch={patch!s:<6} execution={tree['Execution Time']:8.1f}ms planning={tree['Planning Time']:6.1f}ms")
+            for parent, n in sorted(total.items()):
+                mine = sorted(p for par, p in parts if par == parent and p in hit)
+                print(f"    {parent:<28} {len(mine)}/{n} partitions: {', '.join(mine)}")
+            if args.plan and patch is not None:
+                print(text)
+
+if __name__ == "__main__":
+    main()
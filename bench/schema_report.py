@@ -0,0 +1,105 @@
+# bench/schema_report.py
+"""
+Snapshot of the lol fact tables for before/after comparisons of schema changes:
+heap and index size per table and per index, plus agg_summary latency for the
+bench.flex_exec_bench bodies.
+
+  python -m bench.schema_report --patch 99.1 --out before.json
+  ... apply a migration ...
+  python -m bench.schema_report --patch 99.1 --out after.json --compare before.json
+
+Expects the synthetic patch to be loaded already (bench.flex_exec_bench does that).
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("RIOT_API_KEY", "bench")  # riot.client reads it at import time
+
+import psycopg
+
+from bench.flex_exec_bench import bodies
+from api.routes import flexible as F
+
+TABLES = ("lol.matches", "lol.participants", "lol.participant_frames", "lol.item_events")
+
+def sizes(conn: psycopg.Connection) -> dict:
+    # summed over pg_partition_tree so partitioned tables (and their indexes) report their leaves
+    out = {}
+    for t in TABLES:
+        heap, idx = conn.execute("""
+          SELECT sum(pg_table_size(relid))::BIGINT, sum(pg_indexes_size(relid))::BIGINT
+          FROM pg_partition_tree(%s::regclass) WHERE isleaf
+        """, (t,)).fetchone()
+        indexes = dict(conn.execute("""
+          SELECT c.relname, (SELECT sum(pg_relation_size(relid))::BIGINT FROM pg_partition_tree(c.oid::regclass))
+          FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+          WHERE i.indrelid = %s::regclass ORDER BY 1
+        """, (t,)).fetchall())
+        out[t] = {"heap": heap, "indexes": idx, "by_index": indexes}
+    return out
+
+def latencies(patch: str, reps: int, skip: set[str]) -> dict:
+    out = {}
+    for name, body in bodies(patch).items():
+        if name in skip:
+            continue
+        F.run_flexible(body.subject, body.ally_filters, body)  # warm-up
+        samples = []
+        for _ in range(reps):
+            t0 = time.perf_counter()
+            F.run_flexible(body.subject, body.ally_filters, body)
+            samples.append((time.perf_counter() - t0) * 1000)
+        out[name] = {"mean_ms": statistics.mean(samples), "p50_ms": statistics.median(samples)}
+    return out
+
+def mib(n: int) -> str:
+    return f"{n / 1024 / 1024:7.1f} MiB"
+
+def main():
+    ap = argparse.ArgumentParser(description="lol schema size + agg_summary latency snapshot")
+    ap.add_argument("--dsn", default=os.getenv("PG_DSN", "dbname=league user=postgres host=localhost"))
+    ap.add_argument("--patch", default="99.1")
+    ap.add_argument("--reps", type=int, default=5)
+    ap.add_argument("--skip", default="role+2ally+enemy", help="comma-separated body names to leave out")
+    ap.add_argument("--out", help="write the snapshot as JSON")
+    ap.add_argument("--compare", help="earlier snapshot to diff against")
+    args = ap.parse_args()
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn:
+        for t in TABLES:
+            conn.execute(f"VACUUM ANALYZE {t}")
+        snap = {"sizes": sizes(conn)}
+    F.PG_DSN = args.dsn
+    F.USE_CUBE = False
+    F.EXEC_MODE = "split"
+    F.FRAME_STORE = "rows"
+    snap["latency"] = latencies(args.patch, args.reps, set(filter(None, args.skip.split(","))))
+
+    before = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)
+
+    for t, s in snap["sizes"].items():
+        line = f"{t:<24} heap={mib(s['heap'])} indexes={mib(s['indexes'])}"
+        if before and t in before["sizes"]:
+            b = before["sizes"][t]
+            line += f"   (was heap={mib(b['heap'])} indexes={mib(b['indexes'])})"
+        print(line)
+        for name, n in s["by_index"].items():
+            print(f"    {name:<44} {mib(n)}")
+    for name, l in snap["latency"].items():
+        line = f"{name:<18} mean={l['mean_ms']:8.1f}ms p50={l['p50_ms']:8.1f}ms"
+        if before and name in before["latency"]:
+            line += f"   (was mean={before['latency'][name]['mean_ms']:8.1f}ms)"
+        print(line)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(snap, f, indent=2)
+
+if __name__ == "__main__":
+    main()
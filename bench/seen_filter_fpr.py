@@ -0,0 +1,55 @@
+# bench/seen_filter_fpr.py
+"""
+Measures SeenFilter's false-positive rate against its theoretical estimate for a memory budget.
+
+  python -m bench.seen_filter_fpr --mb 8 --items 5000000 --probes 200000
+
+Inserts --items synthetic match ids, probes --probes ids that were never added, checks
+there are no false negatives, round-trips the filter through save/load, and exits non-zero
+if the measured FP rate exceeds --tolerance times the estimate.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+from riot.seen_filter import SeenFilter
+
+def main():
+    ap = argparse.ArgumentParser(description="SeenFilter false-positive rate check")
+    ap.add_argument("--mb", type=float, default=8.0, help="memory budget in MiB")
+    ap.add_argument("--items", type=int, default=5_000_000)
+    ap.add_argument("--probes", type=int, default=200_000)
+    ap.add_argument("--tolerance", type=float, default=1.5)
+    args = ap.parse_args()
+
+    sf = SeenFilter(memory_bytes=int(args.mb * 1024 * 1024), expected_items=args.items)
+    t0 = time.perf_counter()
+    sf.update(f"NA1_{5_000_000_000 + i}" for i in range(args.items))
+    t_add = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    false_neg = sum(1 for i in range(0, args.items, max(1, args.items // args.probes))
+                    if not sf.might_contain(f"NA1_{5_000_000_000 + i}"))
+    fp = sum(1 for i in range(args.probes) if sf.might_contain(f"EUW1_{7_000_000_000 + i}"))
+    t_probe = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "seen.bin")
+        sf.save(path)
+        again = SeenFilter.load(path)
+        roundtrip_ok = again.bits == sf.bits and again.k == sf.k and again.count == sf.count
+
+    measured = fp / args.probes
+    estimate = sf.estimated_fp_rate()
+    print(f"budget={args.mb}MiB bits={sf.m} k={sf.k} items={sf.count}")
+    print(f"add   : {args.items / t_add:,.0f} ids/s")
+    print(f"probe : {(args.probes * 2) / t_probe:,.0f} ids/s")
+    print(f"fp    : measured={measured:.5f} estimated={estimate:.5f}")
+    print(f"false negatives={false_neg} save/load ok={roundtrip_ok}")
+    ok = false_neg == 0 and roundtrip_ok and measured <= estimate * args.tolerance + 1e-4
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
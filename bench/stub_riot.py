@@ -0,0 +1,115 @@
+# bench/stub_riot.py
+"""
+Local stand-in for the match-v5 API, serving bench.synthetic payloads.
+Routes are mounted under /{routing}, so point clients at RIOT_BASE_URL=http://127.0.0.1:8765/{routing}.
+
+  python -m bench.stub_riot --port 8765 --latency-ms 120 --p429 0.05
+
+Injects a fixed latency (+ jitter) on every response and answers a fraction of requests
+with 429 + Retry-After, like the real edge does when a bucket is exhausted.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from bench.synthetic import SyntheticMatches
+
+class StubRiot:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, latency_ms: float = 100.0,
+                 jitter_ms: float = 30.0, p429: float = 0.0, retry_after: float = 1.0, seed: int = 7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.gen = SyntheticMatches(seed=seed, players=500)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "429": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{{routing}}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body=None, headers=None):
+                payload = json.dumps(body, separators=(",", ":")).encode("utf-8") if body is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.counts["requests"] += 1
+                    delay = max(0.0, stub.latency_ms + stub._rng.uniform(-stub.jitter_ms, stub.jitter_ms)) / 1000.0
+                    throttle = stub._rng.random() < stub.p429
+                    if throttle:
+                        stub.counts["429"] += 1
+                time.sleep(delay)
+                if throttle:
+                    return self._send(429, {"status": {"status_code": 429, "message": "Rate limit exceeded"}},
+                                      {"Retry-After": f"{stub.retry_after:g}"})
+
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                # /{routing}/lol/match/v5/matches/...
+                tail = parts[4:] if len(parts) > 4 and parts[1:4] == ["lol", "match", "v5"] else None
+                if not tail or tail[0] != "matches":
+                    return self._send(404, {"status": {"status_code": 404}})
+                if len(tail) == 4 and tail[1] == "by-puuid" and tail[3] == "ids":
+                    qs = parse_qs(url.query)
+                    start = int(qs.get("start", ["0"])[0])
+                    count = int(qs.get("count", ["20"])[0])
+                    total = 250
+                    ids = [f"NA1_{stub.gen.id_base + i}" for i in range(start, min(start + count, total))]
+                    return self._send(200, ids)
+                if len(tail) in (2, 3):
+                    try:
+                        idx = int(tail[1].split("_", 1)[1]) - stub.gen.id_base
+                    except (IndexError, ValueError):
+                        return self._send(404, {"status": {"status_code": 404}})
+                    with stub._lock:
+                        match, timeline = stub.gen.match(idx)
+                    return self._send(200, timeline if len(tail) == 3 and tail[2] == "timeline" else match)
+                return self._send(404, {"status": {"status_code": 404}})
+
+        return Handler
+
+    def start(self) -> "StubRiot":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub Riot match-v5 server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=100.0)
+    ap.add_argument("--jitter-ms", type=float, default=30.0)
+    ap.add_argument("--p429", type=float, default=0.0, help="fraction of requests answered with 429")
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    args = ap.parse_args()
+    stub = StubRiot(args.host, args.port, args.latency_ms, args.jitter_ms, args.p429, args.retry_after)
+    print(f"stub riot listening on {stub.base_url}")
+    stub.server.serve_forever()
+
+if __name__ == "__main__":
+    main()
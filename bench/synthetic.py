@@ -0,0 +1,102 @@
+# bench/synthetic.py
+"""
+Deterministic generator of Riot-shaped match + timeline payloads.
+Everything is derived from the seed, so two runs with the same arguments produce identical data.
+"""
+import random
+import string
+from typing import Iterator
+
+POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+ITEM_POOL = (1001, 1036, 1038, 1052, 1054, 1055, 1056, 2003, 2031, 3006, 3020, 3031, 3047, 3071,
+             3078, 3089, 3111, 3153, 3157, 3165, 3742, 6653, 6655, 6672, 6691)
+
+def make_puuid(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits + "-_", k=78))
+
+class SyntheticMatches:
+    def __init__(self, seed: int = 7, players: int = 5000, champs: int = 160,
+                 patch: str = "25.17", region: str = "NA1", id_base: int = 5_000_000_000, skew: float = 0.0):
+        self.rng = random.Random(seed)
+        self.players = [make_puuid(self.rng) for _ in range(players)]
+        self.champs = list(range(1, champs + 1))
+        self.patch = patch
+        self.region = region
+        self.id_base = id_base
+        # skew > 0: champion k is picked with weight 1 / k**skew (a few popular picks, a long tail),
+        # like real pick rates; 0 keeps picks uniform
+        self.weights = [1 / k ** skew for k in self.champs] if skew > 0 else None
+
+    def pick_champs(self, n: int) -> list[int]:
+        if self.weights is None:
+            return self.rng.sample(self.champs, n)
+        # weighted sampling without replacement (Efraimidis-Spirakis): top-n of u ** (1 / w)
+        keyed = sorted(((self.rng.random() ** (1 / w), c) for c, w in zip(self.champs, self.weights)), reverse=True)
+        return [c for _, c in keyed[:n]]
+
+    def match(self, idx: int) -> tuple[dict, dict]:
+        rng = self.rng
+        mid = f"{self.region}_{self.id_base + idx}"
+        minutes = rng.randint(20, 40)
+        blue_win = rng.random() < 0.5
+        puuids = rng.sample(self.players, 10)
+        champs = self.pick_champs(10)
+
+        participants = []
+        for i in range(10):
+            team = 100 if i < 5 else 200
+            participants.append({
+                "puuid": puuids[i], "teamId": team, "championId": champs[i],
+                "teamPosition": POSITIONS[i % 5], "lane": "NONE", "role": "NONE",
+                "win": blue_win if team == 100 else not blue_win,
+                "kills": rng.randint(0, 15), "deaths": rng.randint(0, 12), "assists": rng.randint(0, 20),
+                "totalMinionsKilled": rng.randint(20, 300), "neutralMinionsKilled": rng.randint(0, 150),
+                "goldEarned": rng.randint(6000, 18000), "totalDamageDealtToChampions": rng.randint(3000, 50000),
+                **{f"item{k}": rng.choice(ITEM_POOL) for k in range(7)},
+            })
+        match = {
+            "metadata": {"matchId": mid, "participants": puuids},
+            "info": {
+                "gameId": self.id_base + idx, "platformId": self.region, "queueId": 420,
+                "gameVersion": f"{self.patch}.{rng.randint(100, 999)}.1234",
+                "gameStartTimestamp": 1_750_000_000_000 + idx * 60_000,
+                "gameDuration": minutes * 60 + rng.randint(0, 59),
+                "participants": participants,
+            },
+        }
+
+        frames = []
+        gold = [500] * 10
+        xp = [0] * 10
+        cs = [0] * 10
+        for minute in range(minutes + 1):
+            pf = {}
+            for i in range(10):
+                if minute:
+                    gold[i] += rng.randint(250, 550)
+                    xp[i] += rng.randint(250, 600)
+                    cs[i] += rng.randint(4, 10)
+                pf[str(i + 1)] = {"participantId": i + 1, "totalGold": gold[i], "currentGold": gold[i] % 1500,
+                                  "xp": xp[i], "level": min(18, 1 + xp[i] // 1000),
+                                  "minionsKilled": cs[i], "jungleMinionsKilled": 0,
+                                  "position": {"x": rng.randint(0, 15000), "y": rng.randint(0, 15000)}}
+            events = []
+            for _ in range(rng.randint(2, 8)):
+                events.append({"type": "ITEM_PURCHASED", "participantId": rng.randint(1, 10),
+                               "itemId": rng.choice(ITEM_POOL), "timestamp": minute * 60_000 + rng.randint(0, 59_999)})
+            if rng.random() < 0.1:
+                events.append({"type": "ITEM_UNDO", "participantId": rng.randint(1, 10), "beforeId": rng.choice(ITEM_POOL),
+                               "afterId": 0, "goldGain": 300, "timestamp": minute * 60_000 + 59_999})
+            events.append({"type": "WARD_PLACED", "creatorId": rng.randint(1, 10), "wardType": "YELLOW_TRINKET",
+                           "timestamp": minute * 60_000 + 30_000})
+            frames.append({"timestamp": minute * 60_000, "participantFrames": pf, "events": events})
+
+        timeline = {
+            "metadata": {"matchId": mid, "participants": puuids},
+            "info": {"frameInterval": 60000, "frames": frames},
+        }
+        return match, timeline
+
+    def matches(self, n: int, start: int = 0) -> Iterator[tuple[dict, dict]]:
+        for idx in range(start, start + n):
+            yield self.match(idx)
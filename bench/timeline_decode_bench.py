@@ -0,0 +1,165 @@
+# bench/timeline_decode_bench.py
+"""
+Timeline decoding for the ingest: a full decode into dicts (stdlib json, orjson, msgspec) followed
+by extraction, against msgspec's typed decoder that only materializes the fields
+riot/decoding.py keeps.
+
+  python -m bench.timeline_decode_bench --archive /tmp/archive --patch 25.17   # recorded timelines
+  python -m bench.timeline_decode_bench --timelines 300                         # synthetic, Riot-shaped
+
+Recorded timelines are read from a raw archive (either layout) through SegmentReader.
+Without --archive, synthetic timelines are padded with the championStats / damageStats blocks and
+the non-item events real ones carry, because those are most of the bytes a real timeline has.
+Every variant runs in a fresh process over the same NDJSON file. It reports the mean parse +
+extract time per timeline and the peak RSS above the process's baseline, with every
+TimelineColumns kept as a buffered batch would. Its rows are also checked against the stdlib
+variant.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import subprocess
+import statistics
+import tempfile
+
+VARIANTS = ("json", "orjson", "msgspec", "msgspec-typed")
+
+CHAMPION_STATS = ("abilityHaste", "abilityPower", "armor", "armorPen", "armorPenPercent", "attackDamage",
+                  "attackSpeed", "bonusArmorPenPercent", "bonusMagicPenPercent", "ccReduction", "cooldownReduction",
+                  "health", "healthMax", "healthRegen", "lifesteal", "magicPen", "magicPenPercent", "magicResist",
+                  "movementSpeed", "omnivamp", "physicalVamp", "power", "powerMax", "powerRegen", "spellVamp")
+DAMAGE_STATS = ("magicDamageDone", "magicDamageDoneToChampions", "magicDamageTaken", "physicalDamageDone",
+                "physicalDamageDoneToChampions", "physicalDamageTaken", "totalDamageDone",
+                "totalDamageDoneToChampions", "totalDamageTaken", "trueDamageDone", "trueDamageDoneToChampions",
+                "trueDamageTaken")
+
+def riot_shaped(timeline: dict, rng: random.Random) -> dict:
+    for fr in timeline["info"]["frames"]:
+        for snap in fr["participantFrames"].values():
+            snap["championStats"] = {k: rng.randint(0, 5000) for k in CHAMPION_STATS}
+            snap["damageStats"] = {k: rng.randint(0, 90000) for k in DAMAGE_STATS}
+            snap["timeEnemySpentControlled"] = rng.randint(0, 90000)
+        ts = fr["timestamp"]
+        for _ in range(rng.randint(6, 14)):
+            fr["events"].append({"type": "SKILL_LEVEL_UP", "participantId": rng.randint(1, 10),
+                                 "skillSlot": rng.randint(1, 4), "levelUpType": "NORMAL", "timestamp": ts + rng.randint(0, 59_999)})
+        for _ in range(rng.randint(0, 3)):
+            damage = [{"basic": False, "magicDamage": rng.randint(0, 900), "name": "Champ", "participantId": rng.randint(1, 10),
+                       "physicalDamage": rng.randint(0, 900), "spellName": "spell", "spellSlot": rng.randint(0, 3),
+                       "trueDamage": rng.randint(0, 200), "type": "OTHER"} for _ in range(rng.randint(3, 8))]
+            fr["events"].append({"type": "CHAMPION_KILL", "killerId": rng.randint(1, 10), "victimId": rng.randint(1, 10),
+                                 "assistingParticipantIds": rng.sample(range(1, 11), 2), "bounty": 300, "shutdownBounty": 0,
+                                 "killStreakLength": 0, "position": {"x": rng.randint(0, 15000), "y": rng.randint(0, 15000)},
+                                 "victimDamageDealt": damage, "victimDamageReceived": damage, "timestamp": ts + rng.randint(0, 59_999)})
+    return timeline
+
+def write_fixtures(path: str, archive: str | None, patch: str, n: int) -> tuple[int, int]:
+    count = size = 0
+    with open(path, "wb") as out:
+        if archive:
+            from riot.storage import Storage
+            from riot.segments import SegmentReader
+            for _, _, payload in SegmentReader(Storage("local", archive)).iter_patch(patch, "timeline"):
+                out.write(payload + b"\n")
+                count, size = count + 1, size + len(payload)
+                if count >= n:
+                    break
+        else:
+            from bench.synthetic import SyntheticMatches
+            rng = random.Random(4)
+            for _, tl in SyntheticMatches(seed=4).matches(n):
+                payload = json.dumps(riot_shaped(tl, rng), separators=(",", ":")).encode()
+                out.write(payload + b"\n")
+                count, size = count + 1, size + len(payload)
+    return count, size
+
+def reset_peak() -> bool:
+    # Linux: "5" resets VmHWM, so loading the fixtures doesn't count towards the peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mib() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux, never reset
+
+def rss_mib() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def child(variant: str, path: str):
+    from riot import decoding as D
+    with open(path, "rb") as f:
+        payloads = [line[:-1] for line in f]
+    if variant == "msgspec-typed":
+        decode = lambda b: D.extract_timeline(b)
+    else:
+        if variant == "json":
+            loads = json.loads
+        elif variant == "orjson":
+            import orjson
+            loads = orjson.loads
+        else:
+            import msgspec
+            loads = msgspec.json.Decoder().decode
+        decode = lambda b: D._from_dict(loads(b))
+    if variant == "msgspec-typed" and D._typed_decoder() is None:
+        raise RuntimeError("msgspec is not installed")
+    base = rss_mib()
+    reset_peak()
+    kept, samples = [], []
+    for b in payloads:
+        t0 = time.perf_counter()
+        kept.append(decode(b))
+        samples.append((time.perf_counter() - t0) * 1000)
+    rows = sum(len(c.f_minute) + len(c.e_ts) for c in kept)
+    digest = hash(tuple((c.match_id, bytes(c.f_gold), bytes(c.e_item), bytes(c.e_kind)) for c in kept))
+    print(json.dumps({"variant": variant, "ms": statistics.mean(samples), "p50": statistics.median(samples),
+                      "peak_mib": peak_rss_mib() - base, "rows": rows, "digest": digest}))
+
+def main():
+    ap = argparse.ArgumentParser(description="full vs selective timeline decoding")
+    ap.add_argument("--archive", help="local raw archive root with recorded timelines")
+    ap.add_argument("--patch", default="25.17")
+    ap.add_argument("--timelines", type=int, default=300)
+    ap.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    ap.add_argument("--fixtures", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child, args.fixtures)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "timelines.ndjson")
+        n, size = write_fixtures(path, args.archive, args.patch, args.timelines)
+        print(f"timelines={n} mean size={size / max(n, 1) / 1024:.0f} KiB source={args.archive or 'synthetic'}")
+        print(f"{'variant':<14} {'mean':>9} {'p50':>9} {'peak RSS':>10}  same rows")
+        want = None
+        for variant in VARIANTS:
+            env = dict(os.environ, PYTHONHASHSEED="0")
+            p = subprocess.run([sys.executable, "-m", "bench.timeline_decode_bench", "--child", variant, "--fixtures", path],
+                               capture_output=True, text=True, env=env)
+            if p.returncode != 0:
+                print(f"{variant:<14} skipped: {p.stderr.strip().splitlines()[-1]}")
+                continue
+            r = json.loads(p.stdout)
+            want = r["digest"] if want is None else want
+            print(f"{variant:<14} {r['ms']:7.2f}ms {r['p50']:7.2f}ms {r['peak_mib']:8.1f}MiB  {r['digest'] == want}")
+
+if __name__ == "__main__":
+    main()
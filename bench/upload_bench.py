@@ -0,0 +1,126 @@
+# bench/upload_bench.py
+"""
+Crawler archive uploads inline against the background Uploader (riot/uploader.py), on a local
+Storage stand-in that adds object-store PUT latency and fails a share of PUTs.
+
+  python -m bench.upload_bench --matches 200 --fetch-ms 100 --put-ms 80 --fail 0.05 --workers 4
+
+Each simulated match spends --fetch-ms on its two Riot calls, then goes through Crawler.archive /
+flush_archive, exactly as process_one runs them. The ledger stand-in checks that every payload of
+a match is on disk when finish_match is called, and that every match is finished exactly once.
+It reports matches/s, the uploader's retry / give-up counts and the put latency percentiles from
+riot.metrics.Metrics.
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+
+from riot.storage import Storage
+from riot.crawler import Crawler
+from riot.metrics import Metrics
+from riot.uploader import Uploader
+from bench.synthetic import SyntheticMatches
+
+class FlakyStorage(Storage):
+    """Local backend with a PUT latency and failure rate; a failed PUT writes nothing."""
+    def __init__(self, root: str, put_ms: float, fail: float, seed: int = 1, **kwargs):
+        super().__init__("local", root, **kwargs)
+        self.put_ms = put_ms
+        self.fail = fail
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def put(self, key: str, payload: bytes, content_type: str = "application/json"):
+        with self._rng_lock:
+            latency = self._rng.uniform(0.5, 1.5) * self.put_ms / 1000
+            failed = self._rng.random() < self.fail
+        time.sleep(latency)
+        if failed:
+            raise ConnectionError(f"injected PUT failure for {key}")
+        super().put(key, payload, content_type)
+
+class CheckingLedger:
+    def __init__(self, storage: Storage, patch: str):
+        self.storage = storage
+        self.patch = patch
+        self.finished: dict[str, int] = {}
+        self.not_durable: list[str] = []
+        self._lock = threading.Lock()
+
+    def finish_match(self, match_id: str, region: str, queue_id: int) -> bool:
+        if self.storage.segments is None:
+            for kind in ("match", "timeline"):
+                if not os.path.exists(os.path.join(self.storage.root, self.storage._path(self.patch, region, match_id, kind))):
+                    self.not_durable.append(match_id)
+        with self._lock:
+            self.finished[match_id] = self.finished.get(match_id, 0) + 1
+        return True
+
+    def extend_leases(self, queue_ids: list[int], lease_s: int = 300) -> int:
+        return len(queue_ids)
+
+def make_crawler(storage: Storage, patch: str, workers: int, retries: int) -> Crawler:
+    c = Crawler.__new__(Crawler)  # no Riot client / DB: only the archive path is exercised
+    c.patch = patch
+    c.storage = storage
+    c.metrics = Metrics()
+    c.ledger = CheckingLedger(storage, patch)
+    c._unflushed = []
+    c._held, c._held_lock, c._renewed_at, c.match_lease_s = set(), threading.Lock(), time.monotonic(), 300
+    c.uploader = Uploader(workers=workers, max_queue=workers * 4, retries=retries, backoff_s=0.05,
+                          metrics=c.metrics) if workers > 0 else None
+    return c
+
+def run(name: str, root: str, payloads, args, workers: int, compaction=None) -> dict:
+    shutil.rmtree(root, ignore_errors=True)
+    storage = FlakyStorage(root, args.put_ms, args.fail if workers > 0 else 0.0, compaction=compaction)
+    c = make_crawler(storage, args.patch, workers, args.retries)
+    t0 = time.perf_counter()
+    for qid, (mid, m, tl) in enumerate(payloads):
+        time.sleep(args.fetch_ms / 1000)  # the two rate-limited Riot calls
+        c.archive(mid, "americas", qid, m, tl)
+    c.flush_archive()
+    if c.uploader is not None:
+        c.uploader.close()
+    elapsed = time.perf_counter() - t0
+    led = c.ledger
+    lost = set(led.finished) ^ {mid for mid, _, _ in payloads}
+    dupes = [mid for mid, n in led.finished.items() if n > 1]
+    given_up = c.uploader.given_up if c.uploader is not None else 0
+    put = c.metrics.histogram("upload_duration_seconds")
+    return {"name": name, "per_s": len(payloads) / elapsed, "finished": len(led.finished),
+            "not_durable": len(led.not_durable), "unfinished": len(lost), "dupes": len(dupes),
+            "retries": int(c.metrics.counter("uploads_total", result="error")), "given_up": given_up,
+            "p50": put.quantile(0.5) * 1000 if put else 0.0,
+            "p95": put.quantile(0.95) * 1000 if put else 0.0}
+
+def main():
+    ap = argparse.ArgumentParser(description="inline vs background archive uploads")
+    ap.add_argument("--dir", default="/tmp/upload_bench")
+    ap.add_argument("--matches", type=int, default=200)
+    ap.add_argument("--patch", default="25.17")
+    ap.add_argument("--fetch-ms", type=float, default=100, help="time for one match's two Riot calls")
+    ap.add_argument("--put-ms", type=float, default=80, help="mean object-store PUT latency")
+    ap.add_argument("--fail", type=float, default=0.05, help="share of PUTs that fail (uploader runs only)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--retries", type=int, default=5)
+    args = ap.parse_args()
+
+    gen = SyntheticMatches(seed=6, patch=args.patch)
+    payloads = [(m["metadata"]["matchId"], json.dumps(m).encode(), json.dumps(tl).encode())
+                for m, tl in gen.matches(args.matches)]
+    print(f"matches={args.matches} fetch={args.fetch_ms:.0f}ms put={args.put_ms:.0f}ms fail={args.fail:.0%}")
+    print(f"{'mode':<22} {'matches/s':>10} {'finished':>9} {'not durable':>12} {'unfinished':>11} "
+          f"{'retries':>8} {'gave up':>8} {'put p50':>8} {'p95':>7}")
+    for name, workers, compaction in (("inline", 0, None), (f"uploader x{args.workers}", args.workers, None),
+                                      ("segments + uploader", args.workers, dict(codec="gz", max_records=50))):
+        r = run(name, os.path.join(args.dir, name.split()[0]), payloads, args, workers, compaction)
+        print(f"{r['name']:<22} {r['per_s']:>10.1f} {r['finished']:>9} {r['not_durable']:>12} {r['unfinished']:>11} "
+              f"{r['retries']:>8} {r['given_up']:>8} {r['p50']:>6.0f}ms {r['p95']:>5.0f}ms")
+
+if __name__ == "__main__":
+    main()
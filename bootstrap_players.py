@@ -85,19 +85,33 @@ def summoner_by_id(platform: str, encrypted_summoner_id: str) -> dict | None:
         return None
     return data
 
-def enqueue_puuid(conn: psycopg.Connection, puuid: str, platform: str):
+def enqueue_puuids(conn: psycopg.Connection, puuids: list[str], platform: str) -> tuple[int, int]:
+    """
+    Upserts a batch of PUUIDs in one statement. Returns (inserted, updated).
+    The batch is deduped first: ON CONFLICT DO UPDATE can't touch the same row twice.
+    """
     regional = PLATFORM_TO_REGIONAL.get(platform.lower())
     if not regional:
         raise ValueError(f"No regional mapping for platform {platform}")
+    batch = list(dict.fromkeys(pu for pu in puuids if pu))
+    if not batch:
+        return 0, 0
     with conn.cursor() as cur:
         cur.execute("""
           INSERT INTO lol.seed_queue(puuid, region_routing, status)
-          VALUES (%s,%s,'PENDING')
+          SELECT pu, %s, 'PENDING' FROM unnest(%s::text[]) AS pu
           ON CONFLICT (puuid) DO UPDATE
             SET region_routing = EXCLUDED.region_routing,
                 status = CASE WHEN lol.seed_queue.status='ERROR' THEN 'PENDING' ELSE lol.seed_queue.status END,
                 updated_at = now()
-        """, (puuid, regional))
+          RETURNING (xmax = 0) AS inserted
+        """, (regional, batch))
+        flags = [r[0] for r in cur.fetchall()]
+    inserted = sum(flags)
+    return inserted, len(flags) - inserted
+
+def enqueue_puuid(conn: psycopg.Connection, puuid: str, platform: str):
+    enqueue_puuids(conn, [puuid], platform)
 
 def main():
     ap = argparse.ArgumentParser(description="Bootstrap seed_queue from ladder")
@@ -106,14 +120,32 @@ def main():
     ap.add_argument("--division", default="I", help="I|II|III|IV (ignored for MASTER+)")
     ap.add_argument("--queue", default="RANKED_SOLO_5x5")
     ap.add_argument("--pages", type=int, default=2, help="ladder pages to sample for non-MASTER+ tiers")
+    ap.add_argument("--batch", type=int, default=500, help="PUUIDs per enqueue statement")
     args = ap.parse_args()
 
     tier = args.tier.upper()
     log.info(f"Bootstrapping: platform={args.platform} tier={tier} div={args.division} queue={args.queue} pages={args.pages}")
 
     total_enqueued = 0
+    total_new = 0
+    pending: list[str] = []
     with psycopg.connect(PG_DSN, autocommit=True) as conn:
 
+        def flush():
+            nonlocal total_enqueued, total_new
+            if not pending:
+                return
+            inserted, updated = enqueue_puuids(conn, pending, args.platform)
+            total_enqueued += inserted + updated
+            total_new += inserted
+            pending.clear()
+            log.info(f"Enqueued so far: {total_enqueued} (new: {total_new})")
+
+        def add(puuid: str):
+            pending.append(puuid)
+            if len(pending) >= args.batch:
+                flush()
+
         if tier in MASTER_PLUS:
             # Single call; large list
             entries = league_entries_master_plus(args.platform, args.queue, tier)
@@ -121,10 +153,7 @@ def main():
             for e in entries:
                 puuid = e.get("puuid")
                 if puuid:
-                    enqueue_puuid(conn, puuid, args.platform)
-                    total_enqueued += 1
-                    if total_enqueued % 100 == 0:
-                        log.info(f"Enqueued so far: {total_enqueued}")
+                    add(puuid)
                     continue
 
                 sid = e.get("summonerId")
@@ -134,8 +163,7 @@ def main():
                 summ = summoner_by_id(args.platform, sid)
                 if not summ:
                     continue
-                enqueue_puuid(conn, summ["puuid"], args.platform)
-                total_enqueued += 1
+                add(summ["puuid"])
         else:
             # Paged flow
             for page in range(1, args.pages + 1):
@@ -150,8 +178,7 @@ def main():
 
                     puuid = e.get("puuid")
                     if puuid:
-                        enqueue_puuid(conn, puuid, args.platform)
-                        total_enqueued += 1
+                        add(puuid)
                         continue
 
                     sid = e.get("summonerId")
@@ -159,13 +186,14 @@ def main():
                         summ = summoner_by_id(args.platform, sid)
                         if not summ:
                             continue
-                        enqueue_puuid(conn, summ["puuid"], args.platform)
-                        total_enqueued += 1
+                        add(summ["puuid"])
                         continue
 
                     log.warning(f"Entry missing both puuid and summonerId on page {page}: {str(e)[:160]}")
+                flush()
+        flush()
 
-    log.info(f"Bootstrap complete. Total enqueued: {total_enqueued}")
+    log.info(f"Bootstrap complete. Total enqueued: {total_enqueued} (new: {total_new})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,167 @@
+# export_parquet.py
+"""
+Exports the lol fact tables to Parquet for the DuckDB engine of /stats/flexible (api/duck.py,
+FLEX_ENGINE=duckdb), one file per table and patch:
+
+  <dir>/matches/p14_3/data.parquet, <dir>/participants/p14_3/data.parquet, ..., <dir>/items.parquet
+  <dir>/manifest.json   patch -> {dir, version, matches}; what the engine reads and stamps its cache with
+
+  python export_parquet.py                    # patches whose lol.data_versions changed since the last run
+  python export_parquet.py --patch 14.3 --force
+  python export_parquet.py --every 300        # keep exporting every 5 minutes
+
+Each patch is read in one REPEATABLE READ transaction, so its four files and the version recorded
+for it come from the same snapshot. Files are written to <dir>/.staging and moved into place with
+os.replace, so a running engine sees either the old or the new file, never a partial one.
+Patches no longer attached (manage_partitions.py detach) are removed from the export.
+"""
+import os, re, json, time, shutil, argparse
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import duckdb
+import psycopg
+from psycopg import sql
+
+from util.logging import setup_logger
+
+load_dotenv()
+log = setup_logger("export_parquet")
+
+PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
+PARQUET_DIR = os.getenv("FLEX_PARQUET_DIR", "parquet")
+MANIFEST = "manifest.json"
+# sort order inside each file; frames lead with minute so the engine's minute filter skips row groups
+FACT_ORDER = {
+    "matches": "match_key",
+    "participants": "match_key, player_key",
+    "participant_frames": "minute, match_key, player_key",
+    "item_events": "match_key, player_key, ts_ms",
+}
+# children first, so a reader never sees participants of a match file that isn't there yet
+REPLACE_ORDER = ("item_events", "participant_frames", "participants", "matches")
+DUCK_TYPES = {
+    "bigint": "BIGINT", "integer": "INTEGER", "smallint": "SMALLINT", "boolean": "BOOLEAN",
+    "text": "VARCHAR", "timestamp with time zone": "TIMESTAMPTZ", "double precision": "DOUBLE",
+}
+
+def patch_dir(patch: str) -> str:
+    """Same naming as lol.patch_partition_suffix: '14.3' -> 'p14_3'."""
+    return "p" + re.sub(r"[^0-9A-Za-z]+", "_", patch)
+
+def load_manifest(root: str) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"patches": {}}
+
+def save_manifest(root: str, manifest: dict):
+    manifest["exported_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    tmp = os.path.join(root, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+def column_types(conn: psycopg.Connection, table: str) -> dict[str, str]:
+    rows = conn.execute("""
+      SELECT column_name, data_type FROM information_schema.columns
+      WHERE table_schema = 'lol' AND table_name = %s ORDER BY ordinal_position
+    """, (table,)).fetchall()
+    return {name: DUCK_TYPES.get(t, "VARCHAR") for name, t in rows}
+
+def copy_table(conn: psycopg.Connection, duck: duckdb.DuckDBPyConnection, query: sql.Composable,
+               params: tuple, types: dict[str, str], dest: str, scratch: str) -> int:
+    """Streams one COPY ... TO STDOUT through a CSV scratch file into a zstd Parquet file; returns rows."""
+    csv_path = os.path.join(scratch, os.path.basename(dest) + ".csv")
+    with open(csv_path, "wb") as f, conn.cursor().copy(sql.SQL("COPY ({}) TO STDOUT (FORMAT csv)").format(query), params) as cp:
+        for chunk in cp:
+            f.write(chunk)
+    duck.execute(f"""
+      COPY (SELECT * FROM read_csv(?, header = false, columns = {duck_struct(types)}))
+      TO '{dest.replace("'", "''")}' (FORMAT parquet, COMPRESSION zstd)
+    """, [csv_path])
+    os.remove(csv_path)
+    return duck.execute("SELECT count(*) FROM read_parquet(?)", [dest]).fetchone()[0]
+
+def duck_struct(types: dict[str, str]) -> str:
+    return "{" + ", ".join(f"'{name}': '{t}'" for name, t in types.items()) + "}"
+
+def export_patch(conn: psycopg.Connection, duck: duckdb.DuckDBPyConnection, root: str, patch: str) -> dict:
+    """Writes one patch's four files and returns its manifest entry."""
+    staging = os.path.join(root, ".staging", patch_dir(patch))
+    os.makedirs(staging, exist_ok=True)
+    with conn.transaction():
+        version = conn.execute("SELECT COALESCE((SELECT version FROM lol.data_versions WHERE patch = %s), 0)",
+                               (patch,)).fetchone()[0]
+        counts = {}
+        for table, order in FACT_ORDER.items():
+            types = column_types(conn, table)
+            query = sql.SQL("SELECT {} FROM lol.{} WHERE patch = %s ORDER BY {}").format(
+                sql.SQL(", ").join(map(sql.Identifier, types)), sql.Identifier(table), sql.SQL(order))
+            counts[table] = copy_table(conn, duck, query, (patch,), types,
+                                       os.path.join(staging, f"{table}.parquet"), staging)
+    for table in REPLACE_ORDER:
+        final = os.path.join(root, table, patch_dir(patch))
+        os.makedirs(final, exist_ok=True)
+        os.replace(os.path.join(staging, f"{table}.parquet"), os.path.join(final, "data.parquet"))
+    shutil.rmtree(staging, ignore_errors=True)
+    log.info(f"patch {patch}: v{version} " + ", ".join(f"{t}={n:,}" for t, n in counts.items()))
+    return {"dir": patch_dir(patch), "version": int(version), "matches": counts["matches"]}
+
+def export_items(conn: psycopg.Connection, duck: duckdb.DuckDBPyConnection, root: str):
+    staging = os.path.join(root, ".staging")
+    os.makedirs(staging, exist_ok=True)
+    types = column_types(conn, "items")
+    query = sql.SQL("SELECT {} FROM lol.items").format(sql.SQL(", ").join(map(sql.Identifier, types)))
+    with conn.transaction():
+        copy_table(conn, duck, query, (), types, os.path.join(staging, "items.parquet"), staging)
+    os.replace(os.path.join(staging, "items.parquet"), os.path.join(root, "items.parquet"))
+
+def drop_patch(root: str, entry: dict):
+    for table in FACT_ORDER:
+        shutil.rmtree(os.path.join(root, table, entry["dir"]), ignore_errors=True)
+
+def run_once(conn: psycopg.Connection, root: str, patches: list[str] | None = None, force: bool = False) -> int:
+    """Exports changed (or the given) patches, prunes detached ones; returns how many patches were written."""
+    os.makedirs(root, exist_ok=True)
+    manifest = load_manifest(root)
+    exported = manifest["patches"]
+    with conn.transaction():
+        versions = dict(conn.execute("SELECT patch, version FROM lol.data_versions").fetchall())
+        attached = [p for (p,) in conn.execute("SELECT DISTINCT patch FROM lol.matches").fetchall()]
+    todo = [p for p in (patches or attached)
+            if p in attached and (force or exported.get(p, {}).get("version") != versions.get(p, 0))]
+    with duckdb.connect() as duck:
+        if todo or not os.path.exists(os.path.join(root, "items.parquet")):
+            export_items(conn, duck, root)
+        for patch in todo:
+            exported[patch] = export_patch(conn, duck, root, patch)
+            manifest["global"] = int(versions.get("*", 0))
+            save_manifest(root, manifest)  # after every patch, so an interrupted run keeps what it finished
+    if patches is None:
+        for patch in [p for p in exported if p not in attached]:
+            drop_patch(root, exported.pop(patch))
+            log.info(f"patch {patch}: no longer attached, removed from the export")
+    save_manifest(root, manifest)
+    return len(todo)
+
+def main():
+    ap = argparse.ArgumentParser(description="Export lol fact tables to Parquet for FLEX_ENGINE=duckdb")
+    ap.add_argument("--dir", default=PARQUET_DIR, help="export root (FLEX_PARQUET_DIR)")
+    ap.add_argument("--patch", action="append", help="only these patches (repeatable)")
+    ap.add_argument("--force", action="store_true", help="re-export even if the data version is unchanged")
+    ap.add_argument("--every", type=float, default=0, help="repeat every N seconds instead of running once")
+    args = ap.parse_args()
+
+    with psycopg.connect(PG_DSN) as conn:
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        while True:
+            t0 = time.perf_counter()
+            n = run_once(conn, args.dir, args.patch, args.force)
+            log.info(f"exported {n} patches to {args.dir} in {time.perf_counter() - t0:.1f}s")
+            if args.every <= 0:
+                break
+            time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# manage_partitions.py
+"""
+Maintains the per-patch partitions of the lol fact tables (restructure.sql, sql/partitions.sql).
+
+  python manage_partitions.py list
+  python manage_partitions.py create 14.3 14.4              # specific patches
+  python manage_partitions.py create-next --ahead 2         # the next 2 minor patches after the newest
+  python manage_partitions.py detach --keep 6               # everything but the 6 newest patches
+  python manage_partitions.py detach --patch 13.1 --drop    # drop instead of archiving
+
+Ingest creates a missing partition on first write, so create / create-next only keep that
+out of the hot path. detach takes a patch out of every fact table at once (children first),
+removes its cube rows and bumps its data version so cached /stats/flexible answers go stale.
+Archived partitions move to schema lol_archive as plain tables; to bring one back, move it to
+lol and ALTER TABLE lol.<table> ATTACH PARTITION lol.<table>_p<patch> FOR VALUES IN ('<patch>').
+"""
+import os, argparse
+from dotenv import load_dotenv
+import psycopg
+from psycopg import sql
+
+from util.logging import setup_logger
+
+load_dotenv()
+log = setup_logger("manage_partitions")
+
+PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
+ARCHIVE_SCHEMA = "lol_archive"
+# referencing tables first, so every foreign key is gone before its target partition leaves
+DETACH_ORDER = ("participant_frame_arrays", "item_events", "participant_frames", "participants", "matches")
+
+def patch_sort_key(patch: str) -> tuple:
+    return tuple(int(p) if p.isdigit() else -1 for p in patch.split("."))
+
+def list_partitions(conn: psycopg.Connection) -> dict[str, dict[str, str]]:
+    """patch -> {parent table name: partition name}"""
+    out: dict[str, dict[str, str]] = {}
+    for patch, parent, part in conn.execute("SELECT patch, parent::text, partition FROM lol.patch_partitions").fetchall():
+        out.setdefault(patch, {})[parent.split(".")[-1]] = part
+    return dict(sorted(out.items(), key=lambda kv: patch_sort_key(kv[0])))
+
+def create(conn: psycopg.Connection, patches: list[str]) -> int:
+    made = 0
+    for patch in patches:
+        n = conn.execute("SELECT lol.create_patch_partitions(%s)", (patch,)).fetchone()[0]
+        log.info(f"patch {patch}: {n} partitions created")
+        made += n
+    return made
+
+def next_patches(newest: str, ahead: int) -> list[str]:
+    """The `ahead` minor patches after `newest` ("14.3", 2 -> ["14.4", "14.5"]). Season rollovers are left to ingest."""
+    major, minor = newest.split(".")[:2]
+    return [f"{major}.{int(minor) + i}" for i in range(1, ahead + 1)]
+
+def detach(conn: psycopg.Connection, patch: str, parts: dict[str, str], drop: bool = False):
+    """Detaches one patch from every fact table in one transaction, then archives or drops the pieces."""
+    with conn.transaction(), conn.cursor() as cur:
+        # take the patch out of the cube while its matches are still attached
+        if conn.execute("SELECT to_regclass('lol.cube_matches')").fetchone()[0]:
+            cur.execute("DELETE FROM lol.cube_matches c USING lol.matches m WHERE m.match_id = c.match_id AND m.patch = %s", (patch,))
+            for t in ("cube_subject", "cube_pair", "cube_items"):
+                cur.execute(sql.SQL("DELETE FROM lol.{} WHERE patch = %s").format(sql.Identifier(t)), (patch,))
+        if not drop:
+            cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(ARCHIVE_SCHEMA)))
+        for table in DETACH_ORDER:
+            part = parts.get(table)
+            if part is None:
+                continue
+            cur.execute(sql.SQL("ALTER TABLE lol.{} DETACH PARTITION lol.{}").format(sql.Identifier(table), sql.Identifier(part)))
+            # a detached partition keeps copies of the parent's foreign keys; they would pin the
+            # partitions detached after it, and ATTACH recreates them anyway
+            cur.execute("""
+              SELECT conname FROM pg_constraint
+              WHERE contype = 'f' AND conrelid = (SELECT oid FROM pg_class WHERE relname = %s AND relnamespace = 'lol'::regnamespace)
+            """, (part,))
+            for (con,) in cur.fetchall():
+                cur.execute(sql.SQL("ALTER TABLE lol.{} DROP CONSTRAINT {}").format(sql.Identifier(part), sql.Identifier(con)))
+            if drop:
+                cur.execute(sql.SQL("DROP TABLE lol.{}").format(sql.Identifier(part)))
+            else:
+                cur.execute(sql.SQL("ALTER TABLE lol.{} SET SCHEMA {}").format(sql.Identifier(part), sql.Identifier(ARCHIVE_SCHEMA)))
+        if conn.execute("SELECT to_regclass('lol.data_versions')").fetchone()[0]:
+            cur.execute("""
+              INSERT INTO lol.data_versions (patch) VALUES (%s)
+              ON CONFLICT (patch) DO UPDATE SET version = lol.data_versions.version + 1, updated_at = now()
+            """, (patch,))
+    log.info(f"patch {patch}: {len(parts)} partitions {'dropped' if drop else 'archived to ' + ARCHIVE_SCHEMA}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Create / detach per-patch partitions of the lol fact tables")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="patches with attached partitions and their match counts")
+    p_create = sub.add_parser("create", help="create partitions for the given patches")
+    p_create.add_argument("patches", nargs="+")
+    p_next = sub.add_parser("create-next", help="create partitions for upcoming minor patches")
+    p_next.add_argument("--ahead", type=int, default=2)
+    p_detach = sub.add_parser("detach", help="detach old patches and archive (default) or drop them")
+    which = p_detach.add_mutually_exclusive_group(required=True)
+    which.add_argument("--patch", action="append", help="patch to detach (repeatable)")
+    which.add_argument("--keep", type=int, help="detach all but the newest N patches")
+    p_detach.add_argument("--drop", action="store_true", help="drop the detached partitions instead of archiving them")
+    p_detach.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    with psycopg.connect(PG_DSN, autocommit=True) as conn:
+        parts = list_partitions(conn)
+        if args.cmd == "list":
+            counts = dict(conn.execute("SELECT patch, count(*) FROM lol.matches GROUP BY patch").fetchall())
+            for patch, tables in parts.items():
+                print(f"{patch:<8} matches={counts.get(patch, 0):>9,}  partitions={len(tables)}")
+        elif args.cmd == "create":
+            create(conn, args.patches)
+        elif args.cmd == "create-next":
+            if not parts:
+                ap.error("no partitions yet; create the current patch first")
+            create(conn, next_patches(list(parts)[-1], args.ahead))
+        else:
+            if args.patch:
+                targets = [p for p in args.patch if p in parts]
+            else:
+                # rank by patches that hold matches, so partitions made ahead by create-next don't count
+                counts = dict(conn.execute("SELECT patch, count(*) FROM lol.matches GROUP BY patch").fetchall())
+                with_data = [p for p in parts if counts.get(p)]
+                targets = with_data[:-args.keep] if args.keep > 0 else list(parts)
+            for patch in targets:
+                if args.dry_run:
+                    log.info(f"would detach patch {patch}: {', '.join(parts[patch].values())}")
+                else:
+                    detach(conn, patch, parts[patch], drop=args.drop)
+
+if __name__ == "__main__":
+    main()
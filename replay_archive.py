@@ -0,0 +1,195 @@
+# replay_archive.py
+"""
+Replays the raw archive (riot/storage.py, riot/segments.py) into the lol tables without calling Riot,
+e.g. to refill them after a schema change instead of re-crawling.
+
+  python replay_archive.py --patch 25.17 --workers 8
+  python replay_archive.py --patch 25.17 --region americas --checkpoint replay.json
+  python replay_archive.py --patch 25.17 --restart           # ignore the saved checkpoint
+
+Match payloads are walked unit by unit (a segment, or one object in the per-payload layout) in key
+order. Each match is paired with its timeline through the timeline indexes, and a process pool
+fetches, decodes and flattens both (match_row / participant_rows / timeline_rows). The rows are loaded
+through BulkIngest. After every flush the checkpoint records the last unit whose matches are all
+committed, so a rerun resumes after it. Loads are idempotent, so a unit flushed only halfway is
+simply replayed again.
+Storage comes from OBJECT_BACKEND / BUCKET_NAME (and the S3_* settings) like the crawler, or --backend / --bucket.
+"""
+import os, json, time, argparse
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("RIOT_API_KEY", "")  # riot.client reads it at import time; replay never calls the API
+
+import psycopg
+
+from riot.storage import Storage
+from riot.segments import SegmentReader
+from riot.decoding import loads
+from run_seed import BulkIngest, FlushError, data_versions_enabled, match_row, participant_rows, timeline_rows, upsert_champions_items
+from util.logging import setup_logger
+
+log = setup_logger("replay_archive")
+
+PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
+CUBE_MAINTAIN = os.getenv("CUBE_MAINTAIN", "0") == "1"
+# "auto" bumps lol.data_versions whenever that table exists (see run_worker.py)
+BUMP_DATA_VERSIONS = os.getenv("BUMP_DATA_VERSIONS", "auto").lower()
+
+def build_storage(backend: str, bucket: str) -> Storage:
+    if backend in ("gcs", "local"):
+        return Storage(backend, bucket)
+    return Storage(
+        "s3",
+        bucket,
+        endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("S3_REGION"),
+    )
+
+# ---------- worker processes ----------
+_reader: SegmentReader | None = None
+
+def _init_worker(backend: str, bucket: str):
+    global _reader
+    _reader = SegmentReader(build_storage(backend, bucket))
+
+def parse_records(records: list[tuple]) -> list[tuple]:
+    """
+    (match_id, match source, timeline location) -> ("ok", match, participants, frames, events) or
+    ("error", match_id, message). A match source is ("frame", codec, bytes) cut from a segment the
+    parent already read, or ("loc", location) to fetch here; a missing timeline leaves no frames.
+    """
+    out = []
+    for match_id, src, tl_loc in records:
+        try:
+            raw = _reader.decode_frame(src[1], src[2]) if src[0] == "frame" else _reader.read(src[1])
+            m = loads(raw)
+            frames, events = timeline_rows(_reader.read(tl_loc)) if tl_loc is not None else ([], [])
+            out.append(("ok", match_row(m), participant_rows(m), frames, events))
+        except Exception as e:
+            out.append(("error", match_id, repr(e)))
+    return out
+
+# ---------- checkpoint ----------
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_checkpoint(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+# ---------- replay ----------
+def replay(conn: psycopg.Connection, reader: SegmentReader, pool: ProcessPoolExecutor, patch: str,
+           region: str | None, state: dict, checkpoint: str, workers: int, chunk: int, batch: int,
+           maintain_cube: bool = False, bump_versions: bool = False) -> dict:
+    scope = f"{patch}/{region or '*'}"
+    mine = state.setdefault(scope, {"after": None, "matches": 0, "errors": 0})
+    bulk = BulkIngest(conn, max_matches=1 << 30, maintain_cube=maintain_cube, bump_versions=bump_versions)
+    inflight: deque = deque()
+    stats = {"matches": 0, "errors": 0, "no_timeline": 0}
+    done_unit = mine["after"]
+    t0 = last_log = time.perf_counter()
+
+    def commit():
+        try:
+            bulk.flush()
+        except FlushError as e:
+            for mid, err in e.failed.items():
+                log.warning(f"skipping {mid}: {err}")
+            stats["matches"] -= len(e.failed)
+            stats["errors"] += len(e.failed)
+        mine.update(after=done_unit, matches=mine["matches"] + stats["matches"] - committed[0],
+                    errors=mine["errors"] + stats["errors"] - committed[1],
+                    updated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        committed[:] = [stats["matches"], stats["errors"]]
+        save_checkpoint(checkpoint, state)
+
+    def drain_one():
+        nonlocal done_unit, last_log
+        fut, closes = inflight.popleft()
+        for res, unit in zip(fut.result(), closes):
+            if res[0] == "ok":
+                bulk.add_rows(*res[1:])
+                stats["matches"] += 1
+            else:
+                stats["errors"] += 1
+                log.warning(f"skipping {res[1]}: {res[2]}")
+            if unit is not None:
+                done_unit = unit
+            if len(bulk) >= batch:
+                commit()
+        if time.perf_counter() - last_log >= 10:
+            last_log = time.perf_counter()
+            log.info(f"{scope}: {stats['matches']:,} matches, "
+                     f"{stats['matches'] / (last_log - t0) * 60:,.0f}/min, at {done_unit}")
+
+    committed = [0, 0]
+    task, closes = [], []
+    for key, reg, locs in reader.units(patch, "match", region, after=mine["after"]):
+        blob = reader.storage.get(key) if locs[0][1][0] == "segment" else None  # one GET per segment
+        for i, (match_id, loc) in enumerate(locs):
+            src = ("frame", loc[4], blob[loc[2]:loc[2] + loc[3]]) if blob is not None else ("loc", loc)
+            tl_loc = reader.locate(patch, reg, "timeline", match_id)
+            stats["no_timeline"] += tl_loc is None
+            task.append((match_id, src, tl_loc))
+            closes.append(key if i == len(locs) - 1 else None)
+            if len(task) >= chunk:
+                inflight.append((pool.submit(parse_records, task), closes))
+                task, closes = [], []
+                while len(inflight) > 2 * workers:
+                    drain_one()
+    if task:
+        inflight.append((pool.submit(parse_records, task), closes))
+    while inflight:
+        drain_one()
+    commit()
+    elapsed = time.perf_counter() - t0
+    stats["seconds"] = round(elapsed, 1)
+    stats["per_min"] = round(stats["matches"] / elapsed * 60) if elapsed > 0 else 0
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay archived match/timeline JSON into the lol tables")
+    ap.add_argument("--patch", action="append", required=True, help="archive patch folder (repeatable)")
+    ap.add_argument("--region", help="only this routing region folder")
+    ap.add_argument("--backend", default=os.getenv("OBJECT_BACKEND", "gcs"), help="gcs | s3 | local")
+    ap.add_argument("--bucket", default=os.getenv("BUCKET_NAME"), help="bucket, or directory for local")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--chunk", type=int, default=25, help="matches per worker task")
+    ap.add_argument("--batch", type=int, default=500, help="matches per BulkIngest flush / checkpoint")
+    ap.add_argument("--checkpoint", default="replay_checkpoint.json")
+    ap.add_argument("--restart", action="store_true", help="start over instead of resuming")
+    ap.add_argument("--refresh-static", action="store_true", help="upsert champions/items from Data Dragon first")
+    ap.add_argument("--maintain-cube", action="store_true", default=CUBE_MAINTAIN)
+    ap.add_argument("--bump-versions", action="store_true", help="bump lol.data_versions even if BUMP_DATA_VERSIONS=0")
+    args = ap.parse_args()
+    if not args.bucket:
+        ap.error("--bucket (or BUCKET_NAME) is required")
+
+    state = {} if args.restart else load_checkpoint(args.checkpoint)
+    reader = SegmentReader(build_storage(args.backend, args.bucket))
+    with psycopg.connect(PG_DSN, autocommit=True) as conn, \
+         ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args.backend, args.bucket)) as pool:
+        if args.refresh_static:
+            upsert_champions_items(conn)
+        bump = args.bump_versions or data_versions_enabled(conn, BUMP_DATA_VERSIONS)
+        for patch in args.patch:
+            if args.restart:
+                state.pop(f"{patch}/{args.region or '*'}", None)
+            stats = replay(conn, reader, pool, patch, args.region, state, args.checkpoint,
+                           args.workers, args.chunk, args.batch, args.maintain_cube, bump)
+            log.info(f"patch {patch}: {stats}")
+
+if __name__ == "__main__":
+    main()
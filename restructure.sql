@@ -18,8 +18,25 @@ CREATE TABLE lol.runes (
   rune_name  TEXT NOT NULL
 );
 
+-- Dictionary encoding: facts are keyed by these integers instead of the text ids
+-- ("NA1_5365324203", 78-char puuids), which keeps every fact index and join narrow.
+CREATE TABLE lol.match_keys (
+  match_key  BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  match_id   TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE lol.player_keys (
+  player_key INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  puuid      TEXT NOT NULL UNIQUE
+);
+
+-- The fact tables are LIST-partitioned by patch: flexible queries filter on it, and retiring an
+-- old patch is a DETACH instead of a DELETE. Every key carries patch because a partitioned
+-- table's primary / foreign keys must include the partition column. Partitions come from
+-- lol.create_patch_partitions (sql/partitions.sql), called by ingest and manage_partitions.py.
 CREATE TABLE lol.matches (
-  match_id       TEXT PRIMARY KEY,
+  match_key      BIGINT NOT NULL REFERENCES lol.match_keys(match_key),
+  match_id       TEXT NOT NULL,
   region         TEXT NOT NULL,
   queue_id       INT  NOT NULL,
   patch          TEXT NOT NULL,
@@ -27,12 +44,15 @@ CREATE TABLE lol.matches (
   game_start_ts  TIMESTAMPTZ NOT NULL,
   duration_s     INT  NOT NULL,
   skill_tier     TEXT,
-  blue_win       BOOLEAN NOT NULL
-);
+  blue_win       BOOLEAN NOT NULL,
+  PRIMARY KEY (match_key, patch),
+  UNIQUE (match_id, patch)
+) PARTITION BY LIST (patch);
 
 CREATE TABLE lol.participants (
-  match_id       TEXT REFERENCES lol.matches(match_id) ON DELETE CASCADE,
-  puuid          TEXT NOT NULL,
+  match_key      BIGINT NOT NULL,
+  player_key     INT  NOT NULL REFERENCES lol.player_keys(player_key),
+  patch          TEXT NOT NULL,
   team_id        INT  NOT NULL CHECK (team_id IN (100,200)),
   side           TEXT GENERATED ALWAYS AS (CASE WHEN team_id=100 THEN 'BLUE' ELSE 'RED' END) STORED,
   champ_id       INT  NOT NULL REFERENCES lol.champions(champ_id),
@@ -48,39 +68,43 @@ CREATE TABLE lol.participants (
   gold_earned    INT NOT NULL,
   damage_dealt   INT,
   item0 INT, item1 INT, item2 INT, item3 INT, item4 INT, item5 INT, item6 INT,
-  PRIMARY KEY (match_id, puuid)
-);
+  PRIMARY KEY (match_key, player_key, patch),
+  FOREIGN KEY (match_key, patch) REFERENCES lol.matches(match_key, patch) ON DELETE CASCADE
+) PARTITION BY LIST (patch);
 
 CREATE TABLE lol.participant_frames (
-  match_id   TEXT NOT NULL,
-  puuid      TEXT NOT NULL,
+  match_key  BIGINT NOT NULL,
+  player_key INT  NOT NULL,
+  patch      TEXT NOT NULL,
   minute     INT  NOT NULL,
   gold       INT  NOT NULL,
   xp         INT  NOT NULL,
   cs         INT  NOT NULL,
-  PRIMARY KEY (match_id, puuid, minute),
-  FOREIGN KEY (match_id, puuid) REFERENCES lol.participants(match_id, puuid) ON DELETE CASCADE
-);
+  PRIMARY KEY (match_key, player_key, minute, patch) INCLUDE (gold, xp),  -- covers subject_stats
+  FOREIGN KEY (match_key, player_key, patch) REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE
+) PARTITION BY LIST (patch);
 
 CREATE TABLE lol.item_events (
-  match_id     TEXT NOT NULL,
-  puuid        TEXT NOT NULL,
+  match_key    BIGINT NOT NULL,
+  player_key   INT   NOT NULL,
+  patch        TEXT  NOT NULL,
   ts_ms        BIGINT NOT NULL,
   event_type   TEXT  NOT NULL,   -- PURCHASE/SELL/UNDO
   item_id      INT   NOT NULL REFERENCES lol.items(item_id),
-  PRIMARY KEY (match_id, puuid, ts_ms, event_type, item_id),
-  FOREIGN KEY (match_id, puuid) REFERENCES lol.participants(match_id, puuid) ON DELETE CASCADE
-);
+  PRIMARY KEY (match_key, player_key, ts_ms, event_type, item_id, patch),
+  FOREIGN KEY (match_key, player_key, patch) REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE
+) PARTITION BY LIST (patch);
 
 -- Indexes
-CREATE INDEX ON lol.matches (patch, skill_tier, queue_id, region);
-CREATE INDEX ON lol.participants (lane_derived, champ_id, match_id);
-CREATE INDEX ON lol.participants (role_derived, champ_id, match_id);
-CREATE INDEX ON lol.participants (team_id, match_id);
+CREATE INDEX ON lol.matches (skill_tier, queue_id, region);  -- patch is the partition
+CREATE INDEX ON lol.participants (lane_derived, champ_id, match_key);
+CREATE INDEX ON lol.participants (role_derived, champ_id, match_key);
 CREATE INDEX ON lol.participants (win);
-CREATE INDEX ON lol.participant_frames (minute);
-CREATE INDEX ON lol.participant_frames (match_id, puuid);
-CREATE INDEX ON lol.item_events (puuid, match_id);
+-- covering / partial indexes for the flexible_filters.sql probes (sql/flex_indexes.sql, bench/index_advisor.py)
+CREATE INDEX participants_match_team_cover
+  ON lol.participants (match_key, team_id) INCLUDE (player_key, role_derived, champ_id, win, patch);
+CREATE INDEX item_events_purchase_cover
+  ON lol.item_events (match_key, player_key) INCLUDE (item_id, patch) WHERE event_type = 'PURCHASE';
 CREATE INDEX ON lol.item_events (item_id);
 
 COMMIT;
@@ -0,0 +1,134 @@
+# riot/async_fetch.py
+import os
+import asyncio
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+from .rate_limit import MultiLimiter, retry_after
+from .decoding import loads
+
+# Override to point at a local stub, e.g. "http://127.0.0.1:8765/{routing}"
+RIOT_BASE_URL = os.getenv("RIOT_BASE_URL", "https://{routing}.api.riotgames.com")
+
+class AsyncMultiLimiter:
+    """
+    asyncio front for rate_limit.MultiLimiter: same windows, method buckets and
+    Retry-After feedback, but waiting yields to the event loop instead of blocking.
+    Pass a shared core (e.g. a PgLimiter) to share the budget with other processes.
+    Waiters on the same key are served in arrival order.
+    """
+    def __init__(self, per_sec: int = 20, per_2min: int = 100, core: Optional[MultiLimiter] = None):
+        self.core = core or MultiLimiter(per_sec=per_sec, per_2min=per_2min)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, key: str, method: Optional[str] = None):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            while True:
+                wait = self.core.reserve(key, method)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def observe(self, key: str, method: Optional[str], status: int, headers) -> None:
+        self.core.observe(key, method, status, headers)
+
+class AsyncMatchFetcher:
+    """
+    Keeps up to `concurrency` match/timeline requests in flight per routing region,
+    all drawing from one shared AsyncMultiLimiter, and hands finished
+    (match, timeline) pairs to a bounded asyncio.Queue for the DB writer.
+    5xx responses are retried with the same backoff as RiotClient._get.
+    """
+    def __init__(self, api_key: str, limiter: Optional[AsyncMultiLimiter] = None,
+                 concurrency: int = 8, base_url: str = RIOT_BASE_URL, timeout: float = 15.0,
+                 max_5xx_retries: int = 5):
+        self.api_key = api_key
+        self.max_5xx_retries = max_5xx_retries
+        self.limiter = limiter or AsyncMultiLimiter()
+        self.concurrency = concurrency
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={"X-Riot-Token": api_key, "User-Agent": "league-context/1.0"},
+            limits=httpx.Limits(max_connections=concurrency * 4, max_keepalive_connections=concurrency * 4),
+        )
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self.stats: Counter = Counter()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _url(self, routing: str, path: str) -> str:
+        return self.base_url.format(routing=routing.lower()) + path
+
+    async def _get(self, routing: str, path: str, method: str, params=None) -> Any:
+        url = self._url(routing, path)
+        key = MultiLimiter.key_for_routing(routing)
+        backoff = 1.0
+        failures_5xx = 0
+        while True:
+            await self.limiter.acquire(key, method)
+            r = await self.client.get(url, params=params)
+            self.stats["requests"] += 1
+            self.limiter.observe(key, method, r.status_code, r.headers)
+            if r.status_code == 429:
+                # the limiter now holds the Retry-After block, so the next acquire() waits it out
+                self.stats["http_429"] += 1
+                print(f"[async] 429 retry-after={retry_after(r.headers)}s url={url}", flush=True)
+                continue
+            if r.status_code >= 500 and failures_5xx < self.max_5xx_retries:
+                self.stats[f"http_{r.status_code}"] += 1
+                failures_5xx += 1
+                wait = max(retry_after(r.headers, 0.0), backoff)
+                print(f"[async] {r.status_code} retry {failures_5xx}/{self.max_5xx_retries} in {wait:.1f}s url={url}", flush=True)
+                await asyncio.sleep(wait)
+                backoff = min(backoff * 2, 16.0)
+                continue
+            r.raise_for_status()
+            return loads(r.content)
+
+    async def match_ids(self, routing: str, puuid: str, start: int = 0, count: int = 100,
+                        queue: Optional[int] = None) -> list[str]:
+        params: Dict[str, Any] = {"start": start, "count": count}
+        if queue is not None:
+            params["queue"] = queue
+        return await self._get(routing, f"/lol/match/v5/matches/by-puuid/{puuid}/ids", "matchlist", params=params)
+
+    async def fetch(self, routing: str, match_id: str) -> tuple[dict, dict]:
+        sem = self._sems.setdefault(routing.lower(), asyncio.Semaphore(self.concurrency))
+        async with sem:
+            match = await self._get(routing, f"/lol/match/v5/matches/{match_id}", "match")
+            timeline = await self._get(routing, f"/lol/match/v5/matches/{match_id}/timeline", "timeline")
+        return match, timeline
+
+    async def _fetch_into(self, routing: str, match_id: str, out: asyncio.Queue) -> Optional[Exception]:
+        """Fetches one match into `out`; returns the error instead of raising so the batch goes on."""
+        try:
+            pair = await self.fetch(routing, match_id)
+        except Exception as ex:
+            self.stats["errors"] += 1
+            print(f"[async] failed {match_id}: {ex!r}", flush=True)
+            return ex
+        self.stats["matches"] += 1
+        await out.put(pair)  # blocks when the writer falls behind
+        return None
+
+    async def run(self, routing: str, match_ids: Iterable[str], out: asyncio.Queue) -> Dict[str, Exception]:
+        """
+        Fetches the ids with at most `concurrency` tasks alive, each taking the next id when it's done
+        with one, so a long id list never becomes that many pending tasks. Returns the ids that failed.
+        """
+        ids = iter(match_ids)
+        failed: Dict[str, Exception] = {}
+
+        async def worker():
+            for mid in ids:
+                err = await self._fetch_into(routing, mid, out)
+                if err is not None:
+                    failed[mid] = err
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return failed
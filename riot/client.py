@@ -4,6 +4,8 @@ from typing import Any
 
 from dotenv import load_dotenv
 
+from .decoding import loads
+
 load_dotenv()
 
 RIOT_KEY = os.environ["RIOT_API_KEY"]
@@ -16,13 +18,14 @@ def _sleep_backoff(resp: requests.Response) -> bool:
         return True
     return False
 
-def request_json(url: str) -> Any:
+def request_json(url: str, raw: bool = False) -> Any:
+    """Decoded response, or with raw=True the body as Riot sent it (decode later, or just archive it)."""
     while True:
         r = requests.get(url, headers=HEAD, timeout=30)
         if _sleep_backoff(r): 
             continue
         r.raise_for_status()
-        return r.json()
+        return r.content if raw else loads(r.content)
 
 def match_ids_by_puuid(routing: str, puuid: str, start=0, count=100, queue=None, start_time=None, end_time=None):
     base = f"https://{routing}.api.riotgames.com"
@@ -33,13 +36,13 @@ def match_ids_by_puuid(routing: str, puuid: str, start=0, count=100, queue=None,
     url = f"{base}/lol/match/v5/matches/by-puuid/{puuid}/ids?{'&'.join(params)}"
     return request_json(url)
 
-def get_match(routing: str, match_id: str):
+def get_match(routing: str, match_id: str, raw: bool = False):
     url = f"https://{routing}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    return request_json(url)
+    return request_json(url, raw)
 
-def get_timeline(routing: str, match_id: str):
+def get_timeline(routing: str, match_id: str, raw: bool = False):
     url = f"https://{routing}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
-    return request_json(url)
+    return request_json(url, raw)
 
 # Data Dragon (names)
 def ddragon_versions():
@@ -1,13 +1,15 @@
-﻿import os, time
+﻿import os, time, threading
 from datetime import datetime, timedelta, timezone
 from typing import Iterable, Optional
 import psycopg
 
 from .riot_api import RiotClient
-from .rate_limit import MultiLimiter
+from .rate_limit import build_limiter
 from .storage import Storage
 from .ledger import Ledger
 from .metrics import Metrics
+from .seen_filter import SeenFilter
+from .uploader import Uploader
 
 def unix_seconds(dt) -> int:
     return int(dt.replace(tzinfo=timezone.utc).timestamp())
@@ -55,32 +57,125 @@ class Crawler:
         #       RIOT_PLATFORM should be the routing region (americas/europe/asia/sea)
         self.region = os.environ["RIOT_REGION"]
         self.platform = os.environ["RIOT_PLATFORM"]
-        self.api = RiotClient(os.environ["RIOT_API_KEY"], self.region, self.platform)
+        # Rate limiter for Riot API since we are limited until we obtain a production-grade API key (shared by all clients).
+        # RATE_LIMIT_BACKEND=postgres shares one budget between every crawler process pointed at the same DB.
+        self.limiter = build_limiter(
+            os.environ.get("RATE_LIMIT_BACKEND", "memory"),
+            dsn=os.environ.get("PG_DSN"),
+            per_sec=int(os.environ.get("RATE_LIMIT_PER_SEC", "20")),
+            per_2min=int(os.environ.get("RATE_LIMIT_PER_2MIN", "100")),
+        )
+        self.metrics = Metrics()
+        self.api = RiotClient(os.environ["RIOT_API_KEY"], self.region, self.platform, limiter=self.limiter,
+                              metrics=self.metrics)
 
         self.patch = os.environ.get("PATCH_TAG", "dev")
         self.queue = int(os.environ.get("QUEUE", "420"))
 
         backend = os.environ.get("OBJECT_BACKEND", "gcs")
         bucket = os.environ["BUCKET_NAME"]
-        if backend == "gcs":
-            self.storage = Storage("gcs", bucket)
+        # OBJECT_COMPACTION=zst|gz archives into rolling NDJSON segments (riot/segments.py) instead of one object per payload
+        codec = os.environ.get("OBJECT_COMPACTION", "")
+        compaction = dict(
+            codec=codec,
+            max_bytes=int(float(os.environ.get("SEGMENT_MAX_MB", "64")) * 1024 * 1024),
+            max_records=int(os.environ.get("SEGMENT_MAX_RECORDS", "2000")),
+            max_age_s=float(os.environ.get("SEGMENT_MAX_AGE_S", "300")),
+        ) if codec else None
+        # OBJECT_COMPRESSION=zst|gz compresses one-object-per-payload archives as they're uploaded
+        object_codec = os.environ.get("OBJECT_COMPRESSION", "") or None
+        if backend in ("gcs", "local"):
+            self.storage = Storage(backend, bucket, compaction=compaction, object_codec=object_codec)
         else:
             self.storage = Storage(
                 "s3",
                 bucket,
+                compaction=compaction,
+                object_codec=object_codec,
                 endpoint_url=os.getenv("S3_ENDPOINT_URL"),
                 aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
                 aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
                 region_name=os.getenv("S3_REGION"),
             )
-        self.ledger = Ledger(os.environ["PG_DSN"])
-        # Rate limiter for Riot API since we are limited until we obtain a production-grade API key (shared by all clients)
-        self.limiter = MultiLimiter(per_sec=20, per_2min=100)
-        self.metrics = Metrics()
+        self.ledger = Ledger(os.environ["PG_DSN"], metrics=self.metrics)
+        # a match whose fetch / archive keeps failing is parked as 'failed' after this many tries
+        self.max_attempts = int(os.environ.get("MATCH_MAX_ATTEMPTS", "5"))
+        # match_queue lease; rows fetched but not yet durable (open segment, upload queue) keep renewing it
+        self.match_lease_s = int(os.environ.get("MATCH_LEASE_S", "300"))
         self.metrics.start_reporter(interval=10.0)
+        # Prometheus text format on http://127.0.0.1:METRICS_PORT/metrics (unset = off)
+        if os.environ.get("METRICS_PORT"):
+            self.metrics.serve(int(os.environ["METRICS_PORT"]), os.environ.get("METRICS_HOST", "127.0.0.1"))
+        # Archive uploads run on a background pool (riot/uploader.py) so PUT latency stays off the
+        # Riot request path; UPLOAD_WORKERS=0 uploads inline.
+        upload_workers = int(os.environ.get("UPLOAD_WORKERS", "4"))
+        self.uploader = Uploader(
+            workers=upload_workers,
+            max_queue=int(os.environ.get("UPLOAD_QUEUE", "64")),
+            retries=int(os.environ.get("UPLOAD_RETRIES", "5")),
+            metrics=self.metrics,
+        ) if upload_workers > 0 else None
+        # Approximate "have we stored this match?" in front of seen_match_ids. SEEN_FILTER_MB=0 disables it.
+        # A miss skips the DB check, which is only sound while this is the one crawler draining the ledger:
+        # the filter holds this process's additions only. CRAWLER_INSTANCES > 1 turns it off.
+        instances = int(os.environ.get("CRAWLER_INSTANCES", "1"))
+        instance = os.environ.get("CRAWLER_INSTANCE", "0")
+        self.seen_filter_path = os.environ.get("SEEN_FILTER_PATH", f"seen_filter.{instance}.bin")
+        memory_bytes = int(float(os.environ.get("SEEN_FILTER_MB", "8")) * 1024 * 1024)
+        if instances > 1 and memory_bytes > 0:
+            print(f"[seen] {instances} crawlers share the ledger, a filter miss wouldn't mean new; filter off")
+            memory_bytes = 0
+        self.seen_filter = self._load_seen_filter(
+            memory_bytes=memory_bytes,
+            expected_items=int(os.environ.get("SEEN_FILTER_EXPECTED", "5000000")),
+        )
+        self._seen_filter_dirty = 0
+        # saved after a drain batch once this many ids were added since the last save (and at the end of drain)
+        self.seen_filter_save_every = int(os.environ.get("SEEN_FILTER_SAVE_EVERY", "1000"))
+        # matches whose payloads sit in an unflushed segment; finished in the ledger once it's written
+        self._unflushed: list[tuple[str, str, int]] = []
+        # queue ids archived but not finished yet; their leases are renewed until finish_match runs
+        self._held: set[int] = set()
+        self._held_lock = threading.Lock()
+        self._renewed_at = time.monotonic()
+
+    def _load_seen_filter(self, memory_bytes: int, expected_items: int) -> Optional[SeenFilter]:
+        if memory_bytes <= 0:
+            return None
+        if os.path.exists(self.seen_filter_path):
+            try:
+                sf = SeenFilter.load(self.seen_filter_path)
+                if sf.m == memory_bytes * 8:
+                    print(f"[seen] loaded filter {self.seen_filter_path}: {sf.count} ids, est. fp={sf.estimated_fp_rate():.4f}")
+                    return sf
+                print("[seen] filter budget changed, rebuilding")
+            except (OSError, ValueError) as ex:
+                print(f"[seen] could not load {self.seen_filter_path}: {ex}; rebuilding")
+        sf = SeenFilter(memory_bytes=memory_bytes, expected_items=expected_items)
+        sf.update(self.ledger.iter_seen_ids())
+        sf.save(self.seen_filter_path)
+        print(f"[seen] built filter from DB: {sf.count} ids, est. fp={sf.estimated_fp_rate():.4f}")
+        return sf
+
+    def save_seen_filter(self, force: bool = True):
+        """Writes the filter if ids were added since the last save; without force only once SEEN_FILTER_SAVE_EVERY piled up."""
+        if not force and self._seen_filter_dirty < self.seen_filter_save_every:
+            return
+        if self.seen_filter is not None and self._seen_filter_dirty:
+            self.seen_filter.save(self.seen_filter_path)
+            self._seen_filter_dirty = 0
+
+    def _enqueue(self, region: str, match_ids: list[str]) -> int:
+        """enqueue_matches minus ids we already stored; only filter hits cost a DB check."""
+        ids = list(dict.fromkeys(match_ids))
+        if self.seen_filter is not None:
+            maybe = [mid for mid in ids if self.seen_filter.might_contain(mid)]
+            if maybe:
+                stored = self.ledger.seen_many(maybe)
+                ids = [mid for mid in ids if mid not in stored]
+        return self.ledger.enqueue_matches(region, ids) if ids else 0
 
     def seed_from_challenger(self, limit: int = 50) -> int:
-        self.limiter.acquire(MultiLimiter.key_for_platform(self.platform))
         entries = self.api.get_challenger_entries() or []
         print(f"[seed] challenger entries: {len(entries)}")
         if not entries:
@@ -99,10 +194,8 @@ class Crawler:
                 sname = e.get("summonerName")
                 try:
                     if sid:
-                        self.limiter.acquire(MultiLimiter.key_for_platform(self.platform))
                         summ = self.api.get_summoner_by_id(sid)
                     elif sname:
-                        self.limiter.acquire(MultiLimiter.key_for_platform(self.platform))
                         summ = self.api.get_summoner_by_name(sname)
                     else:
                         print(f"[seed] entry missing puuid/summonerId/summonerName, skipping")
@@ -117,7 +210,6 @@ class Crawler:
                 continue
 
             try:
-                self.limiter.acquire(MultiLimiter.key_for_platform(self.platform))
                 match_ids = self.api.get_match_ids_by_puuid(
                     puuid, queue=self.queue, start=0, count=50, type_="ranked"
                 )
@@ -130,7 +222,7 @@ class Crawler:
                 continue
 
             # enqueue with routing region (self.platform) so the worker can fetch properly
-            added = self.ledger.enqueue_matches(self.platform, match_ids)
+            added = self._enqueue(self.platform, match_ids)
             total_enqueued += added
 
             if idx % 10 == 0:
@@ -189,7 +281,8 @@ class Crawler:
             for platform_host in platforms:
                 p = platform_host.lower()
                 routing = PLATFORM_TO_ROUTING.get(p, "americas")
-                temp_api = RiotClient(api_key, region=platform_host, platform=routing)
+                temp_api = RiotClient(api_key, region=platform_host, platform=routing, limiter=self.limiter,
+                                      metrics=self.metrics)
 
                 for tier in (t.upper() for t in tiers):
                     print(f"[seed] {platform_host} {tier}")
@@ -198,22 +291,18 @@ class Crawler:
                     # 1) League entries (platform-scoped rate limit)
                     try:
                         if tier == "CHALLENGER":
-                            self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                             entries = temp_api.get_challenger_entries() or []
                             self.metrics.record_request("platform", platform_host, "league")
                         elif tier == "GRANDMASTER":
-                            self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                             entries = temp_api.get_grandmaster_entries() or []
                             self.metrics.record_request("platform", platform_host, "league")
                         elif tier == "MASTER":
-                            self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                             entries = temp_api.get_master_entries() or []
                             self.metrics.record_request("platform", platform_host, "league")
                         else:
                             for div in divisions:
                                 page = 1
                                 while True:
-                                    self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                                     batch = temp_api.get_entries_paginated(
                                         queue="RANKED_SOLO_5x5", tier=tier, division=div, page=page
                                     ) or []
@@ -249,11 +338,9 @@ class Crawler:
                             sname = e.get("summonerName")
                             try:
                                 if sid:
-                                    self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                                     summ = temp_api.get_summoner_by_id(sid)
                                     self.metrics.record_request("platform", platform_host, "league")
                                 elif sname:
-                                    self.limiter.acquire(MultiLimiter.key_for_platform(platform_host))
                                     summ = temp_api.get_summoner_by_name(sname)
                                     self.metrics.record_request("platform", platform_host, "league")
                                 else:
@@ -290,7 +377,6 @@ class Crawler:
                             params["end_time"] = until
 
                         try:
-                            self.limiter.acquire(MultiLimiter.key_for_routing(routing))
                             match_ids = temp_api.get_match_ids_by_puuid(puuid, **params)
                             self.metrics.record_request("platform", platform_host, "league")
                         except Exception as ex:
@@ -308,7 +394,7 @@ class Crawler:
                             continue
 
                         try:
-                            added = self.ledger.enqueue_matches(routing, match_ids)
+                            added = self._enqueue(routing, match_ids)
                             total_enqueued += added
                         except Exception as ex:
                             print(f"[seed] enqueue failed ({platform_host} {tier}) puuid={puuid[:8]}…: {ex}")
@@ -323,8 +409,10 @@ class Crawler:
 
     
    # ---------- Worker ----------
-    def process_one(self) -> bool:
-        item = self.ledger.pop_next_match()
+    def process_one(self, item: Optional[tuple[str, str, int]] = None) -> bool:
+        if item is None:
+            rows = self.ledger.pop_next_matches(1, self.match_lease_s)
+            item = rows[0] if rows else None
         if not item:
             print("[worker] queue empty")
             return False
@@ -334,40 +422,146 @@ class Crawler:
 
         # Build a client that points match-v5 to the proper routing
         api_key = os.environ["RIOT_API_KEY"]
-        api = RiotClient(api_key, region=self.region, platform=routing)
+        api = RiotClient(api_key, region=self.region, platform=routing, limiter=self.limiter, metrics=self.metrics)
 
-        if self.ledger.seen(match_id):
-            self.ledger.mark_done(qid)
+        # a filter miss means "definitely new": skip the DB round trip
+        maybe_seen = self.seen_filter is None or self.seen_filter.might_contain(match_id)
+        if maybe_seen and self.ledger.done_if_seen(match_id, qid):
             print(f"[worker] already seen {match_id}, marked done")
             return True
 
         try:
-            self.limiter.acquire(MultiLimiter.key_for_routing(routing))
-            match = api.get_match(match_id)
+            # archived as the bytes Riot sent: nothing here reads the payloads, so nothing decodes them
+            match = api.get_match(match_id, raw=True)
             self.metrics.record_request("routing", routing, "match")
-            self.storage.write_json(self.patch, routing, match_id, "match", match)
-
-            self.limiter.acquire(MultiLimiter.key_for_routing(routing))
-            timeline = api.get_timeline(match_id)
+            timeline = api.get_timeline(match_id, raw=True)
             self.metrics.record_request("routing", routing, "timeline")
-            self.storage.write_json(self.patch, routing, match_id, "timeline", timeline)
-
-            self.ledger.mark_seen(match_id, routing)
-            self.ledger.mark_done(qid)
-            print(f"[worker] saved {match_id}")
+            self.archive(match_id, routing, qid, match, timeline)
+            # added before the upload is durable: if it fails, the filter only costs one extra DB check
+            if self.seen_filter is not None:
+                self.seen_filter.add(match_id)
+                self._seen_filter_dirty += 1
+            print(f"[worker] fetched {match_id}")
             self.metrics.record_processed(routing, 1)
             time.sleep(0.05)  # polite pacing between calls
             return True
         except Exception as e:
             print(f"[worker] error on {match_id}: {e!r}")
+            try:
+                if self.ledger.mark_failed(qid, repr(e), self.max_attempts):
+                    print(f"[worker] giving up on {match_id} after {self.max_attempts} attempts")
+            except Exception as ex:
+                print(f"[worker] could not release {match_id} (its lease will): {ex!r}")
             time.sleep(1.0)
             return True
 
-    def drain(self, max_items=200):
+    def archive(self, match_id: str, routing: str, qid: int, match: bytes, timeline: bytes):
+        """
+        Stores both payloads and finishes the match in the ledger once they are durable: after the
+        upload (on the uploader when there is one), or after the segment holding them is written.
+        """
+        if self.storage.segments is not None:
+            self.storage.write_json(self.patch, routing, match_id, "match", match)
+            self.storage.write_json(self.patch, routing, match_id, "timeline", timeline)
+            self._unflushed.append((match_id, routing, qid))
+            self._hold([qid])
+            self.flush_archive(force=False)
+            return
+
+        def upload():
+            self.storage.write_json(self.patch, routing, match_id, "match", match)
+            self.storage.write_json(self.patch, routing, match_id, "timeline", timeline)
+
+        def finish():
+            try:
+                self.ledger.finish_match(match_id, routing, qid)
+            finally:
+                self._release([qid])
+
+        if self.uploader is None:
+            upload()
+            self.ledger.finish_match(match_id, routing, qid)
+        else:
+            self._hold([qid])
+            # given up: stop renewing, so the lease runs out and the match is crawled again
+            self.uploader.submit(match_id, upload, finish, on_fail=lambda: self._release([qid]))
+
+    def _hold(self, qids: list[int]):
+        with self._held_lock:
+            self._held.update(qids)
+
+    def _release(self, qids: list[int]):
+        with self._held_lock:
+            self._held.difference_update(qids)
+
+    def renew_held(self, force: bool = False) -> int:
+        """
+        Renews the leases of matches fetched but not yet finished (buffered in a segment or waiting
+        on the uploader), so another crawler's reap_expired() doesn't re-queue them. Runs at most
+        every third of the lease unless forced.
+        """
+        if not force and time.monotonic() - self._renewed_at < self.match_lease_s / 3:
+            return 0
+        with self._held_lock:
+            qids = list(self._held)
+        self._renewed_at = time.monotonic()
+        return self.ledger.extend_leases(qids, self.match_lease_s) if qids else 0
+
+    def flush_archive(self, force: bool = True) -> int:
+        """Writes buffered segments (when due, or always with force) and finishes their matches once written."""
+        if self.storage.segments is None:
+            return 0
+        if not force and not self.storage.segments.due():
+            self.renew_held()
+            return 0
+        segs = self.storage.segments.take()
+        if not segs:
+            return 0
+        done, self._unflushed = self._unflushed, []
+
+        def write():
+            self.storage.segments.write(segs)
+
+        qids = [qid for _, _, qid in done]
+
+        def finish():
+            try:
+                for match_id, routing, qid in done:
+                    self.ledger.finish_match(match_id, routing, qid)
+            finally:
+                self._release(qids)
+            print(f"[worker] archived segment batch of {len(done)} matches")
+
+        if self.uploader is None:
+            try:
+                write()
+            except Exception:
+                self._release(qids)
+                raise
+            finish()
+        else:
+            self.uploader.submit(f"{len(segs)} segments", write, finish, on_fail=lambda: self._release(qids))
+        return len(done)
+
+    def drain(self, max_items=200, batch_size: int = 20):
+        # give back work abandoned by crashed workers before claiming more
+        reaped = self.ledger.reap_expired(self.match_lease_s)
+        if reaped:
+            print(f"[worker] reaped {reaped} expired leases")
         processed = 0
         while processed < max_items:
-            had = self.process_one()
-            if not had:
+            self.renew_held()
+            batch = self.ledger.pop_next_matches(min(batch_size, max_items - processed), self.match_lease_s)
+            if not batch:
+                print("[worker] queue empty")
                 break
-            processed += 1
+            for item in batch:
+                self.process_one(item)
+                processed += 1
+            self.save_seen_filter(force=False)  # a crash loses at most one checkpoint's worth of ids
+        self.flush_archive()
+        if self.uploader is not None:
+            self.renew_held(force=True)  # the uploads still queued may take a while
+            self.uploader.join()  # every processed match is stored (or given up on) before returning
+        self.save_seen_filter()
         return processed
@@ -0,0 +1,205 @@
+# riot/decoding.py
+"""
+JSON decoding for Riot payloads.
+
+loads() uses the fastest decoder installed: orjson, then msgspec, then the stdlib json module.
+JSON_DECODER=orjson|msgspec|json pins one.
+
+extract_timeline() keeps only what the ingest reads from a timeline: participantFrames
+gold/xp/cs and the item events. It stores them as TimelineColumns, a handful of typed arrays,
+instead of the full dict tree. Given raw bytes and msgspec, it decodes straight into structs that
+declare just those fields, so the rest of every frame and event is skipped, not materialized.
+"""
+import os
+import json
+from array import array
+from typing import Any, Callable, List, Optional, Union
+
+# Riot item event type -> our item_events.event_type
+ITEM_EVENT_TYPES = {
+    "ITEM_PURCHASED": "PURCHASE",
+    "ITEM_SOLD": "SELL",
+    "ITEM_DESTROYED": "DESTROY",
+    "ITEM_PICKUP": "PICKUP",
+}
+EVENT_KINDS = ("PURCHASE", "SELL", "DESTROY", "PICKUP", "UNDO_BEFORE", "UNDO_AFTER")
+_KIND = {k: i for i, k in enumerate(EVENT_KINDS)}
+_RIOT_KIND = {t: _KIND[k] for t, k in ITEM_EVENT_TYPES.items()}
+_UNDO_BEFORE, _UNDO_AFTER = _KIND["UNDO_BEFORE"], _KIND["UNDO_AFTER"]
+
+Payload = Union[bytes, bytearray, memoryview, str]
+
+def _pick_loads(name: str) -> tuple[str, Callable[[Payload], Any]]:
+    if name in ("auto", "orjson"):
+        try:
+            import orjson  # optional dependency
+            return "orjson", orjson.loads
+        except ImportError:
+            if name == "orjson":
+                raise RuntimeError("JSON_DECODER=orjson needs the 'orjson' package")
+    if name in ("auto", "msgspec"):
+        try:
+            import msgspec  # optional dependency
+            return "msgspec", msgspec.json.Decoder().decode
+        except ImportError:
+            if name == "msgspec":
+                raise RuntimeError("JSON_DECODER=msgspec needs the 'msgspec' package")
+    if name in ("auto", "json"):
+        return "json", json.loads
+    raise ValueError(f"JSON_DECODER must be auto, orjson, msgspec or json, not {name!r}")
+
+DECODER, _loads = _pick_loads(os.getenv("JSON_DECODER", "auto"))
+
+def loads(data: Payload) -> Any:
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return _loads(data)
+
+class TimelineColumns:
+    """
+    One timeline's ingest fields as parallel arrays. Participants are 0-based indexes into puuids;
+    event kinds index EVENT_KINDS. frame_rows() / event_rows() give the tuples timeline_rows() returns.
+    """
+    __slots__ = ("match_id", "puuids", "f_minute", "f_player", "f_gold", "f_xp", "f_cs",
+                 "e_ts", "e_player", "e_kind", "e_item")
+
+    def __init__(self, match_id: str, puuids: List[str]):
+        self.match_id = match_id
+        self.puuids = puuids
+        self.f_minute = array("H")
+        self.f_player = array("B")
+        self.f_gold = array("l")
+        self.f_xp = array("l")
+        self.f_cs = array("l")
+        self.e_ts = array("q")
+        self.e_player = array("B")
+        self.e_kind = array("B")
+        self.e_item = array("l")
+
+    def _player(self, pid: Any) -> Optional[int]:
+        # participantId "1".."N" (frame keys are strings, event ids ints) -> index into puuids
+        try:
+            i = int(pid) - 1
+        except (TypeError, ValueError):
+            return None
+        return i if 0 <= i < len(self.puuids) and str(pid) == str(i + 1) else None
+
+    def add_frame(self, minute: int, pid: Any, gold: int, xp: int, cs: int):
+        i = self._player(pid)
+        if i is None:
+            return
+        self.f_minute.append(minute)
+        self.f_player.append(i)
+        self.f_gold.append(int(gold))
+        self.f_xp.append(int(xp))
+        self.f_cs.append(int(cs))
+
+    def add_event(self, ev_type: Optional[str], pid: Any, ts_ms: Any, item_id: Any, before_id: Any, after_id: Any):
+        if ev_type == "ITEM_UNDO":
+            kinds = []
+            if before_id and before_id != 0:
+                kinds.append((_UNDO_BEFORE, before_id))
+            if after_id and after_id != 0 and after_id != before_id:
+                kinds.append((_UNDO_AFTER, after_id))
+        elif ev_type in _RIOT_KIND and item_id:
+            kinds = [(_RIOT_KIND[ev_type], item_id)]
+        else:
+            return
+        i = self._player(pid) if pid is not None else None
+        if i is None:
+            return  # non-participant event
+        for kind, item in kinds:
+            self.e_ts.append(int(ts_ms or 0))
+            self.e_player.append(i)
+            self.e_kind.append(kind)
+            self.e_item.append(int(item))
+
+    def frame_rows(self) -> list[tuple]:
+        mid, pu = self.match_id, self.puuids
+        return [(mid, pu[p], m, g, x, c)
+                for m, p, g, x, c in zip(self.f_minute, self.f_player, self.f_gold, self.f_xp, self.f_cs)]
+
+    def event_rows(self) -> list[tuple]:
+        mid, pu = self.match_id, self.puuids
+        return [(mid, pu[p], t, EVENT_KINDS[k], item)
+                for t, p, k, item in zip(self.e_ts, self.e_player, self.e_kind, self.e_item)]
+
+def _from_dict(timeline: dict) -> TimelineColumns:
+    cols = TimelineColumns(timeline["metadata"]["matchId"], list(timeline["metadata"]["participants"]))
+    frames = timeline["info"]["frames"]
+    for minute, fr in enumerate(frames):
+        for pid, snap in fr.get("participantFrames", {}).items():
+            cols.add_frame(minute, pid, snap.get("totalGold") or snap.get("gold") or 0, snap.get("xp", 0),
+                           snap.get("minionsKilled", 0) + snap.get("jungleMinionsKilled", 0))
+    for fr in frames:
+        for ev in fr.get("events", []):
+            cols.add_event(ev.get("type"), ev.get("participantId"), ev.get("timestamp", 0),
+                           ev.get("itemId"), ev.get("beforeId"), ev.get("afterId"))
+    return cols
+
+_typed = None
+
+def _typed_decoder():
+    """msgspec decoder for just the timeline fields we keep, or None without msgspec."""
+    global _typed
+    if _typed is None:
+        try:
+            import msgspec  # optional dependency
+        except ImportError:
+            _typed = False
+            return None
+
+        class Snap(msgspec.Struct):
+            totalGold: Optional[int] = None
+            gold: Optional[int] = None
+            xp: int = 0
+            minionsKilled: int = 0
+            jungleMinionsKilled: int = 0
+
+        class Event(msgspec.Struct):
+            type: Optional[str] = None
+            participantId: Optional[int] = None
+            timestamp: int = 0
+            itemId: Optional[int] = None
+            beforeId: Optional[int] = None
+            afterId: Optional[int] = None
+
+        class Frame(msgspec.Struct):
+            participantFrames: dict[str, Snap] = msgspec.field(default_factory=dict)
+            events: List[Event] = msgspec.field(default_factory=list)
+
+        class Info(msgspec.Struct):
+            frames: List[Frame]
+
+        class Metadata(msgspec.Struct):
+            matchId: str
+            participants: List[str]
+
+        class Timeline(msgspec.Struct):
+            metadata: Metadata
+            info: Info
+
+        _typed = msgspec.json.Decoder(Timeline, strict=False)
+    return _typed or None
+
+def _from_typed(tl) -> TimelineColumns:
+    cols = TimelineColumns(tl.metadata.matchId, tl.metadata.participants)
+    for minute, fr in enumerate(tl.info.frames):
+        for pid, s in fr.participantFrames.items():
+            cols.add_frame(minute, pid, s.totalGold or s.gold or 0, s.xp, s.minionsKilled + s.jungleMinionsKilled)
+    for fr in tl.info.frames:
+        for ev in fr.events:
+            cols.add_event(ev.type, ev.participantId, ev.timestamp, ev.itemId, ev.beforeId, ev.afterId)
+    return cols
+
+def extract_timeline(timeline: Union[dict, Payload], selective: bool = True) -> TimelineColumns:
+    """
+    TimelineColumns from a decoded timeline dict or its raw JSON. Raw JSON goes through the typed
+    msgspec decoder when it's installed (and selective is left on), otherwise through loads().
+    """
+    if isinstance(timeline, dict):
+        return _from_dict(timeline)
+    typed = _typed_decoder() if selective else None
+    if typed is not None:
+        return _from_typed(typed.decode(timeline))
+    return _from_dict(loads(timeline))
@@ -1,52 +1,194 @@
-﻿from typing import Optional, Iterable
+﻿import time
+from contextlib import contextmanager
+from typing import Optional, Iterable, Iterator
 import psycopg
+from psycopg_pool import ConnectionPool
+
+from .metrics import Metrics
 
 class Ledger:
-    def __init__(self, dsn: str):
+    """
+    Crawler bookkeeping (seen_match_ids / match_queue) over a small long-lived pool.
+    Hot statements run with prepare=True, so each pooled connection parses/plans them once.
+    """
+    def __init__(self, dsn: str, metrics: Optional[Metrics] = None, min_size: int = 1, max_size: int = 4):
         self.dsn = dsn
+        self.metrics = metrics
+        self.pool = ConnectionPool(
+            dsn, min_size=min_size, max_size=max_size,
+            timeout=10,  # wait up to 10s for a conn
+            kwargs={"autocommit": True, "connect_timeout": 5},
+            configure=self._on_connect,
+            open=True,
+        )
+
+    def _on_connect(self, con: psycopg.Connection):
+        # runs once per physical connection; with a warm pool this stays flat while matches climb
+        if self.metrics is not None:
+            self.metrics.record_db_connection()
+
+    def close(self):
+        self.pool.close()
+
+    @contextmanager
+    def _timed(self, op: str):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_db_write(op, time.monotonic() - t0)
 
     def seen(self, match_id: str) -> bool:
-        with psycopg.connect(self.dsn) as con, con.cursor() as cur:
-            cur.execute("select 1 from seen_match_ids where match_id=%s", (match_id,))
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("select 1 from seen_match_ids where match_id=%s", (match_id,), prepare=True)
             return cur.fetchone() is not None
 
+    def seen_many(self, match_ids: Iterable[str]) -> set[str]:
+        ids = list(match_ids)
+        if not ids:
+            return set()
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("select match_id from seen_match_ids where match_id = any(%s)", (ids,), prepare=True)
+            return {r[0] for r in cur.fetchall()}
+
+    def iter_seen_ids(self, batch: int = 50_000) -> Iterator[str]:
+        """Streams every seen match id through a server-side cursor (used to build the SeenFilter)."""
+        with self.pool.connection() as con, con.transaction():
+            with con.cursor(name="seen_ids_scan") as cur:
+                cur.itersize = batch
+                cur.execute("select match_id from seen_match_ids")
+                for (mid,) in cur:
+                    yield mid
+
     def mark_seen(self, match_id: str, region: str):
-        with psycopg.connect(self.dsn) as con, con.cursor() as cur:
+        with self.pool.connection() as con, con.cursor() as cur:
             cur.execute(
               "insert into seen_match_ids(match_id, region) values(%s,%s) on conflict do nothing",
-              (match_id, region)
+              (match_id, region), prepare=True
             )
-            con.commit()
+
+    def done_if_seen(self, match_id: str, queue_id: int) -> bool:
+        """seen() + mark_done() in one statement: closes the queue row only if the match is already stored."""
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("""
+              update match_queue set done_at=now(), status='done', lease_expires_at=null
+               where id=%s and exists (select 1 from seen_match_ids where match_id=%s)
+              returning id
+            """, (queue_id, match_id), prepare=True)
+            return cur.fetchone() is not None
+
+    def finish_match(self, match_id: str, region: str, queue_id: int) -> bool:
+        """
+        Check seen + mark seen + mark done in one transaction.
+        Returns False if another worker had already recorded the match.
+        """
+        with self._timed("finish_match"), self.pool.connection() as con, con.transaction(), con.cursor() as cur:
+            cur.execute(
+              "insert into seen_match_ids(match_id, region) values(%s,%s) on conflict do nothing returning 1",
+              (match_id, region), prepare=True
+            )
+            was_new = cur.fetchone() is not None
+            cur.execute(
+              "update match_queue set done_at=now(), status='done', lease_expires_at=null where id=%s",
+              (queue_id,), prepare=True
+            )
+            return was_new
+
+    def enqueue_matches_new(self, region: str, ids: Iterable[str], dedupe: bool = True) -> list[str]:
+        """One INSERT ... SELECT FROM unnest for the whole batch; returns the ids that were actually new."""
+        batch = list(dict.fromkeys(ids)) if dedupe else list(ids)
+        if not batch:
+            return []
+        with self._timed("enqueue_matches"), self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("""
+              insert into match_queue(match_id, region)
+              select mid, %s from unnest(%s::text[]) as mid
+              on conflict do nothing
+              returning match_id
+            """, (region, batch), prepare=True)
+            return [r[0] for r in cur.fetchall()]
 
     def enqueue_matches(self, region: str, ids: Iterable[str]) -> int:
-        inserted = 0
-        with psycopg.connect(self.dsn) as con, con.cursor() as cur:
-            for mid in ids:
-                cur.execute(
-                  "insert into match_queue(match_id, region) values(%s,%s) on conflict do nothing",
-                  (mid, region)
-                )
-                inserted += cur.rowcount
-            con.commit()
-        return inserted
+        return len(self.enqueue_matches_new(region, ids))
+
+    def pop_next_matches(self, n: int, lease_s: int = 300) -> list[tuple[str, str, int]]:
+        """
+        Claims up to n queued rows in one round trip. SKIP LOCKED lets concurrent workers
+        claim disjoint rows instead of queueing on the same one; each claim carries a lease
+        that reap_expired() honours if the worker dies before mark_done.
+        """
+        with self._timed("pop_matches"), self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("""
+              with picked as (
+                select id from match_queue
+                 where status='queued'
+                 order by enqueued_at asc
+                 limit %s
+                 for update skip locked
+              )
+              update match_queue q
+                 set picked_at = now(), status='processing',
+                     lease_expires_at = now() + make_interval(secs => %s)
+                from picked
+               where q.id = picked.id
+              returning q.match_id, q.region, q.id
+            """, (n, lease_s), prepare=True)
+            return cur.fetchall()
 
     def pop_next_match(self) -> Optional[tuple[str, str, int]]:
-        with psycopg.connect(self.dsn) as con, con.cursor() as cur:
+        rows = self.pop_next_matches(1)
+        return rows[0] if rows else None
+
+    def extend_leases(self, queue_ids: list[int], lease_s: int = 300) -> int:
+        """Pushes the lease of rows still 'processing' out to lease_s from now; returns how many were renewed."""
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("""
+              update match_queue set lease_expires_at = now() + make_interval(secs => %s)
+               where id = any(%s) and status='processing'
+            """, (lease_s, queue_ids))
+            return cur.rowcount
+
+    def reap_expired(self, lease_s: int = 300) -> int:
+        """
+        Returns 'processing' rows whose lease has run out to the queue. Rows picked before leases
+        existed have none; they count as expired lease_s after picked_at (or at once without one).
+        """
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("""
+              update match_queue
+                 set status='queued', picked_at=null, lease_expires_at=null
+               where status='processing'
+                 and coalesce(lease_expires_at, picked_at + make_interval(secs => %s), '-infinity') < now()
+            """, (lease_s,))
+            return cur.rowcount
+
+    def mark_failed(self, queue_id: int, error: str, max_attempts: int = 5) -> bool:
+        """
+        Hands a row the worker couldn't finish back to the queue, behind everything already waiting;
+        after max_attempts it's parked as 'failed' with the last error. Returns True if it was parked.
+        """
+        with self.pool.connection() as con, con.cursor() as cur:
             cur.execute("""
               update match_queue
-                 set picked_at = now(), status='processing'
-               where id = (
-                 select id from match_queue
-                  where status='queued'
-                  order by enqueued_at asc
-                  limit 1
-               )
-              returning match_id, region, id
-            """)
+                 set attempts = attempts + 1, last_error = %s, picked_at = null, lease_expires_at = null,
+                     status = case when attempts + 1 >= %s then 'failed' else 'queued' end,
+                     enqueued_at = now()
+               where id = %s
+              returning status
+            """, (error, max_attempts, queue_id), prepare=True)
             row = cur.fetchone()
-            return row if row else None
+            return row is not None and row[0] == "failed"
 
     def mark_done(self, queue_id: int):
-        with psycopg.connect(self.dsn) as con, con.cursor() as cur:
-            cur.execute("update match_queue set done_at=now(), status='done' where id=%s", (queue_id,))
-            con.commit()
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("update match_queue set done_at=now(), status='done', lease_expires_at=null where id=%s",
+                        (queue_id,), prepare=True)
+
+    def mark_done_many(self, queue_ids: Iterable[int]):
+        ids = list(queue_ids)
+        if not ids:
+            return
+        with self.pool.connection() as con, con.cursor() as cur:
+            cur.execute("update match_queue set done_at=now(), status='done', lease_expires_at=null where id = any(%s)",
+                        (ids,), prepare=True)
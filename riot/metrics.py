@@ -1,148 +1,366 @@
 # riot/metrics.py
 from __future__ import annotations
 import time
-from collections import defaultdict, deque, Counter
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from threading import Lock, Thread
-from typing import Dict, Deque, Tuple, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-_WINDOW_1S = 1.0
-_WINDOW_120S = 120.0
+_WINDOW_1S = 1
+_WINDOW_120S = 120
+
+# seconds; Riot calls, PUTs and DB writes all land between a few ms and a few s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# name -> (prometheus type, help); names not listed are exported untyped
+METRIC_HELP: Dict[str, Tuple[str, str]] = {
+    "riot_requests_total": ("counter", "Riot API calls by scope (platform|routing), key and endpoint"),
+    "riot_request_rate": ("gauge", "Riot API calls per second over the last 1s / 120s window"),
+    "riot_429_total": ("counter", "Riot API 429 responses"),
+    "riot_errors_total": ("counter", "Riot API calls that failed"),
+    "riot_request_duration_seconds": ("histogram", "Riot API HTTP latency per attempt, limiter wait excluded"),
+    "crawler_enqueued_total": ("counter", "match ids added to match_queue"),
+    "crawler_processed_total": ("counter", "matches fetched and handed to the archive"),
+    "crawler_queue_size": ("gauge", "match_queue backlog"),
+    "db_connections_total": ("counter", "physical DB connections opened"),
+    "db_write_duration_seconds": ("histogram", "DB write latency by operation"),
+    "upload_queue_depth": ("gauge", "archive uploads queued or in flight"),
+    "upload_duration_seconds": ("histogram", "archive upload latency per attempt that succeeded"),
+    "upload_queued_seconds": ("histogram", "time an archive upload waited in the uploader queue"),
+    "uploads_total": ("counter", "archive upload attempts by result"),
+    "worker_write_queue": ("gauge", "fetched (match, timeline) pairs waiting for the async worker's DB writer"),
+    "api_request_duration_seconds": ("histogram", "API request latency by route and answer source"),
+    "api_phase_duration_seconds": ("histogram", "API request time by phase: cache, pool wait, each statement, serialize"),
+    "api_rejected_total": ("counter", "API requests turned away with 503 by request class and where they waited"),
+    "api_cache_total": ("counter", "API response cache lookups by result"),
+    "api_pool_connections": ("gauge", "API connection pool connections by state"),
+}
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+class RateRing:
+    """Events per second over the last `size` seconds: one bucket per second, O(1) to add."""
+    __slots__ = ("size", "counts", "stamps")
+
+    def __init__(self, size: int = _WINDOW_120S):
+        self.size = size
+        self.counts = [0] * size
+        self.stamps = [-1] * size
+
+    def add(self, now: float, n: int = 1):
+        sec = int(now)
+        i = sec % self.size
+        if self.stamps[i] != sec:
+            self.stamps[i] = sec
+            self.counts[i] = 0
+        self.counts[i] += n
+
+    def count(self, now: float, window: int) -> int:
+        """Events in the last `window` whole seconds (the current, partial second excluded)."""
+        sec = int(now)
+        total = 0
+        for s in range(sec - window, sec):
+            i = s % self.size
+            if self.stamps[i] == s:
+                total += self.counts[i]
+        return total
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimated from the buckets (linear within one), like histogram_quantile()."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = self.bounds[i - 1] if i else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
 
 class Metrics:
     """
-    Thread-safe sliding-window metrics.
-    Tracks requests per (scope, key, endpoint) and prints a periodic summary.
-    - scope: 'platform' (na1/euw1/kr/...) or 'routing' (americas/europe/asia/sea)
-    - key:   actual platform_host or routing string
-    - endpoint: 'league', 'summoner', 'match', 'timeline', etc.
-    Also tracks queue size, enqueued, processed, 429s, errors.
+    Thread-safe crawler / worker / API metrics, printed as a periodic summary and exported in the
+    Prometheus text format (render_prometheus(), serve() for processes without an HTTP server).
+    - requests per (scope, key, endpoint): counters plus a per-second ring for 1s / 120s rates
+      - scope: 'platform' (na1/euw1/kr/...) or 'routing' (americas/europe/asia/sea)
+      - key:   actual platform_host or routing string
+      - endpoint: 'league', 'summoner', 'match', 'timeline', etc.
+    - latency histograms: Riot HTTP calls, DB writes, archive uploads
+    - gauges: match queue size, upload queue depth
+    Every record_* call is O(1) under one short lock; reports and scrapes copy state and format
+    it outside the lock.
     """
-    def __init__(self):
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
         self._lock = Lock()
-        # timestamps for sliding windows
-        self._events: Dict[Tuple[str, str, str], Deque[float]] = defaultdict(deque)
-        # counters (total since start)
-        self._totals = Counter()
-        # gauges
-        self._queue_size: Optional[int] = None
-        self._last_print = 0.0
+        self.buckets = tuple(buckets)
+        self._rings: Dict[Tuple[str, str, str], RateRing] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._hists: Dict[Tuple[str, Labels], Histogram] = {}
+        self._requests: Dict[Tuple[str, str, str], Tuple[RateRing, Tuple[str, Labels]]] = {}
+        self._latency: Dict[Tuple[str, str, str, int], Histogram] = {}
+        self._collectors: List[Callable[["Metrics"], None]] = []
         self._reporter: Optional[Thread] = None
         self._running = False
+        self._server: Optional[ThreadingHTTPServer] = None
 
-    def start_reporter(self, interval: float = 10.0):
-        if self._reporter and self._reporter.is_alive():
-            return
-        self._running = True
-        self._reporter = Thread(target=self._loop, args=(interval,), daemon=True)
-        self._reporter.start()
+    # ---------- generic instruments ----------
+    def inc(self, name: str, n: float = 1, **labels):
+        k = (name, _labels(labels))
+        with self._lock:
+            self._counters[k] += n
 
-    def stop_reporter(self):
-        self._running = False
+    def set_gauge(self, name: str, value: float, **labels):
+        k = (name, _labels(labels))
+        with self._lock:
+            self._gauges[k] = value
 
-    def _loop(self, interval: float):
-        while self._running:
-            time.sleep(interval)
-            try:
-                self.print_summary()
-            except Exception:
-                pass
+    def observe(self, name: str, seconds: float, **labels):
+        k = (name, _labels(labels))
+        with self._lock:
+            h = self._hists.get(k)
+            if h is None:
+                h = self._hists[k] = Histogram(self.buckets)
+            h.observe(seconds)
+
+    def add_collector(self, fn: Callable[["Metrics"], None]):
+        """fn(metrics) runs before every scrape, e.g. to set gauges read from a connection pool."""
+        self._collectors.append(fn)
 
+    # ---------- crawler / worker ----------
     def record_request(self, scope: str, key: str, endpoint: str):
-        now = time.monotonic()
         k = (scope, key.lower(), endpoint)
+        now = time.time()
         with self._lock:
-            dq = self._events[k]
-            dq.append(now)
-            self._totals[f"req_total::{scope}::{key.lower()}::{endpoint}"] += 1
+            slot = self._requests.get(k)
+            if slot is None:
+                labels = _labels({"scope": scope, "key": k[1], "endpoint": endpoint})
+                slot = self._requests[k] = (RateRing(), ("riot_requests_total", labels))
+                self._rings[k] = slot[0]
+            slot[0].add(now)
+            self._counters[slot[1]] += 1
 
-    def record_429(self, scope: str, key: str, endpoint: str):
+    def record_request_latency(self, scope: str, key: str, endpoint: str, seconds: float, status: int):
+        # called once per Riot call: the histogram is looked up by a plain tuple, not by labels
+        k = (scope, key, endpoint, status // 100)
         with self._lock:
-            self._totals[f"429::{scope}::{key.lower()}::{endpoint}"] += 1
+            h = self._latency.get(k)
+            if h is None:
+                labels = _labels({"scope": scope, "key": key.lower(), "endpoint": endpoint, "status": f"{status // 100}xx"})
+                h = self._hists.get(("riot_request_duration_seconds", labels))
+                if h is None:
+                    h = self._hists[("riot_request_duration_seconds", labels)] = Histogram(self.buckets)
+                self._latency[k] = h
+            h.observe(seconds)
+
+    def record_429(self, scope: str, key: str, endpoint: str):
+        self.inc("riot_429_total", scope=scope, key=key.lower(), endpoint=endpoint)
 
     def record_error(self, scope: str, key: str, endpoint: str):
-        with self._lock:
-            self._totals[f"err::{scope}::{key.lower()}::{endpoint}"] += 1
+        self.inc("riot_errors_total", scope=scope, key=key.lower(), endpoint=endpoint)
 
     def record_enqueued(self, routing: str, n: int):
-        with self._lock:
-            self._totals[f"enqueued::{routing.lower()}"] += n
+        self.inc("crawler_enqueued_total", n, routing=routing.lower())
 
     def record_processed(self, routing: str, n: int = 1):
-        with self._lock:
-            self._totals[f"processed::{routing.lower()}"] += n
+        self.inc("crawler_processed_total", n, routing=routing.lower())
+
+    def record_db_connection(self, n: int = 1):
+        self.inc("db_connections_total", n)
+
+    def record_db_write(self, op: str, seconds: float):
+        self.observe("db_write_duration_seconds", seconds, op=op)
 
     def set_queue_size(self, n: int):
+        self.set_gauge("crawler_queue_size", n)
+
+    def set_upload_queue(self, n: int):
+        self.set_gauge("upload_queue_depth", n)
+
+    def record_upload(self, seconds: float, ok: bool, queued_s: Optional[float] = None):
         with self._lock:
-            self._queue_size = n
+            self._counters[("uploads_total", (("result", "ok" if ok else "error"),))] += 1
+        if ok:
+            self.observe("upload_duration_seconds", seconds)
+            if queued_s is not None:
+                self.observe("upload_queued_seconds", queued_s)
 
-    def _prune(self):
-        now = time.monotonic()
+    # ---------- reading ----------
+    def snapshot(self) -> dict:
+        """Copies of every counter, gauge and histogram, plus the request rates."""
+        for fn in self._collectors:
+            try:
+                fn(self)
+            except Exception:
+                pass
+        now = time.time()
         with self._lock:
-            for dq in self._events.values():
-                # prune > 120s; we compute both 1s and 120s rates from same deque
-                cutoff = now - _WINDOW_120S
-                while dq and dq[0] < cutoff:
-                    dq.popleft()
-
-    def _rates(self):
-        now = time.monotonic()
-        one = now - _WINDOW_1S
-        two = now - _WINDOW_120S
-        rates_1s: Dict[Tuple[str, str, str], int] = {}
-        rates_120s: Dict[Tuple[str, str, str], int] = {}
+            rates = {k: (r.count(now, _WINDOW_1S), r.count(now, _WINDOW_120S)) for k, r in self._rings.items()}
+            hists = {}
+            for k, h in self._hists.items():
+                c = Histogram(h.bounds)
+                c.counts, c.sum, c.count = list(h.counts), h.sum, h.count
+                hists[k] = c
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "hists": hists, "rates": rates}
+
+    def counter(self, name: str, **labels) -> float:
         with self._lock:
-            for k, dq in self._events.items():
-                # dq already pruned to 120s
-                # 1s window count
-                cnt_1s = 0
-                for t in reversed(dq):
-                    if t < one:
-                        break
-                    cnt_1s += 1
-                rates_1s[k] = cnt_1s
-                rates_120s[k] = len(dq)  # 120s window size
-        return rates_1s, rates_120s
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        with self._lock:
+            return self._hists.get((name, _labels(labels)))
+
+    def render_prometheus(self) -> str:
+        snap = self.snapshot()
+        series: Dict[str, List[str]] = defaultdict(list)
+        for (name, labels), v in sorted(snap["counters"].items()):
+            series[name].append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        for (name, labels), v in sorted(snap["gauges"].items()):
+            series[name].append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        for (scope, key, ep), (r1, r120) in sorted(snap["rates"].items()):
+            labels = (("endpoint", ep), ("key", key), ("scope", scope))
+            series["riot_request_rate"].append(f"riot_request_rate{_fmt_labels(labels, ('window', '1s'))} {r1}")
+            series["riot_request_rate"].append(
+                f"riot_request_rate{_fmt_labels(labels, ('window', '120s'))} {_fmt_value(r120 / _WINDOW_120S)}")
+        for (name, labels), h in sorted(snap["hists"].items()):
+            cum = 0
+            for bound, c in zip(h.bounds + (float("inf"),), h.counts):
+                cum += c
+                series[name].append(f"{name}_bucket{_fmt_labels(labels, ('le', _fmt_value(bound)))} {cum}")
+            series[name].append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h.sum)}")
+            series[name].append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+        out = []
+        for name in sorted(series):
+            kind, text = METRIC_HELP.get(name, ("untyped", ""))
+            if text:
+                out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(series[name])
+        return "\n".join(out) + "\n"
+
+    # ---------- periodic summary ----------
+    def start_reporter(self, interval: float = 10.0):
+        if self._reporter and self._reporter.is_alive():
+            return
+        self._running = True
+        self._reporter = Thread(target=self._loop, args=(interval,), daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self):
+        self._running = False
+
+    def _loop(self, interval: float):
+        while self._running:
+            time.sleep(interval)
+            try:
+                self.print_summary()
+            except Exception:
+                pass
 
     def print_summary(self):
-        self._prune()
-        rates1, rates2 = self._rates()
+        snap = self.snapshot()
+        counters, gauges, hists = snap["counters"], snap["gauges"], snap["hists"]
 
         # Aggregate nicely for log line
-        by_scope_key = defaultdict(lambda: {"1s": Counter(), "120s": Counter(), "endpoints": defaultdict(lambda: {"1s": 0, "120s": 0})})
-        for (scope, key, ep), v1 in rates1.items():
-            v2 = rates2[(scope, key, ep)]
-            d = by_scope_key[(scope, key)]
-            d["1s"][ep] += v1
-            d["120s"][ep] += v2
-            d["endpoints"][ep]["1s"] += v1
-            d["endpoints"][ep]["120s"] += v2
-
-        lines = []
-        with self._lock:
-            qsz = self._queue_size
-            totals = dict(self._totals)
+        by_scope_key = defaultdict(dict)
+        for (scope, key, ep), rates in snap["rates"].items():
+            by_scope_key[(scope, key)][ep] = rates
 
-        lines.append("=== pacing ===")
+        lines = ["=== pacing ==="]
+        qsz = gauges.get(("crawler_queue_size", ()))
         if qsz is not None:
-            lines.append(f"queue_size={qsz}")
+            lines.append(f"queue_size={int(qsz)}")
+        processed = sum(v for (name, _), v in counters.items() if name == "crawler_processed_total")
+        if processed:
+            lines.append(f"db_connections_per_match={counters.get(('db_connections_total', ()), 0) / processed:.3f}")
+        uq = gauges.get(("upload_queue_depth", ()))
+        put = hists.get(("upload_duration_seconds", ()))
+        if uq is not None or put is not None:
+            line = (f"upload_queue={int(uq or 0)} ok={int(counters.get(('uploads_total', (('result', 'ok'),)), 0))} "
+                    f"err={int(counters.get(('uploads_total', (('result', 'error'),)), 0))}")
+            if put is not None:
+                line += f" put p50={put.quantile(0.5) * 1000:.0f}ms p95={put.quantile(0.95) * 1000:.0f}ms"
+            wait = hists.get(("upload_queued_seconds", ()))
+            if wait is not None:
+                line += f" queued p95={wait.quantile(0.95) * 1000:.0f}ms"
+            lines.append(line)
 
         # per scope/key summary
-        for (scope, key), d in sorted(by_scope_key.items()):
-            tot1 = sum(d["1s"].values())
-            tot2 = sum(d["120s"].values())
-            # convert 120s to per-second average for readability
-            avg2 = tot2 / 120.0 if tot2 else 0.0
-            lines.append(f"{scope}:{key} -> {tot1:2d}/s, {avg2:.2f}/s (120s window)")
-            # endpoint breakdown
-            for ep in sorted(d["endpoints"].keys()):
-                v1 = d["endpoints"][ep]["1s"]
-                v2 = d["endpoints"][ep]["120s"]
+        for (scope, key), eps in sorted(by_scope_key.items()):
+            tot1 = sum(r[0] for r in eps.values())
+            tot2 = sum(r[1] for r in eps.values())
+            lines.append(f"{scope}:{key} -> {tot1:2d}/s, {tot2 / 120.0:.2f}/s (120s window)")
+            for ep in sorted(eps):
+                v1, v2 = eps[ep]
                 lines.append(f"  - {ep:<8} {v1:2d}/s, {v2/120.0:.2f}/s (120s)")
+        for (name, labels), h in sorted(hists.items()):
+            if name in ("riot_request_duration_seconds", "db_write_duration_seconds"):
+                tag = ",".join(v for _, v in labels)
+                lines.append(f"{name}[{tag}] n={h.count} p50={h.quantile(0.5) * 1000:.0f}ms "
+                             f"p95={h.quantile(0.95) * 1000:.0f}ms")
 
-        # totals
-        # enqueued/processed per routing
-        for k, v in sorted(totals.items()):
-            if k.startswith("enqueued::") or k.startswith("processed::") or k.startswith("429::") or k.startswith("err::"):
-                lines.append(f"{k}={v}")
+        # totals: enqueued/processed per routing, 429s, errors
+        for (name, labels), v in sorted(counters.items()):
+            if name in ("crawler_enqueued_total", "crawler_processed_total", "riot_429_total", "riot_errors_total"):
+                lines.append(f"{name}{_fmt_labels(labels)}={int(v)}")
 
         print("\n".join(lines))
+
+    # ---------- /metrics for processes without a web server ----------
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves GET /metrics on a daemon thread (crawler, worker); returns the server."""
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
@@ -1,42 +1,139 @@
 # riot/rate_limit.py
 import time
-from collections import deque
-from typing import Dict
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Mapping, Optional, Tuple
+
+Windows = List[Tuple[int, float]]  # [(limit, window_seconds), ...]
+
+# Riot's published per-method budgets (per platform/routing key). The live values come
+# back in X-Method-Rate-Limit on every response and replace these at runtime.
+DEFAULT_METHOD_LIMITS: Dict[str, Windows] = {
+    "match": [(2000, 10.0)],
+    "timeline": [(2000, 10.0)],
+    "matchlist": [(2000, 10.0)],
+    "league": [(50, 10.0)],
+    "summoner": [(1600, 60.0)],
+}
+
+def parse_rate_header(value: Optional[str]) -> Windows:
+    """'20:1,100:120' -> [(20, 1.0), (100, 120.0)]; malformed or non-positive pairs are dropped."""
+    out: Windows = []
+    for part in (value or "").split(","):
+        limit, _, window = part.strip().partition(":")
+        try:
+            limit, window = int(limit), float(window)
+        except ValueError:
+            continue
+        if limit > 0 and window > 0:
+            out.append((limit, window))
+    return out
+
+def retry_after(headers: Mapping[str, str], default: float = 1.0) -> float:
+    """Retry-After in seconds; `default` when it's missing or not a number (e.g. an HTTP date)."""
+    try:
+        return max(float(headers.get("Retry-After", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+def _wait_needed(stamps: List[float], windows: Windows, now: float) -> float:
+    """Seconds until one more hit fits every window; stamps must be sorted ascending."""
+    wait = 0.0
+    n = len(stamps)
+    for limit, window in windows:
+        if limit <= 0 or window <= 0:
+            continue  # not a usable window (parse_rate_header drops these too)
+        in_window = n - bisect_right(stamps, now - window)
+        if in_window >= limit:
+            # the hit that has to age out before we fit is the limit-th newest
+            wait = max(wait, stamps[n - limit] + window - now)
+    return wait
 
 class MultiLimiter:
     """
     Enforces both: ≤per_sec in any 1s window AND ≤per_2min in any 120s window,
     keyed by 'routing' like 'na1','euw1','americas'.
+
+    Thread-safe. Every key also has per-method buckets ('match', 'timeline', 'league', ...)
+    that must have room too. observe() feeds Riot's X-App-Rate-Limit / X-Method-Rate-Limit
+    and Retry-After headers back in so the windows track what the server actually enforces.
     """
-    def __init__(self, per_sec: int = 20, per_2min: int = 100):
+    def __init__(self, per_sec: int = 20, per_2min: int = 100,
+                 method_limits: Optional[Mapping[str, Windows]] = None):
         self.per_sec = per_sec
         self.per_2min = per_2min
-        self._sec: Dict[str, deque] = {}
-        self._long: Dict[str, deque] = {}
-
-    def acquire(self, key: str):
-        now = time.monotonic()
-        dq1 = self._sec.setdefault(key, deque())
-        dq2 = self._long.setdefault(key, deque())
-
-        # prune old entries
-        one = now - 1.0
-        two = now - 120.0
-        while dq1 and dq1[0] < one:
-            dq1.popleft()
-        while dq2 and dq2[0] < two:
-            dq2.popleft()
-
-        # if violating either window, sleep until the earliest becomes free
-        if len(dq1) >= self.per_sec or len(dq2) >= self.per_2min:
-            wait1 = max(0.0, (dq1[0] + 1.0) - now) if dq1 else 0.0
-            wait2 = max(0.0, (dq2[0] + 120.0) - now) if dq2 else 0.0
-            time.sleep(max(wait1, wait2))
-            return self.acquire(key)
-
-        # record this request
-        dq1.append(now)
-        dq2.append(now)
+        self.method_limits: Dict[str, Windows] = dict(DEFAULT_METHOD_LIMITS if method_limits is None else method_limits)
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Windows] = {}       # bucket -> learned windows (from headers)
+        self._stamps: Dict[str, List[float]] = {}    # bucket -> sorted hit times
+        self._blocked_until: Dict[str, float] = {}   # bucket -> monotonic deadline (Retry-After)
+
+    # ---- buckets ----
+    @staticmethod
+    def _method_bucket(key: str, method: str) -> str:
+        return f"{key}::{method}"
+
+    def _buckets(self, key: str, method: Optional[str]) -> List[Tuple[str, Windows]]:
+        key = key.lower()
+        out = [(key, self._windows.get(key) or [(self.per_sec, 1.0), (self.per_2min, 120.0)])]
+        if method:
+            mb = self._method_bucket(key, method)
+            windows = self._windows.get(mb) or self.method_limits.get(method)
+            if windows:
+                out.append((mb, windows))
+        return out
+
+    # ---- core ----
+    def reserve(self, key: str, method: Optional[str] = None) -> float:
+        """
+        Non-blocking: records a hit and returns 0.0 if every bucket has room,
+        otherwise records nothing and returns how long to wait before retrying.
+        """
+        with self._lock:
+            now = time.monotonic()
+            buckets = self._buckets(key, method)
+            wait = 0.0
+            for bucket, windows in buckets:
+                wait = max(wait, self._blocked_until.get(bucket, 0.0) - now)
+                stamps = self._stamps.setdefault(bucket, [])
+                longest = max((w for _, w in windows), default=0.0)
+                cut = bisect_right(stamps, now - longest)
+                if cut:
+                    del stamps[:cut]
+                wait = max(wait, _wait_needed(stamps, windows, now))
+            if wait > 0:
+                return wait
+            for bucket, _ in buckets:
+                self._stamps[bucket].append(now)
+            return 0.0
+
+    def acquire(self, key: str, method: Optional[str] = None):
+        while True:
+            wait = self.reserve(key, method)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    # ---- feedback from responses ----
+    def observe(self, key: str, method: Optional[str], status: int, headers: Mapping[str, str]):
+        key = key.lower()
+        app = parse_rate_header(headers.get("X-App-Rate-Limit"))
+        meth = parse_rate_header(headers.get("X-Method-Rate-Limit"))
+        with self._lock:
+            if app:
+                self._windows[key] = app
+            if meth and method:
+                self._windows[self._method_bucket(key, method)] = meth
+        if status == 429 or status == 503:
+            retry = retry_after(headers)
+            scope = (headers.get("X-Rate-Limit-Type") or "application").lower()
+            bucket = self._method_bucket(key, method) if scope == "method" and method else key
+            self.penalize(bucket, retry)
+
+    def penalize(self, bucket: str, seconds: float):
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._blocked_until[bucket] = max(self._blocked_until.get(bucket, 0.0), until)
 
     @staticmethod
     def key_for_platform(platform_host: str) -> str:
@@ -47,3 +144,64 @@ class MultiLimiter:
     def key_for_routing(routing: str) -> str:
         # match-v5 limits are per routing region (americas/europe/asia/sea)
         return routing.lower()
+
+class PgLimiter(MultiLimiter):
+    """
+    Same policy as MultiLimiter, but hits and Retry-After blocks live in Postgres
+    (sql/rate_limit.sql) so every crawler/worker process on the host shares one budget.
+    Each reserve() is one short transaction serialized per key by an advisory lock.
+    """
+    def __init__(self, dsn: str, per_sec: int = 20, per_2min: int = 100,
+                 method_limits: Optional[Mapping[str, Windows]] = None, prune_every: int = 500):
+        super().__init__(per_sec, per_2min, method_limits)
+        import psycopg
+        self._conn = psycopg.connect(dsn, autocommit=True)
+        self._conn_lock = threading.Lock()
+        self._prune_every = prune_every
+        self._since_prune = 0
+
+    def reserve(self, key: str, method: Optional[str] = None) -> float:
+        with self._lock:
+            buckets = self._buckets(key, method)
+        names = [b for b, _ in buckets]
+        longest = max((w for _, windows in buckets for _, w in windows), default=0.0)
+        with self._conn_lock, self._conn.transaction(), self._conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (key.lower(),))
+            cur.execute("""
+                SELECT bucket, EXTRACT(EPOCH FROM clock_timestamp() - ts)::float8
+                  FROM rate_limit_hits
+                 WHERE bucket = ANY(%s) AND ts > clock_timestamp() - make_interval(secs => %s)
+            """, (names, longest))
+            ages: Dict[str, List[float]] = {b: [] for b in names}
+            for bucket, age in cur.fetchall():
+                ages[bucket].append(-age)
+            cur.execute("""
+                SELECT COALESCE(MAX(EXTRACT(EPOCH FROM until - clock_timestamp())), 0)::float8
+                  FROM rate_limit_blocks WHERE bucket = ANY(%s)
+            """, (names,))
+            wait = max(0.0, cur.fetchone()[0])
+            for bucket, windows in buckets:
+                wait = max(wait, _wait_needed(sorted(ages[bucket]), windows, 0.0))
+            if wait > 0:
+                return wait
+            cur.execute("INSERT INTO rate_limit_hits (bucket) SELECT unnest(%s::text[])", (names,))
+            self._since_prune += 1
+            if self._since_prune >= self._prune_every:
+                self._since_prune = 0
+                cur.execute("DELETE FROM rate_limit_hits WHERE ts < clock_timestamp() - interval '10 minutes'")
+        return 0.0
+
+    def penalize(self, bucket: str, seconds: float):
+        with self._conn_lock, self._conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO rate_limit_blocks (bucket, until)
+                VALUES (%s, clock_timestamp() + make_interval(secs => %s))
+                ON CONFLICT (bucket) DO UPDATE SET until = GREATEST(rate_limit_blocks.until, EXCLUDED.until)
+            """, (bucket, seconds))
+
+def build_limiter(backend: str = "memory", dsn: Optional[str] = None, per_sec: int = 20, per_2min: int = 100) -> MultiLimiter:
+    if backend == "postgres":
+        if not dsn:
+            raise ValueError("postgres rate limit backend needs a DSN")
+        return PgLimiter(dsn, per_sec=per_sec, per_2min=per_2min)
+    return MultiLimiter(per_sec=per_sec, per_2min=per_2min)
@@ -1,7 +1,11 @@
 ﻿import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 import httpx
 
+from .rate_limit import MultiLimiter, retry_after
+from .metrics import Metrics
+from .decoding import loads
+
 class RiotClient:
     """
     region  = platform host (e.g., na1, euw1, kr)
@@ -9,47 +13,89 @@ class RiotClient:
 
     League/Summoner endpoints use 'region' (platform host).
     Match v5 endpoints use 'platform' (routing region).
+
+    With a limiter, every request (retries included) acquires from it first and the
+    response's rate-limit headers / Retry-After are fed back via limiter.observe().
+    With metrics, every HTTP attempt's latency (limiter wait excluded) goes into its histogram.
+
+    get_match / get_timeline(raw=True) return the response body undecoded, for callers that only
+    archive it (Storage.write_json takes the bytes as they are).
+
+    429s wait out Retry-After (through the limiter when there is one). 5xx responses are retried
+    after max(Retry-After, backoff), the backoff doubling from 1s up to 16s, at most max_5xx_retries
+    times before the error is raised.
     """
-    def __init__(self, api_key: str, region: str, platform: str, timeout: float = 15.0):
+    def __init__(self, api_key: str, region: str, platform: str, timeout: float = 15.0,
+                 limiter: Optional[MultiLimiter] = None, metrics: Optional[Metrics] = None,
+                 max_5xx_retries: int = 5):
         self.api_key = api_key
+        self.max_5xx_retries = max_5xx_retries
         self.region = region
         self.platform = platform
+        self.limiter = limiter
+        self.metrics = metrics
         self.client = httpx.Client(timeout=timeout)
 
-    def _get(self, url, params=None):
+    def _platform_key(self) -> str:
+        return MultiLimiter.key_for_platform(self.region)
+
+    def _routing_key(self) -> str:
+        return MultiLimiter.key_for_routing(self.platform)
+
+    def _get(self, url, params=None, key: Optional[str] = None, method: Optional[str] = None, raw: bool = False):
         headers = {"X-Riot-Token": self.api_key, "User-Agent": "league-context/1.0"}
         backoff = 1.0
+        failures_5xx = 0
         while True:
+            if self.limiter is not None and key:
+                self.limiter.acquire(key, method)
+            t0 = time.monotonic()
             r = self.client.get(url, params=params, headers=headers)
+            if self.metrics is not None and key and method:
+                scope = "routing" if key == self._routing_key() else "platform"
+                self.metrics.record_request_latency(scope, key, method, time.monotonic() - t0, r.status_code)
+            if self.limiter is not None and key:
+                self.limiter.observe(key, method, r.status_code, r.headers)
             if r.status_code in (401, 403):
                 # show the reason and raise immediately
                 try:
                     print(f"[riot] {r.status_code} url={url} body={r.text}", flush=True)
                 finally:
                     r.raise_for_status()
-            if r.status_code in (429, 503, 504):
-                ra = float(r.headers.get("Retry-After", "1"))
-                time.sleep(ra + 0.1)
-                print(f"[riot] {r.status_code} sleeping {ra}s url={url}", flush=True)
-                time.sleep(ra); backoff = min(backoff * 2, 16.0); continue
+            if r.status_code == 429:
+                ra = retry_after(r.headers)
+                if self.limiter is not None and key:
+                    # limiter now holds the Retry-After block; the next acquire() waits it out
+                    print(f"[riot] 429 retry-after={ra}s url={url}", flush=True)
+                else:
+                    print(f"[riot] 429 sleeping {ra}s url={url}", flush=True)
+                    time.sleep(ra)
+                continue
+            if r.status_code >= 500 and failures_5xx < self.max_5xx_retries:
+                failures_5xx += 1
+                wait = max(retry_after(r.headers, 0.0), backoff)
+                print(f"[riot] {r.status_code} retry {failures_5xx}/{self.max_5xx_retries} in {wait:.1f}s url={url}", flush=True)
+                time.sleep(wait)
+                backoff = min(backoff * 2, 16.0)
+                continue
             r.raise_for_status()
-            return r.json()
+            return r.content if raw else loads(r.content)
 
 
     # --- League lists (Master+) ---
     def get_challenger_entries(self, queue: str = "RANKED_SOLO_5x5") -> List[Dict[str, Any]]:
         url = f"https://{self.region}.api.riotgames.com/lol/league/v4/challengerleagues/by-queue/{queue}"
-        data = self._get(url)
+        data = self._get(url, key=self._platform_key(), method="league")
         return data.get("entries", [])  # [{summonerId, summonerName, ...}]
 
     def get_grandmaster_entries(self, queue: str = "RANKED_SOLO_5x5") -> List[Dict[str, Any]]:
         url = f"https://{self.region}.api.riotgames.com/lol/league/v4/grandmasterleagues/by-queue/{queue}"
-        data = self._get(url)
+        data = self._get(url, key=self._platform_key(), method="league")
         return data.get("entries", [])
 
     def get_master_entries(self, queue: str = "RANKED_SOLO_5x5") -> List[Dict[str, Any]]:
         url = f"https://{self.region}.api.riotgames.com/lol/league/v4/masterleagues/by-queue/{queue}"
-        data = self._get(url)
+        data = self._get(url, key=self._platform_key(), method="league")
         return data.get("entries", [])
 
     def get_entries_paginated(
@@ -66,25 +112,25 @@ class RiotClient:
         tier = tier.upper()
         division = division.upper()
         url = f"https://{self.region}.api.riotgames.com/lol/league/v4/entries/{queue}/{tier}/{division}"
-        return self._get(url, params={"page": page})
+        return self._get(url, params={"page": page}, key=self._platform_key(), method="league")
 
     # --- Summoner (platform host) ---
     def get_summoner_by_id(self, summoner_id: str) -> Dict[str, Any]:
         url = f"https://{self.region}.api.riotgames.com/lol/summoner/v4/summoners/{summoner_id}"
-        return self._get(url)
+        return self._get(url, key=self._platform_key(), method="summoner")
 
     def get_summoner_by_name(self, name: str) -> Dict[str, Any]:
         url = f"https://{self.region}.api.riotgames.com/lol/summoner/v4/summoners/by-name/{name}"
-        return self._get(url)
+        return self._get(url, key=self._platform_key(), method="summoner")
     
     def get_summoner_by_puuid(self, puuid: str) -> dict:
         url = f"https://{self.region}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
-        return self._get(url)
+        return self._get(url, key=self._platform_key(), method="summoner")
 
     def get_ranked_entries_by_summoner(self, summoner_id: str) -> list[dict]:
         # GET /lol/league/v4/entries/by-summoner/{summonerId}
         url = f"https://{self.region}.api.riotgames.com/lol/league/v4/entries/by-summoner/{summoner_id}"
-        return self._get(url)
+        return self._get(url, key=self._platform_key(), method="league")
 
     # --- Match v5 (routing region) ---
     def get_match_ids_by_puuid(
@@ -108,12 +154,12 @@ class RiotClient:
             params["endTime"] = end_time
         if type_:
             params["type"] = type_
-        return self._get(url, params=params)
+        return self._get(url, params=params, key=self._routing_key(), method="matchlist")
 
-    def get_match(self, match_id: str) -> Dict[str, Any]:
+    def get_match(self, match_id: str, raw: bool = False) -> Union[Dict[str, Any], bytes]:
         url = f"https://{self.platform}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-        return self._get(url)
+        return self._get(url, key=self._routing_key(), method="match", raw=raw)
 
-    def get_timeline(self, match_id: str) -> Dict[str, Any]:
+    def get_timeline(self, match_id: str, raw: bool = False) -> Union[Dict[str, Any], bytes]:
         url = f"https://{self.platform}.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
-        return self._get(url)
+        return self._get(url, key=self._routing_key(), method="timeline", raw=raw)
@@ -0,0 +1,70 @@
+# riot/seen_filter.py
+import os
+import math
+import struct
+import hashlib
+from typing import Iterable
+
+_MAGIC = b"LSBF1"
+_HEADER = struct.Struct("<5sQIQ")  # magic, m_bits, k, count
+
+class SeenFilter:
+    """
+    Bloom filter over seen match ids ("NA1_5365324203"), sized from a memory budget.
+    might_contain() == False means the id was definitely never added, so the caller can
+    skip the seen_match_ids lookup; True means "probably", so the DB still decides. That only holds
+    while one process adds every stored id: the filter doesn't see other crawlers' writes.
+    """
+    def __init__(self, memory_bytes: int = 8 * 1024 * 1024, expected_items: int = 5_000_000):
+        self.m = max(8, memory_bytes * 8)
+        # optimal k for the budget: (m/n) * ln 2
+        self.k = max(1, min(16, round(self.m / max(1, expected_items) * math.log(2))))
+        self.bits = bytearray(self.m // 8)
+        self.count = 0
+
+    def _positions(self, match_id: str):
+        d = hashlib.blake2b(match_id.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, match_id: str):
+        bits = self.bits
+        for p in self._positions(match_id):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def update(self, match_ids: Iterable[str]):
+        for mid in match_ids:
+            self.add(mid)
+
+    def might_contain(self, match_id: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(match_id))
+
+    __contains__ = might_contain
+
+    def estimated_fp_rate(self) -> float:
+        return (1.0 - math.exp(-self.k * self.count / self.m)) ** self.k
+
+    # ---- persistence ----
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.m, self.k, self.count))
+            f.write(self.bits)
+        os.replace(tmp, path)  # readers never see a half-written filter
+
+    @classmethod
+    def load(cls, path: str) -> "SeenFilter":
+        with open(path, "rb") as f:
+            magic, m, k, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a seen filter")
+            bits = bytearray(f.read())
+        if len(bits) != m // 8:
+            raise ValueError(f"{path} is truncated")
+        sf = cls.__new__(cls)
+        sf.m, sf.k, sf.count, sf.bits = m, k, count, bits
+        return sf
@@ -0,0 +1,240 @@
+import gzip
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Compacted raw archive. Instead of one object per payload, Storage(compaction=...) appends payloads to
+# rolling segments, one per (patch, region, kind):
+#
+#   raw/{patch}/{region}/{matches|timelines}/seg-{utc}-{id}.ndjson.zst        every payload is one
+#   raw/{patch}/{region}/{matches|timelines}/seg-{utc}-{id}.ndjson.zst.idx.json  independent frame
+#
+# Each payload line is compressed as its own zstd (or gzip) frame. Concatenated frames are still
+# one valid stream, so `zstd -dc seg.ndjson.zst` gives plain NDJSON, while the sidecar index
+# ({"codec", "records": [[match_id, offset, length], ...]}) lets SegmentReader.get fetch a single
+# payload with one ranged read. The index is written after its segment, so a segment without an
+# index never became durable and readers ignore it.
+#
+# Without compaction, payloads are one object each: {match_id}.json, or {match_id}.json.{zst|gz}
+# when Storage(object_codec=...) compresses them on the way out.
+
+SEGMENT_PREFIX = "seg-"
+INDEX_SUFFIX = ".idx.json"
+CODECS = {"zst": "application/zstd", "gz": "application/gzip"}
+OBJECT_SUFFIXES = {".json": None, ".json.zst": "zst", ".json.gz": "gz"}
+
+def _codec(codec: str, level: Optional[int]):
+    """(compress, decompress) for one frame."""
+    if codec == "zst":
+        try:
+            import zstandard  # optional dependency
+        except ImportError as e:
+            raise RuntimeError("zstd segments need the 'zstandard' package (or use codec 'gz')") from e
+        cctx = zstandard.ZstdCompressor(level=3 if level is None else level)
+        dctx = zstandard.ZstdDecompressor()
+        return cctx.compress, dctx.decompress
+    if codec == "gz":
+        return (lambda b: gzip.compress(b, compresslevel=6 if level is None else level, mtime=0)), gzip.decompress
+    raise ValueError(f"Unsupported segment codec {codec!r}")
+
+def stream_writer(codec: str, fileobj, level: Optional[int] = None):
+    """File-like compressor writing one `codec` stream into fileobj; close() finishes the stream, not fileobj."""
+    if codec == "zst":
+        _codec(codec, level)  # same missing-package error as segments
+        import zstandard
+        return zstandard.ZstdCompressor(level=3 if level is None else level).stream_writer(fileobj, closefd=False)
+    if codec == "gz":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6 if level is None else level, mtime=0)
+    raise ValueError(f"Unsupported object codec {codec!r}")
+
+def object_name(name: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(match_id, codec or None) for a per-payload object's file name, None for anything else."""
+    if name.startswith(SEGMENT_PREFIX):
+        return None
+    for suffix, codec in OBJECT_SUFFIXES.items():
+        if name.endswith(suffix):
+            return name[: -len(suffix)], codec
+    return None
+
+class _OpenSegment:
+    __slots__ = ("key", "buf", "records", "opened")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.buf = bytearray()
+        self.records: List[list] = []
+        self.opened = time.monotonic()
+
+class SegmentWriter:
+    """
+    Buffers payloads per (patch, region, kind) and writes them as segments on flush().
+    due() says when a roll threshold is hit: max_bytes compressed in total, max_records in
+    one segment, or the oldest open segment older than max_age_s.
+    """
+    def __init__(self, storage, codec: str = "zst", level: Optional[int] = None,
+                 max_bytes: int = 64 * 1024 * 1024, max_records: int = 2000, max_age_s: float = 300.0):
+        self.storage = storage
+        self.codec = codec
+        self.compress, _ = _codec(codec, level)
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.max_age_s = max_age_s
+        self._open: Dict[Tuple[str, str, str], _OpenSegment] = {}
+        self._lock = threading.Lock()
+
+    def _new_key(self, patch: str, region: str, kind: str) -> str:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        return (f"raw/{patch}/{region}/{self.storage.folder(kind)}/"
+                f"{SEGMENT_PREFIX}{stamp}-{uuid.uuid4().hex[:8]}.ndjson.{self.codec}")
+
+    def add(self, patch: str, region: str, match_id: str, kind: str, payload: bytes) -> str:
+        """Buffers one payload; returns the key of the segment it will be written to."""
+        if b"\n" in payload:
+            # raw response bytes may be pretty-printed; a newline can only be whitespace in JSON
+            payload = payload.replace(b"\n", b" ")
+        frame = self.compress(payload + b"\n")
+        with self._lock:
+            seg = self._open.get((patch, region, kind))
+            if seg is None:
+                seg = self._open[(patch, region, kind)] = _OpenSegment(self._new_key(patch, region, kind))
+            seg.records.append([match_id, len(seg.buf), len(frame)])
+            seg.buf += frame
+            return seg.key
+
+    def buffered_bytes(self) -> int:
+        return sum(len(s.buf) for s in self._open.values())
+
+    def due(self) -> bool:
+        segs = list(self._open.values())
+        if not segs:
+            return False
+        return (sum(len(s.buf) for s in segs) >= self.max_bytes
+                or max(len(s.records) for s in segs) >= self.max_records
+                or time.monotonic() - min(s.opened for s in segs) >= self.max_age_s)
+
+    def flush(self) -> List[str]:
+        """Writes every open segment and its index; returns the match ids now durable."""
+        return self.write(self.take())
+
+    def take(self) -> List[_OpenSegment]:
+        """Closes the open segments and hands them over, for write() now or on an uploader thread."""
+        with self._lock:
+            segs, self._open = list(self._open.values()), {}
+        return segs
+
+    def write(self, segs: List[_OpenSegment]) -> List[str]:
+        """Writes taken segments, each before its index; safe to retry. Returns the match ids now durable."""
+        ids = set()
+        for seg in segs:
+            self.storage.put(seg.key, bytes(seg.buf), CODECS[self.codec])
+            index = {"codec": self.codec, "records": seg.records}
+            self.storage.put(seg.key + INDEX_SUFFIX, json.dumps(index, separators=(",", ":")).encode())
+            ids.update(r[0] for r in seg.records)
+        return sorted(ids)
+
+class SegmentReader:
+    """
+    Reads the raw archive back, compacted segments and one-object-per-payload keys alike:
+    get() fetches one payload (a ranged read for segments), iter_patch() streams a whole patch.
+    Payloads come back as the JSON bytes that were archived; decoding is up to the caller.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self._folders: Dict[str, Dict[str, Tuple]] = {}
+        self._codecs: Dict[str, object] = {}
+
+    def _decompress(self, codec: str):
+        if codec not in self._codecs:
+            self._codecs[codec] = _codec(codec, None)[1]
+        return self._codecs[codec]
+
+    def index(self, segment_key: str) -> dict:
+        return json.loads(self.storage.get(segment_key + INDEX_SUFFIX))
+
+    def _folder_map(self, prefix: str) -> Dict[str, Tuple]:
+        """match_id -> ("segment", key, offset, length, codec) | ("object", key) for one raw/{patch}/{region}/{folder}/."""
+        found = self._folders.get(prefix)
+        if found is None:
+            found = {}
+            for key in self.storage.list_keys(prefix):
+                name = key.rsplit("/", 1)[-1]
+                if name.startswith(SEGMENT_PREFIX) and key.endswith(INDEX_SUFFIX):
+                    seg = key[: -len(INDEX_SUFFIX)]
+                    idx = self.index(seg)
+                    for match_id, off, length in idx["records"]:
+                        found[match_id] = ("segment", seg, off, length, idx["codec"])
+                elif (obj := object_name(name)) is not None:
+                    found.setdefault(obj[0], ("object", key))
+            self._folders[prefix] = found
+        return found
+
+    def locate(self, patch: str, region: str, kind: str, match_id: str) -> Optional[Tuple]:
+        """Where one payload lives (see _folder_map), or None if it isn't in the archive."""
+        return self._folder_map(f"raw/{patch}/{region}/{self.storage.folder(kind)}/").get(match_id)
+
+    def read(self, loc: Tuple) -> bytes:
+        if loc[0] == "object":
+            data = self.storage.get(loc[1])
+            codec = object_name(loc[1].rsplit("/", 1)[-1])[1]
+            return data if codec is None else self._decompress_stream(codec, data)
+        _, seg, off, length, codec = loc
+        return self.decode_frame(codec, self.storage.get(seg, start=off, length=length))
+
+    def _decompress_stream(self, codec: str, data: bytes) -> bytes:
+        # streamed objects don't record their size up front, which ZstdDecompressor.decompress needs
+        if codec == "zst":
+            self._decompress(codec)
+            import zstandard
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return self._decompress(codec)(data)
+
+    def decode_frame(self, codec: str, frame: bytes) -> bytes:
+        return self._decompress(codec)(frame).rstrip(b"\n")
+
+    def get(self, patch: str, region: str, kind: str, match_id: str) -> Optional[bytes]:
+        """One archived payload, or None if it isn't in the archive."""
+        loc = self.locate(patch, region, kind, match_id)
+        return None if loc is None else self.read(loc)
+
+    def units(self, patch: str, kind: str = "match", region: Optional[str] = None,
+              after: Optional[str] = None) -> Iterator[Tuple[str, str, List[Tuple]]]:
+        """
+        (key, region, locations) per segment or per-payload object of one kind, in key order and
+        starting after key `after`; locations are [(match_id, location), ...] in write order.
+        Only segment indexes are read, so this is how a resumable replay walks the archive.
+        """
+        folder = self.storage.folder(kind)
+        prefix = f"raw/{patch}/" + (f"{region}/" if region else "")
+        for key in self.storage.list_keys(prefix):
+            parts = key.split("/")
+            if len(parts) != 5 or parts[3] != folder:
+                continue
+            reg, name = parts[2], parts[4]
+            if name.startswith(SEGMENT_PREFIX):
+                if not key.endswith(INDEX_SUFFIX):
+                    continue
+                seg = key[: -len(INDEX_SUFFIX)]
+                if after is not None and seg <= after:
+                    continue
+                idx = self.index(seg)
+                yield seg, reg, [(mid, ("segment", seg, off, length, idx["codec"])) for mid, off, length in idx["records"]]
+            elif (obj := object_name(name)) is not None:
+                if after is not None and key <= after:
+                    continue
+                yield key, reg, [(obj[0], ("object", key))]
+
+    def iter_patch(self, patch: str, kind: str = "match", region: Optional[str] = None) -> Iterator[Tuple[str, str, bytes]]:
+        """
+        (region, match_id, payload) for every archived payload of one kind in a patch, one GET per
+        segment. A match archived twice (re-crawled) comes out twice; callers upsert anyway.
+        """
+        for key, reg, locs in self.units(patch, kind, region):
+            if locs[0][1][0] == "object":
+                yield reg, locs[0][0], self.read(locs[0][1])
+                continue
+            blob = self.storage.get(key)
+            for match_id, (_, _, off, length, codec) in locs:
+                yield reg, match_id, self.decode_frame(codec, blob[off:off + length])
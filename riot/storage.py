@@ -1,10 +1,21 @@
-﻿import json
-from typing import Dict, Any
+﻿import os
+import json
+import tempfile
+from typing import Dict, Any, Iterator, Optional, Union
 
 class Storage:
-    def __init__(self, backend: str, bucket: str, **kwargs):
+    """
+    Raw-archive object store: gcs, s3, or local (bucket = a directory; for tests and replays).
+    With compaction set (riot/segments.SegmentWriter), write_json buffers payloads into rolling
+    NDJSON segments instead of writing one object per match; call flush() to make them durable.
+    Without compaction, object_codec (zst | gz) compresses each object as it is written.
+    """
+    def __init__(self, backend: str, bucket: str, compaction: Optional[Dict[str, Any]] = None,
+                 object_codec: Optional[str] = None, object_level: Optional[int] = None, **kwargs):
         self.backend = backend
         self.bucket = bucket
+        self.object_codec = object_codec or None
+        self.object_level = object_level
         if backend == "gcs":
             from google.cloud import storage as gcs
             self.client = gcs.Client()
@@ -17,26 +28,125 @@ class Storage:
                 aws_access_key_id=kwargs.get("aws_access_key_id"),
                 aws_secret_access_key=kwargs.get("aws_secret_access_key"),
                 region_name=kwargs.get("region_name"))
+        elif backend == "local":
+            self.root = bucket.replace("file://", "")
         else:
             raise ValueError("Unsupported backend")
+        self.segments = None
+        if compaction is not None:
+            from .segments import SegmentWriter
+            self.segments = SegmentWriter(self, **compaction)
 
-    def _path(self, patch: str, region: str, match_id: str, kind: str) -> str:
+    @staticmethod
+    def folder(kind: str) -> str:
         ## Have to get our folders named correctly for various word endings
         if kind == "match":
-            folder = "matches"
+            return "matches"
         elif kind == "timeline":
-            folder = "timelines"
+            return "timelines"
+        return f"{kind}s"
+
+    def _path(self, patch: str, region: str, match_id: str, kind: str) -> str:
+        suffix = f".{self.object_codec}" if self.object_codec else ""
+        return f"raw/{patch}/{region}/{self.folder(kind)}/{match_id}.json{suffix}"
+
+    # ---------- object primitives ----------
+    def put(self, key: str, payload: bytes, content_type: str = "application/json"):
+        if self.backend == "gcs":
+            blob = self.bucket_ref.blob(key)
+            blob.upload_from_string(payload, content_type=content_type)
+        elif self.backend == "local":
+            path = os.path.join(self.root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)  # readers never see a half-written object
         else:
-            folder = f"{kind}s"
-        return f"raw/{patch}/{region}/{folder}/{match_id}.json"
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=payload, ContentType=content_type) # pyright: ignore[reportAttributeAccessIssue]
 
+    def put_compressed(self, key: str, payload: bytes, codec: str, level: Optional[int] = None, chunk: int = 1 << 20):
+        """
+        put() of payload compressed on the way out, a chunk at a time: straight into the file on
+        local, into a spooled buffer that is then uploaded as a stream on gcs / s3.
+        """
+        from .segments import CODECS, stream_writer
+        view = memoryview(payload)
+        if self.backend == "local":
+            path = os.path.join(self.root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".part"
+            with open(tmp, "wb") as f:
+                with stream_writer(codec, f, level) as w:
+                    for i in range(0, len(view), chunk):
+                        w.write(view[i:i + chunk])
+            os.replace(tmp, path)
+            return
+        with tempfile.SpooledTemporaryFile(max_size=8 << 20) as f:
+            with stream_writer(codec, f, level) as w:
+                for i in range(0, len(view), chunk):
+                    w.write(view[i:i + chunk])
+            f.seek(0)
+            if self.backend == "gcs":
+                self.bucket_ref.blob(key).upload_from_file(f, content_type=CODECS[codec])
+            else:
+                self.client.upload_fileobj(f, self.bucket, key, ExtraArgs={"ContentType": CODECS[codec]}) # pyright: ignore[reportAttributeAccessIssue]
 
-    def write_json(self, patch: str, region: str, match_id: str, kind: str, data: Dict[str, Any]):
-        key = self._path(patch, region, match_id, kind)
-        payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    def get(self, key: str, start: Optional[int] = None, length: Optional[int] = None) -> bytes:
+        """Whole object, or `length` bytes from `start` (a ranged GET on gcs / s3)."""
         if self.backend == "gcs":
             blob = self.bucket_ref.blob(key)
-            blob.upload_from_string(payload, content_type="application/json")
+            if start is None:
+                return blob.download_as_bytes()
+            return blob.download_as_bytes(start=start, end=start + length - 1)  # end is inclusive
+        if self.backend == "local":
+            with open(os.path.join(self.root, key), "rb") as f:
+                if start is None:
+                    return f.read()
+                f.seek(start)
+                return f.read(length)
+        kw = {} if start is None else {"Range": f"bytes={start}-{start + length - 1}"}
+        return self.client.get_object(Bucket=self.bucket, Key=key, **kw)["Body"].read() # pyright: ignore[reportAttributeAccessIssue]
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        """Keys under `prefix`, in lexical order."""
+        if self.backend == "gcs":
+            for blob in self.client.list_blobs(self.bucket_ref, prefix=prefix):
+                yield blob.name
+        elif self.backend == "local":
+            base = os.path.join(self.root, prefix.rstrip("/"))
+            keys = []
+            for dirpath, _, files in os.walk(base):
+                for name in files:
+                    if not name.endswith(".part"):
+                        keys.append(os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/"))
+            yield from sorted(keys)
+        else:
+            pages = self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix) # pyright: ignore[reportAttributeAccessIssue]
+            for page in pages:
+                for obj in page.get("Contents", []):
+                    yield obj["Key"]
+
+    # ---------- raw archive ----------
+    def write_json(self, patch: str, region: str, match_id: str, kind: str, data: Union[Dict[str, Any], bytes]):
+        """Archives one payload: a decoded dict, or the response body as Riot sent it (stored as-is)."""
+        if isinstance(data, (bytes, bytearray)):
+            payload = bytes(data)
         else:
-            self.client.put_object(Bucket=self.bucket, Key=key, Body=payload, ContentType="application/json") # pyright: ignore[reportAttributeAccessIssue]
+            payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        if self.segments is not None:
+            return self.segments.add(patch, region, match_id, kind, payload)
+        key = self._path(patch, region, match_id, kind)
+        if self.object_codec:
+            self.put_compressed(key, payload, self.object_codec, self.object_level)
+        else:
+            self.put(key, payload)
         return key
+
+    def flush(self, force: bool = True) -> list[str]:
+        """Writes buffered segments (all of them, or only if a roll threshold is hit); returns the match ids made durable."""
+        if self.segments is None:
+            return []
+        if not force and not self.segments.due():
+            return []
+        return self.segments.flush()
@@ -0,0 +1,113 @@
+# riot/uploader.py
+from __future__ import annotations
+import time
+import queue
+import random
+import threading
+from collections import deque
+from typing import Callable, Deque, Optional
+
+from .metrics import Metrics
+
+class _Job:
+    __slots__ = ("label", "fn", "on_done", "on_fail", "queued_at")
+
+    def __init__(self, label: str, fn: Callable[[], object], on_done: Optional[Callable[[], object]],
+                 on_fail: Optional[Callable[[], object]] = None):
+        self.label = label
+        self.fn = fn
+        self.on_done = on_done
+        self.on_fail = on_fail
+        self.queued_at = time.monotonic()
+
+class Uploader:
+    """
+    Background object-store uploads for the crawler.
+    submit() queues an upload (a callable doing the PUTs) and returns right away; it only blocks
+    while `max_queue` uploads are already waiting, which keeps payload memory bounded. `workers`
+    threads run the uploads, retrying failures with jittered exponential backoff. on_done runs on
+    the uploader thread once the upload succeeded. That is where the ledger is told the match is
+    stored, so nothing is marked seen/done before its payloads are durable. An upload that still
+    fails after `retries` retries is dropped; its queue lease expires and the match is crawled again.
+    """
+    def __init__(self, workers: int = 4, max_queue: int = 64, retries: int = 5, backoff_s: float = 0.5,
+                 max_backoff_s: float = 30.0, metrics: Optional[Metrics] = None, keep_failed: int = 1000):
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.metrics = metrics
+        # labels of the latest uploads that ran out of retries (the oldest fall off); given_up counts them all
+        self.failed: Deque[str] = deque(maxlen=keep_failed)
+        self.given_up = 0
+        self._given_up_lock = threading.Lock()
+        self._q: queue.Queue[Optional[_Job]] = queue.Queue(maxsize=max_queue)
+        self._threads = [threading.Thread(target=self._run, name=f"uploader-{i}", daemon=True) for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, label: str, fn: Callable[[], object], on_done: Optional[Callable[[], object]] = None,
+               on_fail: Optional[Callable[[], object]] = None):
+        """on_fail runs (on the uploader thread) when the upload is given up on."""
+        self._q.put(_Job(label, fn, on_done, on_fail))
+        self._gauge()
+
+    def pending(self) -> int:
+        """Uploads queued or in flight."""
+        return self._q.unfinished_tasks
+
+    def join(self):
+        """Waits until every submitted upload has finished (succeeded or given up)."""
+        self._q.join()
+
+    def close(self):
+        self.join()
+        for _ in self._threads:
+            self._q.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _gauge(self):
+        if self.metrics is not None:
+            self.metrics.set_upload_queue(self._q.unfinished_tasks)
+
+    def _run(self):
+        while True:
+            job = self._q.get()
+            try:
+                if job is None:
+                    return
+                ok = self._upload(job)
+                callback = job.on_done if ok else job.on_fail
+                if callback is not None:
+                    try:
+                        callback()
+                    except Exception as ex:
+                        # payloads are durable (or not written at all); the lease expires and the re-crawl sorts it out
+                        print(f"[upload] {job.label} {'completion' if ok else 'failure'} callback failed: {ex!r}", flush=True)
+            finally:
+                self._q.task_done()
+                self._gauge()
+
+    def _upload(self, job: _Job) -> bool:
+        delay = self.backoff_s
+        for attempt in range(self.retries + 1):
+            t0 = time.monotonic()
+            try:
+                job.fn()
+            except Exception as ex:
+                if self.metrics is not None:
+                    self.metrics.record_upload(time.monotonic() - t0, ok=False)
+                if attempt == self.retries:
+                    print(f"[upload] giving up on {job.label} after {attempt + 1} attempts: {ex!r}", flush=True)
+                    self.failed.append(job.label)
+                    with self._given_up_lock:
+                        self.given_up += 1
+                    return False
+                print(f"[upload] {job.label} failed ({ex!r}), retrying in {delay:.1f}s", flush=True)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.max_backoff_s)
+                continue
+            if self.metrics is not None:
+                self.metrics.record_upload(time.monotonic() - t0, ok=True, queued_s=t0 - job.queued_at)
+            return True
+        return False
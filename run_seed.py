@@ -1,5 +1,5 @@
 ﻿# run_seed.py
-import os, argparse
+import os, time, argparse
 from typing import Iterable
 from dotenv import load_dotenv
 import psycopg
@@ -8,6 +8,8 @@ from datetime import datetime, timezone
 
 from riot.client import match_ids_by_puuid, get_match, get_timeline, ddragon_latest_version, ddragon_champions, ddragon_items
 from riot.normalize import derive_patch, derive_lane_role
+from riot.decoding import extract_timeline
+from riot.metrics import Metrics
 
 from util.logging import setup_logger
 log = setup_logger(__name__)
@@ -18,6 +20,11 @@ load_dotenv()
 PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
 DEFAULT_ROUTING = os.getenv("DEFAULT_ROUTING", "AMERICAS")
 DEFAULT_QUEUE = int(os.getenv("DEFAULT_QUEUE", "420"))
+# where per-minute frames go: "rows" = lol.participant_frames, "arrays" = lol.participant_frame_arrays
+# (sql/frame_arrays.sql), "both" while migrating
+FRAME_STORE = os.getenv("FRAME_STORE", "rows").lower()
+# text id -> surrogate key entries kept per process before the cache starts over
+KEY_CACHE_MAX = int(os.getenv("KEY_CACHE_MAX", "200000"))
 ITEM_NAME_CACHE: dict[int, str] | None = None
 
 def get_item_name(item_id: int) -> str:
@@ -49,11 +56,82 @@ def upsert_champions_items(conn: psycopg.Connection):
                         (iid, name))
             
             
+class KeyResolver:
+    """
+    Maps Riot's text ids onto the integer surrogate keys of lol.match_keys / lol.player_keys,
+    creating missing keys as it goes. Lookups are batched (one SELECT, one INSERT for the misses)
+    and cached in-process; the cache is dropped wholesale once it holds max_cached entries.
+    Keys created inside a transaction that later rolls back are gone from the database,
+    so callers must clear() after a failed write.
+    """
+    def __init__(self, max_cached: int = KEY_CACHE_MAX):
+        self.max_cached = max_cached
+        self._match: dict[str, int] = {}
+        self._player: dict[str, int] = {}
+
+    def clear(self):
+        self._match.clear()
+        self._player.clear()
+
+    def _resolve(self, cur, table: str, key_col: str, id_col: str, cache: dict[str, int], ids: Iterable[str]) -> dict[str, int]:
+        out = {i: cache[i] for i in ids if i in cache}
+        missing = [i for i in dict.fromkeys(ids) if i not in out]
+        if missing:
+            cur.execute(f"SELECT {id_col}, {key_col} FROM {table} WHERE {id_col} = ANY(%s)", (missing,))
+            out.update(cur.fetchall())
+            missing = [i for i in missing if i not in out]
+        if missing:
+            cur.execute(f"""
+              INSERT INTO {table} ({id_col}) SELECT unnest(%s::text[])
+              ON CONFLICT ({id_col}) DO NOTHING
+              RETURNING {id_col}, {key_col}
+            """, (missing,))
+            out.update(cur.fetchall())
+            lost = [i for i in missing if i not in out]  # inserted concurrently by another writer
+            if lost:
+                cur.execute(f"SELECT {id_col}, {key_col} FROM {table} WHERE {id_col} = ANY(%s)", (lost,))
+                out.update(cur.fetchall())
+        if len(cache) + len(out) > self.max_cached:
+            cache.clear()
+        cache.update(out)
+        return out
+
+    def match_keys(self, cur, match_ids: Iterable[str]) -> dict[str, int]:
+        return self._resolve(cur, "lol.match_keys", "match_key", "match_id", self._match, list(match_ids))
+
+    def player_keys(self, cur, puuids: Iterable[str]) -> dict[str, int]:
+        return self._resolve(cur, "lol.player_keys", "player_key", "puuid", self._player, list(puuids))
+
+    def encode(self, cur, rows: list[tuple]) -> list[tuple]:
+        """Swaps the leading (match_id, puuid) of participant/frame/event rows for (match_key, player_key)."""
+        if not rows:
+            return []
+        mk = self.match_keys(cur, [r[0] for r in rows])
+        pk = self.player_keys(cur, [r[1] for r in rows])
+        return [(mk[r[0]], pk[r[1]]) + tuple(r[2:]) for r in rows]
+
+KEYS = KeyResolver()
+
+# patches whose partitions this process has already created or seen
+PATCH_PARTITIONS: set[str] = set()
+
+def ensure_patch_partitions(conn: psycopg.Connection, patches: Iterable[str]):
+    """
+    Creates the lol.* partitions for patches not seen yet (lol.create_patch_partitions, sql/partitions.sql).
+    Call it outside the write transaction: creating a partition locks its parent table until commit.
+    """
+    new = sorted(set(patches) - PATCH_PARTITIONS)
+    if not new:
+        return
+    with conn.cursor() as cur:
+        cur.execute("SELECT lol.create_patch_partitions(p) FROM unnest(%s::text[]) AS p", (new,))
+    PATCH_PARTITIONS.update(new)
+
 def _ts_ms_to_dt(ts_ms: int):
     return datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc)
 
 def insert_match(conn: psycopg.Connection, info: dict):
-    match_id = info["gameId"]
+    match_id = str(info["gameId"])
     region = info.get("platformId","NA1")
     queue_id = info["queueId"]
     patch = derive_patch(info["gameVersion"])
@@ -61,14 +139,16 @@ def insert_match(conn: psycopg.Connection, info: dict):
     game_start_ts = psycopg.TimestampFromTicks(info["gameStartTimestamp"]/1000.0)
     duration_s = info["gameDuration"]
     blue_win = any(p["win"] for p in info["participants"] if p["teamId"] == 100)
+    ensure_patch_partitions(conn, [patch])
     with conn.cursor() as cur:
+        match_key = KEYS.match_keys(cur, [match_id])[match_id]
         cur.execute("""
-        INSERT INTO lol.matches (match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (match_id) DO NOTHING
-        """, (match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, None, blue_win))
+        INSERT INTO lol.matches (match_key, match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        ON CONFLICT (match_key, patch) DO NOTHING
+        """, (match_key, match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, None, blue_win))
 
-def insert_match_from_payload(conn: psycopg.Connection, match_payload: dict):
+def match_row(match_payload: dict, skill_tier: str | None = None) -> tuple:
     mid = match_payload["metadata"]["matchId"]       # <-- canonical, e.g. "NA1_5365324203"
     info = match_payload["info"]
     region = info.get("platformId","NA1")
@@ -78,60 +158,73 @@ def insert_match_from_payload(conn: psycopg.Connection, match_payload: dict):
     game_start_ts = _ts_ms_to_dt(info["gameStartTimestamp"])
     duration_s = info["gameDuration"]
     blue_win = any(p["win"] for p in info["participants"] if p["teamId"] == 100)
+    return (mid, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
 
+def insert_match_from_payload(conn: psycopg.Connection, match_payload: dict):
+    row = match_row(match_payload)
+    ensure_patch_partitions(conn, [row[3]])
     with conn.cursor() as cur:
+        match_key = KEYS.match_keys(cur, [row[0]])[row[0]]
         cur.execute("""
-        INSERT INTO lol.matches (match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (match_id) DO NOTHING
-        """, (mid, region, queue_id, patch, game_version, game_start_ts, duration_s, None, blue_win))
+        INSERT INTO lol.matches (match_key, match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        ON CONFLICT (match_key, patch) DO NOTHING
+        """, (match_key,) + row)
 
 
-def insert_participants_from_payload(conn: psycopg.Connection, match_payload: dict):
+def participant_rows(match_payload: dict) -> list[tuple]:
     mid = match_payload["metadata"]["matchId"]       # <-- canonical
-    info = match_payload["info"]
+    rows = []
+    for p in match_payload["info"]["participants"]:
+        lane_d, role_d = derive_lane_role(p)
+        cs = p.get("totalMinionsKilled",0) + p.get("neutralMinionsKilled",0)
+        rows.append((
+            mid, p["puuid"], p["teamId"], p["championId"],
+            p.get("lane"), p.get("role"), lane_d, role_d,
+            p["win"], p["kills"], p["deaths"], p["assists"],
+            cs, p.get("goldEarned",0), p.get("totalDamageDealtToChampions"),
+            p.get("item0"), p.get("item1"), p.get("item2"),
+            p.get("item3"), p.get("item4"), p.get("item5"), p.get("item6")
+        ))
+    return rows
 
+def insert_participants_from_payload(conn: psycopg.Connection, match_payload: dict):
+    patch = derive_patch(match_payload["info"]["gameVersion"])
     with conn.cursor() as cur:
-        for p in info["participants"]:
-            lane_d, role_d = derive_lane_role(p)
-            cs = p.get("totalMinionsKilled",0) + p.get("neutralMinionsKilled",0)
+        for row in KEYS.encode(cur, participant_rows(match_payload)):
             cur.execute("""
             INSERT INTO lol.participants
-              (match_id, puuid, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
+              (match_key, player_key, patch, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
                win, kills, deaths, assists, cs, gold_earned, damage_dealt,
                item0,item1,item2,item3,item4,item5,item6)
             VALUES
-              (%s,%s,%s,%s,%s,%s,%s,%s,
+              (%s,%s,%s,%s,%s,%s,%s,%s,%s,
                %s,%s,%s,%s,%s,%s,%s,
                %s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (match_id, puuid) DO NOTHING
-            """, (
-                mid, p["puuid"], p["teamId"], p["championId"],
-                p.get("lane"), p.get("role"), lane_d, role_d,
-                p["win"], p["kills"], p["deaths"], p["assists"],
-                cs, p.get("goldEarned",0), p.get("totalDamageDealtToChampions"),
-                p.get("item0"), p.get("item1"), p.get("item2"),
-                p.get("item3"), p.get("item4"), p.get("item5"), p.get("item6")
-            ))
+            ON CONFLICT (match_key, player_key, patch) DO NOTHING
+            """, row[:2] + (patch,) + row[2:])
 
 def insert_participants(conn: psycopg.Connection, info: dict):
-    mid = info["gameId"]
+    mid = str(info["gameId"])
+    patch = derive_patch(info["gameVersion"])
     with conn.cursor() as cur:
+        match_key = KEYS.match_keys(cur, [mid])[mid]
+        player_keys = KEYS.player_keys(cur, [p["puuid"] for p in info["participants"]])
         for p in info["participants"]:
             lane_d, role_d = derive_lane_role(p)
             cs = p.get("totalMinionsKilled",0) + p.get("neutralMinionsKilled",0)
             cur.execute("""
             INSERT INTO lol.participants
-              (match_id, puuid, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
+              (match_key, player_key, patch, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
                win, kills, deaths, assists, cs, gold_earned, damage_dealt,
                item0,item1,item2,item3,item4,item5,item6)
             VALUES
-              (%s,%s,%s,%s,%s,%s,%s,%s,
+              (%s,%s,%s,%s,%s,%s,%s,%s,%s,
                %s,%s,%s,%s,%s,%s,%s,
                %s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (match_id, puuid) DO NOTHING
+            ON CONFLICT (match_key, player_key, patch) DO NOTHING
             """, (
-                mid, p["puuid"], p["teamId"], p["championId"],
+                match_key, player_keys[p["puuid"]], patch, p["teamId"], p["championId"],
                 p.get("lane"), p.get("role"), lane_d, role_d,
                 p["win"], p["kills"], p["deaths"], p["assists"],
                 cs, p.get("goldEarned",0), p.get("totalDamageDealtToChampions"),
@@ -139,85 +232,309 @@ def insert_participants(conn: psycopg.Connection, info: dict):
                 p.get("item3"), p.get("item4"), p.get("item5"), p.get("item6")
             ))
 
+def timeline_rows(timeline: dict | bytes) -> tuple[list[tuple], list[tuple]]:
+    """Flattens a timeline (decoded, or its raw JSON) into (participant_frames rows, item_events rows)."""
+    cols = extract_timeline(timeline)
+    return cols.frame_rows(), cols.event_rows()
+
+def frame_array_rows(frame_rows: Iterable[tuple]) -> list[tuple]:
+    """
+    Packs participant_frames rows into one (match_id, puuid, gold[], xp[], cs[]) row per participant.
+    Minute m lives at array index m + 1 (Postgres arrays are 1-based); missing minutes stay NULL.
+    """
+    by_participant: dict[tuple[str, str], list[tuple]] = {}
+    for mid, pu, minute, gold, xp, cs in frame_rows:
+        by_participant.setdefault((mid, pu), []).append((minute, gold, xp, cs))
+    out = []
+    for (mid, pu), frames in by_participant.items():
+        n = max(f[0] for f in frames) + 1
+        gold, xp, cs = [None] * n, [None] * n, [None] * n
+        for minute, g, x, c in frames:
+            gold[minute], xp[minute], cs[minute] = g, x, c
+        out.append((mid, pu, gold, xp, cs))
+    return out
+
+def frame_stores(store: str = FRAME_STORE) -> tuple[str, ...]:
+    if store not in ("rows", "arrays", "both"):
+        raise ValueError(f"FRAME_STORE must be rows, arrays or both, not {store!r}")
+    return ("rows", "arrays") if store == "both" else (store,)
+
 """inserts timeline data, including participant frames and item events"""
-def insert_timeline(conn: psycopg.Connection, timeline: dict):
-    mid = timeline["metadata"]["matchId"]
-    # participantId (1..10) -> puuid
-    id_to_puuid = {str(i+1): pu for i, pu in enumerate(timeline["metadata"]["participants"])}
+def insert_timeline(conn: psycopg.Connection, timeline: dict, frame_store: str = FRAME_STORE):
+    frame_rows, event_rows = timeline_rows(timeline)
+    stores = frame_stores(frame_store)
 
     with conn.cursor() as cur:
-        # Per-minute frames
-        for minute, fr in enumerate(timeline["info"]["frames"]):
-            pf = fr.get("participantFrames", {})
-            for pid, snap in pf.items():
-                pu = id_to_puuid.get(pid)
-                if not pu:
-                    continue
-                gold = snap.get("totalGold") or snap.get("gold") or 0
-                cs = snap.get("minionsKilled", 0) + snap.get("jungleMinionsKilled", 0)
-                xp = snap.get("xp", 0)
+        # frames/events live in their match's patch partition, so the match must be stored first
+        mid = timeline["metadata"]["matchId"]
+        match_key = KEYS.match_keys(cur, [mid])[mid]
+        found = cur.execute("SELECT patch FROM lol.matches WHERE match_key = %s", (match_key,)).fetchone()
+        if found is None:
+            log.warning(f"Skipping timeline for {mid}: match not stored")
+            return
+        patch = found[0]
+
+        if "rows" in stores:
+            for row in KEYS.encode(cur, frame_rows):
+                cur.execute("""
+                    INSERT INTO lol.participant_frames (match_key, player_key, patch, minute, gold, xp, cs)
+                    VALUES (%s,%s,%s,%s,%s,%s,%s)
+                    ON CONFLICT (match_key, player_key, minute, patch) DO NOTHING
+                """, row[:2] + (patch,) + row[2:])
+        if "arrays" in stores:
+            for row in KEYS.encode(cur, frame_array_rows(frame_rows)):
+                cur.execute("""
+                    INSERT INTO lol.participant_frame_arrays (match_key, player_key, patch, gold, xp, cs)
+                    VALUES (%s,%s,%s,%s,%s,%s)
+                    ON CONFLICT (match_key, player_key, patch) DO NOTHING
+                """, row[:2] + (patch,) + row[2:])
+
+        for (mid, pu, ts_ms, r_type, r_item), (mk, pk, *_) in zip(event_rows, KEYS.encode(cur, event_rows)):
+            try:
+                ensure_item_exists(cur, r_item)
                 cur.execute("""
-                    INSERT INTO lol.participant_frames (match_id, puuid, minute, gold, xp, cs)
+                    INSERT INTO lol.item_events (match_key, player_key, patch, ts_ms, event_type, item_id)
                     VALUES (%s,%s,%s,%s,%s,%s)
-                    ON CONFLICT (match_id, puuid, minute) DO NOTHING
-                """, (mid, pu, minute, int(gold), int(xp), int(cs)))
-
-        # Item-oriented events
-                # Item-oriented events
-        for fr in timeline["info"]["frames"]:
-            for ev in fr.get("events", []):
-                ev_type = ev.get("type")
-                if ev_type not in ("ITEM_PURCHASED", "ITEM_SOLD", "ITEM_UNDO", "ITEM_DESTROYED", "ITEM_PICKUP"):
-                    continue
-
-                pid = ev.get("participantId")
-                pu = id_to_puuid.get(str(pid)) if pid is not None else None
-                if not pu:
-                    continue  # non-participant event
-
-                ts_ms = int(ev.get("timestamp", 0))
-                rows = []
-
-                if ev_type == "ITEM_PURCHASED":
-                    item_id = ev.get("itemId")
-                    if item_id:
-                        rows.append(("PURCHASE", int(item_id)))
-
-                elif ev_type == "ITEM_SOLD":
-                    item_id = ev.get("itemId")
-                    if item_id:
-                        rows.append(("SELL", int(item_id)))
-
-                elif ev_type == "ITEM_DESTROYED":
-                    item_id = ev.get("itemId")
-                    if item_id:
-                        rows.append(("DESTROY", int(item_id)))
-
-                elif ev_type == "ITEM_PICKUP":
-                    item_id = ev.get("itemId")
-                    if item_id:
-                        rows.append(("PICKUP", int(item_id)))
-
-                elif ev_type == "ITEM_UNDO":
-                    b = ev.get("beforeId")  # may be 0/None
-                    a = ev.get("afterId")
-                    if b and b != 0:
-                        rows.append(("UNDO_BEFORE", int(b)))
-                    if a and a != 0 and a != b:
-                        rows.append(("UNDO_AFTER", int(a)))
-
-                for r_type, r_item in rows:
-                    try:
-                        ensure_item_exists(cur, r_item)
-                        cur.execute("""
-                            INSERT INTO lol.item_events (match_id, puuid, ts_ms, event_type, item_id)
-                            VALUES (%s,%s,%s,%s,%s)
-                            ON CONFLICT DO NOTHING
-                        """, (mid, pu, ts_ms, r_type, r_item))
-                    except Exception as ex:
-                        log.warning(
-                            f"Skipping item event insert mid={mid} pu={pu} ts={ts_ms} type={r_type} item={r_item}: {ex}"
-                        )
+                    ON CONFLICT DO NOTHING
+                """, (mk, pk, patch, ts_ms, r_type, r_item))
+            except Exception as ex:
+                log.warning(
+                    f"Skipping item event insert mid={mid} pu={pu} ts={ts_ms} type={r_type} item={r_item}: {ex}"
+                )
+
+# ----------------------------
+# Bulk ingest (COPY -> staging -> set-based merge)
+# ----------------------------
+MATCH_COLS = ("match_key", "match_id", "region", "queue_id", "patch", "game_version", "game_start_ts", "duration_s", "skill_tier", "blue_win")
+PARTICIPANT_COLS = ("match_key", "player_key", "team_id", "champ_id", "lane_raw", "role_raw", "lane_derived", "role_derived",
+                    "win", "kills", "deaths", "assists", "cs", "gold_earned", "damage_dealt",
+                    "item0", "item1", "item2", "item3", "item4", "item5", "item6")
+FRAME_COLS = ("match_key", "player_key", "minute", "gold", "xp", "cs")
+FRAME_ARRAY_COLS = ("match_key", "player_key", "gold", "xp", "cs")
+ITEM_EVENT_COLS = ("match_key", "player_key", "ts_ms", "event_type", "item_id")
+
+# Temp tables live for the session; ON COMMIT DELETE ROWS empties them after every flush.
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS stg_matches (
+  match_key BIGINT, match_id TEXT, region TEXT, queue_id INT, patch TEXT, game_version TEXT,
+  game_start_ts TIMESTAMPTZ, duration_s INT, skill_tier TEXT, blue_win BOOLEAN
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS stg_participants (
+  match_key BIGINT, player_key INT, team_id INT, champ_id INT, lane_raw TEXT, role_raw TEXT,
+  lane_derived TEXT, role_derived TEXT, win BOOLEAN, kills INT, deaths INT, assists INT,
+  cs INT, gold_earned INT, damage_dealt INT,
+  item0 INT, item1 INT, item2 INT, item3 INT, item4 INT, item5 INT, item6 INT
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS stg_participant_frames (
+  match_key BIGINT, player_key INT, minute INT, gold INT, xp INT, cs INT
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS stg_participant_frame_arrays (
+  match_key BIGINT, player_key INT, gold INT[], xp INT[], cs INT[]
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS stg_item_events (
+  match_key BIGINT, player_key INT, ts_ms BIGINT, event_type TEXT, item_id INT
+) ON COMMIT DELETE ROWS;
+"""
+
+MERGE_SQL = [
+    f"""INSERT INTO lol.matches ({", ".join(MATCH_COLS)})
+        SELECT {", ".join(MATCH_COLS)} FROM stg_matches
+        ON CONFLICT (match_key, patch) DO NOTHING""",
+    # staging rows carry no patch; the facts take it from the match they join to
+    f"""INSERT INTO lol.participants ({", ".join(PARTICIPANT_COLS)}, patch)
+        SELECT {", ".join("s." + c for c in PARTICIPANT_COLS)}, m.patch FROM stg_participants s
+        JOIN lol.matches m ON m.match_key = s.match_key
+        ON CONFLICT (match_key, player_key, patch) DO NOTHING""",
+    # frames/events only for participants that actually exist (timeline may arrive without its match)
+    f"""INSERT INTO lol.item_events ({", ".join(ITEM_EVENT_COLS)}, patch)
+        SELECT {", ".join("s." + c for c in ITEM_EVENT_COLS)}, p.patch FROM stg_item_events s
+        JOIN lol.participants p ON p.match_key = s.match_key AND p.player_key = s.player_key
+        ON CONFLICT DO NOTHING""",
+]
+
+# one per frame store; run after MERGE_SQL so the participants they join to are in place
+FRAME_MERGE_SQL = {
+    "rows": f"""INSERT INTO lol.participant_frames ({", ".join(FRAME_COLS)}, patch)
+        SELECT {", ".join("s." + c for c in FRAME_COLS)}, p.patch FROM stg_participant_frames s
+        JOIN lol.participants p ON p.match_key = s.match_key AND p.player_key = s.player_key
+        ON CONFLICT (match_key, player_key, minute, patch) DO NOTHING""",
+    "arrays": f"""INSERT INTO lol.participant_frame_arrays ({", ".join(FRAME_ARRAY_COLS)}, patch)
+        SELECT {", ".join("s." + c for c in FRAME_ARRAY_COLS)}, p.patch FROM stg_participant_frame_arrays s
+        JOIN lol.participants p ON p.match_key = s.match_key AND p.player_key = s.player_key
+        ON CONFLICT (match_key, player_key, patch) DO NOTHING""",
+}
+
+def apply_cube(conn: psycopg.Connection, match_ids: Iterable[str]) -> int:
+    """Folds matches into the lol.cube_* aggregates (sql/flex_cube.sql); parts already applied are skipped."""
+    ids = list(dict.fromkeys(match_ids))
+    if not ids:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute("SELECT lol.cube_apply(%s::text[])", (ids,))
+        return cur.fetchone()[0]
+
+def bump_data_versions(conn: psycopg.Connection, patches: Iterable[str]):
+    """Bumps lol.data_versions (sql/data_versions.sql) so cached /stats/flexible answers for these patches go stale."""
+    patches = sorted(set(patches))
+    if not patches:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+          INSERT INTO lol.data_versions (patch) SELECT unnest(%s::text[])
+          ON CONFLICT (patch) DO UPDATE SET version = lol.data_versions.version + 1, updated_at = now()
+        """, (patches,))
+
+def data_versions_enabled(conn: psycopg.Connection, setting: str) -> bool:
+    """BUMP_DATA_VERSIONS: "1" / "0" force bumping on / off, "auto" bumps whenever lol.data_versions exists."""
+    if setting != "auto":
+        return setting == "1"
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('lol.data_versions') IS NOT NULL")
+        return cur.fetchone()[0]
+
+class BulkIngest:
+    """
+    Buffers matches, participants, frames and item events in memory and writes them
+    with COPY into session temp tables followed by one INSERT ... SELECT per target table.
+    A flush is a handful of round trips regardless of how many matches are buffered.
+    Buffers hold Riot's text ids; they're swapped for surrogate keys (KeyResolver) at flush time.
+    With maintain_cube=True the flushed matches are folded into the flexible cube, and with
+    bump_versions=True their patches' data versions are bumped, both in the same transaction.
+    With metrics, every flush's duration is recorded as the "bulk_flush" DB write.
+    With autoflush=False, add_rows never flushes; the caller checks full() and flushes itself.
+    """
+    def __init__(self, conn: psycopg.Connection, max_matches: int = 50, maintain_cube: bool = False,
+                 bump_versions: bool = False, frame_store: str = FRAME_STORE, keys: KeyResolver | None = None,
+                 metrics: Metrics | None = None, autoflush: bool = True):
+        self.conn = conn
+        self.metrics = metrics
+        self.keys = keys or KEYS
+        self.max_matches = max_matches
+        self.autoflush = autoflush
+        self.frame_stores = frame_stores(frame_store)
+        self.maintain_cube = maintain_cube
+        self.bump_versions = bump_versions
+        self._matches: list[tuple] = []
+        self._participants: list[tuple] = []
+        self._frames: list[tuple] = []
+        self._events: list[tuple] = []
+        self._known_items: set[int] = set()
+        self._staging_ready = False
+
+    def __len__(self) -> int:
+        return len(self._matches)
+
+    def full(self) -> bool:
+        return len(self._matches) >= self.max_matches
+
+    def add_match(self, match_payload: dict, timeline: dict | bytes | None = None, skill_tier: str | None = None):
+        frames, events = timeline_rows(timeline) if timeline is not None else ([], [])
+        self.add_rows(match_row(match_payload, skill_tier), participant_rows(match_payload), frames, events)
+
+    def add_rows(self, match: tuple, participants: list[tuple], frames: list[tuple] = (), events: list[tuple] = ()):
+        """Rows already flattened by match_row / participant_rows / timeline_rows (e.g. in another process)."""
+        self._matches.append(match)
+        self._participants.extend(participants)
+        self._frames.extend(frames)
+        self._events.extend(events)
+        if self.autoflush and self.full():
+            self.flush()
+
+    def add_timeline(self, timeline: dict | bytes):
+        frame_rows, event_rows = timeline_rows(timeline)
+        self._frames.extend(frame_rows)
+        self._events.extend(event_rows)
+
+    def _ensure_items(self, cur, events: list[tuple]) -> list[int]:
+        new_ids = sorted({r[4] for r in events} - self._known_items)
+        if new_ids:
+            cur.execute(
+                "INSERT INTO lol.items (item_id, item_name) SELECT * FROM unnest(%s::int[], %s::text[]) ON CONFLICT DO NOTHING",
+                (new_ids, [get_item_name(i) for i in new_ids]),
+            )
+        return new_ids
+
+    @staticmethod
+    def _copy(cur, table: str, cols: tuple[str, ...], rows: list[tuple]):
+        if not rows:
+            return
+        with cur.copy(f"COPY {table} ({', '.join(cols)}) FROM STDIN") as cp:
+            for row in rows:
+                cp.write_row(row)
+
+    def flush(self) -> int:
+        """
+        Writes everything buffered in one transaction and returns the number of matches flushed.
+        If that fails, each match is retried in a transaction of its own so one bad match can't
+        take the rest of the batch down with it; FlushError then names the ones that still failed.
+        The buffer is empty afterwards either way.
+        """
+        batch = (self._matches, self._participants, self._frames, self._events)
+        if not any(batch):
+            return 0
+        self._matches, self._participants, self._frames, self._events = [], [], [], []
+        t0 = time.monotonic()
+        try:
+            try:
+                self._write(*batch)
+                return len(batch[0])
+            except Exception as e:
+                self.keys.clear()  # keys created in the rolled-back transaction no longer exist
+                first = e
+            failed: dict[str, Exception] = {}
+            for mid, rows in _rows_by_match(*batch).items():
+                try:
+                    self._write(*rows)
+                except Exception as e:
+                    self.keys.clear()
+                    failed[mid] = e
+            if failed:
+                raise FlushError(failed, len(batch[0])) from first
+            return len(batch[0])
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_db_write("bulk_flush", time.monotonic() - t0)
+
+    def _write(self, matches: list[tuple], participants: list[tuple], frames: list[tuple], events: list[tuple]):
+        ensure_patch_partitions(self.conn, {r[3] for r in matches})
+        with self.conn.transaction(), self.conn.cursor() as cur:
+            if not self._staging_ready:
+                cur.execute(STAGING_DDL)
+            new_items = self._ensure_items(cur, events)
+            match_keys = self.keys.match_keys(cur, [r[0] for r in matches])
+            self._copy(cur, "stg_matches", MATCH_COLS, [(match_keys[r[0]],) + r for r in matches])
+            self._copy(cur, "stg_participants", PARTICIPANT_COLS, self.keys.encode(cur, participants))
+            if "rows" in self.frame_stores:
+                self._copy(cur, "stg_participant_frames", FRAME_COLS, self.keys.encode(cur, frames))
+            if "arrays" in self.frame_stores:
+                self._copy(cur, "stg_participant_frame_arrays", FRAME_ARRAY_COLS,
+                           self.keys.encode(cur, frame_array_rows(frames)))
+            self._copy(cur, "stg_item_events", ITEM_EVENT_COLS, self.keys.encode(cur, events))
+            for stmt in MERGE_SQL:
+                cur.execute(stmt)
+            for store in self.frame_stores:
+                cur.execute(FRAME_MERGE_SQL[store])
+            if self.maintain_cube:
+                apply_cube(self.conn, [r[0] for r in matches] + [r[0] for r in frames] + [r[0] for r in events])
+            if self.bump_versions and matches:
+                bump_data_versions(self.conn, [r[3] for r in matches])
+        self._staging_ready = True
+        self._known_items.update(new_items)
+
+class FlushError(Exception):
+    """Matches BulkIngest.flush couldn't write even one at a time; `failed` maps match id -> error."""
+    def __init__(self, failed: dict[str, Exception], batch_size: int):
+        super().__init__(f"{len(failed)} of {batch_size} buffered matches failed to write: "
+                         + ", ".join(f"{mid} ({err})" for mid, err in list(failed.items())[:3]))
+        self.failed = failed
+
+def _rows_by_match(matches, participants, frames, events) -> dict[str, tuple[list, list, list, list]]:
+    """Splits a BulkIngest batch per match id (column 0 of every buffered row)."""
+    out: dict[str, tuple[list, list, list, list]] = {}
+    for i, rows in enumerate((matches, participants, frames, events)):
+        for r in rows:
+            out.setdefault(r[0], ([], [], [], []))[i].append(r)
+    return out
 
 def seed_for_puuid(conn: psycopg.Connection, routing: str, puuid: str, queue: int, start: int, count: int):
     mids = match_ids_by_puuid(routing, puuid, start=start, count=count, queue=queue)
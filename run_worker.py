@@ -1,6 +1,9 @@
 ﻿# run_worker.py
 import os
 import time
+import uuid
+import socket
+import asyncio
 import traceback
 import psycopg
 from psycopg.rows import dict_row
@@ -9,7 +12,9 @@ from util.logging import setup_logger
 
 from riot.client import match_ids_by_puuid, get_match, get_timeline, ddragon_latest_version, ddragon_champions, ddragon_items
 from riot.normalize import derive_patch, derive_lane_role
-from run_seed import upsert_champions_items, insert_match_from_payload, insert_participants_from_payload, insert_timeline  # re-use existing inserts
+from riot.async_fetch import AsyncMatchFetcher, AsyncMultiLimiter
+from riot.metrics import Metrics
+from run_seed import upsert_champions_items, insert_match_from_payload, insert_participants_from_payload, insert_timeline, apply_cube, bump_data_versions, data_versions_enabled, BulkIngest, FlushError  # re-use existing inserts
 
 load_dotenv()
 log = setup_logger("worker")
@@ -17,54 +22,187 @@ log = setup_logger("worker")
 PG_DSN = os.getenv("PG_DSN", "dbname=league user=postgres host=localhost")
 DEFAULT_QUEUE = int(os.getenv("DEFAULT_QUEUE", "420"))
 POLL_S = int(os.getenv("WORKER_POLL_SECONDS", "5"))
+# "rows" = one INSERT per row (legacy), "bulk" = buffered COPY + set-based merge
+INGEST_MODE = os.getenv("WORKER_INGEST", "rows").lower()
+INGEST_BATCH = int(os.getenv("WORKER_INGEST_BATCH", "25"))
+# fold each ingested match into the /stats/flexible cube (needs sql/flex_cube.sql applied)
+CUBE_MAINTAIN = os.getenv("CUBE_MAINTAIN", "0") == "1"
+# bump lol.data_versions per patch so the API's response cache drops stale answers (sql/data_versions.sql);
+# "auto" bumps whenever that table exists, "1" / "0" force it on / off
+BUMP_DATA_VERSIONS = os.getenv("BUMP_DATA_VERSIONS", "auto").lower()
+# "sync" = one match at a time via riot.client, "async" = AsyncMatchFetcher with many requests in flight
+WORKER_MODE = os.getenv("WORKER_MODE", "sync").lower()
+FETCH_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WRITE_QUEUE_MAX = int(os.getenv("WORKER_QUEUE_MAX", "32"))
+RIOT_API_KEY = os.getenv("RIOT_API_KEY", "")
 
-def claim_next(conn: psycopg.Connection):
+# Prometheus text format on http://127.0.0.1:METRICS_PORT/metrics (unset = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS = Metrics()
+
+SEED_LEASE_S = int(os.getenv("WORKER_LEASE_SECONDS", "3600"))
+REAP_EVERY = int(os.getenv("WORKER_REAP_EVERY", "20"))  # claim attempts between reaper runs
+# seed_queue rows claimed per round trip; the ones waiting their turn get their lease renewed with
+# the running job's, on every page of match ids
+CLAIM_BATCH = int(os.getenv("WORKER_CLAIM_BATCH", "4"))
+# written to seed_queue.claimed_by on claim; renewing, completing and failing a job all require it,
+# so a worker whose lease was reaped can't touch a row another worker has claimed since
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_bump_versions: bool | None = None
+
+def bump_versions(conn: psycopg.Connection) -> bool:
+    """BUMP_DATA_VERSIONS, resolved once per process."""
+    global _bump_versions
+    if _bump_versions is None:
+        _bump_versions = data_versions_enabled(conn, BUMP_DATA_VERSIONS)
+    return _bump_versions
+
+class LeaseLost(Exception):
+    """The running job's lease was reaped and the row handed to another worker; this one drops the job."""
+
+def claim_batch(conn: psycopg.Connection, n: int, lease_s: int = SEED_LEASE_S, owner: str = WORKER_ID) -> list[dict]:
+    """Claims up to n PENDING rows; SKIP LOCKED keeps concurrent workers off each other's rows."""
     with conn.cursor(row_factory=dict_row) as cur:
         cur.execute("""
         WITH nextjob AS (
           SELECT puuid FROM lol.seed_queue
           WHERE status='PENDING'
           ORDER BY updated_at
-          LIMIT 1
+          LIMIT %s
+          FOR UPDATE SKIP LOCKED
         )
         UPDATE lol.seed_queue sq
-        SET status='RUNNING', updated_at=now()
+        SET status='RUNNING', updated_at=now(), lease_expires_at=now() + make_interval(secs => %s), claimed_by=%s
         FROM nextjob
         WHERE sq.puuid = nextjob.puuid
         RETURNING sq.puuid, sq.region_routing
-        """)
-        return cur.fetchone()
+        """, (n, lease_s, owner))
+        return cur.fetchall()
+
+def claim_next(conn: psycopg.Connection):
+    jobs = claim_batch(conn, 1)
+    return jobs[0] if jobs else None
 
-def complete(conn: psycopg.Connection, puuid: str):
+def extend_lease(conn: psycopg.Connection, puuid: str, lease_s: int = SEED_LEASE_S, owner: str = WORKER_ID) -> bool:
+    return puuid in extend_leases(conn, [puuid], lease_s, owner)
+
+def extend_leases(conn: psycopg.Connection, puuids: list[str], lease_s: int = SEED_LEASE_S, owner: str = WORKER_ID) -> set[str]:
+    """Renews the leases this worker still holds; returns those puuids (a reaped one is missing)."""
     with conn.cursor() as cur:
-        cur.execute("UPDATE lol.seed_queue SET status='DONE', updated_at=now(), last_error=NULL WHERE puuid=%s", (puuid,))
+        cur.execute("""
+        UPDATE lol.seed_queue SET lease_expires_at=now() + make_interval(secs => %s)
+        WHERE puuid = ANY(%s) AND status='RUNNING' AND claimed_by=%s
+        RETURNING puuid
+        """, (lease_s, puuids, owner))
+        return {r[0] for r in cur.fetchall()}
 
-def fail(conn: psycopg.Connection, puuid: str, err: str):
+def renew_leases(conn: psycopg.Connection, puuid: str | None, waiting: list[dict]):
+    """
+    Renews the running job's lease (puuid, None between jobs) and those of the claimed jobs queued
+    behind it. Waiting jobs this worker no longer holds are dropped from `waiting`; losing the
+    running one raises LeaseLost.
+    """
+    held = extend_leases(conn, ([puuid] if puuid else []) + [j["puuid"] for j in waiting])
+    lost = [j["puuid"] for j in waiting if j["puuid"] not in held]
+    if lost:
+        log.warning(f"Lost the lease on {len(lost)} queued jobs, dropping them: {lost}")
+        waiting[:] = [j for j in waiting if j["puuid"] in held]
+    if puuid and puuid not in held:
+        raise LeaseLost(puuid)
+
+def release(conn: psycopg.Connection, puuids: list[str], owner: str = WORKER_ID):
+    """Hands claimed jobs that never started back to the queue (worker shutting down)."""
     with conn.cursor() as cur:
-        cur.execute("UPDATE lol.seed_queue SET status='ERROR', updated_at=now(), last_error=%s WHERE puuid=%s", (err, puuid))
+        cur.execute("""
+        UPDATE lol.seed_queue SET status='PENDING', updated_at=now(), lease_expires_at=NULL, claimed_by=NULL
+        WHERE puuid = ANY(%s) AND status='RUNNING' AND claimed_by=%s
+        """, (puuids, owner))
 
-def enqueue_new_puuids(conn: psycopg.Connection, regional: str, puuids: list[str]):
-    if not puuids:
-        return
+def reap_expired(conn: psycopg.Connection, lease_s: int = SEED_LEASE_S) -> int:
+    """
+    Puts RUNNING jobs whose worker stopped renewing the lease back to PENDING. Rows claimed
+    before leases existed have none; they count as expired lease_s after their last update.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        UPDATE lol.seed_queue
+        SET status='PENDING', updated_at=now(), lease_expires_at=NULL, claimed_by=NULL
+        WHERE status='RUNNING' AND COALESCE(lease_expires_at, updated_at + make_interval(secs => %s)) < now()
+        """, (lease_s,))
+        return cur.rowcount
+
+def complete(conn: psycopg.Connection, puuid: str, owner: str = WORKER_ID, note: str | None = None) -> bool:
+    return complete_many(conn, [puuid], owner, note) == 1
+
+def complete_many(conn: psycopg.Connection, puuids: list[str], owner: str = WORKER_ID, note: str | None = None) -> int:
+    """Marks DONE the jobs this worker still holds, with `note` (e.g. matches skipped) in last_error; returns how many it did."""
+    with conn.cursor() as cur:
+        cur.execute("""
+        UPDATE lol.seed_queue SET status='DONE', updated_at=now(), last_error=%s, lease_expires_at=NULL
+        WHERE puuid = ANY(%s) AND status='RUNNING' AND claimed_by=%s
+        """, (note, puuids, owner))
+        return cur.rowcount
+
+def fail(conn: psycopg.Connection, puuid: str, err: str, owner: str = WORKER_ID) -> bool:
     with conn.cursor() as cur:
-        for pu in puuids:
-            cur.execute("""
-              INSERT INTO lol.seed_queue(puuid, region_routing, status)
-              VALUES (%s,%s,'PENDING')
-              ON CONFLICT (puuid) DO NOTHING
-            """, (pu, regional))
-
-def work_one(conn: psycopg.Connection, puuid: str, routing: str):
+        cur.execute("""
+        UPDATE lol.seed_queue SET status='ERROR', updated_at=now(), last_error=%s, lease_expires_at=NULL
+        WHERE puuid=%s AND status='RUNNING' AND claimed_by=%s
+        """, (err, puuid, owner))
+        return cur.rowcount == 1
+
+def enqueue_new_puuids(conn: psycopg.Connection, regional: str, puuids: list[str]) -> int:
+    """Enqueues a batch of PUUIDs in one statement; returns how many were new."""
+    batch = list(dict.fromkeys(pu for pu in puuids if pu))
+    if not batch:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute("""
+          INSERT INTO lol.seed_queue(puuid, region_routing, status)
+          SELECT pu, %s, 'PENDING' FROM unnest(%s::text[]) AS pu
+          ON CONFLICT (puuid) DO NOTHING
+        """, (regional, batch), prepare=True)
+        return cur.rowcount
+
+def flush_bulk(bulk: BulkIngest, puuid: str, failed: dict[str, Exception]) -> int:
+    """Flushes the buffered matches; returns how many couldn't be written (each one is logged and added to `failed`)."""
+    try:
+        bulk.flush()
+        return 0
+    except FlushError as e:
+        for mid, err in e.failed.items():
+            log.error(f"Failed writing match {mid} for {puuid}: {err}")
+        failed.update(e.failed)
+        return len(e.failed)
+
+def failed_note(failed: dict[str, Exception], limit: int = 20) -> str | None:
+    """last_error of a job that finished with some matches skipped (both worker modes complete such jobs)."""
+    if not failed:
+        return None
+    shown = ", ".join(f"{mid} ({err!r})" for mid, err in list(failed.items())[:limit])
+    more = f" and {len(failed) - limit} more" if len(failed) > limit else ""
+    return f"{len(failed)} matches skipped: {shown}{more}"
+
+def work_one(conn: psycopg.Connection, puuid: str, routing: str, waiting: list[dict] | None = None) -> dict[str, Exception]:
+    """
+    Ingests every match of one seed job; `waiting` are the claimed jobs queued behind it, renewed with it.
+    Returns the matches that couldn't be fetched or written: they're logged and skipped, not fatal.
+    """
     log.info(f"Working puuid={puuid} routing={routing}")
     upsert_champions_items(conn)  # idempotent helper
     start = 0
     total_matches = 0
+    failed: dict[str, Exception] = {}
+    bulk = BulkIngest(conn, max_matches=INGEST_BATCH, maintain_cube=CUBE_MAINTAIN, bump_versions=bump_versions(conn),
+                      metrics=METRICS, autoflush=False) if INGEST_MODE == "bulk" else None
     while True:
         mids = match_ids_by_puuid(routing, puuid, start=start, count=100, queue=DEFAULT_QUEUE)
         if not mids:
             log.info(f"No more matches at start={start} for {puuid}")
             break
         log.info(f"Fetched {len(mids)} match ids (start={start}) for {puuid}")
+        renew_leases(conn, puuid, waiting if waiting is not None else [])
         for mid in mids:
             try:
                 log.info(f"Processing match {mid}")
@@ -74,40 +212,197 @@ def work_one(conn: psycopg.Connection, puuid: str, routing: str):
                 others = metadata.get("participants", [])
                 enqueue_new_puuids(conn, routing, others)
 
-                insert_match_from_payload(conn, m)          # <-- uses metadata.matchId
-                insert_participants_from_payload(conn, m)   # <-- uses metadata.matchId
+                t0 = time.monotonic()
+                if bulk is None:
+                    insert_match_from_payload(conn, m)          # <-- uses metadata.matchId
+                    insert_participants_from_payload(conn, m)   # <-- uses metadata.matchId
 
-                tl = get_timeline(routing, mid)
-                insert_timeline(conn, tl)                   # already uses metadata.matchId
+                # bulk mode reads the timeline through the selective extractor, so skip the full decode
+                tl = get_timeline(routing, mid, raw=bulk is not None)
+                if bulk is None:
+                    insert_timeline(conn, tl)                   # already uses metadata.matchId
+                    if CUBE_MAINTAIN:
+                        apply_cube(conn, [mid])
+                    if bump_versions(conn):
+                        bump_data_versions(conn, [derive_patch(m["info"]["gameVersion"])])
+                    METRICS.record_db_write("match_rows", time.monotonic() - t0)
+                else:
+                    bulk.add_match(m, tl)
 
+                METRICS.record_processed(routing)
                 total_matches += 1
             except Exception as e:
                 log.error(f"Failed match {mid} for {puuid}: {e}", exc_info=True)
+                failed[mid] = e
+            # outside the per-match try: a failed flush concerns every buffered match, not just this one
+            if bulk is not None and bulk.full():
+                total_matches -= flush_bulk(bulk, puuid, failed)
         start += 100
-    log.info(f"Finished {puuid}; total_matches_ingested={total_matches}")
+    if bulk is not None:
+        total_matches -= flush_bulk(bulk, puuid, failed)
+    log.info(f"Finished {puuid}; total_matches_ingested={total_matches} failed={len(failed)}")
+    return failed
+
+def _ingest_pair(conn: psycopg.Connection, routing: str, m: dict, tl: dict, bulk: BulkIngest | None):
+    enqueue_new_puuids(conn, routing, m.get("metadata", {}).get("participants", []))
+    if bulk is None:
+        t0 = time.monotonic()
+        insert_match_from_payload(conn, m)
+        insert_participants_from_payload(conn, m)
+        insert_timeline(conn, tl)
+        if CUBE_MAINTAIN:
+            apply_cube(conn, [m["metadata"]["matchId"]])
+        if bump_versions(conn):
+            bump_data_versions(conn, [derive_patch(m["info"]["gameVersion"])])
+        METRICS.record_db_write("match_rows", time.monotonic() - t0)
+    else:
+        bulk.add_match(m, tl)
+    METRICS.record_processed(routing)
+
+async def _write_loop(conn: psycopg.Connection, puuid: str, routing: str, queue: asyncio.Queue,
+                      bulk: BulkIngest | None, failed: dict[str, Exception]) -> int:
+    """Single DB writer: drains (match, timeline) pairs until it sees the None sentinel, then flushes."""
+    written = 0
+    while True:
+        pair = await queue.get()
+        METRICS.set_gauge("worker_write_queue", queue.qsize())
+        if pair is None:
+            if bulk is not None:
+                written -= await asyncio.to_thread(flush_bulk, bulk, puuid, failed)
+            return written
+        m, tl = pair
+        try:
+            await asyncio.to_thread(_ingest_pair, conn, routing, m, tl, bulk)
+            written += 1
+        except Exception as e:
+            mid = m.get("metadata", {}).get("matchId")
+            log.error(f"Failed writing match {mid}: {e}", exc_info=True)
+            failed[mid] = e
+        if bulk is not None and bulk.full():
+            written -= await asyncio.to_thread(flush_bulk, bulk, puuid, failed)
+
+async def work_one_async(conn: psycopg.Connection, puuid: str, routing: str,
+                         fetcher: AsyncMatchFetcher, waiting: list[dict] | None = None) -> dict[str, Exception]:
+    """work_one on the event loop: same lease renewal, same result (the matches skipped)."""
+    log.info(f"Working (async) puuid={puuid} routing={routing}")
+    await asyncio.to_thread(upsert_champions_items, conn)
+    bulk = BulkIngest(conn, max_matches=INGEST_BATCH, maintain_cube=CUBE_MAINTAIN, bump_versions=bump_versions(conn),
+                      metrics=METRICS, autoflush=False) if INGEST_MODE == "bulk" else None
+    queue: asyncio.Queue = asyncio.Queue(maxsize=WRITE_QUEUE_MAX)
+    failed: dict[str, Exception] = {}
+    writer = asyncio.create_task(_write_loop(conn, puuid, routing, queue, bulk, failed))
+    start = 0
+    try:
+        while True:
+            mids = await fetcher.match_ids(routing, puuid, start=start, count=100, queue=DEFAULT_QUEUE)
+            if not mids:
+                log.info(f"No more matches at start={start} for {puuid}")
+                break
+            log.info(f"Fetched {len(mids)} match ids (start={start}) for {puuid}")
+            await asyncio.to_thread(renew_leases, conn, puuid, waiting if waiting is not None else [])
+            failed.update(await fetcher.run(routing, mids, queue))
+            start += 100
+    finally:
+        await queue.put(None)
+        total_matches = await writer
+    log.info(f"Finished {puuid}; total_matches_ingested={total_matches} failed={len(failed)} fetch_stats={dict(fetcher.stats)}")
+    return failed
+
+async def main_async():
+    log.info(f"Async worker starting (concurrency={FETCH_CONCURRENCY}, queue_max={WRITE_QUEUE_MAX})...")
+    fetcher = AsyncMatchFetcher(RIOT_API_KEY, AsyncMultiLimiter(per_sec=20, per_2min=100), concurrency=FETCH_CONCURRENCY)
+    try:
+        with psycopg.connect(PG_DSN, autocommit=True) as conn:
+            await asyncio.to_thread(bump_versions, conn)  # resolve off the event loop
+            attempts = 0
+            pending: list[dict] = []
+            try:
+                while True:
+                    if pending:
+                        await asyncio.to_thread(renew_leases, conn, None, pending)  # still queued behind the previous job
+                    if not pending:
+                        if attempts % REAP_EVERY == 0:
+                            reaped = await asyncio.to_thread(reap_expired, conn)
+                            if reaped:
+                                log.info(f"Reaped {reaped} expired seed_queue leases")
+                        attempts += 1
+                        pending = await asyncio.to_thread(claim_batch, conn, CLAIM_BATCH)
+                        if not pending:
+                            await asyncio.sleep(POLL_S)
+                            continue
+                        log.info(f"Claimed {len(pending)} jobs")
+                    job = pending.pop(0)
+                    await _run_job_async(conn, job, fetcher, pending)
+            finally:
+                if pending:
+                    await asyncio.to_thread(release, conn, [j["puuid"] for j in pending])
+    finally:
+        await fetcher.aclose()
+
+async def _run_job_async(conn: psycopg.Connection, job: dict, fetcher: AsyncMatchFetcher, waiting: list[dict]):
+    puuid = job["puuid"]
+    routing = job["region_routing"]
+    log.info(f"Starting job puuid={puuid} routing={routing}")
+    try:
+        failed = await work_one_async(conn, puuid, routing, fetcher, waiting)
+        if await asyncio.to_thread(complete, conn, puuid, WORKER_ID, failed_note(failed)):
+            log.info(f"Completed job puuid={puuid}")
+        else:
+            log.warning(f"Finished puuid={puuid} but its lease was reaped; the row is left to its new owner")
+    except LeaseLost:
+        log.warning(f"Lease on puuid={puuid} was reaped mid-job; dropping it")
+    except Exception as e:
+        await asyncio.to_thread(fail, conn, puuid, traceback.format_exc())
+        log.error(f"Job failed puuid={puuid}: {e}", exc_info=True)
 
 def main():
+    if METRICS_PORT:
+        METRICS.serve(METRICS_PORT, os.getenv("METRICS_HOST", "127.0.0.1"))
+    if WORKER_MODE == "async":
+        try:
+            asyncio.run(main_async())
+        except KeyboardInterrupt:
+            log.info("Worker interrupted, exiting.")
+        return
     log.info("Worker starting...")
     with psycopg.connect(PG_DSN, autocommit=True) as conn:
+        attempts = 0
+        pending: list[dict] = []
         while True:
             try:
-                job = claim_next(conn)
-                if not job:
-                    time.sleep(POLL_S)
-                    continue
+                if pending:
+                    renew_leases(conn, None, pending)  # still queued behind the previous job
+                if not pending:
+                    if attempts % REAP_EVERY == 0:
+                        reaped = reap_expired(conn)
+                        if reaped:
+                            log.info(f"Reaped {reaped} expired seed_queue leases")
+                    attempts += 1
+                    pending = claim_batch(conn, CLAIM_BATCH)
+                    if not pending:
+                        time.sleep(POLL_S)
+                        continue
+                    log.info(f"Claimed {len(pending)} jobs")
+                job = pending.pop(0)
                 puuid = job["puuid"]
                 routing = job["region_routing"]
-                log.info(f"Claimed job puuid={puuid} routing={routing}")
+                log.info(f"Starting job puuid={puuid} routing={routing}")
                 try:
-                    work_one(conn, puuid, routing)
-                    complete(conn, puuid)
-                    log.info(f"Completed job puuid={puuid}")
+                    failed = work_one(conn, puuid, routing, pending)
+                    if complete(conn, puuid, WORKER_ID, failed_note(failed)):
+                        log.info(f"Completed job puuid={puuid}")
+                    else:
+                        log.warning(f"Finished puuid={puuid} but its lease was reaped; the row is left to its new owner")
+                except LeaseLost:
+                    log.warning(f"Lease on puuid={puuid} was reaped mid-job; dropping it")
                 except Exception as e:
                     msg = traceback.format_exc()
                     fail(conn, puuid, msg)
                     log.error(f"Job failed puuid={puuid}: {e}", exc_info=True)
             except KeyboardInterrupt:
                 log.info("Worker interrupted, exiting.")
+                if pending:
+                    release(conn, [j["puuid"] for j in pending])
                 break
             except Exception as loop_ex:
                 log.error(f"Worker loop error: {loop_ex}", exc_info=True)
@@ -0,0 +1,11 @@
+-- Data-version stamps used to invalidate the /stats/flexible response cache (api/cache.py).
+-- Ingest bumps a patch's row when it commits matches for that patch (BUMP_DATA_VERSIONS, on
+-- by default once this table exists);
+-- /admin/refresh bumps the '*' row, which every cached answer depends on.
+BEGIN;
+CREATE TABLE IF NOT EXISTS lol.data_versions (
+  patch       TEXT PRIMARY KEY,
+  version     BIGINT NOT NULL DEFAULT 1,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+COMMIT;
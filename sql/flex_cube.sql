@@ -0,0 +1,190 @@
+-- Pre-aggregated store behind /stats/flexible (FLEX_CUBE=1).
+-- Apply after restructure.sql; safe to re-run. Maintained incrementally by lol.cube_apply(match_ids),
+-- which ingest calls for every match, timeline or item events it stores (CUBE_MAINTAIN=1) and
+-- backfill_cube.py replays.
+--
+-- Shapes covered: subject only, subject + one ally, subject + one enemy, keyed by
+-- patch / skill_tier / role / champ. skill_tier '' stands for "not set" (matches.skill_tier IS NULL),
+-- so the API sends skill_tier = '' requests to the raw query.
+-- Rows per minute hold count, wins and gold/xp sums of the subject at that minute;
+-- minute = -1 counts every game regardless of frames (used to gate top items by min_n).
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS lol.cube_matches (
+  match_id        TEXT PRIMARY KEY,           -- matches already folded into the cube
+  applied_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  frames_applied  BOOLEAN NOT NULL DEFAULT FALSE,  -- per-minute subject / pair rows are in
+  items_applied   BOOLEAN NOT NULL DEFAULT FALSE   -- cube_items rows are in
+);
+
+CREATE TABLE IF NOT EXISTS lol.cube_subject (
+  patch       TEXT   NOT NULL,
+  skill_tier  TEXT   NOT NULL,
+  role        TEXT   NOT NULL,
+  champ_id    INT    NOT NULL,
+  minute      INT    NOT NULL,
+  n           BIGINT NOT NULL,
+  wins        BIGINT NOT NULL,
+  gold_sum    BIGINT NOT NULL,
+  xp_sum      BIGINT NOT NULL,
+  PRIMARY KEY (champ_id, minute, patch, skill_tier, role)
+);
+
+CREATE TABLE IF NOT EXISTS lol.cube_pair (
+  relation        TEXT   NOT NULL CHECK (relation IN ('ALLY','ENEMY')),
+  patch           TEXT   NOT NULL,
+  skill_tier      TEXT   NOT NULL,
+  role            TEXT   NOT NULL,
+  champ_id        INT    NOT NULL,
+  other_role      TEXT   NOT NULL,
+  other_champ_id  INT    NOT NULL,
+  minute          INT    NOT NULL,
+  n               BIGINT NOT NULL,
+  wins            BIGINT NOT NULL,
+  gold_sum        BIGINT NOT NULL,
+  xp_sum          BIGINT NOT NULL,
+  PRIMARY KEY (champ_id, other_champ_id, relation, minute, patch, skill_tier, role, other_role)
+);
+
+CREATE TABLE IF NOT EXISTS lol.cube_items (
+  patch       TEXT   NOT NULL,
+  skill_tier  TEXT   NOT NULL,
+  role        TEXT   NOT NULL,
+  champ_id    INT    NOT NULL,
+  item_id     INT    NOT NULL,
+  picks       BIGINT NOT NULL,
+  PRIMARY KEY (champ_id, patch, skill_tier, role, item_id)
+);
+
+-- Cubes built before frames / items were tracked per match (and before same-champ ally pairs
+-- were counted) are emptied once; run backfill_cube.py afterwards to rebuild them.
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                 WHERE table_schema = 'lol' AND table_name = 'cube_matches' AND column_name = 'frames_applied') THEN
+    TRUNCATE lol.cube_matches, lol.cube_subject, lol.cube_pair, lol.cube_items;
+    ALTER TABLE lol.cube_matches ADD COLUMN frames_applied BOOLEAN NOT NULL DEFAULT FALSE,
+                                 ADD COLUMN items_applied  BOOLEAN NOT NULL DEFAULT FALSE;
+  END IF;
+END $$;
+
+-- Frames of the given matches from whichever store ingest writes (FRAME_STORE=rows|arrays|both;
+-- sql/frame_arrays.sql is optional). With both, a participant's per-row copy wins.
+CREATE OR REPLACE FUNCTION lol.cube_frames(p_match_keys BIGINT[])
+RETURNS TABLE (match_key BIGINT, player_key INT, patch TEXT, minute INT, gold INT, xp INT)
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+  RETURN QUERY
+    SELECT fr.match_key, fr.player_key, fr.patch, fr.minute, fr.gold, fr.xp
+    FROM lol.participant_frames fr
+    WHERE fr.match_key = ANY(p_match_keys);
+  IF to_regclass('lol.participant_frame_arrays') IS NOT NULL THEN
+    RETURN QUERY
+      SELECT a.match_key, a.player_key, a.patch, (g.i - 1)::INT, g.gold, g.xp
+      FROM lol.participant_frame_arrays a
+      CROSS JOIN LATERAL unnest(a.gold, a.xp) WITH ORDINALITY AS g(gold, xp, i)  -- minute m at index m + 1
+      WHERE a.match_key = ANY(p_match_keys) AND g.gold IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM lol.participant_frames fr
+                        WHERE fr.match_key = a.match_key AND fr.player_key = a.player_key AND fr.patch = a.patch);
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION lol.cube_apply(p_match_ids TEXT[]) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_all    BIGINT[];
+  v_new    BIGINT[];  -- matches seen for the first time: game counts (minute = -1)
+  v_frames BIGINT[];  -- matches whose frames are stored but not folded in yet
+  v_items  BIGINT[];  -- same for purchase events
+BEGIN
+  -- each part is claimed before it's folded in, so it's counted exactly once even with concurrent
+  -- callers, and frames / events stored after their match are picked up by a later call
+  WITH claimed AS (
+    INSERT INTO lol.cube_matches (match_id)
+    SELECT m.match_id FROM lol.matches m WHERE m.match_id = ANY(p_match_ids)
+    ON CONFLICT DO NOTHING
+    RETURNING match_id
+  )
+  SELECT array_agg(m.match_key) INTO v_new FROM claimed c JOIN lol.matches m ON m.match_id = c.match_id;
+
+  SELECT array_agg(m.match_key) INTO v_all FROM lol.matches m WHERE m.match_id = ANY(p_match_ids);
+  WITH claimed AS (
+    UPDATE lol.cube_matches c SET frames_applied = TRUE
+    FROM lol.matches m
+    WHERE c.match_id = ANY(p_match_ids) AND NOT c.frames_applied AND m.match_id = c.match_id
+      AND m.match_key IN (SELECT f.match_key FROM lol.cube_frames(v_all) f)
+    RETURNING m.match_key
+  )
+  SELECT array_agg(match_key) INTO v_frames FROM claimed;
+
+  WITH claimed AS (
+    UPDATE lol.cube_matches c SET items_applied = TRUE
+    FROM lol.matches m
+    WHERE c.match_id = ANY(p_match_ids) AND NOT c.items_applied AND m.match_id = c.match_id
+      AND EXISTS (SELECT 1 FROM lol.item_events ie
+                  WHERE ie.match_key = m.match_key AND ie.patch = m.patch AND ie.event_type = 'PURCHASE')
+    RETURNING m.match_key
+  )
+  SELECT array_agg(match_key) INTO v_items FROM claimed;
+
+  IF v_new IS NOT NULL THEN
+    INSERT INTO lol.cube_subject AS c (patch, skill_tier, role, champ_id, minute, n, wins, gold_sum, xp_sum)
+    SELECT m.patch, COALESCE(m.skill_tier, ''), p.role_derived, p.champ_id, -1,
+           COUNT(*), COUNT(*) FILTER (WHERE p.win), 0, 0
+    FROM lol.matches m
+    JOIN lol.participants p ON p.match_key = m.match_key AND p.patch = m.patch
+    WHERE m.match_key = ANY(v_new)
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (champ_id, minute, patch, skill_tier, role) DO UPDATE
+      SET n = c.n + EXCLUDED.n, wins = c.wins + EXCLUDED.wins;
+  END IF;
+
+  IF v_frames IS NOT NULL THEN
+    INSERT INTO lol.cube_subject AS c (patch, skill_tier, role, champ_id, minute, n, wins, gold_sum, xp_sum)
+    SELECT m.patch, COALESCE(m.skill_tier, ''), p.role_derived, p.champ_id, fr.minute,
+           COUNT(*), COUNT(*) FILTER (WHERE p.win), SUM(fr.gold), SUM(fr.xp)
+    FROM lol.matches m
+    JOIN lol.participants p           ON p.match_key = m.match_key AND p.patch = m.patch
+    JOIN lol.cube_frames(v_frames) fr ON fr.match_key = p.match_key AND fr.player_key = p.player_key AND fr.patch = p.patch
+    WHERE m.match_key = ANY(v_frames)
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (champ_id, minute, patch, skill_tier, role) DO UPDATE
+      SET n = c.n + EXCLUDED.n, wins = c.wins + EXCLUDED.wins,
+          gold_sum = c.gold_sum + EXCLUDED.gold_sum, xp_sum = c.xp_sum + EXCLUDED.xp_sum;
+
+    -- o includes p itself: the raw query lets the subject's own row satisfy an ally filter naming
+    -- the same champ, so (A, A, 'ALLY') counts every game of A whose roles match both filters
+    INSERT INTO lol.cube_pair AS c (relation, patch, skill_tier, role, champ_id, other_role, other_champ_id, minute, n, wins, gold_sum, xp_sum)
+    SELECT CASE WHEN o.team_id = p.team_id THEN 'ALLY' ELSE 'ENEMY' END,
+           m.patch, COALESCE(m.skill_tier, ''), p.role_derived, p.champ_id, o.role_derived, o.champ_id, fr.minute,
+           COUNT(*), COUNT(*) FILTER (WHERE p.win), SUM(fr.gold), SUM(fr.xp)
+    FROM lol.matches m
+    JOIN lol.participants p           ON p.match_key = m.match_key AND p.patch = m.patch
+    JOIN lol.participants o           ON o.match_key = p.match_key AND o.patch = p.patch
+    JOIN lol.cube_frames(v_frames) fr ON fr.match_key = p.match_key AND fr.player_key = p.player_key AND fr.patch = p.patch
+    WHERE m.match_key = ANY(v_frames)
+    GROUP BY 1, 2, 3, 4, 5, 6, 7, 8
+    ON CONFLICT (champ_id, other_champ_id, relation, minute, patch, skill_tier, role, other_role) DO UPDATE
+      SET n = c.n + EXCLUDED.n, wins = c.wins + EXCLUDED.wins,
+          gold_sum = c.gold_sum + EXCLUDED.gold_sum, xp_sum = c.xp_sum + EXCLUDED.xp_sum;
+  END IF;
+
+  IF v_items IS NOT NULL THEN
+    INSERT INTO lol.cube_items AS c (patch, skill_tier, role, champ_id, item_id, picks)
+    SELECT m.patch, COALESCE(m.skill_tier, ''), p.role_derived, p.champ_id, ie.item_id, COUNT(*)
+    FROM lol.matches m
+    JOIN lol.participants p ON p.match_key = m.match_key AND p.patch = m.patch
+    JOIN lol.item_events ie ON ie.match_key = p.match_key AND ie.player_key = p.player_key AND ie.patch = p.patch
+                          AND ie.event_type = 'PURCHASE'
+    WHERE m.match_key = ANY(v_items)
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (champ_id, patch, skill_tier, role, item_id) DO UPDATE
+      SET picks = c.picks + EXCLUDED.picks;
+  END IF;
+
+  RETURN (SELECT COUNT(DISTINCT k) FROM unnest(COALESCE(v_new, '{}') || COALESCE(v_frames, '{}') || COALESCE(v_items, '{}')) AS k);
+END;
+$$;
+
+COMMIT;
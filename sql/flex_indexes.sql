@@ -0,0 +1,29 @@
+-- Covering / partial indexes for the /stats/flexible raw path (sql/flexible_filters.sql), as
+-- proposed by bench/index_advisor.py; restructure.sql already declares them for new databases.
+-- Each index is created on the partitioned parent and cascades to every patch partition, which
+-- can't be CONCURRENTLY: run it in a quiet window. VACUUM afterwards so index-only scans skip the heap.
+BEGIN;
+
+-- ally/enemy side and subject_rows look participants up by match (and team); the partitions still
+-- filter on patch, so it rides along in INCLUDE to keep the scan index-only
+CREATE INDEX IF NOT EXISTS participants_match_team_cover
+  ON lol.participants (match_key, team_id) INCLUDE (player_key, role_derived, champ_id, win, patch);
+DROP INDEX IF EXISTS lol.participants_team_id_match_key_idx;
+
+-- subject_stats reads gold / xp per match, player and minute: carry them in the primary key
+-- instead of a second index over the largest table
+ALTER TABLE lol.participant_frames DROP CONSTRAINT participant_frames_pkey;
+ALTER TABLE lol.participant_frames ADD PRIMARY KEY (match_key, player_key, minute, patch) INCLUDE (gold, xp);
+DROP INDEX IF EXISTS lol.participant_frames_minute_idx;
+DROP INDEX IF EXISTS lol.participant_frames_match_key_player_key_idx;
+
+-- top_items only counts PURCHASE events; the partial index is ~60% of the primary key it replaces as the probe
+CREATE INDEX IF NOT EXISTS item_events_purchase_cover
+  ON lol.item_events (match_key, player_key) INCLUDE (item_id, patch) WHERE event_type = 'PURCHASE';
+DROP INDEX IF EXISTS lol.item_events_player_key_match_key_idx;
+
+COMMIT;
+
+VACUUM ANALYZE lol.participants;
+VACUUM ANALYZE lol.participant_frames;
+VACUUM ANALYZE lol.item_events;
@@ -0,0 +1,77 @@
+-- Cube-backed variants of flexible_filters.sql (tables in flex_cube.sql).
+-- Same output columns as agg_summary / top_items. Only used for shapes where every
+-- filter names a champ_id, so each counted row is exactly one game.
+
+-- =========================
+-- = CUBE: SUBJECT ONLY    =
+-- =========================
+-- name: subject_summary
+WITH rolled AS (
+  SELECT SUM(c.n) AS n, SUM(c.wins) AS wins, SUM(c.gold_sum) AS gold_sum, SUM(c.xp_sum) AS xp_sum
+  FROM lol.cube_subject c
+  WHERE c.champ_id = %(champ_id)s
+    AND c.minute   = %(minute)s
+    AND (%(role)s::TEXT       IS NULL OR c.role       = %(role)s)
+    AND (%(patch)s::TEXT      IS NULL OR c.patch      = %(patch)s)
+    AND (%(skill_tier)s::TEXT IS NULL OR c.skill_tier = %(skill_tier)s)
+)
+SELECT n                                      AS n_games,
+       (wins::NUMERIC / n)::NUMERIC(5,3)      AS winrate,
+       (gold_sum::NUMERIC / n)::NUMERIC(10,2) AS gold_at_min,
+       (xp_sum::NUMERIC / n)::NUMERIC(10,2)   AS xp_at_min
+FROM rolled
+WHERE n >= %(min_n)s;
+
+-- =========================
+-- = CUBE: SUBJECT + ONE   =
+-- =========================
+-- name: pair_summary
+WITH rolled AS (
+  SELECT SUM(c.n) AS n, SUM(c.wins) AS wins, SUM(c.gold_sum) AS gold_sum, SUM(c.xp_sum) AS xp_sum
+  FROM lol.cube_pair c
+  WHERE c.champ_id       = %(champ_id)s
+    AND c.other_champ_id = %(other_champ_id)s
+    AND c.relation       = %(relation)s
+    AND c.minute         = %(minute)s
+    AND (%(role)s::TEXT       IS NULL OR c.role       = %(role)s)
+    AND (%(other_role)s::TEXT IS NULL OR c.other_role = %(other_role)s)
+    AND (%(patch)s::TEXT      IS NULL OR c.patch      = %(patch)s)
+    AND (%(skill_tier)s::TEXT IS NULL OR c.skill_tier = %(skill_tier)s)
+)
+SELECT n                                      AS n_games,
+       (wins::NUMERIC / n)::NUMERIC(5,3)      AS winrate,
+       (gold_sum::NUMERIC / n)::NUMERIC(10,2) AS gold_at_min,
+       (xp_sum::NUMERIC / n)::NUMERIC(10,2)   AS xp_at_min
+FROM rolled
+WHERE n >= %(min_n)s;
+
+-- =========================
+-- = CUBE: SUBJECT ITEMS   =
+-- =========================
+-- name: subject_items
+WITH n_base AS (
+  -- minute = -1 rows count every game, with or without frames
+  SELECT COALESCE(SUM(c.n), 0) AS n_games
+  FROM lol.cube_subject c
+  WHERE c.champ_id = %(champ_id)s
+    AND c.minute   = -1
+    AND (%(role)s::TEXT       IS NULL OR c.role       = %(role)s)
+    AND (%(patch)s::TEXT      IS NULL OR c.patch      = %(patch)s)
+    AND (%(skill_tier)s::TEXT IS NULL OR c.skill_tier = %(skill_tier)s)
+),
+picks AS (
+  SELECT ci.item_id, SUM(ci.picks) AS picks
+  FROM lol.cube_items ci
+  WHERE ci.champ_id = %(champ_id)s
+    AND (%(role)s::TEXT       IS NULL OR ci.role       = %(role)s)
+    AND (%(patch)s::TEXT      IS NULL OR ci.patch      = %(patch)s)
+    AND (%(skill_tier)s::TEXT IS NULL OR ci.skill_tier = %(skill_tier)s)
+  GROUP BY ci.item_id
+)
+SELECT pk.item_id, it.item_name, pk.picks
+FROM picks pk
+JOIN lol.items it ON it.item_id = pk.item_id
+CROSS JOIN n_base nb
+WHERE nb.n_games >= %(min_n)s
+ORDER BY pk.picks DESC
+LIMIT 25;
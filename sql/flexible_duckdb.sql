@@ -0,0 +1,182 @@
+-- agg_summary / top_items of flexible_filters.sql in DuckDB's dialect, run by api/duck.py against
+-- the Parquet export of export_parquet.py (FLEX_ENGINE=duckdb). lol.<table> is swapped for a
+-- read_parquet() of the exported files: only the requested patch's files when a patch is set,
+-- so there is no patch predicate here. Averages are carried as integer hundredths / thousandths
+-- and rounded half-up like Postgres' NUMERIC casts; the engine scales them back.
+
+-- name: setup
+-- a / b rounded half-up, for the non-negative sums and counts below
+CREATE OR REPLACE MACRO round_div(a, b) AS (2 * a + b) // (2 * b);
+
+-- =========================
+-- = FLEXIBLE AGG SUMMARY =
+-- =========================
+-- name: agg_summary
+WITH
+subject_req AS (
+  SELECT NULLIF(UPPER(json_extract_string($subject, '$.role')), '') AS role,
+         TRY_CAST(json_extract_string($subject, '$.champ_id') AS INTEGER) AS champ_id
+),
+ally_req AS (
+  SELECT NULLIF(UPPER(f.role), '') AS role, f.champ_id
+  FROM (SELECT unnest(from_json($ally_filters, '[{"role": "VARCHAR", "champ_id": "INTEGER"}]')) AS f)
+),
+enemy_req AS (
+  SELECT NULLIF(UPPER(f.role), '') AS role, f.champ_id
+  FROM (SELECT unnest(from_json($enemy_filters, '[{"role": "VARCHAR", "champ_id": "INTEGER"}]')) AS f)
+),
+ally_req_all AS (
+  SELECT * FROM subject_req
+  UNION ALL
+  SELECT * FROM ally_req
+),
+candidate_matches AS (
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE $skill_tier::VARCHAR IS NULL OR m.skill_tier = $skill_tier::VARCHAR
+),
+ally_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+  JOIN ally_req_all ar
+    ON (ar.role     IS NULL OR p.role_derived = ar.role)
+   AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
+),
+enemy_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+  JOIN enemy_req er
+    ON (er.role     IS NULL OR p.role_derived = er.role)
+   AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
+),
+eligible AS (
+  SELECT a.match_key, a.team_id AS ally_team
+  FROM ally_side_matches a
+  LEFT JOIN enemy_side_matches e
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
+  WHERE (SELECT COUNT(*) FROM enemy_req) = 0
+     OR e.team_id IS NOT NULL
+),
+subject_rows AS (
+  SELECT DISTINCT p.match_key, p.player_key, p.team_id, p.win
+  FROM eligible el
+  JOIN lol.participants p
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+  JOIN subject_req sr
+    ON (sr.role     IS NULL OR p.role_derived = sr.role)
+   AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
+),
+subject_stats AS (
+  -- per-match averages in hundredths, i.e. AVG(...)::NUMERIC(10,2)
+  SELECT s.match_key,
+         round_div(SUM(fr.gold) * 100, COUNT(*)) AS gold_c,
+         round_div(SUM(fr.xp)   * 100, COUNT(*)) AS xp_c
+  FROM subject_rows s
+  JOIN lol.participant_frames fr
+    ON fr.match_key  = s.match_key
+   AND fr.player_key = s.player_key
+  WHERE fr.minute = $minute::INTEGER
+  GROUP BY s.match_key
+),
+rolled AS (
+  SELECT
+    COUNT(DISTINCT s.match_key)                                   AS n_games,
+    round_div(SUM(CASE WHEN s.win THEN 1000 ELSE 0 END), COUNT(*)) AS winrate_m,
+    round_div(SUM(st.gold_c), COUNT(*))                           AS gold_c,
+    round_div(SUM(st.xp_c), COUNT(*))                             AS xp_c
+  FROM subject_rows s
+  JOIN subject_stats st ON st.match_key = s.match_key
+)
+SELECT n_games, winrate_m, gold_c, xp_c
+FROM rolled
+WHERE n_games >= $min_n::INTEGER;
+
+-- ======================
+-- = TOP ITEM POPULARS =
+-- ======================
+-- name: top_items
+WITH
+subject_req AS (
+  SELECT NULLIF(UPPER(json_extract_string($subject, '$.role')), '') AS role,
+         TRY_CAST(json_extract_string($subject, '$.champ_id') AS INTEGER) AS champ_id
+),
+ally_req AS (
+  SELECT NULLIF(UPPER(f.role), '') AS role, f.champ_id
+  FROM (SELECT unnest(from_json($ally_filters, '[{"role": "VARCHAR", "champ_id": "INTEGER"}]')) AS f)
+),
+enemy_req AS (
+  SELECT NULLIF(UPPER(f.role), '') AS role, f.champ_id
+  FROM (SELECT unnest(from_json($enemy_filters, '[{"role": "VARCHAR", "champ_id": "INTEGER"}]')) AS f)
+),
+ally_req_all AS (
+  SELECT * FROM subject_req
+  UNION ALL
+  SELECT * FROM ally_req
+),
+candidate_matches AS (
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE $skill_tier::VARCHAR IS NULL OR m.skill_tier = $skill_tier::VARCHAR
+),
+ally_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+  JOIN ally_req_all ar
+    ON (ar.role     IS NULL OR p.role_derived = ar.role)
+   AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
+),
+enemy_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+  JOIN enemy_req er
+    ON (er.role     IS NULL OR p.role_derived = er.role)
+   AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
+),
+eligible AS (
+  SELECT a.match_key, a.team_id AS ally_team
+  FROM ally_side_matches a
+  LEFT JOIN enemy_side_matches e
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
+  WHERE (SELECT COUNT(*) FROM enemy_req) = 0
+     OR e.team_id IS NOT NULL
+),
+subject_rows AS (
+  SELECT DISTINCT p.match_key, p.player_key
+  FROM eligible el
+  JOIN lol.participants p
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+  JOIN subject_req sr
+    ON (sr.role     IS NULL OR p.role_derived = sr.role)
+   AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
+),
+subject_item_events AS (
+  SELECT ie.item_id, COUNT(*) AS picks
+  FROM subject_rows s
+  JOIN lol.item_events ie
+    ON ie.match_key  = s.match_key
+   AND ie.player_key = s.player_key
+  WHERE ie.event_type = 'PURCHASE'
+  GROUP BY ie.item_id
+),
+n_base AS (
+  SELECT COUNT(DISTINCT match_key) AS n_games FROM eligible
+)
+SELECT sie.item_id, it.item_name, sie.picks
+FROM subject_item_events sie
+JOIN lol.items it ON it.item_id = sie.item_id
+CROSS JOIN n_base nb
+WHERE nb.n_games >= $min_n::INTEGER
+ORDER BY sie.picks DESC
+LIMIT 25;
@@ -39,76 +39,82 @@ ally_req_all AS (
   SELECT * FROM ally_req
 ),
 candidate_matches AS (
-  SELECT m.match_id
-  FROM lol.matches m, params p
-  WHERE (p.patch IS NULL OR m.patch = p.patch)
-    AND (p.skill_tier IS NULL OR m.skill_tier = p.skill_tier)
+  -- patch / skill_tier read the bind parameters, not params.*, so the planner sees constants:
+  -- it prunes patch partitions and an unset filter drops out of the row estimates
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE (%(patch)s::TEXT IS NULL OR m.patch = %(patch)s::TEXT)
+    AND (%(skill_tier)s::TEXT IS NULL OR m.skill_tier = %(skill_tier)s::TEXT)
 ),
 ally_side_matches AS (
   -- A match qualifies for the ally side if ALL requested rows
   -- (subject + ally filters) are satisfied ON THE SAME TEAM.
-  SELECT cm.match_id, p.team_id
+  SELECT cm.match_key, p.team_id
   FROM candidate_matches cm
-  JOIN lol.participants p ON p.match_id = cm.match_id
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN ally_req_all ar
     ON (ar.role     IS NULL OR p.role_derived = ar.role)
    AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
-  GROUP BY cm.match_id, p.team_id
+  GROUP BY cm.match_key, p.team_id
   HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
 ),
 enemy_side_matches AS (
   -- Opposing team must satisfy ALL enemy filters (if any)
-  SELECT cm.match_id, p.team_id
+  SELECT cm.match_key, p.team_id
   FROM candidate_matches cm
-  JOIN lol.participants p ON p.match_id = cm.match_id
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN enemy_req er
     ON (er.role     IS NULL OR p.role_derived = er.role)
    AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
-  GROUP BY cm.match_id, p.team_id
+  GROUP BY cm.match_key, p.team_id
   HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
 ),
 eligible AS (
   -- Keep matches where ally side is satisfied, and enemy side (if provided)
   -- is satisfied on the OPPOSITE team.
-  SELECT a.match_id, a.team_id AS ally_team
+  SELECT a.match_key, a.team_id AS ally_team
   FROM ally_side_matches a
   LEFT JOIN enemy_side_matches e
-    ON e.match_id = a.match_id AND e.team_id <> a.team_id
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
   WHERE (SELECT COUNT(*) FROM enemy_req) = 0
      OR e.team_id IS NOT NULL
 ),
 
 -- Only the subject participant(s) on the ally team
 subject_rows AS (
-  SELECT DISTINCT p.match_id, p.puuid, p.team_id, p.win
+  SELECT DISTINCT p.match_key, p.player_key, p.team_id, p.win
   FROM eligible el
   JOIN lol.participants p
-    ON p.match_id = el.match_id AND p.team_id = el.ally_team
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+   AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN subject_req sr
     ON (sr.role     IS NULL OR p.role_derived = sr.role)
    AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
 ),
 
 subject_stats AS (
-  SELECT s.match_id,
+  SELECT s.match_key,
          AVG(fr.gold)::NUMERIC(10,2) AS gold_at_min,
          AVG(fr.xp)::NUMERIC(10,2)   AS xp_at_min
   FROM params prm
   JOIN subject_rows s ON TRUE
   JOIN lol.participant_frames fr
-    ON fr.match_id = s.match_id
-   AND fr.puuid    = s.puuid
-   AND fr.minute   = prm.minute
-  GROUP BY s.match_id
+    ON fr.match_key  = s.match_key
+   AND fr.player_key = s.player_key
+   AND (%(patch)s::TEXT IS NULL OR fr.patch = %(patch)s::TEXT)
+   AND fr.minute     = prm.minute
+  GROUP BY s.match_key
 ),
 rolled AS (
   SELECT
-    COUNT(DISTINCT s.match_id)                                AS n_games,
+    COUNT(DISTINCT s.match_key)                               AS n_games,
     AVG(CASE WHEN s.win THEN 1.0 ELSE 0.0 END)::NUMERIC(5,3)  AS winrate,
     AVG(st.gold_at_min)::NUMERIC(10,2)                        AS gold_at_min,
     AVG(st.xp_at_min)::NUMERIC(10,2)                          AS xp_at_min
   FROM subject_rows s
-  JOIN subject_stats st ON st.match_id = s.match_id
+  JOIN subject_stats st ON st.match_key = s.match_key
 )
 SELECT n_games, winrate, gold_at_min, xp_at_min
 FROM rolled
@@ -153,46 +159,49 @@ ally_req_all AS (
   SELECT * FROM ally_req
 ),
 candidate_matches AS (
-  SELECT m.match_id
-  FROM lol.matches m, params p
-  WHERE (p.patch IS NULL OR m.patch = p.patch)
-    AND (p.skill_tier IS NULL OR m.skill_tier = p.skill_tier)
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE (%(patch)s::TEXT IS NULL OR m.patch = %(patch)s::TEXT)
+    AND (%(skill_tier)s::TEXT IS NULL OR m.skill_tier = %(skill_tier)s::TEXT)
 ),
 ally_side_matches AS (
-  SELECT cm.match_id, p.team_id
+  SELECT cm.match_key, p.team_id
   FROM candidate_matches cm
-  JOIN lol.participants p ON p.match_id = cm.match_id
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN ally_req_all ar
     ON (ar.role     IS NULL OR p.role_derived = ar.role)
    AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
-  GROUP BY cm.match_id, p.team_id
+  GROUP BY cm.match_key, p.team_id
   HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
 ),
 enemy_side_matches AS (
-  SELECT cm.match_id, p.team_id
+  SELECT cm.match_key, p.team_id
   FROM candidate_matches cm
-  JOIN lol.participants p ON p.match_id = cm.match_id
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN enemy_req er
     ON (er.role     IS NULL OR p.role_derived = er.role)
    AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
-  GROUP BY cm.match_id, p.team_id
+  GROUP BY cm.match_key, p.team_id
   HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
 ),
 eligible AS (
-  SELECT a.match_id, a.team_id AS ally_team
+  SELECT a.match_key, a.team_id AS ally_team
   FROM ally_side_matches a
   LEFT JOIN enemy_side_matches e
-    ON e.match_id = a.match_id AND e.team_id <> a.team_id
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
   WHERE (SELECT COUNT(*) FROM enemy_req) = 0
      OR e.team_id IS NOT NULL
 ),
 
 -- Subject-only purchases
 subject_rows AS (
-  SELECT DISTINCT p.match_id, p.puuid
+  SELECT DISTINCT p.match_key, p.player_key
   FROM eligible el
   JOIN lol.participants p
-    ON p.match_id = el.match_id AND p.team_id = el.ally_team
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+   AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
   JOIN subject_req sr
     ON (sr.role     IS NULL OR p.role_derived = sr.role)
    AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
@@ -201,13 +210,14 @@ subject_item_events AS (
   SELECT ie.item_id, COUNT(*) AS picks
   FROM subject_rows s
   JOIN lol.item_events ie
-    ON ie.match_id = s.match_id
-   AND ie.puuid    = s.puuid
+    ON ie.match_key  = s.match_key
+   AND ie.player_key = s.player_key
+   AND (%(patch)s::TEXT IS NULL OR ie.patch = %(patch)s::TEXT)
   WHERE ie.event_type = 'PURCHASE'  -- only subject's purchases
   GROUP BY ie.item_id
 ),
 n_base AS (
-  SELECT COUNT(DISTINCT match_id) AS n_games FROM eligible
+  SELECT COUNT(DISTINCT match_key) AS n_games FROM eligible
 )
 SELECT sie.item_id, it.item_name, sie.picks
 FROM subject_item_events sie
@@ -216,3 +226,268 @@ CROSS JOIN n_base nb
 WHERE nb.n_games >= (SELECT min_n FROM params)
 ORDER BY sie.picks DESC
 LIMIT 25;
+
+
+
+-- ==============================
+-- = SUMMARY + ITEMS, ONE PASS  =
+-- ==============================
+-- name: combined
+-- Same answers as agg_summary + top_items, but the match selection runs once:
+-- subject_rows is referenced by both branches, so Postgres materializes it a single time.
+-- Returns no row when the summary is below min_n (the split path stops there too).
+WITH
+params AS (
+  SELECT
+    %(patch)s::TEXT               AS patch,
+    %(skill_tier)s::TEXT          AS skill_tier,
+    %(minute)s::INT               AS minute,
+    %(min_n)s::INT                AS min_n,
+    %(subject)s::JSONB            AS subject,
+    %(ally_filters)s::JSONB       AS ally_filters,
+    %(enemy_filters)s::JSONB      AS enemy_filters
+),
+subject_req AS (
+  SELECT
+    NULLIF(UPPER(p.subject->>'role'), '')  AS role,
+    NULLIF(p.subject->>'champ_id','')::INT AS champ_id
+  FROM params p
+),
+ally_req AS (
+  SELECT NULLIF(UPPER(f->>'role'), '')  AS role,
+         NULLIF(f->>'champ_id','')::INT AS champ_id
+  FROM params, LATERAL jsonb_array_elements(params.ally_filters) AS f
+),
+enemy_req AS (
+  SELECT NULLIF(UPPER(f->>'role'), '')  AS role,
+         NULLIF(f->>'champ_id','')::INT AS champ_id
+  FROM params, LATERAL jsonb_array_elements(params.enemy_filters) AS f
+),
+ally_req_all AS (
+  SELECT * FROM subject_req
+  UNION ALL
+  SELECT * FROM ally_req
+),
+candidate_matches AS (
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE (%(patch)s::TEXT IS NULL OR m.patch = %(patch)s::TEXT)
+    AND (%(skill_tier)s::TEXT IS NULL OR m.skill_tier = %(skill_tier)s::TEXT)
+),
+ally_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN ally_req_all ar
+    ON (ar.role     IS NULL OR p.role_derived = ar.role)
+   AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
+),
+enemy_side_matches AS (
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN enemy_req er
+    ON (er.role     IS NULL OR p.role_derived = er.role)
+   AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
+),
+eligible AS (
+  SELECT a.match_key, a.team_id AS ally_team
+  FROM ally_side_matches a
+  LEFT JOIN enemy_side_matches e
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
+  WHERE (SELECT COUNT(*) FROM enemy_req) = 0
+     OR e.team_id IS NOT NULL
+),
+subject_rows AS MATERIALIZED (
+  SELECT DISTINCT p.match_key, p.player_key, p.team_id, p.win
+  FROM eligible el
+  JOIN lol.participants p
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+   AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN subject_req sr
+    ON (sr.role     IS NULL OR p.role_derived = sr.role)
+   AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
+),
+
+-- summary branch
+subject_stats AS (
+  SELECT s.match_key,
+         AVG(fr.gold)::NUMERIC(10,2) AS gold_at_min,
+         AVG(fr.xp)::NUMERIC(10,2)   AS xp_at_min
+  FROM params prm
+  JOIN subject_rows s ON TRUE
+  JOIN lol.participant_frames fr
+    ON fr.match_key  = s.match_key
+   AND fr.player_key = s.player_key
+   AND (%(patch)s::TEXT IS NULL OR fr.patch = %(patch)s::TEXT)
+   AND fr.minute     = prm.minute
+  GROUP BY s.match_key
+),
+rolled AS (
+  SELECT
+    COUNT(DISTINCT s.match_key)                               AS n_games,
+    AVG(CASE WHEN s.win THEN 1.0 ELSE 0.0 END)::NUMERIC(5,3)  AS winrate,
+    AVG(st.gold_at_min)::NUMERIC(10,2)                        AS gold_at_min,
+    AVG(st.xp_at_min)::NUMERIC(10,2)                          AS xp_at_min
+  FROM subject_rows s
+  JOIN subject_stats st ON st.match_key = s.match_key
+),
+
+-- items branch
+subject_item_events AS (
+  SELECT ie.item_id, COUNT(*) AS picks
+  FROM (SELECT DISTINCT match_key, player_key FROM subject_rows) s
+  JOIN lol.item_events ie
+    ON ie.match_key  = s.match_key
+   AND ie.player_key = s.player_key
+   AND (%(patch)s::TEXT IS NULL OR ie.patch = %(patch)s::TEXT)
+  WHERE ie.event_type = 'PURCHASE'
+  GROUP BY ie.item_id
+),
+n_base AS (
+  SELECT COUNT(DISTINCT match_key) AS n_games FROM eligible  -- as top_items counts it
+),
+top AS (
+  SELECT sie.item_id, it.item_name, sie.picks
+  FROM subject_item_events sie
+  JOIN lol.items it ON it.item_id = sie.item_id
+  CROSS JOIN n_base nb
+  WHERE nb.n_games >= (SELECT min_n FROM params)
+  ORDER BY sie.picks DESC
+  LIMIT 25
+)
+SELECT r.n_games, r.winrate, r.gold_at_min, r.xp_at_min,
+       COALESCE((SELECT jsonb_agg(jsonb_build_array(t.item_id, t.item_name, t.picks) ORDER BY t.picks DESC) FROM top t),
+                '[]'::jsonb) AS top_items
+FROM rolled r
+WHERE r.n_games >= (SELECT min_n FROM params);
+
+
+
+-- ==================================
+-- = FLEXIBLE AGG SUMMARY (ARRAYS)  =
+-- ==================================
+-- name: agg_summary_arrays
+-- agg_summary over lol.participant_frame_arrays (sql/frame_arrays.sql, FLEX_FRAME_STORE=arrays)
+WITH
+params AS (
+  SELECT
+    %(patch)s::TEXT               AS patch,
+    %(skill_tier)s::TEXT          AS skill_tier,
+    %(minute)s::INT               AS minute,
+    %(min_n)s::INT                AS min_n,
+    %(subject)s::JSONB            AS subject,
+    %(ally_filters)s::JSONB       AS ally_filters,
+    %(enemy_filters)s::JSONB      AS enemy_filters
+),
+subject_req AS (
+  -- exactly one row describing "my pick"
+  SELECT
+    NULLIF(UPPER(p.subject->>'role'), '')  AS role,
+    NULLIF(p.subject->>'champ_id','')::INT AS champ_id
+  FROM params p
+),
+ally_req AS (
+  -- zero or more extra ally constraints
+  SELECT NULLIF(UPPER(f->>'role'), '')  AS role,
+         NULLIF(f->>'champ_id','')::INT AS champ_id
+  FROM params, LATERAL jsonb_array_elements(params.ally_filters) AS f
+),
+enemy_req AS (
+  -- zero or more enemy constraints
+  SELECT NULLIF(UPPER(f->>'role'), '')  AS role,
+         NULLIF(f->>'champ_id','')::INT AS champ_id
+  FROM params, LATERAL jsonb_array_elements(params.enemy_filters) AS f
+),
+ally_req_all AS (
+  -- subject + any ally filters; all must be on the same team
+  SELECT * FROM subject_req
+  UNION ALL
+  SELECT * FROM ally_req
+),
+candidate_matches AS (
+  SELECT m.match_key
+  FROM lol.matches m
+  WHERE (%(patch)s::TEXT IS NULL OR m.patch = %(patch)s::TEXT)
+    AND (%(skill_tier)s::TEXT IS NULL OR m.skill_tier = %(skill_tier)s::TEXT)
+),
+ally_side_matches AS (
+  -- A match qualifies for the ally side if ALL requested rows
+  -- (subject + ally filters) are satisfied ON THE SAME TEAM.
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN ally_req_all ar
+    ON (ar.role     IS NULL OR p.role_derived = ar.role)
+   AND (ar.champ_id IS NULL OR p.champ_id     = ar.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM ally_req_all)
+),
+enemy_side_matches AS (
+  -- Opposing team must satisfy ALL enemy filters (if any)
+  SELECT cm.match_key, p.team_id
+  FROM candidate_matches cm
+  JOIN lol.participants p ON p.match_key = cm.match_key
+                         AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN enemy_req er
+    ON (er.role     IS NULL OR p.role_derived = er.role)
+   AND (er.champ_id IS NULL OR p.champ_id     = er.champ_id)
+  GROUP BY cm.match_key, p.team_id
+  HAVING COUNT(*) = (SELECT COUNT(*) FROM enemy_req)
+),
+eligible AS (
+  -- Keep matches where ally side is satisfied, and enemy side (if provided)
+  -- is satisfied on the OPPOSITE team.
+  SELECT a.match_key, a.team_id AS ally_team
+  FROM ally_side_matches a
+  LEFT JOIN enemy_side_matches e
+    ON e.match_key = a.match_key AND e.team_id <> a.team_id
+  WHERE (SELECT COUNT(*) FROM enemy_req) = 0
+     OR e.team_id IS NOT NULL
+),
+
+-- Only the subject participant(s) on the ally team
+subject_rows AS (
+  SELECT DISTINCT p.match_key, p.player_key, p.team_id, p.win
+  FROM eligible el
+  JOIN lol.participants p
+    ON p.match_key = el.match_key AND p.team_id = el.ally_team
+   AND (%(patch)s::TEXT IS NULL OR p.patch = %(patch)s::TEXT)
+  JOIN subject_req sr
+    ON (sr.role     IS NULL OR p.role_derived = sr.role)
+   AND (sr.champ_id IS NULL OR p.champ_id     = sr.champ_id)
+),
+
+subject_stats AS (
+  -- one row per participant; minute m sits at index m + 1, NULL past the end of the game
+  SELECT s.match_key,
+         AVG(fr.gold[prm.minute + 1])::NUMERIC(10,2) AS gold_at_min,
+         AVG(fr.xp[prm.minute + 1])::NUMERIC(10,2)   AS xp_at_min
+  FROM params prm
+  JOIN subject_rows s ON TRUE
+  JOIN lol.participant_frame_arrays fr
+    ON fr.match_key  = s.match_key
+   AND fr.player_key = s.player_key
+   AND (%(patch)s::TEXT IS NULL OR fr.patch = %(patch)s::TEXT)
+   AND fr.gold[prm.minute + 1] IS NOT NULL
+  GROUP BY s.match_key
+),
+rolled AS (
+  SELECT
+    COUNT(DISTINCT s.match_key)                               AS n_games,
+    AVG(CASE WHEN s.win THEN 1.0 ELSE 0.0 END)::NUMERIC(5,3)  AS winrate,
+    AVG(st.gold_at_min)::NUMERIC(10,2)                        AS gold_at_min,
+    AVG(st.xp_at_min)::NUMERIC(10,2)                          AS xp_at_min
+  FROM subject_rows s
+  JOIN subject_stats st ON st.match_key = s.match_key
+)
+SELECT n_games, winrate, gold_at_min, xp_at_min
+FROM rolled
+WHERE n_games >= (SELECT min_n FROM params);
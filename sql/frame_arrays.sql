@@ -0,0 +1,18 @@
+-- Compact alternative to lol.participant_frames: one row per participant with per-minute
+-- gold / xp / cs packed into INT[] (minute m at index m + 1). Written when FRAME_STORE=arrays|both,
+-- read by the API when FLEX_FRAME_STORE=arrays and by lol.cube_apply (sql/flex_cube.sql).
+-- backfill_frame_arrays.py converts existing rows.
+-- Partitioned by patch like the other fact tables; needs sql/partitions.sql.
+BEGIN;
+CREATE TABLE IF NOT EXISTS lol.participant_frame_arrays (
+  match_key  BIGINT NOT NULL,
+  player_key INT   NOT NULL,
+  patch      TEXT  NOT NULL,
+  gold       INT[] NOT NULL,
+  xp         INT[] NOT NULL,
+  cs         INT[] NOT NULL,
+  PRIMARY KEY (match_key, player_key, patch),
+  FOREIGN KEY (match_key, player_key, patch) REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE
+) PARTITION BY LIST (patch);
+SELECT lol.create_patch_partitions(patch) FROM (SELECT DISTINCT patch FROM lol.patch_partitions) p;
+COMMIT;
@@ -0,0 +1,27 @@
+-- Crawler work queue (riot.ledger.Ledger). Safe to re-run on an existing database.
+BEGIN;
+CREATE TABLE IF NOT EXISTS seen_match_ids (
+  match_id  TEXT PRIMARY KEY,
+  region    TEXT NOT NULL,
+  seen_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS match_queue (
+  id           BIGSERIAL PRIMARY KEY,
+  match_id     TEXT NOT NULL UNIQUE,
+  region       TEXT NOT NULL,
+  status       TEXT NOT NULL DEFAULT 'queued',   -- queued/processing/done/failed
+  enqueued_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  picked_at    TIMESTAMPTZ,
+  done_at      TIMESTAMPTZ
+);
+
+-- Leases: a 'processing' row whose lease ran out goes back to 'queued' (Ledger.reap_expired)
+ALTER TABLE match_queue ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS match_queue_queued_idx ON match_queue (enqueued_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS match_queue_lease_idx ON match_queue (lease_expires_at) WHERE status = 'processing';
+
+-- Failed fetches go back to 'queued' until attempts reaches the crawler's limit, then 'failed' (Ledger.mark_failed)
+ALTER TABLE match_queue ADD COLUMN IF NOT EXISTS attempts   INT NOT NULL DEFAULT 0;
+ALTER TABLE match_queue ADD COLUMN IF NOT EXISTS last_error TEXT;
+COMMIT;
@@ -0,0 +1,159 @@
+-- Migrates the unpartitioned lol fact tables (restructure.sql before patch partitioning) to
+-- LIST partitions by patch. Apply sql/partitions.sql first and re-run sql/flex_cube.sql after.
+-- The old tables are parked in schema lol_unpartitioned, copied into one partition per patch
+-- and dropped; runs in one transaction, so budget temporary disk for a full copy of the facts.
+BEGIN;
+
+CREATE SCHEMA lol_unpartitioned;
+ALTER TABLE lol.matches            SET SCHEMA lol_unpartitioned;
+ALTER TABLE lol.participants       SET SCHEMA lol_unpartitioned;
+ALTER TABLE lol.participant_frames SET SCHEMA lol_unpartitioned;
+ALTER TABLE lol.item_events        SET SCHEMA lol_unpartitioned;
+
+CREATE TABLE lol.matches (
+  match_key      BIGINT NOT NULL,
+  match_id       TEXT NOT NULL,
+  region         TEXT NOT NULL,
+  queue_id       INT  NOT NULL,
+  patch          TEXT NOT NULL,
+  game_version   TEXT NOT NULL,
+  game_start_ts  TIMESTAMPTZ NOT NULL,
+  duration_s     INT  NOT NULL,
+  skill_tier     TEXT,
+  blue_win       BOOLEAN NOT NULL
+) PARTITION BY LIST (patch);
+
+CREATE TABLE lol.participants (
+  match_key      BIGINT NOT NULL,
+  player_key     INT  NOT NULL,
+  patch          TEXT NOT NULL,
+  team_id        INT  NOT NULL CHECK (team_id IN (100,200)),
+  side           TEXT GENERATED ALWAYS AS (CASE WHEN team_id=100 THEN 'BLUE' ELSE 'RED' END) STORED,
+  champ_id       INT  NOT NULL,
+  lane_raw       TEXT,
+  role_raw       TEXT,
+  lane_derived   TEXT NOT NULL,
+  role_derived   TEXT NOT NULL,
+  win            BOOLEAN NOT NULL,
+  kills          INT NOT NULL,
+  deaths         INT NOT NULL,
+  assists        INT NOT NULL,
+  cs             INT NOT NULL,
+  gold_earned    INT NOT NULL,
+  damage_dealt   INT,
+  item0 INT, item1 INT, item2 INT, item3 INT, item4 INT, item5 INT, item6 INT
+) PARTITION BY LIST (patch);
+
+CREATE TABLE lol.participant_frames (
+  match_key  BIGINT NOT NULL,
+  player_key INT  NOT NULL,
+  patch      TEXT NOT NULL,
+  minute     INT  NOT NULL,
+  gold       INT  NOT NULL,
+  xp         INT  NOT NULL,
+  cs         INT  NOT NULL
+) PARTITION BY LIST (patch);
+
+CREATE TABLE lol.item_events (
+  match_key    BIGINT NOT NULL,
+  player_key   INT   NOT NULL,
+  patch        TEXT  NOT NULL,
+  ts_ms        BIGINT NOT NULL,
+  event_type   TEXT  NOT NULL,
+  item_id      INT   NOT NULL
+) PARTITION BY LIST (patch);
+
+DO $$
+BEGIN
+  IF to_regclass('lol.participant_frame_arrays') IS NOT NULL THEN
+    ALTER TABLE lol.participant_frame_arrays SET SCHEMA lol_unpartitioned;
+    CREATE TABLE lol.participant_frame_arrays (
+      match_key  BIGINT NOT NULL,
+      player_key INT   NOT NULL,
+      patch      TEXT  NOT NULL,
+      gold       INT[] NOT NULL,
+      xp         INT[] NOT NULL,
+      cs         INT[] NOT NULL
+    ) PARTITION BY LIST (patch);
+  END IF;
+END $$;
+
+SELECT lol.create_patch_partitions(patch) FROM (SELECT DISTINCT patch FROM lol_unpartitioned.matches) m;
+
+-- ---- copy; rows are routed to their patch partition, loaded before constraints/indexes exist ----
+INSERT INTO lol.matches (match_key, match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win)
+SELECT match_key, match_id, region, queue_id, patch, game_version, game_start_ts, duration_s, skill_tier, blue_win
+FROM lol_unpartitioned.matches
+ORDER BY patch, match_key;
+
+INSERT INTO lol.participants
+  (match_key, player_key, patch, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
+   win, kills, deaths, assists, cs, gold_earned, damage_dealt, item0, item1, item2, item3, item4, item5, item6)
+SELECT p.match_key, p.player_key, m.patch, p.team_id, p.champ_id, p.lane_raw, p.role_raw, p.lane_derived, p.role_derived,
+       p.win, p.kills, p.deaths, p.assists, p.cs, p.gold_earned, p.damage_dealt,
+       p.item0, p.item1, p.item2, p.item3, p.item4, p.item5, p.item6
+FROM lol_unpartitioned.participants p
+JOIN lol_unpartitioned.matches m ON m.match_key = p.match_key
+ORDER BY m.patch, p.match_key, p.player_key;
+
+INSERT INTO lol.participant_frames (match_key, player_key, patch, minute, gold, xp, cs)
+SELECT f.match_key, f.player_key, m.patch, f.minute, f.gold, f.xp, f.cs
+FROM lol_unpartitioned.participant_frames f
+JOIN lol_unpartitioned.matches m ON m.match_key = f.match_key
+ORDER BY m.patch, f.match_key, f.player_key, f.minute;
+
+INSERT INTO lol.item_events (match_key, player_key, patch, ts_ms, event_type, item_id)
+SELECT e.match_key, e.player_key, m.patch, e.ts_ms, e.event_type, e.item_id
+FROM lol_unpartitioned.item_events e
+JOIN lol_unpartitioned.matches m ON m.match_key = e.match_key
+ORDER BY m.patch, e.match_key, e.player_key, e.ts_ms;
+
+DO $$
+BEGIN
+  IF to_regclass('lol_unpartitioned.participant_frame_arrays') IS NOT NULL THEN
+    INSERT INTO lol.participant_frame_arrays (match_key, player_key, patch, gold, xp, cs)
+    SELECT a.match_key, a.player_key, m.patch, a.gold, a.xp, a.cs
+    FROM lol_unpartitioned.participant_frame_arrays a
+    JOIN lol_unpartitioned.matches m ON m.match_key = a.match_key
+    ORDER BY m.patch, a.match_key, a.player_key;
+  END IF;
+END $$;
+
+DROP SCHEMA lol_unpartitioned CASCADE;
+
+-- ---- constraints and indexes, same as restructure.sql; each cascades to every partition ----
+ALTER TABLE lol.matches ADD PRIMARY KEY (match_key, patch);
+ALTER TABLE lol.matches ADD UNIQUE (match_id, patch);
+ALTER TABLE lol.matches ADD FOREIGN KEY (match_key) REFERENCES lol.match_keys(match_key);
+ALTER TABLE lol.participants ADD PRIMARY KEY (match_key, player_key, patch);
+ALTER TABLE lol.participants ADD FOREIGN KEY (match_key, patch) REFERENCES lol.matches(match_key, patch) ON DELETE CASCADE;
+ALTER TABLE lol.participants ADD FOREIGN KEY (player_key) REFERENCES lol.player_keys(player_key);
+ALTER TABLE lol.participants ADD FOREIGN KEY (champ_id) REFERENCES lol.champions(champ_id);
+ALTER TABLE lol.participant_frames ADD PRIMARY KEY (match_key, player_key, minute, patch) INCLUDE (gold, xp);
+ALTER TABLE lol.participant_frames ADD FOREIGN KEY (match_key, player_key, patch)
+  REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE;
+ALTER TABLE lol.item_events ADD PRIMARY KEY (match_key, player_key, ts_ms, event_type, item_id, patch);
+ALTER TABLE lol.item_events ADD FOREIGN KEY (match_key, player_key, patch)
+  REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE;
+ALTER TABLE lol.item_events ADD FOREIGN KEY (item_id) REFERENCES lol.items(item_id);
+
+DO $$
+BEGIN
+  IF to_regclass('lol.participant_frame_arrays') IS NOT NULL THEN
+    ALTER TABLE lol.participant_frame_arrays ADD PRIMARY KEY (match_key, player_key, patch);
+    ALTER TABLE lol.participant_frame_arrays ADD FOREIGN KEY (match_key, player_key, patch)
+      REFERENCES lol.participants(match_key, player_key, patch) ON DELETE CASCADE;
+  END IF;
+END $$;
+
+CREATE INDEX ON lol.matches (skill_tier, queue_id, region);
+CREATE INDEX ON lol.participants (lane_derived, champ_id, match_key);
+CREATE INDEX ON lol.participants (role_derived, champ_id, match_key);
+CREATE INDEX ON lol.participants (win);
+CREATE INDEX participants_match_team_cover
+  ON lol.participants (match_key, team_id) INCLUDE (player_key, role_derived, champ_id, win, patch);
+CREATE INDEX item_events_purchase_cover
+  ON lol.item_events (match_key, player_key) INCLUDE (item_id, patch) WHERE event_type = 'PURCHASE';
+CREATE INDEX ON lol.item_events (item_id);
+
+COMMIT;
@@ -0,0 +1,44 @@
+-- Per-patch partitions of the lol fact tables (restructure.sql declares them PARTITION BY LIST (patch)).
+-- Ingest calls lol.create_patch_partitions for every patch it writes (run_seed.ensure_patch_partitions);
+-- manage_partitions.py creates upcoming patches ahead of time and detaches / archives old ones.
+BEGIN;
+
+CREATE OR REPLACE FUNCTION lol.patch_partition_suffix(p_patch TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT 'p' || regexp_replace(p_patch, '[^0-9A-Za-z]+', '_', 'g')
+$$;
+
+-- Creates the missing partitions for one patch and returns how many were made.
+-- Parents come before children so each new partition's foreign key has its target in place.
+CREATE OR REPLACE FUNCTION lol.create_patch_partitions(p_patch TEXT) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_table TEXT;
+  v_part  TEXT;
+  v_made  INT := 0;
+BEGIN
+  -- two writers meeting a new patch at once would otherwise race on CREATE TABLE
+  PERFORM pg_advisory_xact_lock(hashtext('lol.create_patch_partitions'));
+  FOREACH v_table IN ARRAY ARRAY['matches', 'participants', 'participant_frames', 'item_events', 'participant_frame_arrays'] LOOP
+    CONTINUE WHEN to_regclass('lol.' || v_table) IS NULL;
+    v_part := v_table || '_' || lol.patch_partition_suffix(p_patch);
+    CONTINUE WHEN to_regclass(format('lol.%I', v_part)) IS NOT NULL;
+    EXECUTE format('CREATE TABLE lol.%I PARTITION OF lol.%I FOR VALUES IN (%L)', v_part, v_table, p_patch);
+    v_made := v_made + 1;
+  END LOOP;
+  RETURN v_made;
+END;
+$$;
+
+-- patch -> attached partitions, e.g. ('14.1', 'lol.matches', 'matches_p14_1')
+CREATE OR REPLACE VIEW lol.patch_partitions AS
+SELECT substring(pg_get_expr(c.relpartbound, c.oid) FROM $re$IN \('(.*)'\)$re$) AS patch,
+       i.inhparent::regclass AS parent,
+       c.relname             AS partition
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent IN (SELECT to_regclass('lol.' || t)
+                      FROM unnest(ARRAY['matches', 'participants', 'participant_frames',
+                                        'item_events', 'participant_frame_arrays']) AS t);
+
+COMMIT;
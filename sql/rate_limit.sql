@@ -0,0 +1,14 @@
+-- Shared rate-limit budget for riot.rate_limit.PgLimiter (RATE_LIMIT_BACKEND=postgres).
+-- Lives next to match_queue / seen_match_ids in the crawler's schema.
+BEGIN;
+CREATE TABLE IF NOT EXISTS rate_limit_hits (
+  bucket  TEXT        NOT NULL,   -- 'americas' or 'americas::match'
+  ts      TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+CREATE INDEX IF NOT EXISTS rate_limit_hits_bucket_ts_idx ON rate_limit_hits (bucket, ts);
+
+CREATE TABLE IF NOT EXISTS rate_limit_blocks (
+  bucket  TEXT PRIMARY KEY,
+  until   TIMESTAMPTZ NOT NULL    -- from Retry-After on a 429
+);
+COMMIT;
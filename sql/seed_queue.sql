@@ -4,7 +4,12 @@ CREATE TABLE IF NOT EXISTS lol.seed_queue (
   region_routing TEXT NOT NULL,
   status      TEXT NOT NULL DEFAULT 'PENDING',
   last_error  TEXT,
-  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  lease_expires_at TIMESTAMPTZ,
+  claimed_by  TEXT  -- run_worker's WORKER_ID while RUNNING
 );
+ALTER TABLE lol.seed_queue ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+ALTER TABLE lol.seed_queue ADD COLUMN IF NOT EXISTS claimed_by TEXT;
 CREATE INDEX IF NOT EXISTS seed_queue_status_idx ON lol.seed_queue (status);
+CREATE INDEX IF NOT EXISTS seed_queue_pending_idx ON lol.seed_queue (updated_at) WHERE status = 'PENDING';
 COMMIT;
@@ -0,0 +1,153 @@
+-- Migrates a text-keyed lol schema (match_id / puuid on every fact row) to the integer
+-- surrogate keys of restructure.sql. Runs in one transaction and rebuilds the fact tables
+-- by copy, so expect roughly the size of participant_frames + item_events in temporary disk.
+-- Re-run flex_cube.sql afterwards (cube_apply joins on the new keys); materialized views that
+-- read the fact tables must be dropped first and recreated after.
+BEGIN;
+
+CREATE TABLE lol.match_keys (
+  match_key  BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  match_id   TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE lol.player_keys (
+  player_key INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  puuid      TEXT NOT NULL UNIQUE
+);
+
+-- oldest games get the smallest keys, so key order roughly follows time
+INSERT INTO lol.match_keys (match_id)
+SELECT match_id FROM lol.matches ORDER BY game_start_ts, match_id;
+
+INSERT INTO lol.player_keys (puuid)
+SELECT DISTINCT puuid FROM lol.participants ORDER BY puuid;
+
+-- ---- new fact tables, loaded before constraints/indexes exist ----
+CREATE TABLE lol.participants_new (
+  match_key      BIGINT NOT NULL,
+  player_key     INT  NOT NULL,
+  team_id        INT  NOT NULL CHECK (team_id IN (100,200)),
+  side           TEXT GENERATED ALWAYS AS (CASE WHEN team_id=100 THEN 'BLUE' ELSE 'RED' END) STORED,
+  champ_id       INT  NOT NULL REFERENCES lol.champions(champ_id),
+  lane_raw       TEXT,
+  role_raw       TEXT,
+  lane_derived   TEXT NOT NULL,
+  role_derived   TEXT NOT NULL,
+  win            BOOLEAN NOT NULL,
+  kills          INT NOT NULL,
+  deaths         INT NOT NULL,
+  assists        INT NOT NULL,
+  cs             INT NOT NULL,
+  gold_earned    INT NOT NULL,
+  damage_dealt   INT,
+  item0 INT, item1 INT, item2 INT, item3 INT, item4 INT, item5 INT, item6 INT
+);
+INSERT INTO lol.participants_new
+  (match_key, player_key, team_id, champ_id, lane_raw, role_raw, lane_derived, role_derived,
+   win, kills, deaths, assists, cs, gold_earned, damage_dealt, item0, item1, item2, item3, item4, item5, item6)
+SELECT mk.match_key, pk.player_key, p.team_id, p.champ_id, p.lane_raw, p.role_raw, p.lane_derived, p.role_derived,
+       p.win, p.kills, p.deaths, p.assists, p.cs, p.gold_earned, p.damage_dealt,
+       p.item0, p.item1, p.item2, p.item3, p.item4, p.item5, p.item6
+FROM lol.participants p
+JOIN lol.match_keys  mk ON mk.match_id = p.match_id
+JOIN lol.player_keys pk ON pk.puuid    = p.puuid
+ORDER BY 1, 2;
+
+CREATE TABLE lol.participant_frames_new (
+  match_key  BIGINT NOT NULL,
+  player_key INT  NOT NULL,
+  minute     INT  NOT NULL,
+  gold       INT  NOT NULL,
+  xp         INT  NOT NULL,
+  cs         INT  NOT NULL
+);
+INSERT INTO lol.participant_frames_new (match_key, player_key, minute, gold, xp, cs)
+SELECT mk.match_key, pk.player_key, f.minute, f.gold, f.xp, f.cs
+FROM lol.participant_frames f
+JOIN lol.match_keys  mk ON mk.match_id = f.match_id
+JOIN lol.player_keys pk ON pk.puuid    = f.puuid
+ORDER BY 1, 2, 3;
+
+CREATE TABLE lol.item_events_new (
+  match_key    BIGINT NOT NULL,
+  player_key   INT   NOT NULL,
+  ts_ms        BIGINT NOT NULL,
+  event_type   TEXT  NOT NULL,   -- PURCHASE/SELL/UNDO
+  item_id      INT   NOT NULL REFERENCES lol.items(item_id)
+);
+INSERT INTO lol.item_events_new (match_key, player_key, ts_ms, event_type, item_id)
+SELECT mk.match_key, pk.player_key, e.ts_ms, e.event_type, e.item_id
+FROM lol.item_events e
+JOIN lol.match_keys  mk ON mk.match_id = e.match_id
+JOIN lol.player_keys pk ON pk.puuid    = e.puuid
+ORDER BY 1, 2, 3;
+
+-- packed frames (sql/frame_arrays.sql), when that table exists
+DO $$
+BEGIN
+  IF to_regclass('lol.participant_frame_arrays') IS NOT NULL THEN
+    CREATE TABLE lol.participant_frame_arrays_new AS
+    SELECT mk.match_key, pk.player_key, a.gold, a.xp, a.cs
+    FROM lol.participant_frame_arrays a
+    JOIN lol.match_keys  mk ON mk.match_id = a.match_id
+    JOIN lol.player_keys pk ON pk.puuid    = a.puuid
+    ORDER BY 1, 2;
+    DROP TABLE lol.participant_frame_arrays;
+    ALTER TABLE lol.participant_frame_arrays_new RENAME TO participant_frame_arrays;
+  END IF;
+END $$;
+
+DROP TABLE lol.item_events;
+DROP TABLE lol.participant_frames;
+DROP TABLE lol.participants;
+ALTER TABLE lol.participants_new       RENAME TO participants;
+ALTER TABLE lol.participant_frames_new RENAME TO participant_frames;
+ALTER TABLE lol.item_events_new        RENAME TO item_events;
+ALTER TABLE lol.participants RENAME CONSTRAINT participants_new_team_id_check  TO participants_team_id_check;
+ALTER TABLE lol.participants RENAME CONSTRAINT participants_new_champ_id_fkey  TO participants_champ_id_fkey;
+ALTER TABLE lol.item_events  RENAME CONSTRAINT item_events_new_item_id_fkey    TO item_events_item_id_fkey;
+
+-- ---- matches: match_key becomes the primary key, match_id stays as a unique lookup ----
+ALTER TABLE lol.matches ADD COLUMN match_key BIGINT;
+UPDATE lol.matches m SET match_key = mk.match_key FROM lol.match_keys mk WHERE mk.match_id = m.match_id;
+ALTER TABLE lol.matches DROP CONSTRAINT matches_pkey;
+ALTER TABLE lol.matches ALTER COLUMN match_key SET NOT NULL;
+ALTER TABLE lol.matches ADD PRIMARY KEY (match_key);
+ALTER TABLE lol.matches ADD UNIQUE (match_id);
+ALTER TABLE lol.matches ADD FOREIGN KEY (match_key) REFERENCES lol.match_keys(match_key);
+
+-- ---- constraints and indexes, same as restructure.sql ----
+ALTER TABLE lol.participants ADD PRIMARY KEY (match_key, player_key);
+ALTER TABLE lol.participants ADD FOREIGN KEY (match_key) REFERENCES lol.matches(match_key) ON DELETE CASCADE;
+ALTER TABLE lol.participants ADD FOREIGN KEY (player_key) REFERENCES lol.player_keys(player_key);
+ALTER TABLE lol.participant_frames ADD PRIMARY KEY (match_key, player_key, minute);
+ALTER TABLE lol.participant_frames ADD FOREIGN KEY (match_key, player_key)
+  REFERENCES lol.participants(match_key, player_key) ON DELETE CASCADE;
+ALTER TABLE lol.item_events ADD PRIMARY KEY (match_key, player_key, ts_ms, event_type, item_id);
+ALTER TABLE lol.item_events ADD FOREIGN KEY (match_key, player_key)
+  REFERENCES lol.participants(match_key, player_key) ON DELETE CASCADE;
+
+DO $$
+BEGIN
+  IF to_regclass('lol.participant_frame_arrays') IS NOT NULL THEN
+    ALTER TABLE lol.participant_frame_arrays ALTER COLUMN match_key SET NOT NULL;
+    ALTER TABLE lol.participant_frame_arrays ALTER COLUMN player_key SET NOT NULL;
+    ALTER TABLE lol.participant_frame_arrays ALTER COLUMN gold SET NOT NULL;
+    ALTER TABLE lol.participant_frame_arrays ALTER COLUMN xp SET NOT NULL;
+    ALTER TABLE lol.participant_frame_arrays ALTER COLUMN cs SET NOT NULL;
+    ALTER TABLE lol.participant_frame_arrays ADD PRIMARY KEY (match_key, player_key);
+    ALTER TABLE lol.participant_frame_arrays ADD FOREIGN KEY (match_key, player_key)
+      REFERENCES lol.participants(match_key, player_key) ON DELETE CASCADE;
+  END IF;
+END $$;
+
+CREATE INDEX ON lol.participants (lane_derived, champ_id, match_key);
+CREATE INDEX ON lol.participants (role_derived, champ_id, match_key);
+CREATE INDEX ON lol.participants (team_id, match_key);
+CREATE INDEX ON lol.participants (win);
+CREATE INDEX ON lol.participant_frames (minute);
+CREATE INDEX ON lol.participant_frames (match_key, player_key);
+CREATE INDEX ON lol.item_events (player_key, match_key);
+CREATE INDEX ON lol.item_events (item_id);
+
+COMMIT;
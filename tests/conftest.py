@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+os.environ.setdefault("RIOT_API_KEY", "test")  # riot.client reads it at import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,111 @@
+# tests/test_cache.py
+import types
+
+import pytest
+
+from api import cache
+from api.cache import DataVersions, LocalBackend, ResponseCache, canonical_key
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=c.monotonic))
+    return c
+
+# ---- DataVersions ----
+def test_stamp_combines_global_and_patch_versions(clock):
+    dv = DataVersions(lambda: {"*": 2, "15.1": 7, "15.2": 3})
+    assert dv.stamp("15.1") == "2.7"
+    assert dv.stamp("99.9") == "2.0"
+    assert dv.stamp(None) == "2.10"  # all-patch answers follow every patch
+
+def test_stamp_rereads_only_after_poll_interval(clock):
+    versions = {"15.1": 1}
+    calls = []
+    dv = DataVersions(lambda: calls.append(1) or dict(versions), poll_s=2.0)
+    assert dv.stamp("15.1") == "0.1"
+    versions["15.1"] = 2
+    clock.now += 1.0
+    assert not dv.due()
+    assert dv.stamp("15.1") == "0.1"
+    clock.now += 1.0
+    assert dv.due()
+    assert dv.stamp("15.1") == "0.2"
+    assert len(calls) == 2
+
+def test_failed_fetch_keeps_the_last_snapshot(clock):
+    answers = [{"15.1": 4}]
+    def fetch():
+        if not answers:
+            raise OSError("db down")
+        return answers.pop()
+    dv = DataVersions(fetch, poll_s=1.0)
+    assert dv.stamp("15.1") == "0.4"
+    clock.now += 5.0
+    assert dv.stamp("15.1") == "0.4"
+    assert not dv.due()  # the failed read still waits a full interval before retrying
+
+def test_canonical_key_ignores_dict_order():
+    assert canonical_key({"a": 1, "b": [1, 2]}) == canonical_key({"b": [1, 2], "a": 1})
+    assert canonical_key({"a": 1}) != canonical_key({"a": 2})
+
+# ---- ResponseCache ----
+def size(response):
+    return len(cache.json.dumps(response, separators=(",", ":")).encode())
+
+def test_hit_and_miss(clock):
+    rc = ResponseCache(max_bytes=1024, ttl_s=60)
+    assert rc.get("k") is None
+    rc.set("k", {"n": 1})
+    assert rc.get("k") == {"n": 1}
+    assert (rc.stats["hits"], rc.stats["misses"]) == (1, 1)
+
+def test_entries_expire_after_ttl(clock):
+    rc = ResponseCache(max_bytes=1024, ttl_s=10)
+    rc.set("k", {"n": 1})
+    clock.now += 9.9
+    assert rc.get("k") == {"n": 1}
+    clock.now += 0.2
+    assert rc.get("k") is None
+    assert rc.stats["expired"] == 1
+    assert rc.snapshot()["entries"] == 0
+
+def test_evicts_least_recently_used_by_bytes(clock):
+    one = {"v": "x" * 20}
+    rc = ResponseCache(max_bytes=3 * size(one), ttl_s=60)
+    for k in ("a", "b", "c"):
+        rc.set(k, one)
+    rc.get("a")  # now b is the oldest
+    rc.set("d", one)
+    assert rc.get("b") is None
+    assert all(rc.get(k) == one for k in ("a", "c", "d"))
+    assert rc.stats["evictions"] == 1
+    assert rc.snapshot()["bytes"] == 3 * size(one)
+
+def test_overwrite_replaces_bytes(clock):
+    rc = ResponseCache(max_bytes=1024, ttl_s=60)
+    rc.set("k", {"v": "x" * 50})
+    rc.set("k", {"v": "y"})
+    assert rc.snapshot()["bytes"] == size({"v": "y"})
+
+def test_response_larger_than_the_budget_is_not_kept(clock):
+    rc = ResponseCache(max_bytes=8, ttl_s=60)
+    rc.set("k", {"v": "x" * 50})
+    assert rc.get("k") is None
+    assert rc.stats["too_large"] == 1
+
+def test_local_miss_falls_back_to_shared(clock):
+    shared = LocalBackend()
+    ResponseCache(max_bytes=1024, ttl_s=60, shared=shared).set("k", {"n": 1})
+    rc = ResponseCache(max_bytes=1024, ttl_s=60, shared=shared)
+    assert rc.get("k") == {"n": 1}
+    assert rc.stats["shared_hits"] == 1
+    assert rc.get("k") == {"n": 1}
+    assert rc.stats["hits"] == 1  # the shared hit was copied into the local LRU
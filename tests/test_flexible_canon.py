@@ -0,0 +1,45 @@
+# tests/test_flexible_canon.py
+from api.cache import DataVersions
+from api.routes import flexible as F
+
+R = F.RoleFilter
+
+def body(**kw):
+    return F.FlexibleBody(**{"patch": "15.1", "min_n": 1, **kw})
+
+def canon(b):
+    return F.canonical_body(b.subject, b.ally_filters, b.enemy_filters, b)
+
+def test_norm_role_trims_and_upper_cases_like_the_sql():
+    assert F._norm_role(" mid ") == "MID"
+    assert F._norm_role("Jungle") == "JUNGLE"
+    assert F._norm_role("") is None
+    assert F._norm_role("   ") is None
+    assert F._norm_role(None) is None
+
+def test_filters_are_matched_as_sets(monkeypatch):
+    monkeypatch.setitem(F.VERSIONS, "postgres", DataVersions(lambda: {"15.1": 3}))  # no database
+    a = body(subject=R(role="mid", champ_id=1), ally_filters=[R(champ_id=9), R(role="top")],
+             enemy_filters=[R(role="bottom", champ_id=3), R(champ_id=2)])
+    b = body(subject=R(role=" MID", champ_id=1), ally_filters=[R(role="TOP "), R(champ_id=9)],
+             enemy_filters=[R(champ_id=2), R(role="Bottom", champ_id=3)])
+    assert canon(a) == canon(b)
+    assert F.cache_key(canon(a), "15.1") == F.cache_key(canon(b), "15.1")
+
+def test_ally_and_enemy_sides_stay_apart():
+    a = body(subject=R(champ_id=1), ally_filters=[R(champ_id=2)])
+    b = body(subject=R(champ_id=1), enemy_filters=[R(champ_id=2)])
+    assert canon(a) != canon(b)
+
+def test_canonical_body_replays_as_the_same_request():
+    a = body(subject=R(role="mid", champ_id=1), ally_filters=[R(role=" "), R(champ_id=4)], skill_tier="GOLD")
+    c = canon(a)
+    again = F.FlexibleBody(**c)
+    assert canon(again) == c
+    assert c["ally_filters"][0] == {"role": None, "champ_id": None}
+
+def test_raw_params_carry_normalised_roles():
+    a = body(subject=R(role=" top ", champ_id=2), enemy_filters=[R(role="mid")])
+    p = F.raw_params(a.subject, a.ally_filters, a)
+    assert F.json.loads(p["subject"]) == {"role": "TOP", "champ_id": 2}
+    assert F.json.loads(p["enemy_filters"]) == [{"role": "MID", "champ_id": None}]
@@ -0,0 +1,31 @@
+# tests/test_rate_limit.py
+from riot.rate_limit import _wait_needed, parse_rate_header, retry_after
+
+def test_room_left_means_no_wait():
+    assert _wait_needed([], [(2, 1.0)], 10.0) == 0.0
+    assert _wait_needed([9.5], [(2, 1.0)], 10.0) == 0.0
+
+def test_full_window_waits_for_the_limit_th_newest_hit():
+    # 3 hits in the last second against 3/s: the oldest of them (9.2) ages out at 10.2
+    assert abs(_wait_needed([9.2, 9.5, 9.9], [(3, 1.0)], 10.0) - 0.2) < 1e-9
+
+def test_hits_outside_the_window_dont_count():
+    assert _wait_needed([1.0, 2.0, 9.9], [(2, 1.0)], 10.0) == 0.0
+
+def test_longest_wait_across_windows_wins():
+    stamps = [0.0, 5.0, 9.8, 9.9]
+    # 2/1s is full until 10.8; 4/120s is full until 120.0
+    assert abs(_wait_needed(stamps, [(2, 1.0), (4, 120.0)], 10.0) - 110.0) < 1e-9
+
+def test_unusable_windows_are_skipped():
+    assert _wait_needed([9.9], [(0, 1.0), (1, 0.0)], 10.0) == 0.0
+
+def test_parse_rate_header_drops_malformed_and_non_positive_pairs():
+    assert parse_rate_header("20:1,100:120") == [(20, 1.0), (100, 120.0)]
+    assert parse_rate_header("0:1, x:2, 5:0, 3:10") == [(3, 10.0)]
+    assert parse_rate_header(None) == []
+
+def test_retry_after():
+    assert retry_after({"Retry-After": "3"}) == 3.0
+    assert retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 1.0
+    assert retry_after({}, default=2.5) == 2.5
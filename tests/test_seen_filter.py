@@ -0,0 +1,43 @@
+# tests/test_seen_filter.py
+import pytest
+
+from riot.seen_filter import SeenFilter
+
+def ids(n, prefix="NA1_"):
+    return [f"{prefix}{5_000_000_000 + i}" for i in range(n)]
+
+def test_added_ids_are_always_found():
+    sf = SeenFilter(memory_bytes=4096, expected_items=1000)
+    sf.update(ids(1000))
+    assert all(sf.might_contain(mid) for mid in ids(1000))
+    assert sf.count == 1000
+
+def test_false_positives_stay_near_the_estimate():
+    sf = SeenFilter(memory_bytes=4096, expected_items=1000)
+    sf.update(ids(1000))
+    fresh = ids(10_000, prefix="EUW1_")
+    fp = sum(mid in sf for mid in fresh) / len(fresh)
+    assert fp < 3 * sf.estimated_fp_rate() + 0.005
+
+def test_empty_filter_contains_nothing():
+    sf = SeenFilter(memory_bytes=1024, expected_items=100)
+    assert not any(sf.might_contain(mid) for mid in ids(100))
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "seen.bin")
+    sf = SeenFilter(memory_bytes=2048, expected_items=200)
+    sf.update(ids(200))
+    sf.save(path)
+    back = SeenFilter.load(path)
+    assert (back.m, back.k, back.count, back.bits) == (sf.m, sf.k, sf.count, sf.bits)
+    assert not (tmp_path / "seen.bin.tmp").exists()
+
+def test_load_rejects_foreign_and_truncated_files(tmp_path):
+    path = tmp_path / "seen.bin"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        SeenFilter.load(str(path))
+    SeenFilter(memory_bytes=2048, expected_items=200).save(str(path))
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        SeenFilter.load(str(path))